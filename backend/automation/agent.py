@@ -22,6 +22,7 @@ from automation.workflow_state_machine import WorkflowStateMachine, WorkflowStat
 from services.browser_automation_service import browser_service
 from services.head_brain_service import head_brain_service
 from services.planner_service import planner_service
+from services.grounding_cache_service import grounding_cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -245,6 +246,9 @@ class AutonomousAgent:
             logger.error("No steps in plan!")
             return False
         
+        # Step verdicts are judged against this run's goal checks only
+        await self.verification.settle_step_verdicts()
+        
         # Navigate to target URL first
         target_url = self.current_plan.get("target_url")
         if target_url:
@@ -276,6 +280,7 @@ class AutonomousAgent:
                 # Check if goal achieved
                 if await self._check_goal_completion():
                     logger.info("🎉 [AGENT] Goal achieved!")
+                    await self.verification.settle_step_verdicts(True)
                     return True
                     
             else:
@@ -299,8 +304,10 @@ class AutonomousAgent:
             logger.error("❌ [AGENT] Max steps reached")
             return False
         
-        # All steps completed
-        return await self._check_goal_completion()
+        # All steps completed: a missed goal contradicts the step verdicts that passed them
+        achieved = await self._check_goal_completion()
+        await self.verification.settle_step_verdicts(achieved)
+        return achieved
     
     async def _execute_step(self, step: Dict[str, Any]) -> bool:
         """
@@ -398,6 +405,9 @@ class AutonomousAgent:
                     
                     # Get new perception for validation
                     new_perception = await self.perception.capture_state(self.session_id)
+                    change = new_perception.get("visual_change")
+                    if change is not None:
+                        self.execution_history[-1]["change_score"] = change.get("score")
                     
                     # Verify step completion
                     is_completed = await self.verification.verify_step(
@@ -406,10 +416,13 @@ class AutonomousAgent:
                         after_perception=new_perception,
                         action_result=action_result
                     )
+                    # An LLM / cached grounding that led to a failed step is forgotten
+                    await grounding_cache_service.report(decision.get("grounding"), is_completed)
                     
                     return is_completed
                 else:
                     logger.warning(f"⚠️ [AGENT] Action failed: {action_result.get('error')}")
+                    await grounding_cache_service.report(decision.get("grounding"), False)
                     return False
             
             logger.warning("⚠️ [AGENT] No action decided")
@@ -892,7 +905,8 @@ Please analyze using this structured approach:
             "success_rate": (self.metrics["steps_completed"] / max(1, self.total_steps)) * 100,
             "execution_time": total_time,
             "steps_per_minute": (self.total_steps / max(1, total_time / 60)) if total_time > 0 else 0,
-            "retry_rate": (self.metrics["retries"] / max(1, self.total_steps)) * 100
+            "retry_rate": (self.metrics["retries"] / max(1, self.total_steps)) * 100,
+            "perception_cache": self.perception.get_cache_stats()
         })
         
         return self.metrics
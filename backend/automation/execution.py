@@ -9,6 +9,7 @@ import random
 from typing import Dict, Any, Optional
 
 from services.browser_automation_service import browser_service
+from services.resource_policy_service import resource_policy_service
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +43,14 @@ class Execution:
             action_type = action.get("type", "").lower()
             logger.info(f"⚡ [EXECUTION] Executing {action_type}")
             
+            # Per-action resource policy (relaxed when the action needs vision on real imagery)
+            await resource_policy_service.begin_step(
+                session_id,
+                policy=action.get("resource_policy"),
+                action=action_type,
+                needs_vision=bool(action.get("needs_vision"))
+            )
+            
             # Ensure page is ready
             await self._ensure_page_ready(session_id)
             
@@ -81,6 +90,9 @@ class Execution:
                 "error": str(e),
                 "action": action
             }
+        
+        finally:
+            await resource_policy_service.end_step(session_id)
     
     async def _ensure_page_ready(self, session_id: str, timeout_seconds: int = 10):
         """Ensure page is fully loaded and ready for interaction"""
@@ -111,14 +123,11 @@ class Execution:
             result = await self.browser_service.navigate(session_id, url)
             
             if result.get("success"):
-                # Capture screenshot after navigation
-                screenshot = await self.browser_service.capture_screenshot(session_id)
-                
                 return {
                     "success": True,
                     "url": result.get("url"),
                     "title": result.get("title"),
-                    "screenshot": screenshot,
+                    "screenshot_ref": result.get("screenshot_ref"),
                     "action": "navigate"
                 }
             else:
@@ -142,6 +151,12 @@ class Execution:
             text = action.get("text", "")
             field = action.get("field", "")
             
+            if action.get("scroll_to"):
+                located = await self._scroll_target_into_view(action["scroll_to"], session_id)
+                if not located.get("success"):
+                    return {"success": False, "error": located.get("error", "Target could not be scrolled into view"), "action": "type_at_cell"}
+                cell = located["cell"]
+            
             if not cell:
                 return {"success": False, "error": "No cell specified for typing"}
             
@@ -159,7 +174,7 @@ class Execution:
                     "cell": cell,
                     "text": text,
                     "field": field,
-                    "screenshot": result.get("screenshot"),
+                    "screenshot_ref": result.get("screenshot_ref"),
                     "action": "type_at_cell"
                 }
             else:
@@ -182,6 +197,12 @@ class Execution:
         try:
             cell = action.get("cell", "")
             
+            if action.get("scroll_to"):
+                located = await self._scroll_target_into_view(action["scroll_to"], session_id)
+                if not located.get("success"):
+                    return {"success": False, "error": located.get("error", "Target could not be scrolled into view"), "action": "click_cell"}
+                cell = located["cell"]
+            
             if not cell:
                 return {"success": False, "error": "No cell specified for clicking"}
             
@@ -198,7 +219,7 @@ class Execution:
                     "success": True,
                     "cell": cell,
                     "coordinates": result.get("coordinates"),
-                    "screenshot": result.get("screenshot"),
+                    "screenshot_ref": result.get("screenshot_ref"),
                     "action": "click_cell"
                 }
             else:
@@ -321,14 +342,14 @@ class Execution:
                     errors.append(f"Error filling field {field_element.get('label', 'unknown')}: {field_error}")
             
             # Capture final screenshot
-            screenshot = await self.browser_service.capture_screenshot(session_id)
+            screenshot_ref = await self.browser_service.capture_screenshot_ref(session_id)
             
             return {
                 "success": filled_count > 0,
                 "fields_filled": filled_count,
                 "total_fields": len(form_fields),
                 "errors": errors,
-                "screenshot": screenshot,
+                "screenshot_ref": screenshot_ref.to_dict() if screenshot_ref else None,
                 "action": "fill_form"
             }
         
@@ -400,7 +421,7 @@ class Execution:
                 "success": result.get("success", False),
                 "captcha_solved": result.get("success", False),
                 "message": result.get("message", "No CAPTCHA detected"),
-                "screenshot": result.get("screenshot"),
+                "screenshot_ref": result.get("screenshot_ref"),
                 "action": "solve_captcha"
             }
         
@@ -411,6 +432,11 @@ class Execution:
                 "action": "solve_captcha"
             }
     
+    async def _scroll_target_into_view(self, scroll_to: Dict[str, Any], session_id: str) -> Dict[str, Any]:
+        """One precise scroll to an off-screen target from the element index; returns its new cell"""
+        logger.info(f"📜 [EXECUTION] Bringing off-screen element {scroll_to.get('eid')} into view")
+        return await self.browser_service.scroll_to_element(session_id, scroll_to.get("eid"), scroll_to.get("doc"))
+    
     async def execute_scroll(self, session_id: str, direction: str = "down", amount: int = 400) -> Dict[str, Any]:
         """Execute scrolling action"""
         try:
@@ -431,7 +457,7 @@ class Execution:
                 "success": True,
                 "direction": direction,
                 "amount": amount,
-                "screenshot": result.get("screenshot_base64"),
+                "screenshot_ref": result.get("screenshot_ref"),
                 "action": "scroll"
             }
         
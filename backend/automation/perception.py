@@ -3,14 +3,24 @@ Perception - State capture and analysis
 Integrates with existing browser_automation_service and scene_builder_service
 """
 
+import os
+import time
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from services.browser_automation_service import browser_service
 from services.scene_builder_service import scene_builder_service
+from services.grid_service import grid_config
+from services.element_set import ElementSet
+from services.page_snapshot_service import page_snapshot_service
+from services.visual_diff_service import visual_diff_service
 
 logger = logging.getLogger(__name__)
 
+# Max age of a cached observation. Counters cover DOM/scroll/resize changes, the TTL
+# bounds staleness from things they cannot see (canvas, video, CSS animations).
+PERCEPTION_CACHE_TTL_S = float(os.environ.get('PERCEPTION_CACHE_TTL_S', '5'))
+
 class Perception:
     """
     Perception system that captures and analyzes current page state.
@@ -20,11 +30,53 @@ class Perception:
     def __init__(self):
         self.browser_service = browser_service
         self.scene_builder = scene_builder_service
+        # session_id -> {"key", "scroll", "snapshot", "state", "ts"}
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self.cache_stats = {"hits": 0, "partial": 0, "misses": 0}
+    
+    def _cache_key(self, probe: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+        """(url, DOM version, viewport, grid) or None if the page cannot be versioned"""
+        if not probe or not probe.get("versions") or probe.get("ready_state") != "complete":
+            return None
+        versions = probe["versions"]
+        return (
+            probe.get("url"),
+            versions.get("dom"),
+            versions.get("resize"),
+            probe.get("vw"),
+            probe.get("vh"),
+            self.browser_service.grid_rows,
+            self.browser_service.grid_cols
+        )
+    
+    def invalidate(self, session_id: Optional[str] = None):
+        """Drop cached observation for a session (or all sessions)"""
+        if session_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(session_id, None)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/partial/miss counters of the perception cache"""
+        total = sum(self.cache_stats.values())
+        return {
+            **self.cache_stats,
+            "total": total,
+            "hit_ratio": round((self.cache_stats["hits"] + self.cache_stats["partial"]) / total, 3) if total else 0.0,
+            "cached_sessions": len(self._cache)
+        }
     
     async def capture_state(self, session_id: str) -> Dict[str, Any]:
         """
         Capture complete page state including visual and structural information.
         
+        Captures are cached per session and keyed by (url, DOM version, viewport, grid)
+        read from in-page counters:
+        - nothing changed        -> cached state returned without touching the page
+        - only scroll changed    -> screenshot, clickables, vision and scene recomputed;
+                                    page text and analysis reused
+        - anything else changed  -> full capture
+        
         Args:
             session_id: Browser session identifier
             
@@ -33,50 +85,87 @@ class Perception:
         """
         try:
             if session_id not in self.browser_service.sessions:
+                self.invalidate(session_id)
                 raise ValueError(f"Session {session_id} not found")
             
             page = self.browser_service.sessions[session_id]['page']
             
-            # 1. Capture screenshot
-            screenshot_base64 = await self.browser_service.capture_screenshot(session_id)
-            
-            # 2. Inject grid and collect DOM data
+            await page_snapshot_service.ensure_version_tracking(page)
+            probe = await page_snapshot_service.read_versions(page)
+            key = self._cache_key(probe)
+            cached = self._cache.get(session_id)
+            
+            if key and cached and cached["key"] == key and time.time() - cached["ts"] < PERCEPTION_CACHE_TTL_S:
+                if cached["scroll"] == probe["versions"].get("scroll"):
+                    self.cache_stats["hits"] += 1
+                    logger.info(f"📸 [PERCEPTION] Cache hit: {cached['state'].get('url')}")
+                    # No frame was compared: verification compares screenshot refs itself
+                    return {**cached["state"], "visual_change": None}
+                state = await self._capture_scrolled(session_id, page, cached)
+                self.cache_stats["partial"] += 1
+                self._store(session_id, key, probe, cached["snapshot"], state)
+                return dict(state)
+            
+            self.cache_stats["misses"] += 1
+            
+            # 1. Capture screenshot (stored as bytes, referenced by digest)
+            screenshot_ref = await self.browser_service.capture_screenshot_ref(session_id)
+            
+            # 2. Inject grid (once per page) and take ONE page snapshot:
+            #    clickables, forms/inputs/buttons, messages, text, hints, readyState
             await self.browser_service._inject_grid_overlay(page)
-            dom_data = await self.browser_service._collect_dom_clickables(page)
-            
-            # 3. Augment with vision
-            vision_elements = await self.browser_service._augment_with_vision(screenshot_base64, dom_data)
-            
-            # 4. Build scene JSON
+            snapshot = await page_snapshot_service.capture(page)
+            dom_data = page_snapshot_service.dom_data(snapshot)
+            
+            # 3. Augment with vision - skipped when nothing visible changed on the same page
+            visual_change = None
+            previous = cached["state"] if cached else None
+            if previous and previous.get("screenshot_ref") and previous.get("url") == snapshot.get("url"):
+                visual_change = await visual_diff_service.compare_async(previous["screenshot_ref"], screenshot_ref)
+            if visual_diff_service.is_unchanged(visual_change):
+                vision_elements = previous.get("vision", [])
+                vision_set = previous.get("vision_set")
+                if vision_set is None:
+                    vision_set = ElementSet.from_dicts(vision_elements)
+                visual_diff_service.record_skip("vision")
+                logger.info(f"📸 [PERCEPTION] No visible change (score={visual_change['change_score']}), reusing vision")
+            else:
+                vision_set = await self.browser_service._augment_with_vision(screenshot_ref, dom_data, session_id, as_set=True)
+                vision_elements = vision_set.to_dicts()
+            
+            # 4. Build scene JSON (reuses the snapshot, no extra page calls)
             scene = await self.scene_builder.build_scene(
                 page=page,
                 dom_data=dom_data,
-                vision_elements=vision_elements,
-                session_id=session_id
+                vision_elements=vision_set,
+                session_id=session_id,
+                snapshot=snapshot,
+                diff=True
             )
             
-            # 5. Extract page text for analysis
-            page_text = await page.evaluate("() => document.body?.innerText || ''")
-            
-            # 6. Get current URL and title
-            current_url = page.url
-            title = await page.title()
+            # 5. Page text, URL and title from the snapshot
+            page_text = snapshot.get("page_text") or ""
+            current_url = snapshot.get("url") or page.url
+            title = snapshot.get("title", "")
             
-            # 7. Check for loading state
-            loading_status = await self.browser_service.is_page_loading(page)
+            # 6. Loading state from readyState + loader indicators
+            loading_status = page_snapshot_service.loading_status(snapshot)
             
-            # 8. Detect common page elements
-            page_analysis = await self._analyze_page_content(page)
+            # 7. Detect common page elements
+            page_analysis = self._analyze_page_content(snapshot)
             
             state = {
-                # Visual information
-                "screenshot_base64": screenshot_base64,
-                "screenshot_id": f"perception_{session_id}_{int(scene.get('ts', 0))}",
+                # Visual information (base64 only at the edge via screenshot_store)
+                "screenshot_ref": screenshot_ref.to_dict() if screenshot_ref else None,
+                "screenshot_id": screenshot_ref.digest if screenshot_ref else f"perception_{session_id}_{int(scene.get('ts', 0))}",
                 
-                # Structural information  
+                # Structural information (vision[] dicts for prompts and routes, the set for matching)
                 "vision": vision_elements,
+                "vision_set": vision_set,
                 "scene": scene,
                 "dom_data": dom_data,
+                # Every interactive element with its page offset (incl. below the fold)
+                "element_index": page_snapshot_service.element_index(snapshot),
                 
                 # Page information
                 "url": current_url,
@@ -86,111 +175,105 @@ class Perception:
                 # State analysis
                 "loading": loading_status,
                 "page_analysis": page_analysis,
+                "visual_change": {
+                    "score": visual_change["change_score"],
+                    "regions": visual_change["regions"]
+                } if visual_change else None,
                 
                 # Meta information
+                "session_id": session_id,
                 "viewport": scene.get("viewport", [1280, 800]),
-                "grid": {"rows": self.browser_service.grid_rows, "cols": self.browser_service.grid_cols},
+                "grid": grid_config.to_dict(),
                 "timestamp": scene.get("ts"),
                 
                 # Summary for quick access
                 "summary": self._create_summary(scene, page_analysis, current_url)
             }
             
-            logger.info(f"📸 [PERCEPTION] Captured state: {len(vision_elements)} elements, {current_url}")
-            return state
+            logger.info(f"📸 [PERCEPTION] Captured state: {len(vision_set)} elements, {current_url}")
+            if key and not snapshot.get("error"):
+                self._store(session_id, key, probe, snapshot, state)
+            else:
+                self.invalidate(session_id)
+            return dict(state)
             
         except Exception as e:
+            self.invalidate(session_id)
             logger.error(f"❌ [PERCEPTION] State capture failed: {e}")
             return {
                 "error": str(e),
-                "screenshot_base64": None,
+                "screenshot_ref": None,
                 "vision": [],
                 "scene": {},
                 "url": "unknown",
                 "summary": f"Perception failed: {e}"
             }
     
-    async def _analyze_page_content(self, page) -> Dict[str, Any]:
-        """Analyze page content for common patterns and elements"""
+    async def _capture_scrolled(self, session_id: str, page, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """Recompute only viewport-dependent parts (scroll moved, DOM unchanged)"""
+        screenshot_ref = await self.browser_service.capture_screenshot_ref(session_id)
+        clickables = await page_snapshot_service.capture(page, parts=["clickables"])
+        # The delta/token must come from this collection: the cached ones describe an
+        # older one and would make the scene builder patch against the wrong base
+        snapshot = {k: v for k, v in cached["snapshot"].items() if k not in ("clickables_delta", "clickables_token")}
+        snapshot.update({
+            "clickables": clickables.get("clickables") or [],
+            "scroll": clickables.get("scroll"),
+            "blind": clickables.get("blind") or [],
+            "clickables_delta": clickables.get("clickables_delta"),
+            "clickables_token": clickables.get("clickables_token")
+        })
+        dom_data = page_snapshot_service.dom_data(snapshot)
+        vision_set = await self.browser_service._augment_with_vision(screenshot_ref, dom_data, session_id, as_set=True)
+        scene = await self.scene_builder.build_scene(
+            page=page,
+            dom_data=dom_data,
+            vision_elements=vision_set,
+            session_id=session_id,
+            snapshot=snapshot,
+            diff=True
+        )
+        state = {
+            **cached["state"],
+            "screenshot_ref": screenshot_ref.to_dict() if screenshot_ref else None,
+            "screenshot_id": screenshot_ref.digest if screenshot_ref else f"perception_{session_id}_{int(scene.get('ts', 0))}",
+            "vision": vision_set.to_dicts(),
+            "vision_set": vision_set,
+            "scene": scene,
+            "dom_data": dom_data,
+            "element_index": page_snapshot_service.element_index(snapshot),
+            "visual_change": None,  # the cached state's diff belongs to another frame
+            "timestamp": scene.get("ts"),
+            "summary": self._create_summary(scene, cached["state"].get("page_analysis", {}), cached["state"].get("url", ""))
+        }
+        cached["snapshot"] = snapshot
+        logger.info(f"📸 [PERCEPTION] Partial recapture (scroll): {len(vision_set)} elements")
+        return state
+    
+    def _store(self, session_id: str, key: Tuple, probe: Dict[str, Any], snapshot: Dict[str, Any], state: Dict[str, Any]):
+        self._cache[session_id] = {
+            "key": key,
+            "scroll": probe["versions"].get("scroll"),
+            "snapshot": snapshot,
+            "state": state,
+            "ts": time.time()
+        }
+    
+    def _analyze_page_content(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Analyze page content for common patterns and elements (from page snapshot)"""
         try:
             analysis = {
-                "forms": [],
-                "buttons": [],
-                "inputs": [],
-                "links": [],
-                "errors": [],
-                "success_messages": [],
+                "forms": snapshot.get("forms") or [],
+                "buttons": snapshot.get("buttons") or [],
+                "inputs": snapshot.get("inputs") or [],
+                "links": [{"count": snapshot.get("link_count", 0)}],
+                "errors": snapshot.get("errors") or [],
+                "success_messages": snapshot.get("success_messages") or [],
                 "page_type": "unknown"
             }
             
-            # Detect forms
-            forms = await page.query_selector_all("form")
-            for form in forms:
-                form_info = await page.evaluate("""(form) => {
-                    const inputs = Array.from(form.querySelectorAll('input, textarea, select'));
-                    return {
-                        action: form.action || '',
-                        method: form.method || 'GET',
-                        input_count: inputs.length,
-                        input_types: inputs.map(i => i.type || i.tagName.toLowerCase())
-                    };
-                }""", form)
-                analysis["forms"].append(form_info)
-            
-            # Detect buttons
-            buttons = await page.query_selector_all("button, input[type='button'], input[type='submit']")
-            for button in buttons:
-                button_text = await button.inner_text()
-                if button_text:
-                    analysis["buttons"].append(button_text.strip()[:50])
-            
-            # Detect input fields
-            inputs = await page.query_selector_all("input, textarea, select")
-            for input_elem in inputs:
-                input_info = await page.evaluate("""(input) => {
-                    return {
-                        type: input.type || input.tagName.toLowerCase(),
-                        name: input.name || '',
-                        placeholder: input.placeholder || '',
-                        required: input.required || false
-                    };
-                }""", input_elem)
-                analysis["inputs"].append(input_info)
-            
-            # Detect links
-            links = await page.query_selector_all("a[href]")
-            link_count = len(links)
-            analysis["links"] = [{"count": link_count}]
-            
-            # Detect error messages
-            error_selectors = [
-                "[class*='error']", "[class*='danger']", "[class*='invalid']",
-                ".alert-danger", ".error-message", ".field-error"
-            ]
-            for selector in error_selectors:
-                elements = await page.query_selector_all(selector)
-                for elem in elements:
-                    is_visible = await elem.is_visible()
-                    if is_visible:
-                        text = await elem.inner_text()
-                        if text.strip():
-                            analysis["errors"].append(text.strip()[:100])
-            
-            # Detect success messages
-            success_selectors = [
-                "[class*='success']", "[class*='confirm']", ".alert-success"
-            ]
-            for selector in success_selectors:
-                elements = await page.query_selector_all(selector)
-                for elem in elements:
-                    is_visible = await elem.is_visible()
-                    if is_visible:
-                        text = await elem.inner_text()
-                        if text.strip():
-                            analysis["success_messages"].append(text.strip()[:100])
-            
             # Determine page type
-            analysis["page_type"] = self._determine_page_type(analysis, page.url)
+            analysis["page_type"] = self._determine_page_type(analysis, snapshot.get("url") or "")
             
             return analysis
             
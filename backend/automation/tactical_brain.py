@@ -4,13 +4,25 @@ Uses Qwen2.5-72B for tactical decisions within the execution loop
 """
 
 import json
+import time
 import logging
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional
 
 from services.openrouter_service import openrouter_service
+from services.grid_service import GridConfig, grid_config
+from services.local_ocr_service import local_ocr_service
+from services.element_matcher import ElementMatcher
+from services.element_set import ElementSet
+from services.grounding_cache_service import grounding_cache_service, step_key
 
 logger = logging.getLogger(__name__)
 
+# Off-screen matches cost a scroll, so an equally good on-screen match wins
+OFFSCREEN_SCORE_FACTOR = 0.95
+# Element matchers kept for recent perceptions
+MATCHER_CACHE_SIZE = 8
+
 class TacticalBrain:
     """
     Tactical decision maker for individual steps.
@@ -21,6 +33,7 @@ class TacticalBrain:
         self.model = "qwen/qwen2.5-72b-instruct"  # Fast tactical decisions
         self.temperature = 0.1  # Low for consistent decisions
         self.max_tokens = 1500
+        self._matchers: "OrderedDict[tuple, tuple]" = OrderedDict()
     
     async def decide(
         self,
@@ -150,17 +163,20 @@ class TacticalBrain:
         )
         
         target_cell = element_result.get("primary")
+        scroll_to = element_result.get("scroll_to")
         confidence = element_result.get("confidence", 0.0)
         
-        if target_cell and confidence > 0.3:  # Require minimum confidence
+        if (target_cell or scroll_to) and confidence > 0.3:  # Require minimum confidence
             return {
                 "action": {
                     "type": "type_at_cell",
                     "cell": target_cell,
+                    "element_id": element_result.get("primary_id"),
+                    "scroll_to": scroll_to,
                     "text": text_to_type,
                     "field": step_field
                 },
-                "reasoning": f"Type '{text_to_type[:20]}...' into field {step_field} at {target_cell} (confidence: {confidence:.2f})",
+                "reasoning": f"Type '{text_to_type[:20]}...' into field {step_field} at {target_cell or 'off-screen ' + scroll_to['eid']} (confidence: {confidence:.2f})",
                 "alternatives": element_result.get("alternatives", []),
                 "confidence": confidence
             }
@@ -181,23 +197,64 @@ class TacticalBrain:
         )
         
         target_cell = element_result.get("primary")
+        scroll_to = element_result.get("scroll_to")
         confidence = element_result.get("confidence", 0.0)
         
-        if target_cell and confidence > 0.3:  # Require minimum confidence
+        if (target_cell or scroll_to) and confidence > 0.3:  # Require minimum confidence
             return {
                 "action": {
                     "type": "click_cell", 
-                    "cell": target_cell
+                    "cell": target_cell,
+                    "element_id": element_result.get("primary_id"),
+                    "scroll_to": scroll_to
                 },
-                "reasoning": f"Click element at {target_cell} (confidence: {confidence:.2f})",
+                "reasoning": f"Click element at {target_cell or 'off-screen ' + scroll_to['eid']} (confidence: {confidence:.2f})",
                 "alternatives": element_result.get("alternatives", []),
                 "confidence": confidence
             }
         else:
+            # Text in canvas / image buttons is invisible to the DOM - read it locally first
+            ocr_decision = await self._ocr_find_element(step_target, perception)
+            if ocr_decision:
+                return ocr_decision
             # Use LLM to find clickable element as fallback
             logger.info(f"⚠️ [TACTICAL] Low confidence ({confidence:.2f}) for clickable element, using LLM fallback")
             return await self._llm_find_element(step, perception, "clickable element")
     
+    async def _ocr_find_element(self, step_target: Any, perception: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Match the target against text read by local OCR in the page's blind regions"""
+        ocr = await local_ocr_service.read_perception(perception, with_regions=True)
+        if not ocr["lines"]:
+            return None
+        vw, vh = perception.get("viewport", [1280, 800])
+        grid = perception.get("grid") or {}
+        config = GridConfig(rows=grid.get("rows", grid_config.rows), cols=grid.get("cols", grid_config.cols))
+        elements = [
+            {
+                "cell": config.bbox_to_cell(line["bbox"], vw, vh),
+                "bbox": line["bbox"],
+                "label": line["text"],
+                "type": "text",
+                "confidence": 0.7,
+                "source": "ocr"
+            }
+            for line in ocr["lines"]
+        ]
+        # On-screen text only: off-screen index entries were already scored
+        result = self._find_target_element_with_scoring(
+            step_target, None, elements, "button", {**perception, "element_index": []}
+        )
+        cell, confidence = result.get("primary"), result.get("confidence", 0.0)
+        if not cell or confidence <= 0.3:
+            return None
+        logger.info(f"🔤 [TACTICAL] Target found by local OCR at {cell} (confidence {confidence:.2f})")
+        return {
+            "action": {"type": "click_cell", "cell": cell, "element_id": None, "scroll_to": None},
+            "reasoning": f"Click text read locally at {cell} (confidence: {confidence:.2f})",
+            "alternatives": result.get("alternatives", []),
+            "confidence": confidence
+        }
+    
     async def _decide_verification(
         self, 
         step: Dict[str, Any], 
@@ -251,6 +308,25 @@ class TacticalBrain:
             }
         
         else:
+            # Banners and messages rendered as images/canvas: read them locally before the LLM
+            ocr = await local_ocr_service.read_perception(perception, include_changes=True)
+            ocr_text = ocr["text"].lower()
+            if ocr_text and any(pattern in ocr_text for pattern in failure_patterns):
+                return {
+                    "action": {
+                        "type": "verification_failed",
+                        "reason": "Error indicators read on screen (local OCR)"
+                    },
+                    "reasoning": "Verification failed - error text found by local OCR"
+                }
+            if ocr_text and any(pattern in ocr_text for pattern in success_patterns):
+                return {
+                    "action": {
+                        "type": "verification_success",
+                        "indicators": {"success_text": True, "source": "ocr", "current_url": current_url}
+                    },
+                    "reasoning": "Verification successful based on text read by local OCR"
+                }
             # Use LLM for complex verification
             return await self._llm_verification(step, perception, resources)
     
@@ -351,204 +427,101 @@ class TacticalBrain:
         """
         NEW: Intelligent element finding with scoring and alternatives.
         
+        Candidates are the on-screen vision elements plus off-screen entries of
+        perception["element_index"]; an off-screen winner has no cell and comes
+        with "scroll_to" ({eid, doc}) so Execution can bring it into view.
+        
         Returns: {
             "primary": "cell_id",
             "alternatives": ["cell_id1", "cell_id2"],
             "confidence": 0.0-1.0,
-            "reasoning": "why primary was chosen"
+            "reasoning": "why primary was chosen",
+            "scroll_to": {"eid", "doc"} (off-screen primary only)
         }
         """
         
-        if not vision_elements:
+        matcher = self._matcher(vision_elements, perception)
+        if not len(matcher):
             return {"primary": None, "alternatives": [], "confidence": 0.0}
         
-        # Score all elements
-        scored_elements = []
-        
-        for element in vision_elements:
-            score = self._score_element_match(
-                element=element,
-                target=step_target,
-                field=step_field,
-                element_type=element_type,
-                perception=perception
-            )
-            
-            if score['overall_score'] > 0.2:  # Only keep candidates above threshold
-                scored_elements.append({
-                    "cell": element.get("cell"),
-                    "element": element,
-                    **score
-                })
-        
-        # Sort by score
-        scored_elements.sort(key=lambda x: x['overall_score'], reverse=True)
+        target_value = step_target.get('value') if isinstance(step_target, dict) and step_target.get('by') == 'label' else None
+        # Top 5 candidates above threshold, from the matcher's index instead of scoring each element
+        scored_elements = matcher.top_k(
+            target_value, step_field, element_type, self._context_fit(step_field, perception)
+        )
         
         if not scored_elements:
             return {"primary": None, "alternatives": [], "confidence": 0.0}
         
+        best = scored_elements[0]['element']
         return {
             "primary": scored_elements[0]['cell'],
-            "alternatives": [e['cell'] for e in scored_elements[1:4]],  # Top 3 alternatives
+            "primary_id": best.get('eid'),  # Stable in-page id (DOM elements)
+            "alternatives": [e['cell'] for e in scored_elements[1:4] if e['cell']],  # Top 3 alternatives
             "confidence": scored_elements[0]['overall_score'],
             "reasoning": scored_elements[0]['reasoning'],
-            "all_candidates": scored_elements[:5]  # For debugging
+            "scroll_to": {"eid": best['eid'], "doc": best['bbox']} if best.get('offscreen') else None,
+            "all_candidates": scored_elements  # For debugging
         }
+    
+    def _offscreen_candidates(self, perception: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Element index entries outside the viewport, shaped like vision elements (bbox = page offset)"""
+        return [
+            {
+                "cell": None,
+                "bbox": entry['doc'],
+                "label": entry.get('label', ''),
+                "type": entry.get('type', ''),
+                "eid": entry['eid'],
+                "source": "dom_index",
+                "offscreen": True
+            }
+            for entry in perception.get('element_index') or []
+            if not entry.get('in_view', True) and entry.get('eid') and entry.get('doc')
+        ]
 
-    def _score_element_match(
-        self,
-        element: Dict[str, Any],
-        target: Any,
-        field: Optional[str],
-        element_type: str,
-        perception: Dict[str, Any]
-    ) -> Dict[str, Any]:
+    def _matcher(self, vision_elements: List[Dict[str, Any]], perception: Dict[str, Any]) -> ElementMatcher:
         """
-        NEW: Multi-factor scoring of element match.
-        
-        Factors:
-        1. Label matching (40% weight) - How well label matches target
-        2. Type matching (30% weight) - Is element type appropriate
-        3. Context fit (20% weight) - Does it make sense in workflow
-        4. Position plausibility (10% weight) - Is it in expected location
-        
-        Returns: {
-            'label_match': 0.0-1.0,
-            'type_match': 0.0-1.0,
-            'context_fit': 0.0-1.0,
-            'position_score': 0.0-1.0,
-            'overall_score': 0.0-1.0,
-            'reasoning': "explanation"
-        }
+        Matcher over the vision elements plus off-screen index entries, built once
+        per perception: cached while the same element lists come back (perception
+        cache hits, several steps / targets against one observation). The
+        perception's own vision list is indexed from its ElementSet columns.
         """
-        
-        element_label = element.get('label', '').lower()
-        element_tag_type = element.get('type', '').lower()
-        element_role = element.get('role', '').lower()
-        
-        scores = {
-            'label_match': 0.0,
-            'type_match': 0.0,
-            'context_fit': 0.0,
-            'position_score': 0.0
-        }
-        
-        # 1. Label Matching (40% weight)
-        if isinstance(target, dict) and target.get('by') == 'label':
-            target_value = target.get('value', '').lower()
-            
-            # Exact match
-            if target_value == element_label:
-                scores['label_match'] = 1.0
-            # Semantic match (using word overlap)
-            elif target_value in element_label or element_label in target_value:
-                # Calculate word overlap
-                target_words = set(target_value.split())
-                label_words = set(element_label.split())
-                overlap = len(target_words & label_words)
-                total = len(target_words | label_words)
-                scores['label_match'] = (overlap / max(1, total)) * 0.9
-            # Partial match (any word matches)
-            elif any(word in element_label for word in target_value.split() if len(word) > 2):
-                scores['label_match'] = 0.5
-        
-        # Field name matching
-        if field:
-            field_lower = field.lower()
-            # Exact field match in label
-            if field_lower in element_label:
-                scores['label_match'] = max(scores['label_match'], 0.8)
-            # Semantic field match (e.g., "email" matches "e-mail" or "electronic mail")
-            elif any(part in element_label for part in field_lower.split('_')):
-                scores['label_match'] = max(scores['label_match'], 0.6)
-        
-        # 2. Type Matching (30% weight)
-        type_mapping = {
-            'textbox': ['textbox', 'input', 'textarea', 'text'],
-            'button': ['button', 'submit'],
-            'link': ['link', 'a'],
-            'checkbox': ['checkbox', 'check'],
-            'select': ['select', 'dropdown', 'combobox']
-        }
-        
-        expected_types = type_mapping.get(element_type, [element_type])
-        if element_tag_type in expected_types or element_role in expected_types:
-            scores['type_match'] = 1.0
-        elif element_tag_type in ['button', 'link'] and element_type in ['button', 'link']:
-            scores['type_match'] = 0.7  # Cross-compatible
-        elif 'button' in element_role and element_type == 'button':
-            scores['type_match'] = 0.8  # Role-based match
+        element_index = perception.get('element_index')
+        viewport_height = perception.get('viewport', [1280, 800])[1]
+        vision_set = perception.get('vision_set') if vision_elements is perception.get('vision') else None
+        source = vision_set if vision_set is not None else vision_elements
+        key = (id(source), id(element_index), viewport_height)
+        cached = self._matchers.get(key)
+        if cached and cached[0] is source and cached[1] is element_index:
+            self._matchers.move_to_end(key)
+            return cached[2]
+        if vision_set is not None:
+            elements = ElementSet.concat([vision_set, ElementSet.from_dicts(self._offscreen_candidates(perception))])
         else:
-            scores['type_match'] = 0.0
-        
-        # 3. Context Fit (20% weight)
-        # Is this element expected at current workflow stage?
-        workflow_state = perception.get('workflow_state', 'unknown')
+            elements = list(vision_elements) + self._offscreen_candidates(perception)
+        matcher = ElementMatcher(elements, viewport_height=viewport_height, offscreen_factor=OFFSCREEN_SCORE_FACTOR)
+        # The sources are held with the matcher so their ids cannot be reused while cached
+        self._matchers[key] = (source, element_index, matcher)
+        if len(self._matchers) > MATCHER_CACHE_SIZE:
+            self._matchers.popitem(last=False)
+        return matcher
+    
+    def _context_fit(self, field: Optional[str], perception: Dict[str, Any]) -> float:
+        """Is a field of this kind expected at the current page type (same for every candidate)"""
+        if not field:
+            return 0.5  # Neutral
         page_type = perception.get('page_analysis', {}).get('page_type', 'unknown')
-        
-        # Context-aware scoring
-        if field:
-            # Email field on registration/login page = high context fit
-            if 'email' in field and page_type in ['registration', 'login']:
-                scores['context_fit'] = 1.0
-            elif 'password' in field and page_type in ['login', 'registration']:
-                scores['context_fit'] = 1.0
-            elif 'username' in field and page_type in ['login', 'registration']:
-                scores['context_fit'] = 0.9
-            elif 'name' in field and page_type == 'registration':
-                scores['context_fit'] = 0.8
-            else:
-                scores['context_fit'] = 0.6  # Default reasonable fit
-        else:
-            scores['context_fit'] = 0.5  # Neutral
-        
-        # 4. Position Plausibility (10% weight)
-        # Elements in standard positions score higher
-        bbox = element.get('bbox', [])
-        if bbox and len(bbox) == 4:
-            x, y, w, h = bbox
-            viewport_height = perception.get('viewport', [1280, 800])[1]
-            
-            # Primary action buttons typically in bottom half or center
-            if element_type == 'button':
-                if y > viewport_height * 0.5:  # Bottom half
-                    scores['position_score'] = 0.8
-                elif 200 < y < 600:  # Mid-range
-                    scores['position_score'] = 0.7
-                else:
-                    scores['position_score'] = 0.5
-            # Input fields typically in upper-middle area
-            elif element_type == 'textbox':
-                if 100 < y < 600:  # Expected form area
-                    scores['position_score'] = 0.8
-                else:
-                    scores['position_score'] = 0.6
-            else:
-                scores['position_score'] = 0.7
-        else:
-            scores['position_score'] = 0.5  # No bbox info, neutral score
-        
-        # Calculate weighted overall score
-        overall_score = (
-            scores['label_match'] * 0.4 +
-            scores['type_match'] * 0.3 +
-            scores['context_fit'] * 0.2 +
-            scores['position_score'] * 0.1
-        )
-        
-        # Generate reasoning
-        reasoning = (
-            f"Label:{scores['label_match']:.2f} "
-            f"Type:{scores['type_match']:.2f} "
-            f"Context:{scores['context_fit']:.2f} "
-            f"Pos:{scores['position_score']:.2f}"
-        )
-        
-        return {
-            **scores,
-            'overall_score': overall_score,
-            'reasoning': reasoning
-        }
+        # Email field on registration/login page = high context fit
+        if 'email' in field and page_type in ['registration', 'login']:
+            return 1.0
+        elif 'password' in field and page_type in ['login', 'registration']:
+            return 1.0
+        elif 'username' in field and page_type in ['login', 'registration']:
+            return 0.9
+        elif 'name' in field and page_type == 'registration':
+            return 0.8
+        return 0.6  # Default reasonable fit
     
     def _guess_field_type(self, label: str) -> str:
         """Guess field type from label"""
@@ -577,6 +550,17 @@ class TacticalBrain:
     async def _llm_find_element(self, step: Dict[str, Any], perception: Dict[str, Any], element_description: str) -> Dict[str, Any]:
         """NEW: Use LLM to find element with improved structured reasoning prompt"""
         
+        # Same site, step and element layout resolved before -> reuse the chosen element
+        vision = perception.get("vision", [])
+        grounding_step = {**step_key(step), "element": element_description}
+        cached = await grounding_cache_service.lookup("element", perception.get("url"), grounding_step, vision)
+        if cached and cached["element"].get("cell"):
+            cell = cached["element"]["cell"]
+            return {
+                **self._cell_decision(step, cell, cached["confidence"], f"Cached grounding at {cell} (confidence: {cached['confidence']:.2f})"),
+                "grounding": {"key": cached["key"], "cached": True}
+            }
+        
         # Include more elements and more context
         vision_summary = []
         for element in perception.get("vision", [])[:25]:  # Increased from 10 to 25 elements
@@ -701,12 +685,14 @@ Analyze and return:
                 {"role": "user", "content": prompt}
             ]
             
+            started = time.perf_counter()
             response = await openrouter_service.chat_completion(
                 messages=messages,
                 model=self.model,
                 temperature=0.1,  # Slightly higher for reasoning
                 max_tokens=1000  # More tokens for structured response
             )
+            llm_ms = (time.perf_counter() - started) * 1000
             
             content = response['choices'][0]['message']['content'].strip()
             
@@ -723,9 +709,9 @@ Analyze and return:
                         "error": f"Could not find {element_description}",
                         "reasoning": "LLM could not locate target element"
                     }
-                # Try to find a cell pattern like A1, B2, etc.
+                # Try to find a cell pattern like A1, B2, C7.2 etc.
                 import re
-                cell_match = re.search(r'\b([A-Z]\d{1,2})\b', content)
+                cell_match = re.search(r'\b([A-Z]\d{1,2}(?:\.[1-4])*)\b', content)
                 if cell_match:
                     cell = cell_match.group(1)
                 else:
@@ -751,32 +737,23 @@ Analyze and return:
             confidence = result.get("confidence", result.get("candidates", [{}])[0].get("confidence", 0.5) if result.get("candidates") else 0.5)
             alternatives = result.get("alternatives", [])
             
-            # Determine action type based on step
-            step_action = step.get("action", "").upper()
-            if step_action == "TYPE":
-                return {
-                    "action": {
-                        "type": "type_at_cell",
-                        "cell": recommended_cell,
-                        "text": step.get("target", ""),
-                        "field": step.get("field")
-                    },
-                    "reasoning": f"LLM identified target at {recommended_cell} (confidence: {confidence:.2f})",
-                    "llm_analysis": result.get("reasoning_summary", ""),
-                    "alternatives": alternatives,
-                    "confidence": confidence
-                }
-            else:  # CLICK
-                return {
-                    "action": {
-                        "type": "click_cell",
-                        "cell": recommended_cell
-                    },
-                    "reasoning": f"LLM identified clickable element at {recommended_cell} (confidence: {confidence:.2f})",
-                    "llm_analysis": result.get("reasoning_summary", ""),
-                    "alternatives": alternatives,
-                    "confidence": confidence
-                }
+            decision = {
+                **self._cell_decision(
+                    step, recommended_cell, confidence,
+                    f"LLM identified {'target' if step.get('action', '').upper() == 'TYPE' else 'clickable element'} at {recommended_cell} (confidence: {confidence:.2f})"
+                ),
+                "llm_analysis": result.get("reasoning_summary", ""),
+                "alternatives": alternatives
+            }
+            chosen = next((el for el in vision if el.get("cell") == recommended_cell), None)
+            if chosen is not None:
+                key = await grounding_cache_service.store(
+                    "element", perception.get("url"), grounding_step, vision,
+                    element=chosen, confidence=float(confidence), llm_ms=llm_ms
+                )
+                if key:
+                    decision["grounding"] = {"key": key, "cached": False}
+            return decision
         
         except Exception as e:
             logger.error(f"❌ [TACTICAL] LLM element finding failed: {e}")
@@ -786,6 +763,22 @@ Analyze and return:
                 "reasoning": "LLM element finding failed"
             }
     
+    def _cell_decision(self, step: Dict[str, Any], cell: str, confidence: float, reasoning: str) -> Dict[str, Any]:
+        """Type or click at a cell chosen by the LLM (or remembered from an earlier LLM answer)"""
+        if step.get("action", "").upper() == "TYPE":
+            action = {
+                "type": "type_at_cell",
+                "cell": cell,
+                "text": step.get("target", ""),
+                "field": step.get("field")
+            }
+        else:  # CLICK
+            action = {
+                "type": "click_cell",
+                "cell": cell
+            }
+        return {"action": action, "reasoning": reasoning, "confidence": confidence}
+    
     async def _llm_verification(self, step: Dict[str, Any], perception: Dict[str, Any], resources: Dict[str, Any]) -> Dict[str, Any]:
         """Use LLM for complex verification scenarios"""
         
@@ -388,7 +388,7 @@ class ToolOrchestrator:
             return {
                 "captcha_solved": result.get("success", False),
                 "captcha_message": result.get("message", ""),
-                "screenshot_updated": bool(result.get("screenshot"))
+                "screenshot_updated": bool(result.get("screenshot_ref"))
             }
             
         except Exception as e:
@@ -5,9 +5,13 @@ Uses intelligent analysis to determine if actions succeeded and goals are achiev
 
 import logging
 import re
-from typing import Dict, Any, List, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
 
 from services.openrouter_service import openrouter_service
+from services.visual_diff_service import visual_diff_service
+from services.local_ocr_service import local_ocr_service
+from services.grounding_cache_service import grounding_cache_service, evidence_digest, step_key, url_pattern
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +24,10 @@ class Verification:
     def __init__(self):
         self.model = "qwen/qwen2.5-vl"  # Vision model for verification
         self.temperature = 0.1
+        # Last LLM goal verdict: (goal, url, screenshot_ref, result) - reused while the screen is unchanged
+        self._last_goal_check = None
+        # verify_step verdicts (cached or stored) of the current run: [(grounding, success)]
+        self._step_verdicts: List[Tuple[Dict[str, Any], bool]] = []
     
     async def verify_step(
         self, 
@@ -150,6 +158,11 @@ class Verification:
                     logger.info(f"✅ [VERIFICATION] Login goal achieved - page type: {page_type}")
                     return True
             
+            # Text the DOM does not expose (canvas, images, rendered banners): local OCR before the LLM
+            local = await self._verify_with_local_ocr(perception, text_indicators, negative_indicators)
+            if local is not None:
+                return local
+            
             # Use LLM for complex goal verification
             return await self._llm_verify_goal(goal, perception, resources)
         
@@ -157,6 +170,28 @@ class Verification:
             logger.error(f"❌ [VERIFICATION] Goal verification failed: {e}")
             return False
     
+    async def _verify_with_local_ocr(
+        self,
+        perception: Dict[str, Any],
+        text_indicators: List[str],
+        negative_indicators: List[str]
+    ) -> Optional[bool]:
+        """Plan indicators matched against locally read screen text; None = undecided"""
+        if not text_indicators and not negative_indicators:
+            return None
+        ocr = await local_ocr_service.read_perception(perception, include_changes=True)
+        ocr_text = ocr["text"].lower()
+        if not ocr_text:
+            return None
+        negative = next((n for n in negative_indicators if n.lower() in ocr_text), None)
+        if negative:
+            logger.warning(f"❌ [VERIFICATION] Goal failed: '{negative}' read on screen (local OCR)")
+            return False
+        if any(indicator.lower() in ocr_text for indicator in text_indicators):
+            logger.info("✅ [VERIFICATION] Goal achieved via text indicator read on screen (local OCR)")
+            return True
+        return None
+    
     async def _verify_navigation(self, step: Dict[str, Any], perception: Dict[str, Any], action_result: Dict[str, Any]) -> bool:
         """Verify navigation step completed successfully"""
         target_url = step.get("target", "")
@@ -276,9 +311,50 @@ class Verification:
         # Ambiguous case - use conservative approach
         return True
     
+    async def settle_step_verdicts(self, achieved: Optional[bool] = None):
+        """
+        Goal check outcome of the run: cached step verdicts it contradicts are
+        forgotten (SUCCESS when the goal was missed after every step passed,
+        FAILED when the goal was reached). None starts a new run without judging.
+        """
+        if achieved is not None:
+            for grounding, success in self._step_verdicts:
+                if success != achieved:
+                    await grounding_cache_service.report(grounding, False)
+        self._step_verdicts = []
+    
+    async def _no_visible_change(self, before: Dict[str, Any], after: Dict[str, Any]) -> bool:
+        """Same URL and the after-frame is visually identical to the before-frame"""
+        if before.get("url") != after.get("url"):
+            return False
+        change = after.get("visual_change")
+        if change is not None:
+            return change.get("score", 1.0) < visual_diff_service.threshold
+        if before.get("screenshot_ref") and after.get("screenshot_ref"):
+            return visual_diff_service.is_unchanged(await visual_diff_service.compare_async(before["screenshot_ref"], after["screenshot_ref"]))
+        return False
+    
     async def _llm_verify_step(self, step: Dict[str, Any], before: Dict[str, Any], after: Dict[str, Any], action_result: Dict[str, Any]) -> bool:
         """Use LLM for complex step verification"""
         try:
+            # Nothing visible happened: a hint for the model, not a verdict (canvas, video
+            # and network-only effects do not show up in the frame diff)
+            unchanged = await self._no_visible_change(before, after)
+            
+            # Same step from the same page to the same resulting layout and page messages -> previous verdict
+            vision = after.get('vision', [])
+            grounding_step = {
+                **step_key(step),
+                "from": url_pattern(before.get('url')),
+                "unchanged": unchanged,
+                "evidence": evidence_digest(after.get('page_analysis'))
+            }
+            cached = await grounding_cache_service.lookup("verify_step", after.get('url'), grounding_step, vision)
+            if cached:
+                success = cached["result"]["success"]
+                self._step_verdicts.append(({"key": cached["key"], "cached": True}, success))
+                return success
+            
             prompt = f"""
             Verify if this automation step was successful:
             
@@ -295,6 +371,7 @@ class Verification:
             - Page type: {after.get('page_analysis', {}).get('page_type', 'unknown')}
             - Errors: {after.get('page_analysis', {}).get('errors', [])}
             - Success messages: {after.get('page_analysis', {}).get('success_messages', [])}
+            - Visible change: {'none (same URL, screen identical to before)' if unchanged else 'yes'}
             
             Action result: {action_result}
             
@@ -311,16 +388,25 @@ class Verification:
                 {"role": "user", "content": prompt}
             ]
             
+            started = time.perf_counter()
             response = await openrouter_service.chat_completion(
                 messages=messages,
                 model=self.model,
                 temperature=self.temperature,
                 max_tokens=100
             )
+            llm_ms = (time.perf_counter() - started) * 1000
             
             result = response['choices'][0]['message']['content'].upper()
             
-            return "SUCCESS" in result
+            success = "SUCCESS" in result
+            key = await grounding_cache_service.store(
+                "verify_step", after.get('url'), grounding_step, vision,
+                result={"success": success}, llm_ms=llm_ms
+            )
+            if key:
+                self._step_verdicts.append(({"key": key, "cached": False}, success))
+            return success
         
         except Exception as e:
             logger.error(f"❌ [VERIFICATION] LLM step verification failed: {e}")
@@ -329,6 +415,17 @@ class Verification:
     async def _llm_verify_goal(self, goal: str, perception: Dict[str, Any], resources: Dict[str, Any]) -> bool:
         """Use LLM for complex goal verification"""
         try:
+            # Same goal, same URL and an unchanged screen -> the previous verdict still holds
+            frame = perception.get("screenshot_ref")
+            if self._last_goal_check and frame:
+                last_goal, last_url, last_frame, last_result = self._last_goal_check
+                if last_goal == goal and last_url == perception.get("url"):
+                    diff = await visual_diff_service.compare_async(last_frame, frame)
+                    if visual_diff_service.is_unchanged(diff):
+                        visual_diff_service.record_skip("verify_goal")
+                        logger.info(f"⏭️ [VERIFICATION] Screen unchanged since last goal check, reusing verdict ({last_result})")
+                        return last_result
+            
             prompt = f"""
             Verify if this automation goal was achieved:
             
@@ -364,8 +461,12 @@ class Verification:
             )
             
             result = response['choices'][0]['message']['content'].upper()
+            # "NOT_ACHIEVED" contains "ACHIEVED": a plain substring test counted it as achieved
+            achieved = "ACHIEVED" in result and "NOT_ACHIEVED" not in result
+            if frame:
+                self._last_goal_check = (goal, perception.get("url"), frame, achieved)
             
-            return "ACHIEVED" in result
+            return achieved
         
         except Exception as e:
             logger.error(f"❌ [VERIFICATION] LLM goal verification failed: {e}")
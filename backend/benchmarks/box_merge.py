@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+DOM + visual detection merge: vectorized box merge vs the per-element scans
+
+The old path dropped visual finds whose grid cell already held a DOM element,
+deduped everything by cell, and then scanned every scene element per vision
+element (20 px top-left proximity). merge_boxes() does one IoU / containment
+pass with DOM priority. Both run on a synthetic page of --dom clickables
+(spread over a long document) plus --visual detections in the viewport.
+
+Usage:
+    python benchmarks/box_merge.py [--dom 2000] [--visual 60] [--runs 500]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.box_merge import merge_boxes, merge_elements, xyxy
+from services.grid_service import GridConfig
+
+VIEWPORT = (1280, 800)
+
+
+def synthetic_page(n_dom, n_visual, doc_height, seed=0):
+    rng = np.random.default_rng(seed)
+    dom = [
+        {'bbox': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)}, 'confidence': 0.9, 'source': 'dom'}
+        for x, y, w, h in zip(rng.integers(0, 1200, n_dom), rng.integers(0, doc_height, n_dom),
+                              rng.integers(20, 240, n_dom), rng.integers(16, 48, n_dom))
+    ]
+    visual = [
+        {'bbox': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)}, 'confidence': 0.6, 'label': 'icon', 'source': 'florence2'}
+        for x, y, w, h in zip(rng.integers(0, 1200, n_visual), rng.integers(0, VIEWPORT[1], n_visual),
+                              rng.integers(16, 200, n_visual), rng.integers(16, 60, n_visual))
+    ]
+    return dom, visual
+
+
+def old_merge(dom, visual, grid):
+    """Cell-based detect() merge + scene builder proximity scan (as before)"""
+    for el in dom + visual:
+        el['cell'] = grid.bbox_to_cell(el['bbox'], *VIEWPORT)
+    results = list(dom)
+    cells = {r['cell'] for r in results}
+    results += [v for v in visual if v['cell'] not in cells]
+    seen = {}
+    for r in results:
+        if r['cell'] not in seen or r['confidence'] > seen[r['cell']]['confidence']:
+            seen[r['cell']] = r
+    scene = [[b['x'], b['y'], b['x'] + b['w'], b['y'] + b['h']] for b in (el['bbox'] for el in dom)]
+    for v in seen.values():
+        if not any(abs(e[0] - v['bbox']['x']) < 20 and abs(e[1] - v['bbox']['y']) < 20 for e in scene):
+            scene.append([v['bbox']['x'], v['bbox']['y'], v['bbox']['x'] + v['bbox']['w'], v['bbox']['y'] + v['bbox']['h']])
+    return scene
+
+
+def time_it(fn, runs):
+    fn()
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dom", type=int, default=2000)
+    parser.add_argument("--visual", type=int, default=60)
+    parser.add_argument("--doc-height", type=int, default=20000, help="DOM elements spread over this many px (800 = all in view)")
+    parser.add_argument("--runs", type=int, default=500)
+    args = parser.parse_args()
+
+    dom, visual = synthetic_page(args.dom, args.visual, args.doc_height)
+    grid = GridConfig(rows=12, cols=8)
+    boxes = np.concatenate([xyxy([d['bbox'] for d in dom]), xyxy([v['bbox'] for v in visual])])
+    priority = np.repeat([0, 1], [len(dom), len(visual)])
+    scores = np.array([d['confidence'] for d in dom] + [v['confidence'] for v in visual], dtype=np.float32)
+
+    kept = len(merge_elements([dom, visual])) - len(dom)
+    print(f"{args.dom} DOM + {args.visual} visual boxes: {kept} visual kept, all {args.dom} DOM kept")
+    print(f"\n{'path':<28} {'ms':>8}")
+    print(f"{'old (cells + scan)':<28} {time_it(lambda: old_merge(dom, visual, grid), max(1, args.runs // 10)):>8.3f}")
+    print(f"{'merge_boxes (arrays)':<28} {time_it(lambda: merge_boxes(boxes, priority, scores), args.runs):>8.3f}")
+    print(f"{'merge_elements (dicts)':<28} {time_it(lambda: merge_elements([dom, visual]), args.runs):>8.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+TacticalBrain target lookup: indexed element matcher vs the per-element scoring loop
+
+The old path scored every element in Python for each query (lower-casing and
+splitting its label, word set operations, type and position rules).
+ElementMatcher builds the label / type / position index once per perception
+and answers each query from its trigram postings. Both run on a synthetic page
+of --elements labelled elements; the index build is timed separately since it
+is paid once per observation, not per step or alternative target.
+
+Usage:
+    python benchmarks/element_matcher.py [--elements 1000] [--runs 200]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.element_matcher import ElementMatcher, TYPE_MAPPING
+
+WORDS = ["sign", "up", "log", "in", "email", "password", "first", "name", "last", "continue", "next",
+         "create", "account", "search", "menu", "cart", "help", "privacy", "terms", "submit", "address",
+         "phone", "country", "city", "forgot", "remember", "me", "subscribe", "newsletter", "accept"]
+TYPES = ["button", "a", "input", "textbox", "select", "checkbox", "div"]
+QUERIES = [({"by": "label", "value": "Sign up"}, None, "button"),
+           ({"by": "label", "value": "email"}, "email", "textbox"),
+           ({"by": "label", "value": "first name"}, "first_name", "textbox"),
+           ({"by": "label", "value": "Continue"}, None, "button")]
+
+
+def synthetic_page(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "cell": f"{chr(65 + int(rng.integers(0, 16)))}{int(rng.integers(1, 25))}",
+            "bbox": {"x": int(rng.integers(0, 1200)), "y": int(rng.integers(0, 800)), "w": 120, "h": 32},
+            "label": " ".join(rng.choice(WORDS, int(rng.integers(1, 4)))).title(),
+            "type": str(rng.choice(TYPES)),
+            "source": "dom"
+        }
+        for _ in range(n)
+    ]
+
+
+def old_score(element, target, field, element_type, viewport_height=800):
+    """Label / type / position rules of the per-element loop (context fit is constant per query)"""
+    element_label = element.get('label', '').lower()
+    element_tag_type = element.get('type', '').lower()
+    element_role = element.get('role', '').lower()
+    label_match = 0.0
+    if isinstance(target, dict) and target.get('by') == 'label':
+        target_value = target.get('value', '').lower()
+        if target_value == element_label:
+            label_match = 1.0
+        elif target_value in element_label or element_label in target_value:
+            target_words, label_words = set(target_value.split()), set(element_label.split())
+            label_match = len(target_words & label_words) / max(1, len(target_words | label_words)) * 0.9
+        elif any(word in element_label for word in target_value.split() if len(word) > 2):
+            label_match = 0.5
+    if field:
+        if field.lower() in element_label:
+            label_match = max(label_match, 0.8)
+        elif any(part in element_label for part in field.lower().split('_')):
+            label_match = max(label_match, 0.6)
+    expected = TYPE_MAPPING.get(element_type, [element_type])
+    type_match = 1.0 if element_tag_type in expected or element_role in expected else 0.0
+    bbox = element.get('bbox', [])
+    if isinstance(bbox, dict):
+        bbox = [bbox.get('x', 0), bbox.get('y', 0), bbox.get('w', 0), bbox.get('h', 0)]
+    y = bbox[1]
+    if element_type == 'button':
+        position = 0.8 if y > viewport_height * 0.5 else 0.7 if 200 < y < 600 else 0.5
+    else:
+        position = 0.8 if 100 < y < 600 else 0.6
+    return label_match * 0.4 + type_match * 0.3 + 0.5 * 0.2 + position * 0.1
+
+
+def old_lookup(elements, target, field, element_type):
+    scored = [(old_score(el, target, field, element_type), el) for el in elements]
+    scored = [s for s in scored if s[0] > 0.2]
+    scored.sort(key=lambda s: s[0], reverse=True)
+    return scored[:5]
+
+
+def time_it(fn, runs):
+    fn()
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--elements", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    elements = synthetic_page(args.elements)
+    matcher = ElementMatcher(elements)
+
+    print(f"{args.elements} elements, {len(QUERIES)} targets per run")
+    print(f"\n{'path':<28} {'ms':>8}")
+    print(f"{'old loop (per target)':<28} "
+          f"{time_it(lambda: [old_lookup(elements, *q) for q in QUERIES], max(1, args.runs // 10)) / len(QUERIES):>8.3f}")
+    print(f"{'index build (per page)':<28} {time_it(lambda: ElementMatcher(elements), max(1, args.runs // 10)):>8.3f}")
+    print(f"{'matcher top_k (per target)':<28} "
+          f"{time_it(lambda: [matcher.top_k(q[0]['value'], q[1], q[2], 0.5) for q in QUERIES], args.runs) / len(QUERIES):>8.3f}")
+    for target, field, element_type in QUERIES:
+        best = matcher.top_k(target['value'], field, element_type, 0.5, k=1)
+        print(f"  {target['value']!r:<14} -> {best[0]['element']['label'] if best else None!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
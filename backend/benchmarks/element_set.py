@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Perception elements: ElementSet columns vs one dict per element
+
+The old path built a dict (plus a bbox dict) per DOM clickable in detect(),
+merged and gridded those dicts, copied the whole list in and out of the vision
+result cache and re-read every dict to index it for TacticalBrain. The new
+path keeps the elements as an ElementSet (float32 boxes, interned strings)
+through the same stages and builds the vision[] dicts once, at the edge.
+Both run on a synthetic page of --elements DOM clickables plus --visual
+detections; memory is measured with tracemalloc on the detect() output.
+
+Usage:
+    python benchmarks/element_set.py [--elements 2000] [--visual 60] [--runs 50]
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.box_merge import merge_elements
+from services.element_matcher import ElementMatcher
+from services.element_set import ElementSet
+from services.grid_service import GridConfig, GridIndex
+
+VIEWPORT = (1280, 800)
+LABELS = ["Sign up", "Log in", "Email", "Password", "Continue", "Next", "Add to cart", "Search",
+          "Menu", "Help", "Privacy", "Terms", "Subscribe", "Accept", "Read more", "Share"]
+TYPES = ["button", "a", "input", "select", "checkbox"]
+
+
+def synthetic_page(n_dom, n_visual, seed=0):
+    rng = np.random.default_rng(seed)
+    dom = [
+        {
+            'eid': f'e{i}',
+            'bbox': {'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)},
+            'label': f"{LABELS[int(rng.integers(0, len(LABELS)))]} {i % 50}",
+            'type': TYPES[int(rng.integers(0, len(TYPES)))],
+            'in_view': True
+        }
+        for i, (x, y, w, h) in enumerate(zip(rng.integers(0, 1200, n_dom), rng.integers(0, VIEWPORT[1], n_dom),
+                                             rng.integers(20, 160, n_dom), rng.integers(16, 40, n_dom)))
+    ]
+    visual = [
+        {'bbox': [int(x), int(y), int(x + w), int(y + h)], 'label': 'icon', 'type': 'icon', 'confidence': 0.6}
+        for x, y, w, h in zip(rng.integers(0, 1200, n_visual), rng.integers(0, VIEWPORT[1], n_visual),
+                              rng.integers(16, 120, n_visual), rng.integers(16, 60, n_visual))
+    ]
+    return dom, visual
+
+
+def old_detect(dom, visual, grid):
+    """Per-element dicts through the merge and the grid (detect() before ElementSet)"""
+    results = [
+        {
+            'cell': None,
+            'bbox': el.get('bbox', {}),
+            'label': (el.get('label') or el.get('text') or el.get('name') or el.get('type', '').upper())[:64],
+            'type': el.get('type') or 'button',
+            'confidence': float(el.get('confidence', 0.90)),
+            'source': 'dom',
+            'eid': el.get('eid')
+        }
+        for el in dom if el.get('in_view') is not False
+    ]
+    florence = [
+        {'cell': None, 'bbox': {'x': b[0], 'y': b[1], 'w': b[2] - b[0], 'h': b[3] - b[1]},
+         'label': v['label'], 'type': v['type'], 'confidence': v['confidence'], 'source': 'florence2'}
+        for v in visual for b in [v['bbox']]
+    ]
+    results = merge_elements([results, florence])
+    index = GridIndex(grid, *VIEWPORT, [r.get('bbox') or {} for r in results])
+    for r, cell in zip(results, index.cells):
+        r['cell'] = cell
+    return results
+
+
+def old_copy(results):
+    """Vision result cache copy (made on put and on every get)"""
+    return [dict(r, bbox=dict(r['bbox'])) if isinstance(r.get('bbox'), dict) else dict(r) for r in results]
+
+
+def new_detect(dom, visual, grid):
+    results = ElementSet.merge([ElementSet.from_dom(dom), ElementSet.from_dicts(visual, source='florence2')])
+    results.assign_cells(grid, *VIEWPORT)
+    return results
+
+
+def time_it(fn, runs):
+    fn()
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def traced_bytes(fn):
+    tracemalloc.start()
+    kept = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--elements", type=int, default=2000)
+    parser.add_argument("--visual", type=int, default=60)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    grid = GridConfig()
+    dom, visual = synthetic_page(args.elements, args.visual)
+    old = old_detect(dom, visual, grid)
+    new = new_detect(dom, visual, grid)
+    # Labels come from the DOM snapshot in both paths: only what detect() adds is counted
+    old_bytes = traced_bytes(lambda: old_detect(dom, visual, grid))
+    new_bytes = traced_bytes(lambda: new_detect(dom, visual, grid))
+
+    print(f"{args.elements} DOM clickables + {args.visual} visual detections -> {len(old)} / {len(new)} elements")
+    print(f"\n{'memory (detect output)':<34} {'KiB':>9} {'B/elem':>8}")
+    print(f"{'dict list (tracemalloc)':<34} {old_bytes / 1024:>9.1f} {old_bytes / len(old):>8.0f}")
+    print(f"{'ElementSet (tracemalloc)':<34} {new_bytes / 1024:>9.1f} {new_bytes / len(new):>8.0f}")
+    print(f"{'ElementSet.nbytes() (cache size)':<34} {new.nbytes() / 1024:>9.1f} {new.nbytes() / len(new):>8.0f}")
+
+    runs = args.runs
+    old_pipeline = lambda: ElementMatcher(old_copy(old_copy(old_detect(dom, visual, grid))))
+    new_pipeline = lambda: (lambda es: (ElementMatcher(es), es.to_dicts()))(new_detect(dom, visual, grid))
+    print(f"\n{'stage':<34} {'dicts ms':>9} {'set ms':>8}")
+    print(f"{'detect (DOM + merge + grid)':<34} {time_it(lambda: old_detect(dom, visual, grid), runs):>9.3f} "
+          f"{time_it(lambda: new_detect(dom, visual, grid), runs):>8.3f}")
+    print(f"{'cache get (copy vs shared)':<34} {time_it(lambda: old_copy(old), runs):>9.3f} {'-':>8}")
+    print(f"{'matcher index build':<34} {time_it(lambda: ElementMatcher(old), runs):>9.3f} "
+          f"{time_it(lambda: ElementMatcher(new), runs):>8.3f}")
+    print(f"{'vision[] JSON at the edge':<34} {'-':>9} {time_it(new.to_dicts, runs):>8.3f}")
+    print(f"{'per observation':<34} {time_it(old_pipeline, runs):>9.3f} {time_it(new_pipeline, runs):>8.3f}")
+    same = [r['cell'] for r in old] == new.cells and [r['eid'] for r in old if r['source'] == 'dom'] == [e for e in new.eids if e]
+    print(f"\nsame elements and cells: {same}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Florence-2 encoder throughput versus batch size (CPU)
+
+Part 1 runs Florence2OnnxPipeline.encode() directly on stacked batches and
+reports images/s per batch size. Part 2 pushes the same number of images
+through EncoderBatcher from concurrent threads (as the vision executor does)
+and reports the batch sizes it actually formed.
+
+Usage:
+    python benchmarks/florence_batching.py                          # synthetic model
+    python benchmarks/florence_batching.py --model-dir /app/backend/onnx_models/florence-2-base --variant q4
+
+Without --model-dir a synthetic model is built (benchmarks/florence_tiny.py)
+with a --image-size vision encoder; its numbers show the trend only.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Florence-2 base: 768x768 images, "<OD>" prompt
+REAL_IMAGE_SIZE = 768
+REAL_PROMPT_IDS = [0, 574, 22486, 5, 8720, 19, 4120, 766, 11, 5, 2274, 4, 2]
+
+
+def make_inputs(batch: int, image_size: int, prompt_ids, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    pixel_values = rng.standard_normal((batch, 3, image_size, image_size)).astype(np.float32)
+    input_ids = np.array([prompt_ids] * batch, dtype=np.int64)
+    return pixel_values, input_ids
+
+
+def bench_direct(pipeline, batch_sizes, images, image_size, prompt_ids):
+    """images/s of encode() on stacked batches"""
+    rows = []
+    for batch in batch_sizes:
+        pixel_values, input_ids = make_inputs(batch, image_size, prompt_ids)
+        pipeline.encode(pixel_values, input_ids)  # warm-up (allocations, thread pool)
+        runs = max(1, images // batch)
+        started = time.perf_counter()
+        for _ in range(runs):
+            pipeline.encode(pixel_values, input_ids)
+        elapsed = time.perf_counter() - started
+        rows.append((batch, runs * batch / elapsed, elapsed * 1000 / runs))
+    return rows
+
+
+def bench_batcher(pipeline, threads, images, image_size, prompt_ids, max_batch, window_ms):
+    """Concurrent callers through EncoderBatcher (one image per call)"""
+    from services.florence_onnx import EncoderBatcher
+
+    batcher = EncoderBatcher(pipeline, max_batch=max_batch, window_ms=window_ms)
+    pixel_values, input_ids = make_inputs(1, image_size, prompt_ids)
+    per_thread = max(1, images // threads)
+    expected = pipeline.encode(pixel_values, input_ids)[0]
+    mismatches = []
+
+    def worker():
+        for _ in range(per_thread):
+            hidden, _ = batcher.encode(pixel_values, input_ids)
+            if not np.allclose(hidden, expected, atol=1e-4):
+                mismatches.append(1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    return threads * per_thread / elapsed, batcher.get_stats(), len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", help="exported Florence-2 directory (default: synthetic model)")
+    parser.add_argument("--variant", default="q4", help="graph suffix for --model-dir (empty for fp32)")
+    parser.add_argument("--image-size", type=int, default=256, help="synthetic model image size")
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--images", type=int, default=64, help="images per measurement")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent callers for the batcher run")
+    parser.add_argument("--window-ms", type=float, default=8.0)
+    args = parser.parse_args()
+
+    from services.florence_onnx import Florence2OnnxPipeline, session_options_summary
+
+    if args.model_dir:
+        pipeline = Florence2OnnxPipeline(args.model_dir, variant=args.variant)
+        image_size, prompt_ids = REAL_IMAGE_SIZE, REAL_PROMPT_IDS
+    else:
+        from florence_tiny import build_tiny_florence, EOS
+        out_dir = tempfile.mkdtemp(prefix="florence_batching_")
+        build_tiny_florence(out_dir, image_size=args.image_size)
+        pipeline = Florence2OnnxPipeline(out_dir, variant="")
+        image_size, prompt_ids = args.image_size, [0, 5, 6, 7, EOS]
+        logger.info(f"🧪 Synthetic model ({image_size}x{image_size} vision encoder) in {out_dir}")
+    pipeline.load()
+    logger.info(f"⚙️ cpus={os.cpu_count()} session options: {session_options_summary()}")
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b.strip()]
+    print(f"\n{'batch':>6} {'images/s':>10} {'ms/batch':>10} {'speedup':>8}")
+    baseline = None
+    for batch, rate, ms in bench_direct(pipeline, batch_sizes, args.images, image_size, prompt_ids):
+        baseline = baseline or rate
+        print(f"{batch:>6} {rate:>10.1f} {ms:>10.2f} {rate / baseline:>7.2f}x")
+
+    print(f"\nEncoderBatcher, {args.threads} concurrent callers, window {args.window_ms}ms:")
+    for max_batch in (1, args.threads):
+        rate, stats, mismatches = bench_batcher(
+            pipeline, args.threads, args.images, image_size, prompt_ids, max_batch, args.window_ms
+        )
+        print(f"  max_batch={max_batch:<3} {rate:>8.1f} images/s  avg batch {stats['avg_batch']:<5} sizes {stats['sizes']}")
+        if mismatches:
+            logger.error(f"❌ {mismatches} batched results differ from the single-image encode")
+            return 1
+    logger.info("✅ Batched encoder outputs match single-image runs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Florence-2 preprocessing: fast path vs the HF processor
+
+Checks that FlorencePreprocessor produces the same pixel_values / input_ids
+as the processor, then times one frame through both paths:
+
+    processor: base64 -> PIL -> processor(text=task, images=image)
+    fast:      raw bytes -> FlorencePreprocessor([bytes], task)
+
+Usage:
+    python benchmarks/florence_preprocess.py [--model-dir DIR] [--runs N]
+
+With transformers installed and a model directory containing the processor
+files, the real processor is the reference. Otherwise a step-by-step copy of
+CLIPImageProcessor (PIL resize, float64 rescale, normalize) is used and the
+prompt check is skipped.
+"""
+import os
+import io
+import sys
+import time
+import base64
+import argparse
+import logging
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "onnx_models", "florence-2-base")
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+SIZE = (768, 768)
+TOLERANCE = 1e-4
+
+
+def synthetic_screenshot(width=1280, height=800, quality=80) -> bytes:
+    """JPEG frame with page-like content (header, text lines, buttons, photo noise)"""
+    rng = np.random.default_rng(0)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([0, 0, width, 64], fill=(33, 37, 41))
+    for i in range(20):
+        y = 100 + i * 28
+        draw.rectangle([40, y, 40 + int(rng.integers(200, 700)), y + 12], fill=(60, 60, 60))
+    for i in range(4):
+        draw.rounded_rectangle([800, 120 + i * 70, 1000, 170 + i * 70], radius=8, fill=(13, 110, 253))
+    photo = Image.fromarray(rng.integers(0, 255, (240, 360, 3), dtype=np.uint8))
+    image.paste(photo, (860, 480))
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+class ReferenceProcessor:
+    """What CLIPImageProcessor does for a PIL input, step by step (no tokenizer)"""
+
+    def __call__(self, text, images, return_tensors="np"):
+        pixels = np.asarray(images.convert("RGB"))
+        resized = np.asarray(Image.fromarray(pixels).resize((SIZE[1], SIZE[0]), resample=3))
+        rescaled = (resized.astype(np.float64) * (1 / 255)).astype(np.float32)
+        normalized = (rescaled - np.asarray(MEAN, dtype=np.float32)) / np.asarray(STD, dtype=np.float32)
+        return {"pixel_values": normalized.transpose(2, 0, 1)[None].astype(np.float32), "input_ids": np.array([[0, 2]])}
+
+
+def load_processor(model_dir):
+    try:
+        from transformers import AutoProcessor
+        return AutoProcessor.from_pretrained(model_dir, trust_remote_code=True), "transformers"
+    except Exception as e:
+        logger.warning(f"⚠️ HF processor unavailable ({e}); comparing against the reference implementation")
+        return ReferenceProcessor(), "reference"
+
+
+def time_it(fn, runs):
+    fn()
+    started = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - started) * 1000 / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--task", default="<OD>")
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    from services.florence_preprocess import FlorencePreprocessor
+
+    processor, kind = load_processor(args.model_dir)
+    if kind == "transformers":
+        fast = FlorencePreprocessor.from_processor(processor)
+        if fast is None:
+            logger.error("❌ Processor settings not supported by the fast path")
+            return 1
+    else:
+        fast = FlorencePreprocessor(SIZE, MEAN, STD, tokenize=lambda task: np.array([[0, 2]]))
+
+    frame = synthetic_screenshot()
+    frame_b64 = base64.b64encode(frame).decode("ascii")
+
+    def processor_path():
+        image = Image.open(io.BytesIO(base64.b64decode(frame_b64))).convert("RGB")
+        return processor(text=args.task, images=image, return_tensors="np")
+
+    def fast_path():
+        return fast([frame], args.task)
+
+    expected, actual = processor_path(), fast_path()
+    diff = float(np.abs(np.asarray(expected["pixel_values"], dtype=np.float32) - actual["pixel_values"]).max())
+    same_ids = kind != "transformers" or np.array_equal(np.asarray(expected["input_ids"]), actual["input_ids"])
+    logger.info(f"🔬 Reference: {kind}; pixel_values {actual['pixel_values'].shape}, max abs diff {diff:.2e}; prompt ids equal: {same_ids}")
+    if diff > TOLERANCE or not same_ids:
+        logger.error(f"❌ Fast path differs from the processor (tolerance {TOLERANCE})")
+        return 1
+
+    slow_ms = time_it(processor_path, args.runs)
+    fast_ms = time_it(fast_path, args.runs)
+    print(f"\n{'path':<12} {'ms/frame':>9}")
+    print(f"{'processor':<12} {slow_ms:>9.2f}")
+    print(f"{'fast':<12} {fast_ms:>9.2f}")
+    print(f"saving: {slow_ms - fast_ms:.2f} ms/frame ({slow_ms / fast_ms:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Tiny synthetic Florence-2 ONNX model for CPU testing of the generation pipeline
+
+Builds the four graphs with the same input/output names and layout as an
+exported Florence-2 model (vision_encoder, embed_tokens, encoder_model,
+decoder_model_merged with past_key_values.* / present.* and use_cache_branch),
+but with toy dimensions. The decoder's logits count the decoder self-attention
+cache length, so the generated sequence is only correct when the KV cache is
+fed back step by step:
+
+    [decoder_start, bos, 4, 5, ..., STOP_AT + 1, eos]
+
+Usage:
+    python benchmarks/florence_tiny.py [--out DIR] [--runs N]
+
+Needs the `onnx` package (model building only) and onnxruntime.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+try:
+    import onnx
+    from onnx import helper, TensorProto, numpy_helper
+except Exception as e:
+    onnx = None
+    logger.warning(f"⚠️ onnx not available ({e}); install it to build the tiny model")
+
+IMAGE_SIZE = 8       # pixel_values: [B, 3, 8, 8]
+IMAGE_TOKENS = 4     # image_features: [B, 4, D]
+D_MODEL = 8
+HEADS = 2
+HEAD_DIM = 4
+LAYERS = 2
+VOCAB = 64
+EOS = 2
+STOP_AT = 12         # decoder emits EOS once the self-attention cache holds this many tokens
+OPSET = 17
+
+
+def _init(name, shape, seed):
+    rng = np.random.default_rng(seed)
+    return numpy_helper.from_array((rng.standard_normal(shape) * 0.1).astype(np.float32), name)
+
+
+def _const(name, values, dtype=np.int64):
+    return numpy_helper.from_array(np.array(values, dtype=dtype), name)
+
+
+def _save(graph, path):
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", OPSET)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+
+
+def build_vision_encoder(path, image_size=IMAGE_SIZE):
+    flat = 3 * image_size * image_size
+    nodes = [
+        helper.make_node("Flatten", ["pixel_values"], ["flat"], axis=1),
+        helper.make_node("MatMul", ["flat", "W"], ["proj"]),
+        helper.make_node("Reshape", ["proj", "shape"], ["image_features"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "vision_encoder",
+        [helper.make_tensor_value_info("pixel_values", TensorProto.FLOAT, ["batch_size", 3, image_size, image_size])],
+        [helper.make_tensor_value_info("image_features", TensorProto.FLOAT, ["batch_size", IMAGE_TOKENS, D_MODEL])],
+        [_init("W", (flat, IMAGE_TOKENS * D_MODEL), 1), _const("shape", [-1, IMAGE_TOKENS, D_MODEL])]
+    )
+    _save(graph, path)
+
+
+def build_embed_tokens(path):
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["E", "input_ids"], ["inputs_embeds"])],
+        "embed_tokens",
+        [helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch_size", "sequence_length"])],
+        [helper.make_tensor_value_info("inputs_embeds", TensorProto.FLOAT, ["batch_size", "sequence_length", D_MODEL])],
+        [_init("E", (VOCAB, D_MODEL), 2)]
+    )
+    _save(graph, path)
+
+
+def build_encoder(path):
+    nodes = [
+        helper.make_node("Cast", ["attention_mask"], ["mask_f"], to=TensorProto.FLOAT),
+        helper.make_node("Unsqueeze", ["mask_f", "last_axis"], ["mask_3d"]),
+        helper.make_node("MatMul", ["inputs_embeds", "W"], ["proj"]),
+        helper.make_node("Tanh", ["proj"], ["act"]),
+        helper.make_node("Mul", ["act", "mask_3d"], ["last_hidden_state"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "encoder_model",
+        [
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch_size", "encoder_sequence_length"]),
+            helper.make_tensor_value_info("inputs_embeds", TensorProto.FLOAT, ["batch_size", "encoder_sequence_length", D_MODEL]),
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch_size", "encoder_sequence_length", D_MODEL])],
+        [_init("W", (D_MODEL, D_MODEL), 3), _const("last_axis", [-1])]
+    )
+    _save(graph, path)
+
+
+def _heads(nodes, src, weight, out):
+    """[B, T, D] @ W -> [B, H, T, Dh]"""
+    nodes += [
+        helper.make_node("MatMul", [src, weight], [out + "_proj"]),
+        helper.make_node("Reshape", [out + "_proj", "heads_shape"], [out + "_split"]),
+        helper.make_node("Transpose", [out + "_split"], [out], perm=[0, 2, 1, 3]),
+    ]
+
+
+def build_decoder_merged(path):
+    kv_shape = ["batch_size", HEADS, None, HEAD_DIM]
+    inputs = [
+        helper.make_tensor_value_info("encoder_attention_mask", TensorProto.INT64, ["batch_size", "encoder_sequence_length"]),
+        helper.make_tensor_value_info("encoder_hidden_states", TensorProto.FLOAT, ["batch_size", "encoder_sequence_length", D_MODEL]),
+        helper.make_tensor_value_info("inputs_embeds", TensorProto.FLOAT, ["batch_size", "decoder_sequence_length", D_MODEL]),
+    ]
+    outputs = [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch_size", "decoder_sequence_length", VOCAB])]
+    initializers = [
+        _const("heads_shape", [0, -1, HEADS, HEAD_DIM]),
+        _const("logits_shape", [1, 1, VOCAB]),
+        _const("len_axis", [2]),
+        _const("stop_at", [STOP_AT]),
+        _const("offset", [2]),
+        _const("eos", [EOS]),
+        _const("depth", VOCAB),
+        numpy_helper.from_array(np.array([0.0, 10.0], dtype=np.float32), "onehot_values"),
+    ]
+    nodes = []
+    then_nodes, else_nodes, branch_outputs = [], [], []
+
+    for layer in range(LAYERS):
+        for kind in ("key", "value"):
+            dec_past = f"past_key_values.{layer}.decoder.{kind}"
+            enc_past = f"past_key_values.{layer}.encoder.{kind}"
+            inputs.append(helper.make_tensor_value_info(dec_past, TensorProto.FLOAT, ["batch_size", HEADS, "past_decoder_sequence_length", HEAD_DIM]))
+            inputs.append(helper.make_tensor_value_info(enc_past, TensorProto.FLOAT, ["batch_size", HEADS, "encoder_sequence_length_out", HEAD_DIM]))
+
+            w_dec, w_enc = f"Wd_{layer}_{kind}", f"We_{layer}_{kind}"
+            initializers += [_init(w_dec, (D_MODEL, HEADS * HEAD_DIM), 10 + layer * 2 + (kind == "value")),
+                             _init(w_enc, (D_MODEL, HEADS * HEAD_DIM), 20 + layer * 2 + (kind == "value"))]
+            new = f"new_{layer}_{kind}"
+            _heads(nodes, "inputs_embeds", w_dec, new)
+            nodes.append(helper.make_node("Concat", [dec_past, new], [f"present.{layer}.decoder.{kind}"], axis=2))
+            outputs.append(helper.make_tensor_value_info(f"present.{layer}.decoder.{kind}", TensorProto.FLOAT, kv_shape))
+
+            # Cross-attention cache: passed through when cached, computed on the first step
+            present_enc = f"present.{layer}.encoder.{kind}"
+            then_nodes.append(helper.make_node("Identity", [enc_past], [present_enc + "_then"]))
+            _heads(else_nodes, "encoder_hidden_states", w_enc, present_enc + "_else")
+            branch_outputs.append(present_enc)
+            outputs.append(helper.make_tensor_value_info(present_enc, TensorProto.FLOAT, kv_shape))
+
+    inputs.append(helper.make_tensor_value_info("use_cache_branch", TensorProto.BOOL, [1]))
+    then_graph = helper.make_graph(
+        then_nodes, "then_branch", [],
+        [helper.make_tensor_value_info(n + "_then", TensorProto.FLOAT, kv_shape) for n in branch_outputs]
+    )
+    else_graph = helper.make_graph(
+        else_nodes, "else_branch", [],
+        [helper.make_tensor_value_info(n + "_else", TensorProto.FLOAT, kv_shape) for n in branch_outputs]
+    )
+    nodes += [
+        helper.make_node("Squeeze", ["use_cache_branch"], ["use_cache"]),
+        helper.make_node("If", ["use_cache"], branch_outputs, then_branch=then_graph, else_branch=else_graph),
+        # logits: one-hot of (cache length + 2), EOS once the cache reaches STOP_AT
+        helper.make_node("Shape", ["present.0.decoder.key"], ["kv_shape"]),
+        helper.make_node("Gather", ["kv_shape", "len_axis"], ["kv_len"], axis=0),
+        helper.make_node("Less", ["kv_len", "stop_at"], ["running"]),
+        helper.make_node("Add", ["kv_len", "offset"], ["counted"]),
+        helper.make_node("Where", ["running", "counted", "eos"], ["token"]),
+        helper.make_node("OneHot", ["token", "depth", "onehot_values"], ["onehot"], axis=-1),
+        helper.make_node("Reshape", ["onehot", "logits_shape"], ["logits"]),
+    ]
+    graph = helper.make_graph(nodes, "decoder_model_merged", inputs, outputs, initializers)
+    _save(graph, path)
+
+
+def build_tiny_florence(out_dir: str, image_size: int = IMAGE_SIZE) -> str:
+    """Write onnx/<graph>.onnx for all four graphs under out_dir (image_size scales the vision encoder only)"""
+    if onnx is None:
+        raise RuntimeError("The onnx package is required to build the tiny model")
+    onnx_dir = os.path.join(out_dir, "onnx")
+    os.makedirs(onnx_dir, exist_ok=True)
+    build_vision_encoder(os.path.join(onnx_dir, "vision_encoder.onnx"), image_size)
+    build_embed_tokens(os.path.join(onnx_dir, "embed_tokens.onnx"))
+    build_encoder(os.path.join(onnx_dir, "encoder_model.onnx"))
+    build_decoder_merged(os.path.join(onnx_dir, "decoder_model_merged.onnx"))
+    return out_dir
+
+
+def tiny_inputs(batch: int = 1, seed: int = 0, image_size: int = IMAGE_SIZE):
+    rng = np.random.default_rng(seed)
+    pixel_values = rng.standard_normal((batch, 3, image_size, image_size)).astype(np.float32)
+    input_ids = np.array([[0, 5, 6, 7, EOS]] * batch, dtype=np.int64)
+    return pixel_values, input_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="directory for the generated model (default: temp dir)")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    from services.florence_onnx import Florence2OnnxPipeline
+
+    out_dir = args.out or tempfile.mkdtemp(prefix="florence_tiny_")
+    build_tiny_florence(out_dir)
+    logger.info(f"🧪 Tiny Florence-2 graphs written to {out_dir}/onnx")
+
+    pipeline = Florence2OnnxPipeline(out_dir, variant="")
+    pipeline.load()
+    pixel_values, input_ids = tiny_inputs()
+
+    expected = [2, 0] + list(range(4, STOP_AT + 2)) + [EOS]
+    tokens = pipeline.generate(pixel_values, input_ids)
+    if tokens != expected:
+        logger.error(f"❌ Unexpected tokens {tokens}, expected {expected}")
+        return 1
+    logger.info(f"✅ Generated {tokens} (KV cache fed back correctly)")
+
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        pipeline.generate(pixel_values, input_ids)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / args.runs
+    logger.info(f"⏱️ {elapsed_ms:.2f} ms per generate() over {args.runs} runs ({len(tokens) - 1} tokens)")
+    logger.info(f"📊 {pipeline.get_stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Florence-2 model variants: latency, memory and box accuracy on golden screenshots
+
+Every (variant, intra-op threads) setting runs in its own process (so peak RSS
+belongs to that setting alone) through LocalVisionService.detect_with_florence,
+the same path observations use. Detections are matched one-to-one against the
+expected boxes at --iou.
+
+Golden directory layout:
+    <name>.png | <name>.jpg   screenshot
+    <name>.json               {"boxes": [{"x", "y", "w", "h"}, ...], "viewport": [w, h]}
+                              (viewport optional: boxes are in image pixels without it)
+
+Usage:
+    python benchmarks/florence_variants.py --golden DIR [--model-dir DIR] [--variants q4,int8,fp16] [--threads 1,2,4] [--out report.json]
+
+The report is JSON: one entry per setting with latency_ms {p50, p90, p95, p99,
+mean}, load_ms, peak_rss_mb, recall, precision and mean_iou, plus the setting
+FLORENCE_VARIANT=auto would pick. Save it as <model-dir>/variant_benchmark.json
+(or point FLORENCE_VARIANT_REPORT at it) to use that pick.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import resource
+import subprocess
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = os.path.join(BACKEND_DIR, "onnx_models", "florence-2-base")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def load_golden(golden_dir):
+    """[(name, image bytes, viewport (w, h) or None, expected boxes)]"""
+    cases = []
+    for name in sorted(os.listdir(golden_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        label_path = os.path.join(golden_dir, f"{stem}.json")
+        if not os.path.exists(label_path):
+            logger.warning(f"⚠️ No {stem}.json next to {name}, skipped")
+            continue
+        with open(label_path) as f:
+            labels = json.load(f)
+        with open(os.path.join(golden_dir, name), "rb") as f:
+            image = f.read()
+        boxes = labels["boxes"] if isinstance(labels, dict) else labels
+        viewport = tuple(labels["viewport"]) if isinstance(labels, dict) and labels.get("viewport") else None
+        cases.append((stem, image, viewport, boxes))
+    return cases
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of [N, 4] and [M, 4] (x, y, w, h) arrays"""
+    a, b = np.asarray(a, dtype=np.float32).reshape(-1, 4), np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2, bx2, by2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3], b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, 0][:, None], b[:, 0][None]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, 1][:, None], b[:, 1][None]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def match(expected, predicted, threshold):
+    """Greedy one-to-one matching by IoU: IoUs of the matched pairs"""
+    if not expected or not predicted:
+        return []
+    ious = iou_matrix(
+        [[b["x"], b["y"], b["w"], b["h"]] for b in expected],
+        [[b["x"], b["y"], b["w"], b["h"]] for b in predicted]
+    )
+    matched = []
+    while ious.size and ious.max() >= threshold:
+        i, j = np.unravel_index(int(ious.argmax()), ious.shape)
+        matched.append(float(ious[i, j]))
+        ious[i, :] = -1
+        ious[:, j] = -1
+    return matched
+
+
+def worker(args):
+    """One setting in this process; FLORENCE_* / ORT_* env is set by the parent"""
+    from services.local_vision_service import local_vision_service
+
+    cases = load_golden(args.golden)
+    started = time.perf_counter()
+    if not local_vision_service.load_florence_model():
+        return {"error": "model load failed (see stderr)"}
+    load_ms = (time.perf_counter() - started) * 1000
+
+    # First frame pays for kernel setup and arenas; not part of the latency figures
+    name, image, viewport, _ = cases[0]
+    local_vision_service.detect_with_florence(image, *(viewport or local_vision_service._open_image(image).size))
+
+    latencies, n_expected, n_predicted, ious = [], 0, 0, []
+    for name, image, viewport, expected in cases:
+        vw, vh = viewport or local_vision_service._open_image(image).size
+        for _ in range(max(1, args.runs)):
+            started = time.perf_counter()
+            detections = local_vision_service.detect_with_florence(image, vw, vh)
+            latencies.append((time.perf_counter() - started) * 1000)
+        boxes = [d["bbox"] for d in detections]
+        matched = match(expected, boxes, args.iou)
+        n_expected += len(expected)
+        n_predicted += len(boxes)
+        ious += matched
+        logger.info(f"🖼️ {name}: {len(matched)}/{len(expected)} boxes matched, {len(boxes)} detected, {latencies[-1]:.0f}ms")
+
+    lat = np.asarray(latencies)
+    return {
+        "frames": len(cases),
+        "runs_per_frame": args.runs,
+        "load_ms": round(load_ms, 1),
+        "latency_ms": {
+            "p50": round(float(np.percentile(lat, 50)), 1),
+            "p90": round(float(np.percentile(lat, 90)), 1),
+            "p95": round(float(np.percentile(lat, 95)), 1),
+            "p99": round(float(np.percentile(lat, 99)), 1),
+            "mean": round(float(lat.mean()), 1)
+        },
+        # ru_maxrss is KB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "recall": round(len(ious) / n_expected, 3) if n_expected else None,
+        "precision": round(len(ious) / n_predicted, 3) if n_predicted else None,
+        "mean_iou": round(float(np.mean(ious)), 3) if ious else None
+    }
+
+
+def run_setting(args, variant, threads):
+    env = {
+        **os.environ,
+        "FLORENCE_MODEL_DIR": args.model_dir,
+        "FLORENCE_VARIANT": variant,
+        "ORT_INTRA_OP_THREADS": str(threads),
+        "FLORENCE_PRELOAD": "false",
+        "FLORENCE_TASK": args.task
+    }
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--golden", args.golden, "--runs", str(args.runs), "--iou", str(args.iou)
+    ]
+    logger.info(f"▶️ variant={variant or 'fp32'} threads={threads or 'default'}")
+    proc = subprocess.run(cmd, env=env, cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True)
+    try:
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        result = {"error": f"worker exited with {proc.returncode}"}
+    return {"variant": variant, "intra_op_threads": threads, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", required=True, help="directory of screenshots + expected boxes")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--variants", default=None, help="comma-separated, 'fp32' = unsuffixed graphs (default: all installed)")
+    parser.add_argument("--threads", default="0", help="comma-separated intra-op thread counts (0 = ONNX Runtime default)")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per screenshot")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for a detection to match an expected box")
+    parser.add_argument("--task", default="<OD>")
+    parser.add_argument("--min-recall", type=float, default=0.8)
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args)))
+        return 0
+
+    from services.florence_variants import available_variants, select_variant
+
+    if not load_golden(args.golden):
+        logger.error(f"❌ No labelled screenshots in {args.golden}")
+        return 1
+    installed = available_variants(args.model_dir)
+    if args.variants:
+        variants = ["" if v == "fp32" else v for v in args.variants.split(",")]
+    else:
+        variants = installed
+    if not variants:
+        logger.error(f"❌ No Florence-2 graphs under {args.model_dir}/onnx")
+        return 1
+    threads = [int(t) for t in args.threads.split(",")]
+
+    results = [run_setting(args, v, t) for v in variants for t in threads]
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_dir": args.model_dir,
+        "task": args.task,
+        "golden": args.golden,
+        "frames": len(load_golden(args.golden)),
+        "iou_threshold": args.iou,
+        "cpus": os.cpu_count(),
+        "results": results
+    }
+    report["recommended"] = select_variant(report, installed, args.min_recall)
+
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload)
+        logger.info(f"💾 Report written to {args.out}")
+    else:
+        print(payload)
+
+    print(f"\n{'variant':<10} {'threads':>7} {'p50':>8} {'p95':>8} {'rss MB':>8} {'recall':>7} {'iou':>6}", file=sys.stderr)
+    for r in results:
+        if r.get("error"):
+            print(f"{r['variant'] or 'fp32':<10} {r['intra_op_threads'] or '-':>7}  {r['error']}", file=sys.stderr)
+            continue
+        print(f"{r['variant'] or 'fp32':<10} {r['intra_op_threads'] or '-':>7} {r['latency_ms']['p50']:>8} {r['latency_ms']['p95']:>8} "
+              f"{r['peak_rss_mb']:>8} {r['recall'] if r['recall'] is not None else '-':>7} {r['mean_iou'] if r['mean_iou'] is not None else '-':>6}",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
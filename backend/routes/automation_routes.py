@@ -1,11 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import logging
-import hashlib
 from services.browser_automation_service import browser_service
+from services.page_readiness_service import page_readiness_service
+from services.page_snapshot_service import page_snapshot_service
+from services.resource_policy_service import resource_policy_service
+from services.screenshot_store import screenshot_store
+from services.visual_diff_service import visual_diff_service
+from services.vision_executor import vision_executor
+from services.vision_result_cache import vision_result_cache
+from services.local_ocr_service import local_ocr_service
+from services.grounding_cache_service import grounding_cache_service
 from services.visual_validator_service import visual_validator_service
 from services.scene_builder_service import scene_builder_service
+from services.grid_service import grid_config
 from services.planner_service import planner_service
 from services.cognitive_services import awareness_service, env_check_service, recon_service, inventory_service
 from services.verifier_service import verifier_service, recovery_service
@@ -21,6 +30,10 @@ logger = logging.getLogger(__name__)
 class CreateSessionRequest(BaseModel):
     session_id: str
     use_proxy: bool = False
+    resource_policy: Optional[str] = None  # allow_all | no_analytics | lean | strict
+
+class ResourcePolicyRequest(BaseModel):
+    policy: str
 
 class NavigateRequest(BaseModel):
     session_id: str
@@ -47,6 +60,11 @@ class HoldDragRequest(BaseModel):
 class ScreenshotRequest(BaseModel):
     session_id: str
 
+class OcrRequest(BaseModel):
+    session_id: str
+    region: Optional[Dict[str, int]] = None  # viewport rect {x, y, w, h}; None = whole screen
+    with_regions: bool = False
+
 class ClickRequest(BaseModel):
     session_id: str
     selector: str
@@ -102,13 +120,14 @@ async def get_screenshot_full(session_id: str):
         page = browser_service.sessions[session_id]['page']
         await browser_service._inject_grid_overlay(page)
         dom_data = await browser_service._collect_dom_clickables(page)
-        screenshot_b64 = await browser_service.capture_screenshot(session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        sid = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, session_id)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         return {
             "screenshot_base64": screenshot_b64,
             "screenshot_id": sid,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "vision": vision,
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "status": "idle"
@@ -126,7 +145,8 @@ async def create_session(request: CreateSessionRequest):
     try:
         result = await browser_service.create_session(
             request.session_id,
-            use_proxy=request.use_proxy
+            use_proxy=request.use_proxy,
+            resource_policy=request.resource_policy
         )
         return result
     except Exception as e:
@@ -144,7 +164,7 @@ async def navigate(request: NavigateRequest):
             await browser_service.create_session(request.session_id, use_proxy=False)
         
         result = await browser_service.navigate(request.session_id, request.url)
-        return result
+        return await screenshot_store.with_base64(result)
     except Exception as e:
         logger.error(f"Error navigating: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -159,7 +179,7 @@ async def click_element(request: ClickRequest):
             raise HTTPException(status_code=404, detail=f"Session {request.session_id} not found. Create session first.")
         
         result = await browser_service.click_element(request.session_id, request.selector)
-        return result
+        return await screenshot_store.with_base64(result)
     except HTTPException:
         raise
     except Exception as e:
@@ -172,7 +192,7 @@ async def type_text(request: TypeRequest):
     """Type text into element by selector"""
     try:
         result = await browser_service.type_text(request.session_id, request.selector, request.text)
-        return result
+        return await screenshot_store.with_base64(result)
     except Exception as e:
         logger.error(f"Error typing: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -210,8 +230,9 @@ async def smart_type_text(request: SmartTypeRequest):
         await page.keyboard.type(request.text)
         await page.wait_for_timeout(500)
         
-        screenshot = await browser_service.capture_screenshot(request.session_id)
-        sid = hashlib.md5(screenshot.encode('utf-8')).hexdigest() if screenshot else None
+        shot = await browser_service.capture_screenshot_ref(request.session_id)
+        screenshot = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         
         return {
             "success": True,
@@ -238,13 +259,14 @@ async def screenshot_query(session_id: str):
         # ensure overlay
         await browser_service._inject_grid_overlay(page)
         dom_data = await browser_service._collect_dom_clickables(page)
-        screenshot_b64 = await browser_service.capture_screenshot(session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        sid = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, session_id)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         return {
             "screenshot_base64": screenshot_b64,
             "screenshot_id": sid,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "vision": vision,
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "status": "idle"
@@ -263,19 +285,18 @@ async def click_cell(req: ClickCellRequest):
         # compute coordinates
         dom_data = await browser_service._collect_dom_clickables(page)
         vw, vh = dom_data.get('vw', 1280), dom_data.get('vh', 800)
-        from services.grid_service import GridConfig
-        grid = GridConfig(rows=browser_service.grid_rows, cols=browser_service.grid_cols)
-        x, y = grid.cell_to_xy(req.cell, vw, vh)
+        x, y = grid_config.cell_to_xy(req.cell, vw, vh)
         # human-like move+click
         from services.anti_detect import HumanBehaviorSimulator
         await HumanBehaviorSimulator.human_click(page, x, y)
-        screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        sid = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(req.session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         return {
             "screenshot_base64": screenshot_b64,
             "screenshot_id": sid,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "vision": vision,
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "status": "idle",
@@ -294,19 +315,18 @@ async def type_at_cell(req: TypeAtCellRequest):
         await browser_service._inject_grid_overlay(page)
         dom_data = await browser_service._collect_dom_clickables(page)
         vw, vh = dom_data.get('vw', 1280), dom_data.get('vh', 800)
-        from services.grid_service import GridConfig
-        grid = GridConfig(rows=browser_service.grid_rows, cols=browser_service.grid_cols)
-        x, y = grid.cell_to_xy(req.cell, vw, vh)
+        x, y = grid_config.cell_to_xy(req.cell, vw, vh)
         from services.anti_detect import HumanBehaviorSimulator
         await HumanBehaviorSimulator.human_click(page, x, y)
         await HumanBehaviorSimulator.human_type(page, None, req.text)
-        screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        sid = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(req.session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         return {
             "screenshot_base64": screenshot_b64,
             "screenshot_id": sid,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "vision": vision,
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "status": "idle",
@@ -325,19 +345,18 @@ async def hold_drag(req: HoldDragRequest):
         await browser_service._inject_grid_overlay(page)
         dom_data = await browser_service._collect_dom_clickables(page)
         vw, vh = dom_data.get('vw', 1280), dom_data.get('vh', 800)
-        from services.grid_service import GridConfig
-        grid = GridConfig(rows=browser_service.grid_rows, cols=browser_service.grid_cols)
-        sx, sy = grid.cell_to_xy(req.from_cell, vw, vh)
-        ex, ey = grid.cell_to_xy(req.to_cell, vw, vh)
+        sx, sy = grid_config.cell_to_xy(req.from_cell, vw, vh)
+        ex, ey = grid_config.cell_to_xy(req.to_cell, vw, vh)
         from services.anti_detect import HumanBehaviorSimulator
         await HumanBehaviorSimulator.human_drag(page, sx, sy, ex, ey)
-        screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        sid = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(req.session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         return {
             "screenshot_base64": screenshot_b64,
             "screenshot_id": sid,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "vision": vision,
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "status": "idle",
@@ -358,7 +377,7 @@ class WaitMsRequest(BaseModel):
 async def do_scroll(req: ScrollRequest):
     try:
         result = await browser_service.scroll(req.session_id, req.dx, req.dy)
-        return result
+        return await screenshot_store.with_base64(result, key="screenshot_base64")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -379,7 +398,7 @@ async def wait_for_element(request: WaitRequest):
             request.selector,
             request.timeout
         )
-        return result
+        return await screenshot_store.with_base64(result)
     except Exception as e:
         logger.error(f"Error waiting: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -395,16 +414,17 @@ async def get_screenshot_endpoint(session_id: str):
         page = browser_service.sessions[session_id]['page']
         await browser_service._inject_grid_overlay(page)
         dom_data = await browser_service._collect_dom_clickables(page)
-        screenshot_b64 = await browser_service.capture_screenshot(session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        sid = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, session_id)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         
         return {
             "screenshot_base64": screenshot_b64,
             "screenshot_id": sid,
             "vision": vision,
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols}
+            "grid": grid_config.to_dict()
         }
     except Exception as e:
         logger.error(f"Error capturing screenshot: {str(e)}")
@@ -427,10 +447,103 @@ async def set_grid_density(req: GridSetRequest):
 @router.get("/grid")
 async def get_grid():
     try:
-        return {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols}
+        return grid_config.to_dict()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Raw screenshot bytes by content digest (no base64 inflation)
+@router.get("/screenshot-blob/{digest}")
+async def get_screenshot_blob(digest: str):
+    ref = screenshot_store.get_ref(digest)
+    data = screenshot_store.get_bytes(digest)
+    if not ref or data is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found or evicted")
+    return Response(content=data, media_type=ref.mime, headers={"Cache-Control": "private, max-age=3600, immutable"})
+
+@router.get("/screenshot-store/stats")
+async def get_screenshot_store_stats():
+    return screenshot_store.get_stats()
+
+# Page readiness: how waits resolved per host (quiet / network / spinner / timeout)
+@router.get("/readiness/stats")
+async def get_readiness_stats():
+    try:
+        return page_readiness_service.get_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Warm browser contexts per shard: hits/misses and acquire latency p50/p99
+@router.get("/context-pool/stats")
+async def get_context_pool_stats():
+    return {f"shard_{s.index}": s.pool.get_stats() for s in browser_service.shards.shards}
+
+# Browser processes: health, load, restarts
+@router.get("/shards/stats")
+async def get_shard_stats():
+    return browser_service.shards.get_stats()
+
+# Resource policies: blocked requests and estimated bytes saved
+@router.get("/resource-policy/stats")
+async def get_resource_policy_stats(session_id: Optional[str] = None):
+    return resource_policy_service.get_stats(session_id)
+
+@router.post("/session/{session_id}/resource-policy")
+async def set_resource_policy(session_id: str, request: ResourcePolicyRequest):
+    if session_id not in browser_service.sessions:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    await resource_policy_service.set_policy(session_id, request.policy)
+    return resource_policy_service.get_stats(session_id)
+
+# DOM clickables protocol: full vs delta collections and the share of elements actually sent
+@router.get("/snapshot/stats")
+async def get_snapshot_stats():
+    return {
+        "clickables": page_snapshot_service.get_delta_stats(),
+        "scene_elements": scene_builder_service.element_stats
+    }
+
+# Visual change detection: comparisons, unchanged frames and skipped vision/LLM calls
+@router.get("/visual-diff/stats")
+async def get_visual_diff_stats():
+    return visual_diff_service.get_stats()
+
+# Vision executor: queue depth, wait/run latency, rejected/expired/cancelled jobs
+@router.get("/vision/executor/stats")
+async def get_vision_executor_stats():
+    return vision_executor.get_stats()
+
+# Local OCR of a screen region (before escalating to a remote VLM)
+@router.post("/ocr/read")
+async def ocr_read(request: OcrRequest):
+    if request.session_id not in browser_service.sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return await local_ocr_service.read_text(request.session_id, request.region, with_regions=request.with_regions)
+
+@router.get("/ocr/stats")
+async def get_ocr_stats():
+    return local_ocr_service.get_stats()
+
+@router.get("/vision/cache/stats")
+async def get_vision_cache_stats():
+    return vision_result_cache.get_stats()
+
+@router.get("/grounding/stats")
+async def get_grounding_stats():
+    return grounding_cache_service.get_stats()
+
+class GroundingInvalidateRequest(BaseModel):
+    key: str
+
+@router.post("/grounding/invalidate")
+async def invalidate_grounding(req: GroundingInvalidateRequest):
+    """Forget a cached grounding (e.g. the action taken from it did not work)"""
+    return {"invalidated": await grounding_cache_service.invalidate(req.key)}
+
+@router.get("/vision/florence/stats")
+async def get_florence_stats():
+    from services.local_vision_service import local_vision_service
+    return local_vision_service.get_florence_stats()
+
 # ============= Supervisor (omitted for brevity) =============
 from services.supervisor_service import supervisor_service
 from pydantic import BaseModel
@@ -438,10 +551,13 @@ from typing import List
 
 class NextStepRequest(BaseModel):
     goal: str
+    # Previous answers; echo an answer's "grounding" with "success": false when its action failed
     history: List[Dict[str, Any]] = []
     screenshot_base64: str
     vision: List[Dict[str, Any]] = []
     model: Optional[str] = None
+    # Page URL: answers are cached per site, step and element layout
+    url: Optional[str] = None
 
 @router.post("/brain/next-step")
 async def brain_next_step(req: NextStepRequest):
@@ -451,7 +567,8 @@ async def brain_next_step(req: NextStepRequest):
             history=req.history,
             screenshot_base64=req.screenshot_base64,
             vision=req.vision,
-            model=req.model or 'qwen/qwen2.5-vl'
+            model=req.model or 'qwen/qwen2.5-vl',
+            url=req.url
         )
         return result
     except Exception as e:
@@ -473,7 +590,7 @@ async def get_page_info(session_id: str):
     """Get current page information"""
     try:
         result = await browser_service.get_page_info(session_id)
-        return result
+        return await screenshot_store.with_base64(result)
     except Exception as e:
         logger.error(f"Error getting page info: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -509,8 +626,9 @@ async def smart_click(request: FindElementsRequest):
         page = browser_service.sessions[request.session_id]['page']
         await page.mouse.click(center_x, center_y)
         await page.wait_for_timeout(1000)
-        screenshot = await browser_service.capture_screenshot(request.session_id)
-        sid = hashlib.md5(screenshot.encode('utf-8')).hexdigest() if screenshot else None
+        shot = await browser_service.capture_screenshot_ref(request.session_id)
+        screenshot = await screenshot_store.to_base64(shot)
+        sid = shot.digest if shot else None
         return {"success": True, "clicked_element": best_element, "screenshot": screenshot, "screenshot_id": sid, "box": box}
     except Exception as e:
         logger.error(f"Error in smart click: {str(e)}")
@@ -528,9 +646,10 @@ async def smoke_check(req: SmokeCheckRequest):
         page = browser_service.sessions[sid]['page']
         await browser_service._inject_grid_overlay(page)
         dom_data = await browser_service._collect_dom_clickables(page)
-        screenshot_b64 = await browser_service.capture_screenshot(sid)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        shot_id = hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+        shot = await browser_service.capture_screenshot_ref(sid)
+        vision = await browser_service._augment_with_vision(shot, dom_data, sid)
+        screenshot_b64 = await screenshot_store.to_base64(shot)
+        shot_id = shot.digest if shot else None
         return {
             "success": True,
             "session_id": sid,
@@ -538,7 +657,7 @@ async def smoke_check(req: SmokeCheckRequest):
             "title": nav.get('title'),
             "screenshot_base64": screenshot_b64,
             "screenshot_id": shot_id,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "vision": vision
         }
@@ -551,6 +670,8 @@ async def smoke_check(req: SmokeCheckRequest):
 
 class SceneSnapshotRequest(BaseModel):
     session_id: str
+    # Also return changes against this session's previous scene
+    diff: bool = False
 
 @router.post("/scene/snapshot")
 async def scene_snapshot(req: SceneSnapshotRequest):
@@ -571,17 +692,18 @@ async def scene_snapshot(req: SceneSnapshotRequest):
         dom_data = await browser_service._collect_dom_clickables(page)
         
         # Get screenshot for vision
-        screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
+        shot = await browser_service.capture_screenshot_ref(req.session_id)
         
         # Augment with vision
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+        vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
         
         # Build Scene JSON
         scene = await scene_builder_service.build_scene(
             page=page,
             dom_data=dom_data,
             vision_elements=vision,
-            session_id=req.session_id
+            session_id=req.session_id,
+            diff=req.diff
         )
         
         logger.info(f"📸 Scene snapshot: {len(scene['elements'])} elements, antibot={scene['antibot']['present']}")
@@ -589,8 +711,8 @@ async def scene_snapshot(req: SceneSnapshotRequest):
         return {
             "success": True,
             "scene": scene,
-            "screenshot_base64": screenshot_b64,
-            "screenshot_id": hashlib.md5(screenshot_b64.encode('utf-8')).hexdigest()
+            "screenshot_base64": await screenshot_store.to_base64(shot),
+            "screenshot_id": shot.digest if shot else None
         }
         
     except Exception as e:
@@ -604,6 +726,8 @@ class PlanDecideRequest(BaseModel):
     session_id: str
     goal: Dict[str, Any]
     scene: Optional[Dict[str, Any]] = None
+    # Replanning: the plan returned before (carries the scene_id it was built from)
+    previous_plan: Optional[Dict[str, Any]] = None
 
 @router.post("/plan/decide")
 async def plan_decide(req: PlanDecideRequest):
@@ -621,20 +745,30 @@ async def plan_decide(req: PlanDecideRequest):
             page = browser_service.sessions[req.session_id]['page']
             await browser_service._inject_grid_overlay(page)
             dom_data = await browser_service._collect_dom_clickables(page)
-            screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
-            vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+            shot = await browser_service.capture_screenshot_ref(req.session_id)
+            vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
             scene = await scene_builder_service.build_scene(page, dom_data, vision, req.session_id)
         
+        # Replanning: send the changes since the previous plan's scene (full elements if it is gone)
+        context = None
+        if req.previous_plan:
+            diff = scene_builder_service.diff_since(scene, req.previous_plan.get('scene_id'))
+            scene = {**scene, "diff": diff}
+            context = {"previous_plan": req.previous_plan}
+        
         # Generate plan
         result = await planner_service.decide_plan(
             goal=req.goal,
-            scene=scene
+            scene=scene,
+            context=context
         )
         
         if not result.get('success'):
             raise HTTPException(status_code=500, detail=result.get('error', 'Planning failed'))
         
         logger.info(f"📋 Plan generated: {len(result['plan'].get('candidates', []))} candidates")
+        # Later replans diff against this scene
+        scene_builder_service.pin_scene(scene)
         
         return {
             "success": True,
@@ -707,8 +841,8 @@ async def env_check(req: EnvCheckRequest):
         
         # Get antibot info from scene
         dom_data = await browser_service._collect_dom_clickables(page)
-        screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+        shot = await browser_service.capture_screenshot_ref(req.session_id)
+        vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
         scene = await scene_builder_service.build_scene(page, dom_data, vision, req.session_id)
         
         result = await env_check_service.check(
@@ -740,8 +874,8 @@ async def recon_scan(req: ReconRequest):
             
             page = browser_service.sessions[req.session_id]['page']
             dom_data = await browser_service._collect_dom_clickables(page)
-            screenshot_b64 = await browser_service.capture_screenshot(req.session_id)
-            vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+            shot = await browser_service.capture_screenshot_ref(req.session_id)
+            vision = await browser_service._augment_with_vision(shot, dom_data, req.session_id)
             scene = await scene_builder_service.build_scene(page, dom_data, vision, req.session_id)
         
         result = await recon_service.scan(scene)
@@ -780,7 +914,8 @@ async def inventory_check(req: InventoryRequest):
 # ============= BLOCK 4: Verifier + Recovery Endpoints =============
 
 class VerifyResultRequest(BaseModel):
-    prevScene: Dict[str, Any]
+    # Optional when currScene carries a diff (scene built with diff=True)
+    prevScene: Optional[Dict[str, Any]] = None
     currScene: Dict[str, Any]
     lastAction: Dict[str, Any]
     goal: Dict[str, Any]
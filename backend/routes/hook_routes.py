@@ -19,10 +19,16 @@ from services.browser_automation_service import browser_service
 from services.supervisor_service import supervisor_service
 from services.anti_detect import HumanBehaviorSimulator
 from services.page_state_service import page_state_service
+from services.page_snapshot_service import page_snapshot_service
+from services.screenshot_store import screenshot_store
+from services.visual_diff_service import visual_diff_service
+from services.resource_policy_service import resource_policy_service
 from services.head_brain_service import head_brain_service
 from services.form_filler_service import form_filler_service
 from services.planner_service import planner_service
-from services.scene_builder_service import SceneBuilderService
+from services.scene_builder_service import scene_builder_service
+from services.grid_service import grid_config
+from services.grounding_cache_service import grounding_cache_service
 # Import automation endpoints for execution
 from routes.automation_routes import SmartTypeRequest, SmartClickRequest, smart_type_text, smart_click, FindElementsRequest
 from routes.profile_routes import CreateProfileRequest
@@ -81,7 +87,7 @@ class AdjustRequest(BaseModel):
 
 # -------- Utilities --------
 
-def log_step(action: str, status: str = "ok", error: Optional[str] = None):
+def log_step(action: str, status: str = "ok", error: Optional[str] = None, change_score: Optional[float] = None):
     entry = {
         "ts": datetime.now().isoformat(),
         "step": len(execution_logs) + 1,
@@ -89,28 +95,38 @@ def log_step(action: str, status: str = "ok", error: Optional[str] = None):
         "status": status,
         "error": error
     }
+    if change_score is not None:
+        entry["change_score"] = change_score
     execution_logs.append(entry)
     logger.info(f"[HOOK] {action} => {status}")
 
+async def _observation_for_client(observation: Dict[str, Any]) -> Dict[str, Any]:
+    """Observations keep a screenshot reference; base64 is produced only for the client"""
+    if not observation.get("screenshot_ref"):
+        return observation
+    return {**observation, "screenshot_base64": await screenshot_store.to_base64(observation["screenshot_ref"])}
+
 async def observe(session_id: str):
     global last_observation
     try:
         # Inject and collect DOM + screenshot + vision
         page = browser_service.sessions[session_id]['page']
         await browser_service._inject_grid_overlay(page)
-        dom_data = await browser_service._collect_dom_clickables(page)
-        screenshot_b64 = await browser_service.capture_screenshot(session_id)
-        vision = await browser_service._augment_with_vision(screenshot_b64, dom_data)
-        # Detect page state (lightweight)
+        snapshot = await page_snapshot_service.capture(page, parts=["clickables", "text", "hints"])
+        dom_data = page_snapshot_service.dom_data(snapshot)
+        screenshot_ref = await browser_service.capture_screenshot_ref(session_id)
+        vision = await browser_service._augment_with_vision(screenshot_ref, dom_data, session_id)
+        # Detect page state (lightweight, from the same snapshot)
         try:
-            state_info = await page_state_service.detect(page)
+            state_info = page_state_service.classify(snapshot.get('page_text', ''), bool(snapshot.get('captcha_marker')))
             page_state = state_info.get('state', 'unknown')
         except Exception:
             page_state = 'unknown'
         last_observation = {
-            "screenshot_base64": screenshot_b64,
+            "screenshot_ref": screenshot_ref.to_dict() if screenshot_ref else None,
+            "screenshot_id": screenshot_ref.digest if screenshot_ref else None,
             "vision": vision,
-            "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+            "grid": grid_config.to_dict(),
             "viewport": {"width": dom_data.get('vw', 1280), "height": dom_data.get('vh', 800)},
             "status": "idle",
             "url": page.url,
@@ -122,7 +138,7 @@ async def observe(session_id: str):
                 "hints": current_plan.get('hints') if current_plan else []
             }
         }
-        return last_observation
+        return await _observation_for_client(last_observation)
     except Exception as e:
         logger.error(f"[HOOK] observe error: {e}")
         last_observation = {"screenshot_base64": None, "vision": [], "grid": {"rows": 12, "cols": 8}, "status": "error"}
@@ -392,17 +408,19 @@ async def exec_task(req: TaskRequest):
         log_step("🧩 [PLANNER] Building detailed execution plan from current scene...")
         try:
             # Build Scene JSON from current page
-            scene_builder = SceneBuilderService()
+            scene_builder = scene_builder_service
             page = browser_service.sessions[session_id]['page']
-            dom_data = await browser_service._collect_dom_clickables(page)
-            screenshot_b64 = await browser_service.capture_screenshot(session_id)
-            vision_elements = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+            snapshot = await page_snapshot_service.capture(page, parts=["clickables", "text", "hints"])
+            dom_data = page_snapshot_service.dom_data(snapshot)
+            screenshot_ref = await browser_service.capture_screenshot_ref(session_id)
+            vision_elements = await browser_service._augment_with_vision(screenshot_ref, dom_data, session_id)
             
             scene = await scene_builder.build_scene(
                 page=page,
                 dom_data=dom_data,
                 vision_elements=vision_elements,
-                session_id=session_id
+                session_id=session_id,
+                snapshot=snapshot
             )
             
             # Call Planner to generate detailed steps
@@ -473,6 +491,8 @@ async def exec_task(req: TaskRequest):
         # Счётчик попыток retry для текущего шага
         step_retry_count = 0
         max_retries_per_step = 3
+        # Cached validator verdict that passed the previous step (dropped if the next action cannot run)
+        passed_grounding = None
         
         while agent_status == "ACTIVE" and current_step_id and step_count < max_steps:
             step_count += 1
@@ -530,8 +550,8 @@ async def exec_task(req: TaskRequest):
                 if loading_status.get('is_loading'):
                     reason = loading_status.get('reason')
                     log_step(f"⏳ [EXECUTOR] Page still loading: {reason}")
-                    await browser_service.wait_for_page_ready(page, timeout_ms=5000)
-                    log_step("✅ [EXECUTOR] Page ready")
+                    ready = await browser_service.wait_for_page_settled(page, timeout_ms=5000)
+                    log_step(f"✅ [EXECUTOR] Page ready ({ready.get('reason')}, {ready.get('elapsed_ms')}ms)")
             except Exception as e:
                 log_step(f"⚠️ [EXECUTOR] Loading check failed: {str(e)}")
             
@@ -540,215 +560,246 @@ async def exec_task(req: TaskRequest):
             # ============================================================
             action_executed = False
             action_error = None
+            url_before = None
+            # Frame the action starts from (refreshed by the pre-action captures below)
+            frame_before = screenshot_store.latest(session_id)
+            # Step-level resource policy; vision-on-imagery steps get images/fonts back
+            await resource_policy_service.begin_step(
+                session_id,
+                policy=current_step.get('resource_policy'),
+                action=step_action,
+                needs_vision=bool(current_step.get('needs_vision'))
+            )
             
             try:
-                page = browser_service.sessions[session_id]['page']
-                current_url = page.url
+                try:
+                    page = browser_service.sessions[session_id]['page']
+                    current_url = url_before = page.url
                 
-                if step_action == 'NAVIGATE':
-                    # Навигация на URL
-                    target_url = step_target or start_url
-                    log_step(f"🌐 [EXECUTOR] human_navigate to {target_url}")
-                    await browser_service.navigate(session_id, target_url)
-                    await asyncio.sleep(random.uniform(2.0, 3.5))  # human reaction time
-                    action_executed = True
+                    if step_action == 'NAVIGATE':
+                        # Навигация на URL
+                        target_url = step_target or start_url
+                        log_step(f"🌐 [EXECUTOR] human_navigate to {target_url}")
+                        await browser_service.navigate(session_id, target_url)
+                        await asyncio.sleep(random.uniform(2.0, 3.5))  # human reaction time
+                        action_executed = True
                     
-                elif step_action == 'TYPE':
-                    # Ввод текста через human_type
-                    # Получаем значение из data_bundle
-                    if step_data_key and step_data_key in used_data:
-                        text_to_type = str(used_data[step_data_key])
-                    else:
-                        text_to_type = step_target or ""
+                    elif step_action == 'TYPE':
+                        # Ввод текста через human_type
+                        # Получаем значение из data_bundle
+                        if step_data_key and step_data_key in used_data:
+                            text_to_type = str(used_data[step_data_key])
+                        else:
+                            text_to_type = step_target or ""
                     
-                    if not text_to_type:
-                        log_step(f"⚠️ [EXECUTOR] No text to type for field {step_field}")
-                        action_error = f"Missing data for {step_data_key}"
-                    else:
-                        log_step(f"⌨️  [EXECUTOR] human_type '{text_to_type[:30]}...' for field {step_field}")
+                        if not text_to_type:
+                            log_step(f"⚠️ [EXECUTOR] No text to type for field {step_field}")
+                            action_error = f"Missing data for {step_data_key}"
+                        else:
+                            log_step(f"⌨️  [EXECUTOR] human_type '{text_to_type[:30]}...' for field {step_field}")
                         
-                        # Найти элемент по field name или использовать vision
-                        await browser_service._inject_grid_overlay(page)
-                        dom_data = await browser_service._collect_dom_clickables(page)
-                        screenshot_b64 = await browser_service.capture_screenshot(session_id)
-                        vision_elements = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+                            # Найти элемент по field name или использовать vision
+                            await browser_service._inject_grid_overlay(page)
+                            dom_data = await browser_service._collect_dom_clickables(page)
+                            screenshot_ref = await browser_service.capture_screenshot_ref(session_id)
+                            frame_before = screenshot_ref or frame_before
+                            vision_elements = await browser_service._augment_with_vision(screenshot_ref, dom_data, session_id)
                         
-                        # Ищем поле в vision по field name с улучшенной логикой
-                        target_cell = None
-                        textbox_elements = [el for el in vision_elements if el.get('type', '').lower() in ['input', 'textarea', 'textbox']]
+                            # Ищем поле в vision по field name с улучшенной логикой
+                            target_cell = None
+                            textbox_elements = [el for el in vision_elements if el.get('type', '').lower() in ['input', 'textarea', 'textbox']]
                         
-                        # First try: exact match by field name in label or aria-label
-                        for el in textbox_elements:
-                            el_cell = el.get('cell')
-                            if el_cell in filled_textbox_cells:
-                                continue  # Skip already filled fields
-                            
-                            el_label = (el.get('label') or '').lower()
-                            el_aria = (el.get('aria_label') or '').lower()
-                            if step_field and (step_field.lower() in el_label or step_field.lower() in el_aria):
-                                target_cell = el_cell
-                                log_step(f"📍 [EXECUTOR] Found field {step_field} by label match at {target_cell}")
-                                break
-                        
-                        # Second try: find first EMPTY/unfilled textbox
-                        if not target_cell:
+                            # First try: exact match by field name in label or aria-label
                             for el in textbox_elements:
                                 el_cell = el.get('cell')
                                 if el_cell in filled_textbox_cells:
-                                    continue  # Skip already filled
-                                
-                                el_label = (el.get('label') or '').strip()
-                                # Empty if label is generic or very short
-                                if el_label in ['INPUT', 'textbox', '1', ''] or len(el_label) <= 3:
+                                    continue  # Skip already filled fields
+                            
+                                el_label = (el.get('label') or '').lower()
+                                el_aria = (el.get('aria_label') or '').lower()
+                                if step_field and (step_field.lower() in el_label or step_field.lower() in el_aria):
                                     target_cell = el_cell
-                                    log_step(f"📍 [EXECUTOR] Using first unfilled textbox at {target_cell}")
+                                    log_step(f"📍 [EXECUTOR] Found field {step_field} by label match at {target_cell}")
                                     break
                         
-                        # Third try: use any unfilled textbox as fallback
-                        if not target_cell:
-                            for el in textbox_elements:
-                                el_cell = el.get('cell')
-                                if el_cell not in filled_textbox_cells:
-                                    target_cell = el_cell
-                                    log_step(f"⚠️ [EXECUTOR] Using first available unfilled textbox at {target_cell} as fallback")
-                                    break
+                            # Second try: find first EMPTY/unfilled textbox
+                            if not target_cell:
+                                for el in textbox_elements:
+                                    el_cell = el.get('cell')
+                                    if el_cell in filled_textbox_cells:
+                                        continue  # Skip already filled
+                                
+                                    el_label = (el.get('label') or '').strip()
+                                    # Empty if label is generic or very short
+                                    if el_label in ['INPUT', 'textbox', '1', ''] or len(el_label) <= 3:
+                                        target_cell = el_cell
+                                        log_step(f"📍 [EXECUTOR] Using first unfilled textbox at {target_cell}")
+                                        break
                         
-                        if target_cell:
-                            result = await browser_service.type_at_cell(session_id, target_cell, text_to_type, human_like=True)
-                            if result.get('success'):
-                                action_executed = True
-                                filled_textbox_cells.add(target_cell)  # Mark as filled
-                                log_step(f"✅ [EXECUTOR] Typed successfully at {target_cell}")
+                            # Third try: use any unfilled textbox as fallback
+                            if not target_cell:
+                                for el in textbox_elements:
+                                    el_cell = el.get('cell')
+                                    if el_cell not in filled_textbox_cells:
+                                        target_cell = el_cell
+                                        log_step(f"⚠️ [EXECUTOR] Using first available unfilled textbox at {target_cell} as fallback")
+                                        break
+                        
+                            if target_cell:
+                                result = await browser_service.type_at_cell(session_id, target_cell, text_to_type, human_like=True)
+                                if result.get('success'):
+                                    action_executed = True
+                                    filled_textbox_cells.add(target_cell)  # Mark as filled
+                                    log_step(f"✅ [EXECUTOR] Typed successfully at {target_cell}")
+                                else:
+                                    action_error = result.get('error', 'Type failed')
                             else:
-                                action_error = result.get('error', 'Type failed')
-                        else:
-                            log_step(f"⚠️ [EXECUTOR] Could not find field {step_field} in vision")
-                            action_error = f"Field {step_field} not found"
+                                log_step(f"⚠️ [EXECUTOR] Could not find field {step_field} in vision")
+                                action_error = f"Field {step_field} not found"
                     
-                elif step_action == 'CLICK':
-                    # Клик через human_click
-                    log_step(f"👆 [EXECUTOR] human_click on {step_target}")
+                    elif step_action == 'CLICK':
+                        # Клик через human_click
+                        log_step(f"👆 [EXECUTOR] human_click on {step_target}")
                     
-                    # Найти кнопку в vision
-                    await browser_service._inject_grid_overlay(page)
-                    dom_data = await browser_service._collect_dom_clickables(page)
-                    screenshot_b64 = await browser_service.capture_screenshot(session_id)
-                    vision_elements = await browser_service._augment_with_vision(screenshot_b64, dom_data)
+                        # Найти кнопку в vision
+                        await browser_service._inject_grid_overlay(page)
+                        dom_data = await browser_service._collect_dom_clickables(page)
+                        screenshot_ref = await browser_service.capture_screenshot_ref(session_id)
+                        frame_before = screenshot_ref or frame_before
+                        vision_elements = await browser_service._augment_with_vision(screenshot_ref, dom_data, session_id)
                     
-                    target_cell = None
-                    for el in vision_elements:
-                        el_label = (el.get('label') or '').lower()
-                        el_type = (el.get('type') or '').lower()
-                        if step_target.lower() in el_label or (el_type == 'button' and not target_cell):
-                            target_cell = el.get('cell')
-                            break
+                        target_cell = None
+                        for el in vision_elements:
+                            el_label = (el.get('label') or '').lower()
+                            el_type = (el.get('type') or '').lower()
+                            if step_target.lower() in el_label or (el_type == 'button' and not target_cell):
+                                target_cell = el.get('cell')
+                                break
                     
-                    if target_cell:
-                        result = await browser_service.click_cell(session_id, target_cell, human_like=True)
-                        if result.get('success'):
-                            action_executed = True
-                            await asyncio.sleep(random.uniform(1.5, 3.0))  # wait for page reaction
-                            log_step(f"✅ [EXECUTOR] Clicked successfully at {target_cell}")
+                        if target_cell:
+                            result = await browser_service.click_cell(session_id, target_cell, human_like=True)
+                            if result.get('success'):
+                                action_executed = True
+                                await asyncio.sleep(random.uniform(1.5, 3.0))  # wait for page reaction
+                                log_step(f"✅ [EXECUTOR] Clicked successfully at {target_cell}")
+                            else:
+                                action_error = result.get('error', 'Click failed')
                         else:
-                            action_error = result.get('error', 'Click failed')
-                    else:
-                        log_step(f"⚠️ [EXECUTOR] Could not find button {step_target} in vision")
-                        action_error = f"Button {step_target} not found"
+                            log_step(f"⚠️ [EXECUTOR] Could not find button {step_target} in vision")
+                            action_error = f"Button {step_target} not found"
                 
-                elif step_action == 'VERIFY_RESULT':
-                    # Верификация не требует действия, только проверка
-                    log_step(f"🔍 [EXECUTOR] Verification step (no action)")
-                    action_executed = True
+                    elif step_action == 'VERIFY_RESULT':
+                        # Верификация не требует действия, только проверка
+                        log_step(f"🔍 [EXECUTOR] Verification step (no action)")
+                        action_executed = True
                     
-                elif step_action == 'WAIT_USER':
-                    # Остановка и ожидание оператора
-                    log_step(f"⏸️ [EXECUTOR] WAIT_USER - stopping for operator")
-                    agent_status = "WAITING_USER"
-                    pending_user_prompt = step_target or "User input required"
-                    # Сохраняем состояние
-                    try:
-                        storage = await page.context.storage_state()
-                        with open(f"/tmp/waiting_state_{session_id}.json", 'w') as f:
-                            import json
-                            json.dump(storage, f)
-                        log_step(f"✅ [EXECUTOR] State saved for operator")
-                    except Exception as e:
-                        log_step(f"⚠️ [EXECUTOR] Failed to save state: {e}")
-                    break
+                    elif step_action == 'WAIT_USER':
+                        # Остановка и ожидание оператора
+                        log_step(f"⏸️ [EXECUTOR] WAIT_USER - stopping for operator")
+                        agent_status = "WAITING_USER"
+                        pending_user_prompt = step_target or "User input required"
+                        # Сохраняем состояние
+                        try:
+                            storage = await page.context.storage_state()
+                            with open(f"/tmp/waiting_state_{session_id}.json", 'w') as f:
+                                import json
+                                json.dump(storage, f)
+                            log_step(f"✅ [EXECUTOR] State saved for operator")
+                        except Exception as e:
+                            log_step(f"⚠️ [EXECUTOR] Failed to save state: {e}")
+                        break
                 
-                elif step_action == 'WAIT':
-                    # Wait for specified milliseconds
-                    wait_ms = int(step_target) if step_target else 1000
-                    log_step(f"⏱️  [EXECUTOR] Waiting {wait_ms}ms")
-                    await asyncio.sleep(wait_ms / 1000.0)
-                    action_executed = True
+                    elif step_action == 'WAIT':
+                        # Wait for specified milliseconds
+                        wait_ms = int(step_target) if step_target else 1000
+                        log_step(f"⏱️  [EXECUTOR] Waiting {wait_ms}ms")
+                        await asyncio.sleep(wait_ms / 1000.0)
+                        action_executed = True
                     
-                else:
-                    log_step(f"⚠️ [PLAN] Unknown action: {step_action}")
-                    action_error = f"Unknown action {step_action}"
+                    else:
+                        log_step(f"⚠️ [PLAN] Unknown action: {step_action}")
+                        action_error = f"Unknown action {step_action}"
                     
-            except Exception as e:
-                log_step(f"❌ [EXECUTOR] Action failed: {str(e)}")
-                action_error = str(e)
-                import traceback
-                traceback.print_exc()
+                except Exception as e:
+                    log_step(f"❌ [EXECUTOR] Action failed: {str(e)}")
+                    action_error = str(e)
+                    import traceback
+                    traceback.print_exc()
             
-            # Если не удалось выполнить действие из-за ошибки - переходим к retry
-            if action_error and not action_executed:
-                log_step(f"❌ [EXECUTOR] Action failed: {action_error}")
-                # Обработка ошибки на следующем шаге (валидатор решит)
+                # Если не удалось выполнить действие из-за ошибки - переходим к retry
+                if action_error and not action_executed:
+                    log_step(f"❌ [EXECUTOR] Action failed: {action_error}")
+                    # The verdict that passed the previous step was probably wrong about it
+                    await grounding_cache_service.report(passed_grounding, False)
+                    passed_grounding = None
+                    # Обработка ошибки на следующем шаге (валидатор решит)
             
-            # ============================================================
-            # STEP 5: CAPTURE STATE AFTER ACTION (для валидации)
-            # ============================================================
-            screenshot_after = None
-            vision_after = []
+                # ============================================================
+                # STEP 5: CAPTURE STATE AFTER ACTION (для валидации)
+                # ============================================================
+                screenshot_after = None
+                vision_after = []
+                change_score = None
+                url_after = None
             
-            if action_executed or action_error:
-                try:
-                    await asyncio.sleep(random.uniform(1.0, 2.0))  # wait for page update
-                    page = browser_service.sessions[session_id]['page']
-                    await browser_service._inject_grid_overlay(page)
-                    dom_data_after = await browser_service._collect_dom_clickables(page)
-                    screenshot_after = await browser_service.capture_screenshot(session_id)
-                    vision_after = await browser_service._augment_with_vision(screenshot_after, dom_data_after)
-                    log_step(f"📸 [VALIDATOR] Captured state AFTER action: {len(vision_after)} elements")
-                except Exception as e:
-                    log_step(f"⚠️ [VALIDATOR] Failed to capture AFTER state: {e}")
+                if action_executed or action_error:
+                    try:
+                        await asyncio.sleep(random.uniform(1.0, 2.0))  # wait for page update
+                        page = browser_service.sessions[session_id]['page']
+                        await browser_service._inject_grid_overlay(page)
+                        dom_data_after = await browser_service._collect_dom_clickables(page)
+                        screenshot_after = await browser_service.capture_screenshot_ref(session_id)
+                        url_after = page.url
+                        if frame_before and screenshot_after:
+                            diff = await visual_diff_service.compare_async(frame_before, screenshot_after)
+                            change_score = diff.get("change_score")
+                        vision_after = await browser_service._augment_with_vision(screenshot_after, dom_data_after, session_id)
+                        log_step(f"📸 [VALIDATOR] Captured state AFTER action: {len(vision_after)} elements", change_score=change_score)
+                    except Exception as e:
+                        log_step(f"⚠️ [VALIDATOR] Failed to capture AFTER state: {e}")
             
-            # ============================================================
-            # STEP 6: VALIDATE STEP (Florence-2 → fallback VLM)
-            # ============================================================
-            validation_result = None
+                # ============================================================
+                # STEP 6: VALIDATE STEP (Florence-2 → fallback VLM)
+                # ============================================================
+                validation_result = None
+                skip_validation = visual_diff_service.skips_validation(step_action, change_score, url_before, url_after)
             
-            if action_executed and screenshot_after:
-                log_step(f"🔍 [VALIDATOR] Validating step {current_step_id}")
+                if action_executed and screenshot_after and skip_validation:
+                    # WAIT / same-URL NAVIGATE are not expected to change the screen
+                    visual_diff_service.record_skip("validator")
+                    validation_result = {"step_status": "ok", "reason": "No visible change (not expected)", "confidence": 0.9}
+                    log_step(f"⏭️ [VALIDATOR] Screen unchanged after {step_action}, skipping VLM", change_score=change_score)
+                elif action_executed and screenshot_after:
+                    log_step(f"🔍 [VALIDATOR] Validating step {current_step_id}")
                 
-                # PHASE 1: Try Florence-2 local validation (FAST, FREE)
-                try:
-                    from services.local_vision_service import local_vision_service
+                    # PHASE 1: Try Florence-2 local validation (FAST, FREE)
+                    try:
+                        from services.local_vision_service import local_vision_service
                     
-                    # Florence-2 для поиска ошибок на экране
-                    florence_loaded = local_vision_service.load_florence_model()
+                        # Florence-2 для поиска ошибок на экране
+                        florence_loaded = local_vision_service.ready
+                        if not florence_loaded:
+                            # Loading here would block the event loop; the preloader brings it up
+                            local_vision_service.start_preload()
                     
-                    if florence_loaded:
-                        log_step("🔍 [VALIDATOR] Using Florence-2 (local)")
-                        # TODO: Florence-2 full pipeline для детекции ошибок
-                        # Пока что упрощённая логика
-                        florence_validation = {"step_status": "ok", "confidence": 0.5}
-                    else:
+                        if florence_loaded:
+                            log_step("🔍 [VALIDATOR] Using Florence-2 (local)")
+                            # TODO: Florence-2 full pipeline для детекции ошибок
+                            # Пока что упрощённая логика
+                            florence_validation = {"step_status": "ok", "confidence": 0.5}
+                        else:
+                            florence_validation = {"step_status": "unknown", "confidence": 0.0}
+                            log_step("⚠️ [VALIDATOR] Florence-2 not available")
+                    except Exception as e:
+                        log_step(f"⚠️ [VALIDATOR] Florence-2 failed: {e}")
                         florence_validation = {"step_status": "unknown", "confidence": 0.0}
-                        log_step("⚠️ [VALIDATOR] Florence-2 not available")
-                except Exception as e:
-                    log_step(f"⚠️ [VALIDATOR] Florence-2 failed: {e}")
-                    florence_validation = {"step_status": "unknown", "confidence": 0.0}
                 
-                # PHASE 2: Fallback to external VLM if low confidence
-                if florence_validation.get('confidence', 0) < 0.7:
-                    log_step("🔍 [VALIDATOR] Low confidence, using external VLM fallback")
+                    # PHASE 2: Fallback to external VLM if low confidence
+                    if florence_validation.get('confidence', 0) < 0.7:
+                        log_step("🔍 [VALIDATOR] Low confidence, using external VLM fallback")
                     
-                    # Формируем промпт для валидатора
-                    validator_prompt = f"""Analyze this screenshot after executing: {step_action} on field '{step_field or step_target}'.
+                        # Формируем промпт для валидатора
+                        validator_prompt = f"""Analyze this screenshot after executing: {step_action} on field '{step_field or step_target}'.
 
 Expected result: Field should be filled / button clicked / page changed.
 
@@ -768,54 +819,67 @@ Return JSON:
 
 CRITICAL: Only use "waiting_user" for phone/SMS/2FA/captcha. NOT for simple validation errors."""
                     
-                    try:
-                        # Вызываем валидатор через supervisor (переиспользуем существующий сервис)
-                        validation_result = await supervisor_service.next_step(
-                            goal=validator_prompt,
-                            history=[],
-                            screenshot_base64=screenshot_after,
-                            vision=vision_after,
-                            available_data={},
-                            model='qwen/qwen2.5-vl',
-                            mode='validate'  # Специальный режим валидации
-                        )
+                        try:
+                            # Вызываем валидатор через supervisor (переиспользуем существующий сервис)
+                            validation_result = await supervisor_service.next_step(
+                                goal=validator_prompt,
+                                history=[],
+                                screenshot_base64=await screenshot_store.to_base64(screenshot_after),
+                                vision=vision_after,
+                                available_data={},
+                                model='qwen/qwen2.5-vl',
+                                mode='validate',  # Специальный режим валидации
+                                change_score=change_score,  # nothing changed -> told to the VLM
+                                url=page.url,  # verdicts are cached per site, element layout
+                                frame_digest=screenshot_after.digest  # and frame
+                            )
                         
-                        log_step(f"✅ [VALIDATOR] External VLM: {validation_result.get('next_action', 'ok')}")
+                            log_step(f"✅ [VALIDATOR] External VLM: {validation_result.get('next_action', 'ok')}", change_score=change_score)
                         
-                        # Преобразуем ответ supervisor в формат валидации
-                        if validation_result.get('next_action') == 'ERROR':
-                            step_status = "needs_fix_and_retry"
-                            reason = validation_result.get('ask_user', 'Validation error')
-                        elif validation_result.get('next_action') == 'WAIT':
-                            step_status = "waiting_user"
-                            reason = "User input required"
-                        else:
-                            step_status = "ok"
-                            reason = "Step validated successfully"
+                            # Преобразуем ответ supervisor в формат валидации
+                            if validation_result.get('next_action') == 'ERROR':
+                                step_status = "needs_fix_and_retry"
+                                reason = validation_result.get('ask_user', 'Validation error')
+                            elif validation_result.get('next_action') == 'WAIT':
+                                step_status = "waiting_user"
+                                reason = "User input required"
+                            else:
+                                step_status = "ok"
+                                reason = "Step validated successfully"
                         
-                        validation_result = {
-                            "step_status": step_status,
-                            "reason": reason,
-                            "confidence": validation_result.get('confidence', 0.7)
-                        }
+                            validation_result = {
+                                "step_status": step_status,
+                                "reason": reason,
+                                "confidence": validation_result.get('confidence', 0.7),
+                                "grounding": validation_result.get('grounding')
+                            }
                         
-                    except Exception as e:
-                        log_step(f"❌ [VALIDATOR] External VLM failed: {e}")
-                        validation_result = {"step_status": "ok", "reason": "Validation unavailable, assuming ok", "confidence": 0.5}
+                        except Exception as e:
+                            log_step(f"❌ [VALIDATOR] External VLM failed: {e}")
+                            validation_result = {"step_status": "ok", "reason": "Validation unavailable, assuming ok", "confidence": 0.5}
+                    else:
+                        validation_result = florence_validation
+                        log_step(f"✅ [VALIDATOR] Florence-2 validated: {validation_result.get('step_status')}")
                 else:
-                    validation_result = florence_validation
-                    log_step(f"✅ [VALIDATOR] Florence-2 validated: {validation_result.get('step_status')}")
-            else:
-                # Нет действия или скриншота - пропускаем валидацию
-                validation_result = {"step_status": "ok", "reason": "No validation needed", "confidence": 1.0}
+                    # Нет действия или скриншота - пропускаем валидацию
+                    validation_result = {"step_status": "ok", "reason": "No validation needed", "confidence": 1.0}
+            finally:
+                await resource_policy_service.end_step(session_id)
             
             # ============================================================
             # STEP 7: PROCESS VALIDATION RESULT
             # ============================================================
             step_status = validation_result.get('step_status', 'ok')
+            grounding = validation_result.get('grounding')
             
             log_step(f"📊 [VALIDATOR] Result: {step_status} (confidence={validation_result.get('confidence', 0)})")
             
+            if step_status == 'ok':
+                passed_grounding = grounding
+            elif grounding and grounding.get('cached'):
+                # A replayed failure verdict would fail every retry on the same layout: ask the VLM again
+                await grounding_cache_service.report(grounding, False)
+            
             if step_status == 'ok':
                 # ✅ Шаг успешен - переходим к следующему
                 log_step(f"✅ [PLAN] Step {current_step_id} PASSED, moving to next")
@@ -925,15 +989,16 @@ CRITICAL: Only use "waiting_user" for phone/SMS/2FA/captcha. NOT for simple vali
             # ============================================================
             # STEP 8: UPDATE OBSERVATION FOR UI
             # ============================================================
+            shown_ref = screenshot_after or screenshot_store.latest(session_id)
             last_observation = {
-                "screenshot_base64": screenshot_after or screenshot_before,
-                "screenshot_id": f"step_{step_count}",
+                "screenshot_ref": shown_ref.to_dict() if shown_ref else None,
+                "screenshot_id": shown_ref.digest if shown_ref else f"step_{step_count}",
                 "vision": vision_after or [],
                 "url": current_url,
                 "step": step_count,
                 "action": step_action,
                 "validation": validation_result,
-                "grid": {"rows": browser_service.grid_rows, "cols": browser_service.grid_cols},
+                "grid": grid_config.to_dict(),
                 "status": agent_status
             }
             
@@ -1049,7 +1114,7 @@ async def get_log():
         "task": current_task,
         "status": agent_status,
         "logs": execution_logs,
-        "observation": last_observation,
+        "observation": await _observation_for_client(last_observation),
         "session_id": current_session_id,
         "plan": current_plan,
         "current_step_id": current_step_id,  # NEW: текущий шаг
@@ -82,3 +82,10 @@ async def get_system_status():
             "key_valid": False,
             "balance": None
         }
+
+
+@router.get("/system-status/vision")
+async def get_vision_status():
+    """Readiness of the local vision model (loading / warming / ready / failed / unavailable)"""
+    from services.local_vision_service import local_vision_service
+    return local_vision_service.get_readiness()
@@ -148,6 +148,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Launch the browser and warm the context pool at startup instead of on the first session
+@app.on_event("startup")
+async def prewarm_browser_pool():
+    if os.environ.get('BROWSER_POOL_PREWARM', 'false').lower() != 'true':
+        return
+    try:
+        from services.browser_automation_service import browser_service
+        await browser_service.initialize()
+        logger.info("✅ Browser launched at startup, context pool warming")
+    except Exception as e:
+        logger.warning(f"Browser prewarm failed: {e}")
+
+# Load and warm up the local vision model in the background; perception is DOM-only until it is ready
+@app.on_event("startup")
+async def preload_vision_model():
+    from services.local_vision_service import local_vision_service, FLORENCE_PRELOAD
+    if FLORENCE_PRELOAD and local_vision_service.start_preload():
+        logger.info("📥 Florence-2 preloading in background")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+
+@app.on_event("shutdown")
+async def shutdown_browser_shards():
+    from services.browser_automation_service import browser_service
+    await browser_service.shards.close_all()
+
+@app.on_event("shutdown")
+async def shutdown_vision_executor():
+    from services.vision_executor import vision_executor
+    vision_executor.shutdown()
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Box Merge - one vectorized dedupe stage for DOM and visual detections
+Sources are merged in priority tiers (DOM first, then Florence-2 / OCR): a
+box is dropped when it duplicates a box already kept from a higher tier,
+either by IoU or by lying inside (or around) a box of similar size. Within a
+lower tier, greedy non-maximum suppression by score removes repeated
+detections. Only tier 0 (DOM) is trusted as-is: distinct DOM elements may
+share a cell or nest without being duplicates. Without DOM elements (canvas
+or image-only pages) every tier, the first included, goes through NMS.
+Overlaps are computed as [candidates x kept] matrices, so a page with
+thousands of DOM elements and tens of visual finds costs one small matrix op.
+"""
+import os
+from operator import itemgetter
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+# IoU at which two boxes are the same element
+BOX_MERGE_IOU = float(os.environ.get('BOX_MERGE_IOU', '0.5'))
+# Share of the smaller box inside the larger one at which they are the same element...
+BOX_MERGE_CONTAIN = float(os.environ.get('BOX_MERGE_CONTAIN', '0.85'))
+# ...as long as the smaller box is at least this fraction of the larger one's area
+# (an icon inside a large canvas is a separate element, a label box inside its button is not)
+BOX_MERGE_MIN_AREA_RATIO = float(os.environ.get('BOX_MERGE_MIN_AREA_RATIO', '0.2'))
+
+_EMPTY = np.zeros((0, 4), dtype=np.float32)
+_XYWH = itemgetter('x', 'y', 'w', 'h')
+
+
+def xyxy(bboxes: Sequence[Any]) -> np.ndarray:
+    """[N, 4] float32 (x1, y1, x2, y2) from {x, y, w, h} dicts or [x1, y1, x2, y2] lists"""
+    if not bboxes:
+        return _EMPTY
+    if isinstance(bboxes[0], dict):
+        try:
+            flat = np.array(list(map(_XYWH, bboxes)), dtype=np.float32)
+        except KeyError:
+            flat = np.array([(b.get('x', 0), b.get('y', 0), b.get('w', 0), b.get('h', 0)) for b in bboxes], dtype=np.float32)
+        flat[:, 2:] += flat[:, :2]
+        return flat
+    return np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+
+
+def _overlaps(a: np.ndarray, b: np.ndarray):
+    """(intersection, area of a, area of b) for every pair of a [N, 4] x b [M, 4]"""
+    # Coordinate-major copies: broadcasting over contiguous rows instead of strided columns
+    at = np.ascontiguousarray(a.T)[:, :, None]
+    bt = np.ascontiguousarray(b.T)[:, None, :]
+    inter = np.minimum(at[2], bt[2])
+    inter -= np.maximum(at[0], bt[0])
+    np.clip(inter, 0, None, out=inter)
+    ih = np.minimum(at[3], bt[3])
+    ih -= np.maximum(at[1], bt[1])
+    np.clip(ih, 0, None, out=ih)
+    inter *= ih
+    return inter, (at[2] - at[0]) * (at[3] - at[1]), (bt[2] - bt[0]) * (bt[3] - bt[1])
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    inter, area_a, area_b = _overlaps(a, b)
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+def duplicate_matrix(
+    a: np.ndarray,
+    b: np.ndarray,
+    iou: float = BOX_MERGE_IOU,
+    contain: float = BOX_MERGE_CONTAIN,
+    min_area_ratio: float = BOX_MERGE_MIN_AREA_RATIO
+) -> np.ndarray:
+    """[N, M] bool: a[i] and b[j] describe the same element"""
+    inter, area_a, area_b = _overlaps(a, b)
+    union = area_a + area_b - inter
+    same = inter >= iou * union
+    smaller = np.minimum(area_a, area_b)
+    same |= (inter >= contain * smaller) & (smaller >= min_area_ratio * np.maximum(area_a, area_b))
+    # Degenerate (zero-area) boxes never match anything
+    same &= inter > 0
+    return same
+
+
+def duplicates_any(
+    a: np.ndarray,
+    b: np.ndarray,
+    iou: float = BOX_MERGE_IOU,
+    contain: float = BOX_MERGE_CONTAIN,
+    min_area_ratio: float = BOX_MERGE_MIN_AREA_RATIO
+) -> np.ndarray:
+    """[N] bool: a[i] duplicates some box of b. Overlap metrics only for pairs that intersect at all."""
+    at = np.ascontiguousarray(a.T)[:, :, None]
+    bt = np.ascontiguousarray(b.T)[:, None, :]
+    hit = at[0] < bt[2]
+    hit &= bt[0] < at[2]
+    hit &= at[1] < bt[3]
+    hit &= bt[1] < at[3]
+    i, j = np.nonzero(hit)
+    found = np.zeros(len(a), dtype=bool)
+    if len(i):
+        pa, pb = a[i], b[j]
+        inter = (np.minimum(pa[:, 2], pb[:, 2]) - np.maximum(pa[:, 0], pb[:, 0])) * \
+                (np.minimum(pa[:, 3], pb[:, 3]) - np.maximum(pa[:, 1], pb[:, 1]))
+        area_a = (pa[:, 2] - pa[:, 0]) * (pa[:, 3] - pa[:, 1])
+        area_b = (pb[:, 2] - pb[:, 0]) * (pb[:, 3] - pb[:, 1])
+        smaller = np.minimum(area_a, area_b)
+        same = inter >= iou * (area_a + area_b - inter)
+        same |= (inter >= contain * smaller) & (smaller >= min_area_ratio * np.maximum(area_a, area_b))
+        found[i[same]] = True
+    return found
+
+
+def merge_boxes(
+    boxes: np.ndarray,
+    priority: np.ndarray,
+    scores: Optional[np.ndarray] = None,
+    iou: float = BOX_MERGE_IOU,
+    contain: float = BOX_MERGE_CONTAIN,
+    min_area_ratio: float = BOX_MERGE_MIN_AREA_RATIO
+) -> np.ndarray:
+    """
+    Indices of boxes to keep, in input order.
+
+    Args:
+        boxes: [N, 4] (x1, y1, x2, y2)
+        priority: [N] tier per box, lower wins (0 = DOM, kept without NMS)
+        scores: [N] confidence deciding NMS order within a tier (default: input order)
+    """
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    priority = np.asarray(priority)
+    scores = np.zeros(n, dtype=np.float32) if scores is None else np.asarray(scores, dtype=np.float32)
+    keep = []
+    kept_boxes = _EMPTY
+
+    for tier in np.unique(priority).tolist():
+        idx = np.flatnonzero(priority == tier)
+        if tier == 0:
+            keep.append(idx)
+            kept_boxes = boxes[idx]
+            continue
+        if len(kept_boxes) and len(idx):
+            cand = boxes[idx]
+            # Only kept boxes touching the candidates' extent can duplicate them (usually the viewport of a long page)
+            near = kept_boxes[
+                (kept_boxes[:, 0] < cand[:, 2].max()) & (kept_boxes[:, 2] > cand[:, 0].min())
+                & (kept_boxes[:, 1] < cand[:, 3].max()) & (kept_boxes[:, 3] > cand[:, 1].min())
+            ]
+            if len(near):
+                idx = idx[~duplicates_any(cand, near, iou, contain, min_area_ratio)]
+        if len(idx) > 1:
+            # Greedy NMS: best score first, each survivor removes its later duplicates
+            idx = idx[np.argsort(-scores[idx], kind='stable')]
+            same = np.triu(duplicate_matrix(boxes[idx], boxes[idx], iou, contain, min_area_ratio), 1)
+            alive = np.ones(len(idx), dtype=bool)
+            # Only boxes with a later duplicate need the sequential pass
+            for i in np.flatnonzero(same.any(axis=1)).tolist():
+                if alive[i]:
+                    alive &= ~same[i]
+            idx = idx[alive]
+        keep.append(idx)
+        kept_boxes = np.concatenate([kept_boxes, boxes[idx]])
+    return np.sort(np.concatenate(keep))
+
+
+def merge_elements(tiers: List[List[Dict[str, Any]]], bbox_key: str = 'bbox') -> List[Dict[str, Any]]:
+    """
+    Merge element lists given highest priority first (e.g. [dom, florence, ocr]).
+    Each list carries {x, y, w, h} dicts or [x1, y1, x2, y2] lists under bbox_key
+    (one format per list) and an optional confidence. The first list (DOM) is
+    returned whole; later elements without a bbox are kept as-is.
+    """
+    if len(tiers) < 2 or not any(tiers[1:]):
+        return list(tiers[0]) if tiers else []
+    top = [el[bbox_key] for el in tiers[0] if el.get(bbox_key)]
+    lower = [el for elements in tiers[1:] for el in elements if el.get(bbox_key)]
+    sizes = [len(top)] + [sum(1 for el in elements if el.get(bbox_key)) for elements in tiers[1:]]
+    boxes = np.concatenate([xyxy(top)] + [
+        xyxy([el[bbox_key] for el in elements if el.get(bbox_key)]) for elements in tiers[1:]
+    ])
+    scores = np.zeros(len(boxes), dtype=np.float32)
+    scores[len(top):] = [float(el.get('confidence') or 0.0) for el in lower]
+    keep = merge_boxes(boxes, np.repeat(np.arange(len(tiers)), sizes), scores)
+    kept = np.zeros(len(boxes), dtype=bool)
+    kept[keep] = True
+    survivors = iter(kept[len(top):].tolist())
+    return list(tiers[0]) + [
+        el for elements in tiers[1:] for el in elements
+        if not el.get(bbox_key) or next(survivors)
+    ]
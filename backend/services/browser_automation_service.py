@@ -5,14 +5,27 @@ Advanced anti-detection with fingerprinting evasion and CAPTCHA solving
 import asyncio
 import logging
 import base64
+import weakref
+import json
 from playwright.async_api import async_playwright, Browser, Page, BrowserContext
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Union
 import os
 from services.anti_detect import (
     HumanBehaviorSimulator,
     AntiDetectFingerprint,
     CaptchaSolver
 )
+from services.page_snapshot_service import page_snapshot_service
+from services.page_readiness_service import page_readiness_service
+from services.screenshot_store import screenshot_store, ScreenshotRef
+from services.browser_context_pool import GENERIC_KEY, pool_key
+from services.browser_shards import BrowserShardManager, BrowserShard
+from services.resource_policy_service import resource_policy_service
+from services.vision_executor import vision_executor
+from services.vision_result_cache import vision_result_cache
+from services.grid_service import grid_config
+from services.element_set import ElementSet
+from services.scene_builder_service import scene_builder_service
 
 logger = logging.getLogger(__name__)
 
@@ -26,46 +39,28 @@ async def human_like_delay(min_ms: int = 100, max_ms: int = 500):
 class BrowserAutomationService:
     def __init__(self):
         self.playwright = None
-        self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
         self.sessions: Dict[str, Dict[str, Any]] = {}
         self.captcha_solver: Optional[CaptchaSolver] = None
-        # Grid config defaults (denser grid by default)
-        self.grid_rows = 24
-        self.grid_cols = 16
+        # Pages that already carry the grid overlay init script
+        self._grid_pages: "weakref.WeakSet[Page]" = weakref.WeakSet()
+        # Browser processes (BROWSER_SHARDS); each shard has its own warm context pool
+        self.shards = BrowserShardManager(self._launch_browser, on_crash=self._on_shard_crash)
+        # session_id -> reason, for sessions lost with a crashed shard
+        self.crashed_sessions: Dict[str, str] = {}
+    
+    @property
+    def browser(self) -> Optional[Browser]:
+        """Browser of the first healthy shard (for callers that predate sharding)"""
+        shard = self.shards.primary()
+        return shard.browser if shard else None
         
     async def initialize(self):
-        """Initialize Playwright and browser with anti-detect"""
+        """Initialize Playwright and browser shards with anti-detect"""
         if not self.playwright:
             self.playwright = await async_playwright().start()
-            try:
-                self.browser = await self.playwright.chromium.launch(
-                    headless=False,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-features=IsolateOrigins,site-per-process'
-                    ]
-                )
-                logger.info("✅ Browser launched headful with anti-detect")
-            except Exception as e:
-                logger.warning(f"Headful launch failed ({e}); falling back to headless")
-                self.browser = await self.playwright.chromium.launch(
-                    headless=True,
-                    args=[
-                        '--no-sandbox',
-                        '--disable-setuid-sandbox',
-                        '--disable-dev-shm-usage',
-                        '--disable-blink-features=AutomationControlled',
-                        '--disable-web-security',
-                        '--disable-features=IsolateOrigins,site-per-process'
-                    ]
-                )
-                logger.info("✅ Browser launched headless with anti-detect fallback")
+            await self.shards.start()
             
             # Initialize CAPTCHA solver
             try:
@@ -74,9 +69,92 @@ class BrowserAutomationService:
                 logger.info("✅ CAPTCHA solver initialized")
             except Exception as e:
                 logger.warning(f"CAPTCHA solver initialization failed: {e}")
+            
+            # Start warming generic contexts in the background
+            for shard in self.shards.shards:
+                shard.pool.start(self._generic_context_options, AntiDetectFingerprint.apply_fingerprinting_evasion)
+    
+    async def _launch_browser(self) -> Browser:
+        """Launch one Chromium process (headful, falling back to headless)"""
+        try:
+            browser = await self.playwright.chromium.launch(
+                headless=False,
+                args=[
+                    '--no-sandbox',
+                    '--disable-setuid-sandbox',
+                    '--disable-dev-shm-usage',
+                    '--disable-blink-features=AutomationControlled',
+                    '--disable-web-security',
+                    '--disable-features=IsolateOrigins,site-per-process'
+                ]
+            )
+            logger.info("✅ Browser launched headful with anti-detect")
+        except Exception as e:
+            logger.warning(f"Headful launch failed ({e}); falling back to headless")
+            browser = await self.playwright.chromium.launch(
+                headless=True,
+                args=[
+                    '--no-sandbox',
+                    '--disable-setuid-sandbox',
+                    '--disable-dev-shm-usage',
+                    '--disable-blink-features=AutomationControlled',
+                    '--disable-web-security',
+                    '--disable-features=IsolateOrigins,site-per-process'
+                ]
+            )
+            logger.info("✅ Browser launched headless with anti-detect fallback")
+        return browser
+    
+    def _on_shard_crash(self, shard: BrowserShard, session_ids: List[str]):
+        """Drop the sessions of a crashed shard; other shards keep running"""
+        for session_id in session_ids:
+            self.sessions.pop(session_id, None)
+            screenshot_store.forget_session(session_id)
+            resource_policy_service.detach(session_id)
+            vision_executor.cancel_session(session_id)
+            vision_result_cache.drop_session(session_id)
+            scene_builder_service.forget_session(session_id)
+            self.crashed_sessions[session_id] = f"Browser shard {shard.index} crashed"
+        # Keep only recent crash records
+        while len(self.crashed_sessions) > 1000:
+            self.crashed_sessions.pop(next(iter(self.crashed_sessions)))
+    
+    def _generic_context_options(self) -> Dict[str, Any]:
+        """Creation-time options of a plain session (each warm context gets its own random UA)"""
+        from services.proxy_service import proxy_service
+        return {
+            'user_agent': proxy_service.get_random_user_agent(),
+            'locale': 'en-US',
+            'timezone_id': 'America/New_York'
+        }
     
-    async def create_session(self, session_id: str, use_proxy: bool = False) -> Dict[str, Any]:
-        """Create a new browser session with anti-detection and optional proxy"""
+    def _split_profile_options(self, context_options: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        Split profile context options into (creation-time, mutable) parts for the pool.
+        None when the context cannot come from the pool (storage_state with localStorage).
+        """
+        fixed = dict(context_options)
+        mutable: Dict[str, Any] = {}
+        for name in ('viewport', 'extra_http_headers'):
+            if fixed.get(name):
+                mutable[name] = fixed.pop(name)
+        storage_path = fixed.pop('storage_state', None)
+        if storage_path:
+            try:
+                with open(storage_path) as f:
+                    storage = json.load(f)
+            except Exception as e:
+                logger.warning(f"Could not read storage_state {storage_path}: {e}")
+                return None
+            # Cookies can be added to a live context; per-origin localStorage cannot
+            if any(origin.get('localStorage') for origin in storage.get('origins', [])):
+                return None
+            if storage.get('cookies'):
+                mutable['cookies'] = storage['cookies']
+        return fixed, mutable
+    
+    async def create_session(self, session_id: str, use_proxy: bool = False, resource_policy: Optional[str] = None) -> Dict[str, Any]:
+        """Create a new browser session with anti-detection, optional proxy and resource policy"""
         await self.initialize()
         
         # Import proxy service
@@ -105,6 +183,7 @@ class BrowserAutomationService:
         }
         
         # Add proxy if enabled and available
+        proxy = None
         if use_proxy and proxy_service.is_enabled():
             await proxy_service.get_proxies()  # Ensure proxies are fetched
             proxy = proxy_service.get_next_proxy()
@@ -116,26 +195,42 @@ class BrowserAutomationService:
                     'password': proxy['password']
                 }
         
-        # Create context and page
-        context = await self.browser.new_context(**context_options)
-        # Apply advanced fingerprinting evasion
-        try:
-            await AntiDetectFingerprint.apply_fingerprinting_evasion(context)
-        except Exception as e:
-            logger.warning(f"Fingerprint evasion failed: {e}")
-        page = await context.new_page()
+        shard = await self.shards.pick()
+        if proxy:
+            # Rotating proxies never repeat a pool key - create the context directly
+            context = await shard.browser.new_context(**context_options)
+            # Apply advanced fingerprinting evasion
+            try:
+                await AntiDetectFingerprint.apply_fingerprinting_evasion(context)
+            except Exception as e:
+                logger.warning(f"Fingerprint evasion failed: {e}")
+            page = await context.new_page()
+        else:
+            # Warm context from the pool (UA chosen at warm-up, evasion already applied)
+            context, page, _ = await shard.pool.acquire(
+                GENERIC_KEY,
+                mutable={
+                    'viewport': context_options['viewport'],
+                    'extra_http_headers': context_options['extra_http_headers']
+                }
+            )
+        # Readiness probe must be in place before the first navigation to see its requests
+        await page_readiness_service.ensure_probe(page)
+        await resource_policy_service.attach(session_id, context, resource_policy)
         
         self.sessions[session_id] = {
             'context': context,
             'page': page,
             'history': [],
-            'use_proxy': use_proxy
+            'use_proxy': use_proxy,
+            'shard': shard.index
         }
+        self.shards.attach(session_id, shard, context)
         
-        logger.info(f"✅ Created session: {session_id} (proxy={use_proxy})")
+        logger.info(f"✅ Created session: {session_id} (proxy={use_proxy}, shard={shard.index})")
         return {'session_id': session_id, 'status': 'ready', 'proxy_enabled': use_proxy}
     
-    async def create_session_from_profile(self, profile_id: str, session_id: str, fingerprint: Optional[Dict[str, Any]] = None, proxy: Optional[Dict[str, Any]] = None, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def create_session_from_profile(self, profile_id: str, session_id: str, fingerprint: Optional[Dict[str, Any]] = None, proxy: Optional[Dict[str, Any]] = None, meta: Optional[Dict[str, Any]] = None, resource_policy: Optional[str] = None) -> Dict[str, Any]:
         """Create session strictly from profile meta (preferred), fallback to fingerprint dict."""
         await self.initialize()
         context_options: Dict[str, Any] = {}
@@ -177,16 +272,27 @@ class BrowserAutomationService:
             storage_path = f"/app/runtime/profiles/{profile_id}/storage_state.json"
             if os.path.exists(storage_path):
                 context_options['storage_state'] = storage_path
-        # Create context
-        context = await self.browser.new_context(**context_options)
+        # Create context (warm from the pool when the options allow it)
+        shard = await self.shards.pick()
+        split = self._split_profile_options(context_options)
+        if split:
+            fixed, mutable = split
+            context, page, _ = await shard.pool.acquire(pool_key(fixed), mutable=mutable, template=fixed)
+        else:
+            context = await shard.browser.new_context(**context_options)
+            page = None
         # Apply anti-detect patches based on provided data
         try:
             await AntiDetectFingerprint.apply_profile(context, meta or fingerprint or {})
         except Exception as e:
             logger.warning(f"apply_profile failed: {e}")
-        page = await context.new_page()
-        self.sessions[session_id] = {'context': context, 'page': page, 'history': [], 'use_proxy': bool(proxy or (meta and meta.get('proxy'))), 'profile_id': profile_id}
-        logger.info(f"✅ Session from profile created: {session_id} (profile={profile_id})")
+        if page is None:
+            page = await context.new_page()
+        await page_readiness_service.ensure_probe(page)
+        await resource_policy_service.attach(session_id, context, resource_policy)
+        self.sessions[session_id] = {'context': context, 'page': page, 'history': [], 'use_proxy': bool(proxy or (meta and meta.get('proxy'))), 'profile_id': profile_id, 'shard': shard.index}
+        self.shards.attach(session_id, shard, context)
+        logger.info(f"✅ Session from profile created: {session_id} (profile={profile_id}, shard={shard.index})")
         return {'session_id': session_id, 'status': 'ready', 'profile_id': profile_id}
 
     async def close_session(self, session_id: str) -> bool:
@@ -195,6 +301,12 @@ class BrowserAutomationService:
                 ctx = self.sessions[session_id]['context']
                 await ctx.close()
                 del self.sessions[session_id]
+                screenshot_store.forget_session(session_id)
+                resource_policy_service.detach(session_id)
+                vision_executor.cancel_session(session_id)
+                vision_result_cache.drop_session(session_id)
+                scene_builder_service.forget_session(session_id)
+                self.shards.detach(session_id)
                 logger.info(f"✅ Closed session {session_id}")
                 return True
             return False
@@ -223,7 +335,7 @@ class BrowserAutomationService:
                     logger.info("✅ CAPTCHA handled automatically")
             
             # Capture screenshot
-            screenshot = await self.capture_screenshot(session_id)
+            screenshot_ref = await self._capture_ref_dict(session_id)
             current_url = page.url
             title = await page.title()
             
@@ -231,7 +343,9 @@ class BrowserAutomationService:
                 'success': True,
                 'url': current_url,
                 'title': title,
-                'screenshot': screenshot
+                'screenshot_ref': screenshot_ref,
+                # Requests blocked by the session's resource policy during this load
+                'resources': resource_policy_service.last_navigation(session_id)
             }
         except Exception as e:
             logger.error(f"Navigation error: {str(e)}")
@@ -243,115 +357,48 @@ class BrowserAutomationService:
     async def wait_for_page_ready(self, page: Page, timeout_ms: int = 10000) -> bool:
         """
         Ждёт полной загрузки страницы (не только DOM, но и скрипты, стили).
-        Проверяет:
+        Внутристраничный probe проверяет одновременно:
         1. document.readyState = 'complete'
-        2. Нет активных network запросов (networkidle)
-        3. Стабильность DOM (количество элементов не меняется)
-        4. Нет loading спиннеров
+        2. Нет активных fetch/XHR запросов
+        3. Стабильность DOM (нет мутаций в течение settle окна)
+        4. Нет видимых loading спиннеров
+        Возвращается сразу как страница успокоилась (без фиксированных sleep).
+        """
+        result = await self.wait_for_page_settled(page, timeout_ms=timeout_ms)
+        return bool(result.get('settled'))
+    
+    async def wait_for_page_settled(
+        self,
+        page: Page,
+        settle_ms: Optional[int] = None,
+        timeout_ms: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Wait for the page to settle and report why the wait ended.
+        settle_ms/timeout_ms default to PAGE_SETTLE_MS/PAGE_SETTLE_TIMEOUT_MS
+        (or the per-host override from PAGE_SETTLE_OVERRIDES).
+        
+        Returns:
+            {settled, reason: quiet|network|spinner|timeout|error, elapsed_ms, ...}
         """
         try:
-            # 1. Ждём document.readyState = 'complete'
-            await page.wait_for_load_state('load', timeout=timeout_ms)
-            
-            # 2. Ждём network idle
-            await page.wait_for_load_state('networkidle', timeout=timeout_ms)
-            
-            # 3. Проверяем стабильность DOM (2 проверки с интервалом 500ms)
-            count1 = await page.evaluate("() => document.querySelectorAll('*').length")
-            await asyncio.sleep(0.5)
-            count2 = await page.evaluate("() => document.querySelectorAll('*').length")
-            
-            if abs(count2 - count1) > 5:
-                # DOM ещё меняется, ждём ещё немного
-                logger.debug(f"DOM still changing: {count1} → {count2}, waiting...")
-                await asyncio.sleep(1)
-            
-            # 4. Проверяем нет ли loading индикаторов
-            loading_selectors = [
-                '[class*="loading"]',
-                '[class*="spinner"]',
-                '[class*="loader"]',
-                '[aria-busy="true"]'
-            ]
-            
-            for selector in loading_selectors:
-                try:
-                    elements = await page.query_selector_all(selector)
-                    visible_loaders = []
-                    for el in elements:
-                        is_visible = await el.is_visible()
-                        if is_visible:
-                            visible_loaders.append(el)
-                    
-                    if visible_loaders:
-                        logger.debug(f"Found {len(visible_loaders)} visible loading indicators, waiting...")
-                        await asyncio.sleep(1)
-                except Exception:
-                    pass
-            
-            logger.debug("✅ Page fully loaded and stable")
-            return True
-            
+            result = await page_readiness_service.wait_until_settled(page, settle_ms=settle_ms, timeout_ms=timeout_ms)
+            if result.get('settled'):
+                logger.debug(f"✅ Page settled in {result.get('elapsed_ms')}ms")
+            else:
+                logger.warning(f"wait_for_page_ready ended without settling: {result.get('reason')} after {result.get('elapsed_ms')}ms")
+            return result
         except Exception as e:
             logger.warning(f"wait_for_page_ready timeout or error: {e}")
-            return False
+            return {"settled": False, "reason": "error", "error": str(e)}
     
     async def is_page_loading(self, page: Page) -> Dict[str, Any]:
         """
-        Быстрая проверка идёт ли сейчас загрузка страницы.
+        Быстрая проверка идёт ли сейчас загрузка страницы (один вызов probe).
         Возвращает статус и причину.
         """
         try:
-            # Проверка 1: document.readyState
-            ready_state = await page.evaluate("() => document.readyState")
-            if ready_state != 'complete':
-                return {
-                    "is_loading": True,
-                    "reason": f"document.readyState = {ready_state}",
-                    "ready_state": ready_state
-                }
-            
-            # Проверка 2: Видимые loading индикаторы
-            loading_selectors = [
-                '[class*="loading"]:visible',
-                '[class*="spinner"]:visible',
-                '[class*="loader"]:visible',
-                '[aria-busy="true"]'
-            ]
-            
-            for selector in loading_selectors:
-                try:
-                    el = await page.query_selector(selector)
-                    if el:
-                        is_visible = await el.is_visible()
-                        if is_visible:
-                            return {
-                                "is_loading": True,
-                                "reason": f"Visible loading indicator: {selector}",
-                                "ready_state": ready_state
-                            }
-                except Exception:
-                    pass
-            
-            # Проверка 3: Стабильность DOM (быстрая)
-            count1 = await page.evaluate("() => document.querySelectorAll('*').length")
-            await asyncio.sleep(0.2)
-            count2 = await page.evaluate("() => document.querySelectorAll('*').length")
-            
-            if abs(count2 - count1) > 10:
-                return {
-                    "is_loading": True,
-                    "reason": f"DOM unstable: {count1} → {count2} elements",
-                    "ready_state": ready_state
-                }
-            
-            # Всё ОК - страница загружена
-            return {
-                "is_loading": False,
-                "reason": "Page fully loaded and stable",
-                "ready_state": ready_state
-            }
-            
+            return await page_readiness_service.status(page)
         except Exception as e:
             logger.error(f"is_page_loading error: {e}")
             return {
@@ -375,11 +422,11 @@ class BrowserAutomationService:
         
         try:
             solved = await self.captcha_solver.auto_solve(page)
-            screenshot = await self.capture_screenshot(session_id)
+            screenshot_ref = await self._capture_ref_dict(session_id)
             
             return {
                 'success': solved,
-                'screenshot': screenshot,
+                'screenshot_ref': screenshot_ref,
                 'message': 'CAPTCHA solved' if solved else 'No CAPTCHA found or solving failed'
             }
         except Exception as e:
@@ -416,11 +463,11 @@ class BrowserAutomationService:
                 
                 await human_like_delay(500, 1500)  # Human pause after click
                 
-                screenshot = await self.capture_screenshot(session_id)
+                screenshot_ref = await self._capture_ref_dict(session_id)
                 
                 return {
                     'success': True,
-                    'screenshot': screenshot,
+                    'screenshot_ref': screenshot_ref,
                     'highlight': box,
                     'human_like': human_like
                 }
@@ -454,11 +501,11 @@ class BrowserAutomationService:
             
             await human_like_delay(300, 800)
             
-            screenshot = await self.capture_screenshot(session_id)
+            screenshot_ref = await self._capture_ref_dict(session_id)
             
             return {
                 'success': True,
-                'screenshot': screenshot,
+                'screenshot_ref': screenshot_ref,
                 'highlight': box,
             }
         except Exception as e:
@@ -468,17 +515,31 @@ class BrowserAutomationService:
                 'error': str(e)
             }
     
+    @property
+    def grid_rows(self) -> int:
+        # One grid definition (services.grid_service.grid_config) for collector, vision, scene and clicks
+        return grid_config.rows
+    
+    @grid_rows.setter
+    def grid_rows(self, rows: int):
+        grid_config.rows = rows
+    
+    @property
+    def grid_cols(self) -> int:
+        return grid_config.cols
+    
+    @grid_cols.setter
+    def grid_cols(self, cols: int):
+        grid_config.cols = cols
+    
     async def click_cell(self, session_id: str, cell: str, human_like: bool = True) -> Dict[str, Any]:
-        """Click on a grid cell (e.g., 'A1', 'C7') - используется для визуального управления"""
+        """Click on a grid cell (e.g., 'A1', 'C7', sub-cell 'C7.2') - используется для визуального управления"""
         if session_id not in self.sessions:
             raise ValueError(f"Session {session_id} not found")
         
         page = self.sessions[session_id]['page']
         
         try:
-            # Импортируем GridConfig
-            from services.grid_service import GridConfig
-            
             # Получаем viewport
             viewport = page.viewport_size
             viewport_w = viewport['width']
@@ -486,8 +547,7 @@ class BrowserAutomationService:
             
             # Преобразуем cell в координаты (используем ТОТ ЖЕ grid что и vision!)
             # Vision использует grid_rows x grid_cols из browser_service
-            grid = GridConfig(rows=self.grid_rows, cols=self.grid_cols)
-            x, y = grid.cell_to_xy(cell, viewport_w, viewport_h)
+            x, y = grid_config.cell_to_xy(cell, viewport_w, viewport_h)
             
             logger.info(f"Clicking cell {cell} at coordinates ({x}, {y})")
             
@@ -556,11 +616,11 @@ class BrowserAutomationService:
             
             await human_like_delay(300, 800)
             
-            screenshot = await self.capture_screenshot(session_id)
+            screenshot_ref = await self._capture_ref_dict(session_id)
             
             return {
                 'success': True,
-                'screenshot': screenshot,
+                'screenshot_ref': screenshot_ref,
                 'cell': cell,
                 'coordinates': {'x': x, 'y': y}
             }
@@ -580,17 +640,13 @@ class BrowserAutomationService:
         page = self.sessions[session_id]['page']
         
         try:
-            # Импортируем GridConfig
-            from services.grid_service import GridConfig
-            
             # Получаем viewport
             viewport = page.viewport_size
             viewport_w = viewport['width']
             viewport_h = viewport['height']
             
             # Преобразуем cell в координаты (тот же grid что и vision)
-            grid = GridConfig(rows=self.grid_rows, cols=self.grid_cols)
-            x, y = grid.cell_to_xy(cell, viewport_w, viewport_h)
+            x, y = grid_config.cell_to_xy(cell, viewport_w, viewport_h)
             
             logger.info(f"Typing at cell {cell} ({x}, {y}): {text}")
             
@@ -616,11 +672,11 @@ class BrowserAutomationService:
             
             await human_like_delay(300, 800)
             
-            screenshot = await self.capture_screenshot(session_id)
+            screenshot_ref = await self._capture_ref_dict(session_id)
             
             return {
                 'success': True,
-                'screenshot': screenshot,
+                'screenshot_ref': screenshot_ref,
                 'cell': cell,
                 'text': text,
                 'coordinates': {'x': x, 'y': y}
@@ -642,11 +698,11 @@ class BrowserAutomationService:
         
         try:
             await page.wait_for_selector(selector, timeout=timeout)
-            screenshot = await self.capture_screenshot(session_id)
+            screenshot_ref = await self._capture_ref_dict(session_id)
             
             return {
                 'success': True,
-                'screenshot': screenshot
+                'screenshot_ref': screenshot_ref
             }
         except Exception as e:
             return {
@@ -654,20 +710,22 @@ class BrowserAutomationService:
                 'error': str(e)
             }
     
-    async def capture_screenshot(self, session_id: str) -> str:
-        """Capture page screenshot as base64 (no data: prefix)"""
+    async def capture_screenshot_ref(self, session_id: str) -> Optional[ScreenshotRef]:
+        """Capture page screenshot into the screenshot store (JPEG/WebP per SCREENSHOT_FORMAT)"""
         if session_id not in self.sessions:
             raise ValueError(f"Session {session_id} not found")
         
         page = self.sessions[session_id]['page']
-        
-        try:
-            screenshot_bytes = await page.screenshot(type='png', full_page=False)
-            screenshot_base64 = base64.b64encode(screenshot_bytes).decode('utf-8')
-            return f"{screenshot_base64}"
-        except Exception as e:
-            logger.error(f"Screenshot error: {str(e)}")
-            return ""
+        return await screenshot_store.capture(page, session_id=session_id)
+    
+    async def _capture_ref_dict(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ref = await self.capture_screenshot_ref(session_id)
+        return ref.to_dict() if ref else None
+    
+    async def capture_screenshot(self, session_id: str) -> str:
+        """Capture page screenshot as base64 (no data: prefix). Edge helper - internal code should use capture_screenshot_ref"""
+        ref = await self.capture_screenshot_ref(session_id)
+        return await screenshot_store.to_base64(ref) if ref else ""
     
     async def get_page_info(self, session_id: str) -> Dict[str, Any]:
         """Get current page information"""
@@ -679,7 +737,7 @@ class BrowserAutomationService:
         return {
             'url': page.url,
             'title': await page.title(),
-            'screenshot': await self.capture_screenshot(session_id)
+            'screenshot_ref': await self._capture_ref_dict(session_id)
         }
     
     async def find_elements_with_vision(self, session_id: str, description: str) -> List[Dict[str, Any]]:
@@ -693,9 +751,6 @@ class BrowserAutomationService:
         page = self.sessions[session_id]['page']
         
         try:
-            # Capture screenshot
-            screenshot = await self.capture_screenshot(session_id)
-            
             # Fallback: Try basic text search instead of vision
             results = []
             try:
@@ -805,7 +860,10 @@ class BrowserAutomationService:
                 const y = Math.max(0, Math.floor(rect.top + offY));
                 const w = Math.floor(rect.width);
                 const h = Math.floor(rect.height);
-                clickables.push({ bbox: { x, y, w, h }, label: (label||'').slice(0,64), type: type||'node', confidence: score });
+                // Same stable ids as the page snapshot collector (when it has run on this document)
+                const ids = window.__chimeraIds;
+                const eid = ids && ids.idOf ? ids.idOf(el) : undefined;
+                clickables.push({ eid, bbox: { x, y, w, h }, label: (label||'').slice(0,64), type: type||'node', confidence: score });
               }
               function collectIn(doc, offX, offY) {
                 const nodes = Array.from(doc.querySelectorAll('a,button,input,textarea,select,[role="button"], [onclick], [role="link"], input[type="submit"], input[type="search"]'));
@@ -850,6 +908,7 @@ class BrowserAutomationService:
               const cw = vw / window.__chimeraGrid.__cols;
               const ch = vh / window.__chimeraGrid.__rows;
               const box = document.createElement('div');
+              box.className = 'chimera-grid-flash';
               box.style.position = 'fixed';
               box.style.left = (col*cw) + 'px';
               box.style.top = (row*ch) + 'px';
@@ -868,26 +927,26 @@ class BrowserAutomationService:
           };
         })();
         """
+        # The init script re-creates the overlay on every navigation, so it is only
+        # registered once per page (repeated add_init_script calls would stack up).
+        if page in self._grid_pages:
+            return
         await page.add_init_script(js)
+        self._grid_pages.add(page)
         # Also run immediately on current document so collect() works without navigation
         try:
             await page.evaluate(js)
         except Exception:
             pass
 
-    async def _collect_dom_clickables(self, page: Page) -> Dict[str, Any]:
-        try:
-            data = await page.evaluate("window.__chimeraGrid ? window.__chimeraGrid.collect() : null")
-            if not data:
-                await self._inject_grid_overlay(page)
-                data = await page.evaluate("window.__chimeraGrid ? window.__chimeraGrid.collect() : null")
-            return data
-        except Exception:
-            return {"vw": 1280, "vh": 800, "clickables": []}
-
-    async def _augment_with_vision(self, screenshot_base64: str, dom_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def _augment_with_vision(self, screenshot: Any, dom_data: Dict[str, Any], session_id: Optional[str] = None,
+                                   as_set: bool = False) -> Union[List[Dict[str, Any]], ElementSet]:
         """
         Augment DOM clickables with Florence-2 visual detection.
+        screenshot: ScreenshotRef (preferred), raw bytes or base64 string.
+        Runs on the vision executor; session_id lets a closed session cancel its jobs.
+        Returns vision[] dicts, or the ElementSet itself with as_set=True (perception
+        keeps the columns and converts once).
         
         Strategy:
         1. Use DOM elements as PRIMARY source (reliable, fast)
@@ -899,62 +958,38 @@ class BrowserAutomationService:
         dom_clickables = dom_data.get('clickables', [])
         logger.info(f"🔍 [AUGMENT] Calling vision with {len(dom_clickables)} DOM clickables, viewport {vw}x{vh}")
         
-        # Call vision service (Florence-2 will be used if enabled)
-        result = local_vision_service.detect(
-            screenshot_base64, 
+        # Vision works on raw bytes - no base64 round-trip for stored screenshots
+        digest = None
+        if isinstance(screenshot, ScreenshotRef):
+            digest = screenshot.digest
+        elif isinstance(screenshot, dict):
+            digest = screenshot.get('digest')
+        if isinstance(screenshot, (ScreenshotRef, dict)):
+            screenshot = screenshot_store.get_bytes(screenshot)
+        
+        # Call vision service off the event loop (Florence-2 will be used if enabled)
+        result = await local_vision_service.detect_set_async(
+            screenshot, 
             vw, 
             vh, 
             dom_clickables=dom_clickables,
             rows=self.grid_rows, 
-            cols=self.grid_cols
+            cols=self.grid_cols,
+            session_id=session_id,
+            screenshot_digest=digest,
+            blind_regions=dom_data.get('blind')
         )
         
         logger.info(f"🔍 [AUGMENT] Vision returned {len(result)} elements")
-        return result
+        return result if as_set else result.to_dicts()
     
     async def _collect_dom_clickables(self, page: Page) -> Dict[str, Any]:
-        """Collect clickable elements from DOM"""
+        """Collect clickable elements from DOM (single in-page call via page snapshot)"""
         try:
-            logger.info("🔍 [DOM] Collecting clickable elements from page...")
-            # Get viewport size
-            viewport = page.viewport_size
-            vw, vh = viewport['width'], viewport['height']
-            logger.info(f"🔍 [DOM] Viewport: {vw}x{vh}")
-            
-            # Collect all interactive elements
-            clickables_data = await page.evaluate("""() => {
-                const elements = [];
-                const selectors = 'a, button, input, select, textarea, [onclick], [role="button"], [role="link"]';
-                document.querySelectorAll(selectors).forEach((el, idx) => {
-                    const rect = el.getBoundingClientRect();
-                    if (rect.width > 0 && rect.height > 0) {
-                        const style = window.getComputedStyle(el);
-                        if (style.display !== 'none' && style.visibility !== 'hidden') {
-                            elements.push({
-                                bbox: {
-                                    x: Math.round(rect.left),
-                                    y: Math.round(rect.top),
-                                    w: Math.round(rect.width),
-                                    h: Math.round(rect.height)
-                                },
-                                label: el.innerText?.trim() || el.value || el.placeholder || el.getAttribute('aria-label') || el.getAttribute('title') || el.tagName,
-                                type: el.tagName.toLowerCase(),
-                                name: el.name || el.id || `element_${idx}`,
-                                confidence: 0.85
-                            });
-                        }
-                    }
-                });
-                return elements;
-            }""")
-            
-            logger.info(f"🔍 [DOM] Found {len(clickables_data or [])} clickable elements")
-            
-            return {
-                'vw': vw,
-                'vh': vh,
-                'clickables': clickables_data or []
-            }
+            snapshot = await page_snapshot_service.capture(page, parts=["clickables"])
+            dom_data = page_snapshot_service.dom_data(snapshot)
+            logger.info(f"🔍 [DOM] Found {len(dom_data['clickables'])} clickable elements, viewport {dom_data['vw']}x{dom_data['vh']}")
+            return dom_data
         except Exception as e:
             logger.error(f"DOM collection error: {e}")
             return {"vw": 1280, "vh": 800, "clickables": []}
@@ -967,11 +1002,12 @@ class BrowserAutomationService:
         try:
             await HumanBehaviorSimulator.human_scroll(page, dy)
             await human_like_delay(200, 500)
-            screenshot_b64 = await self.capture_screenshot(session_id)
+            screenshot_ref = await self.capture_screenshot_ref(session_id)
             dom_data = await self._collect_dom_clickables(page)
-            vision = await self._augment_with_vision(screenshot_b64, dom_data)
+            vision = await self._augment_with_vision(screenshot_ref, dom_data, session_id)
             return {
-                "screenshot_base64": screenshot_b64,
+                "screenshot_ref": screenshot_ref.to_dict() if screenshot_ref else None,
+                "screenshot_id": screenshot_ref.digest if screenshot_ref else None,
                 "vision": vision,
                 "status": "idle"
             }
@@ -979,6 +1015,62 @@ class BrowserAutomationService:
             logger.error(f"Scroll error: {e}")
             return {"error": str(e)}
 
+    async def scroll_to_element(self, session_id: str, element_id: str, doc: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Bring an element from the document index into view in one move and return its cell.
+        element_id is the stable in-page id; doc (page offset) is used when the id is gone.
+        A single wheel gesture of the exact distance is tried first; if the element is
+        still not on screen (inner scroll container, sticky header) it is scrolled into
+        the viewport center directly.
+        """
+        if session_id not in self.sessions:
+            raise ValueError(f"Session {session_id} not found")
+        page = self.sessions[session_id]['page']
+        try:
+            from services.page_snapshot_service import in_viewport
+            
+            located = await page_snapshot_service.locate(page, element_id)
+            if not located:
+                return {'success': False, 'error': 'Page not reachable', 'element_id': element_id}
+            vh = located['vh']
+            if located.get('found'):
+                bbox = located['bbox']
+                dy = bbox['y'] + bbox['h'] / 2 - vh / 2
+            elif doc:
+                dy = doc['y'] + doc['h'] / 2 - vh / 2 - located['scroll']['y']
+            else:
+                return {'success': False, 'error': f"Element {element_id} not found", 'element_id': element_id}
+            
+            if abs(dy) >= 1:
+                await page.mouse.wheel(0, int(dy))
+                await human_like_delay(150, 350)
+            
+            located = await page_snapshot_service.locate(page, element_id)
+            if located and located.get('found') and not in_viewport(located['bbox'], located['vw'], located['vh']):
+                located = await page_snapshot_service.locate(page, element_id, center=True)
+            if located and located.get('found'):
+                bbox = located['bbox']
+            elif located and doc:
+                bbox = {'x': doc['x'] - located['scroll']['x'], 'y': doc['y'] - located['scroll']['y'], 'w': doc['w'], 'h': doc['h']}
+            else:
+                return {'success': False, 'error': f"Element {element_id} not found after scroll", 'element_id': element_id}
+            
+            if not in_viewport(bbox, located['vw'], located['vh']):
+                return {'success': False, 'error': f"Element {element_id} is still off-screen", 'element_id': element_id}
+            
+            cell = grid_config.bbox_to_cell(bbox, located['vw'], located['vh'])
+            logger.info(f"📜 Scrolled {element_id} into view ({int(dy)}px) -> {cell}")
+            return {
+                'success': True,
+                'element_id': element_id,
+                'cell': cell,
+                'bbox': bbox,
+                'scrolled_by': int(dy)
+            }
+        except Exception as e:
+            logger.error(f"Scroll to element error: {e}")
+            return {'success': False, 'error': str(e), 'element_id': element_id}
+
     async def wait(self, ms: int = 500):
         await human_like_delay(ms, ms + 50)
 
@@ -0,0 +1,367 @@
+"""
+Browser Context Pool - pre-warmed BrowserContext/Page pairs for fast session creation
+Warm contexts are grouped by the options Playwright fixes at creation time
+(user agent, locale, timezone, proxy, ...). A session takes a warm context with
+a matching key and gets the mutable options (viewport, extra headers, cookies)
+applied afterwards; on a miss a fresh context is created exactly as before.
+A background task refills the pool, and open contexts (sessions + warm) are capped:
+a miss with no room evicts a warm context, or else waits for a session to close
+(up to BROWSER_POOL_ACQUIRE_TIMEOUT_S) and then raises PoolExhausted.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Set, Tuple, Callable, Awaitable, Deque
+
+from playwright.async_api import Browser, BrowserContext, Page
+
+from services.page_readiness_service import page_readiness_service
+
+logger = logging.getLogger(__name__)
+
+# Warm generic contexts (plain create_session without proxy)
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', '2'))
+# Warm contexts per profile key (kept only for keys requested more than once)
+BROWSER_POOL_PROFILE_SIZE = int(os.environ.get('BROWSER_POOL_PROFILE_SIZE', '1'))
+# Profile keys remembered for refilling (LRU)
+BROWSER_POOL_MAX_KEYS = int(os.environ.get('BROWSER_POOL_MAX_KEYS', '4'))
+# Upper bound on open contexts: active sessions + warm + being created
+BROWSER_POOL_MAX_CONTEXTS = int(os.environ.get('BROWSER_POOL_MAX_CONTEXTS', '24'))
+# How long a session waits for a free context slot when all are in use, seconds
+BROWSER_POOL_ACQUIRE_TIMEOUT_S = float(os.environ.get('BROWSER_POOL_ACQUIRE_TIMEOUT_S', '30'))
+
+GENERIC_KEY = "generic"
+# Options that can be applied to an existing context; everything else is part of the pool key
+MUTABLE_OPTIONS = ('viewport', 'extra_http_headers', 'cookies')
+
+Prepare = Optional[Callable[[BrowserContext], Awaitable[Any]]]
+
+
+class PoolExhausted(RuntimeError):
+    """Every context slot stayed in use for BROWSER_POOL_ACQUIRE_TIMEOUT_S"""
+
+
+@dataclass
+class WarmContext:
+    context: BrowserContext
+    page: Page
+    browser: Browser
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class PoolTemplate:
+    """How to build contexts for one key"""
+    factory: Callable[[], Dict[str, Any]]
+    prepare: Prepare = None
+    size: int = 1
+    uses: int = 0
+
+
+def pool_key(options: Dict[str, Any]) -> str:
+    """Stable key of the creation-time (immutable) options"""
+    fixed = {k: v for k, v in options.items() if k not in MUTABLE_OPTIONS and v is not None}
+    encoded = json.dumps(fixed, sort_keys=True, default=str)
+    return "ctx:" + hashlib.blake2b(encoded.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class BrowserContextPool:
+    """
+    Keyed pool of warm (context, page) pairs.
+    - acquire(key, mutable, template, prepare) -> (context, page, warm)
+    - attached(context) once the acquired context is counted as a session
+    - release() after a session closed (frees room, triggers refill)
+    """
+
+    def __init__(
+        self,
+        browser_getter: Callable[[], Optional[Browser]],
+        active_count: Callable[[], int],
+        max_contexts: int = BROWSER_POOL_MAX_CONTEXTS,
+        acquire_timeout_s: float = BROWSER_POOL_ACQUIRE_TIMEOUT_S
+    ):
+        self._browser_getter = browser_getter
+        self._active_count = active_count
+        self.max_contexts = max_contexts
+        self.acquire_timeout_s = acquire_timeout_s
+        self._warm: Dict[str, Deque[WarmContext]] = {}
+        self._templates: "OrderedDict[str, PoolTemplate]" = OrderedDict()
+        self._pending = 0
+        # Contexts handed out but not yet counted by active_count (session still being set up)
+        self._handed: Set[BrowserContext] = set()
+        self._waiters = 0
+        self._room = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._refill_again = False
+        self._latencies: Deque[float] = deque(maxlen=1024)
+        self.stats = {"hits": 0, "misses": 0, "created": 0, "evicted": 0, "discarded": 0, "errors": 0, "waited": 0, "exhausted": 0}
+
+    def start(self, factory: Callable[[], Dict[str, Any]], prepare: Prepare = None):
+        """Register the generic template and start warming it"""
+        self._templates[GENERIC_KEY] = PoolTemplate(factory=factory, prepare=prepare, size=BROWSER_POOL_SIZE, uses=1)
+        self._schedule_refill()
+
+    async def acquire(
+        self,
+        key: str,
+        mutable: Optional[Dict[str, Any]] = None,
+        template: Optional[Dict[str, Any]] = None,
+        prepare: Prepare = None
+    ) -> Tuple[BrowserContext, Page, bool]:
+        """
+        Take a warm context for key (or create a fresh one) with mutable options applied.
+
+        Args:
+            key: GENERIC_KEY or pool_key(options)
+            mutable: viewport / extra_http_headers / cookies for this session
+            template: creation-time options (required for non-generic keys)
+            prepare: coroutine run on a new context before its page is opened
+        Returns:
+            (context, page, warm) - warm is True when served from the pool
+        Raises:
+            PoolExhausted: no context slot freed up within acquire_timeout_s
+        """
+        started = time.perf_counter()
+        mutable = mutable or {}
+        tpl = self._remember(key, template, prepare)
+        entry = self._take(key)
+
+        if entry is not None:
+            self.stats["hits"] += 1
+            context, page = entry.context, entry.page
+            await self._apply_mutable(context, page, mutable)
+        else:
+            self.stats["misses"] += 1
+            await self._wait_for_room(key)
+            options = self._creation_options(tpl.factory(), mutable)
+            self._pending += 1
+            try:
+                context, page = await self._create(options, tpl.prepare)
+            finally:
+                self._pending -= 1
+        self._hand_out(context)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._latencies.append(elapsed_ms)
+        logger.info(f"🏊 [POOL] {'Warm' if entry else 'Fresh'} context for {key} in {elapsed_ms:.0f}ms")
+        self._schedule_refill()
+        return context, page, entry is not None
+
+    def attached(self, context: BrowserContext):
+        """The session holding context is now in active_count: stop counting it separately"""
+        self._handed.discard(context)
+
+    def release(self):
+        """A session context was closed: wake a waiting acquire, else refill"""
+        self._room.set()
+        self._schedule_refill()
+
+    async def close_all(self):
+        """Close every warm context (shutdown / browser relaunch)"""
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+        for key in list(self._warm.keys()):
+            for entry in self._warm.pop(key):
+                await self._close(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = sorted(self._latencies)
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+            "acquire_ms": {
+                "p50": round(self._percentile(samples, 0.50), 1),
+                "p99": round(self._percentile(samples, 0.99), 1),
+                "samples": len(samples)
+            },
+            "warm": {key: len(entries) for key, entries in self._warm.items() if entries},
+            "pending": self._pending,
+            "handed_out": len(self._handed),
+            "waiting": self._waiters,
+            "active_sessions": self._active_count(),
+            "max_contexts": self.max_contexts,
+            "templates": {key: {"size": t.size, "uses": t.uses} for key, t in self._templates.items()}
+        }
+
+    # ----- internals -----
+
+    def _remember(self, key: str, template: Optional[Dict[str, Any]], prepare: Prepare) -> PoolTemplate:
+        tpl = self._templates.get(key)
+        if tpl is None:
+            if template is None:
+                raise ValueError(f"No pool template for {key}")
+            fixed = dict(template)
+            tpl = PoolTemplate(factory=lambda: dict(fixed), prepare=prepare, size=BROWSER_POOL_PROFILE_SIZE)
+            self._templates[key] = tpl
+            # Forget the least recently used profile keys (the generic template stays)
+            profile_keys = [k for k in self._templates if k != GENERIC_KEY]
+            while len(profile_keys) > BROWSER_POOL_MAX_KEYS:
+                old = profile_keys.pop(0)
+                self._templates.pop(old, None)
+                for entry in self._warm.pop(old, ()):
+                    asyncio.ensure_future(self._close(entry))
+                    self.stats["evicted"] += 1
+        else:
+            self._templates.move_to_end(key)
+        tpl.uses += 1
+        return tpl
+
+    def _take(self, key: str) -> Optional[WarmContext]:
+        entries = self._warm.get(key)
+        while entries:
+            entry = entries.popleft()
+            if self._is_usable(entry):
+                return entry
+            self.stats["discarded"] += 1
+            asyncio.ensure_future(self._close(entry))
+        return None
+
+    def _is_usable(self, entry: WarmContext) -> bool:
+        browser = self._browser_getter()
+        return (
+            browser is not None and entry.browser is browser and browser.is_connected()
+            and not entry.page.is_closed()
+        )
+
+    def _warm_count(self) -> int:
+        return sum(len(entries) for entries in self._warm.values())
+
+    def _has_room(self) -> bool:
+        open_contexts = self._active_count() + len(self._handed) + self._warm_count() + self._pending
+        return open_contexts < self.max_contexts
+
+    async def _wait_for_room(self, key: str):
+        """Make room for one more context: evict a warm one, else wait for a session to close"""
+        deadline = time.monotonic() + self.acquire_timeout_s
+        waited = False
+        self._waiters += 1
+        try:
+            while not self._has_room():
+                if self._evict_one(prefer_other_than=key):
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats["exhausted"] += 1
+                    raise PoolExhausted(f"All {self.max_contexts} browser contexts in use for {self.acquire_timeout_s:.0f}s")
+                if not waited:
+                    waited = True
+                    self.stats["waited"] += 1
+                    logger.info(f"⏳ [POOL] {self.max_contexts} contexts open, waiting for a session to close")
+                self._room.clear()
+                try:
+                    await asyncio.wait_for(self._room.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters -= 1
+
+    def _hand_out(self, context: BrowserContext):
+        """Count context until the caller's session is attached (or the context is closed)"""
+        self._handed.add(context)
+        try:
+            context.once("close", lambda *_: (self._handed.discard(context), self.release()))
+        except Exception:
+            pass
+
+    def _evict_one(self, prefer_other_than: Optional[str] = None) -> bool:
+        """Close one warm context to make room (other keys first, oldest first)"""
+        candidates = [k for k, entries in self._warm.items() if entries]
+        candidates.sort(key=lambda k: (k == prefer_other_than, self._warm[k][0].created_at))
+        if not candidates:
+            return False
+        entry = self._warm[candidates[0]].popleft()
+        self.stats["evicted"] += 1
+        asyncio.ensure_future(self._close(entry))
+        return True
+
+    def _creation_options(self, template: Dict[str, Any], mutable: Dict[str, Any]) -> Dict[str, Any]:
+        options = dict(template)
+        if mutable.get('viewport'):
+            options['viewport'] = mutable['viewport']
+        if mutable.get('extra_http_headers'):
+            options['extra_http_headers'] = mutable['extra_http_headers']
+        if mutable.get('cookies'):
+            options['storage_state'] = {'cookies': mutable['cookies'], 'origins': []}
+        return options
+
+    async def _apply_mutable(self, context: BrowserContext, page: Page, mutable: Dict[str, Any]):
+        if mutable.get('viewport'):
+            await page.set_viewport_size(mutable['viewport'])
+        if mutable.get('extra_http_headers'):
+            await context.set_extra_http_headers(mutable['extra_http_headers'])
+        if mutable.get('cookies'):
+            await context.add_cookies(mutable['cookies'])
+
+    async def _create(self, options: Dict[str, Any], prepare: Prepare) -> Tuple[BrowserContext, Page]:
+        browser = self._browser_getter()
+        if browser is None:
+            raise RuntimeError("Browser not initialized")
+        context = await browser.new_context(**options)
+        try:
+            if prepare:
+                await prepare(context)
+            page = await context.new_page()
+            # Readiness probe must be in place before the first navigation to see its requests
+            await page_readiness_service.ensure_probe(page)
+        except Exception:
+            await context.close()
+            raise
+        self.stats["created"] += 1
+        return context, page
+
+    def _schedule_refill(self):
+        if self._refill_task and not self._refill_task.done():
+            self._refill_again = True
+            return
+        try:
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+        except RuntimeError:
+            pass  # no running loop (import time / sync context)
+
+    async def _refill(self):
+        while True:
+            self._refill_again = False
+            for key, tpl in list(self._templates.items()):
+                # Profile keys are warmed only once they have been reused
+                if key != GENERIC_KEY and tpl.uses < 2:
+                    continue
+                # Sessions waiting for a slot come before warm spares
+                while len(self._warm.get(key, ())) < tpl.size and self._has_room() and not self._waiters:
+                    browser = self._browser_getter()
+                    if browser is None or not browser.is_connected():
+                        return
+                    self._pending += 1
+                    try:
+                        context, page = await self._create(tpl.factory(), tpl.prepare)
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        logger.warning(f"⚠️ [POOL] Warm-up failed for {key}: {e}")
+                        return
+                    finally:
+                        self._pending -= 1
+                    entry = WarmContext(context=context, page=page, browser=browser)
+                    if key not in self._templates:
+                        await self._close(entry)
+                        break
+                    self._warm.setdefault(key, deque()).append(entry)
+                    logger.debug(f"🏊 [POOL] Warmed context for {key} ({len(self._warm[key])}/{tpl.size})")
+            if not self._refill_again:
+                return
+
+    async def _close(self, entry: WarmContext):
+        try:
+            await entry.context.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _percentile(samples: List[float], q: float) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
@@ -0,0 +1,230 @@
+"""
+Browser Shards - several Chromium processes behind one BrowserAutomationService
+New sessions go to the least-loaded healthy shard. A shard whose browser
+disconnects (crash, OOM kill) or stops answering health pings is relaunched in
+the background; only the sessions that lived on it are failed.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Set, Callable, Awaitable
+
+from playwright.async_api import Browser, BrowserContext
+
+from services.browser_context_pool import BrowserContextPool
+
+logger = logging.getLogger(__name__)
+
+# Number of browser processes
+BROWSER_SHARDS = max(1, int(os.environ.get('BROWSER_SHARDS', '1')))
+# Seconds between health pings of every shard
+BROWSER_SHARD_HEALTH_S = float(os.environ.get('BROWSER_SHARD_HEALTH_S', '15'))
+# A ping slower than this counts as a failure; two in a row mark the shard hung
+BROWSER_SHARD_PING_TIMEOUT_S = float(os.environ.get('BROWSER_SHARD_PING_TIMEOUT_S', '5'))
+# How long session creation waits for a shard to come back when all are down
+BROWSER_SHARD_WAIT_S = float(os.environ.get('BROWSER_SHARD_WAIT_S', '30'))
+
+RELAUNCH_BACKOFF_MAX_S = 30.0
+
+
+class BrowserShard:
+    """One browser process, its sessions and its warm context pool"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser: Optional[Browser] = None
+        self.sessions: Set[str] = set()
+        self.healthy = False
+        self.restarts = 0
+        self.ping_failures = 0
+        self.last_ping_ms: Optional[float] = None
+        self.launched_at: Optional[float] = None
+        self.pool = BrowserContextPool(lambda: self.browser, lambda: len(self.sessions))
+
+    def load(self) -> int:
+        return len(self.sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "healthy": self.healthy,
+            "sessions": len(self.sessions),
+            "contexts": len(self.browser.contexts) if self.browser and self.healthy else 0,
+            "restarts": self.restarts,
+            "last_ping_ms": self.last_ping_ms,
+            "uptime_s": int(time.time() - self.launched_at) if self.launched_at and self.healthy else 0,
+            "pool": self.pool.get_stats()
+        }
+
+
+class BrowserShardManager:
+    """
+    Launches K browser processes and places sessions on them.
+    - start(): launch all shards, start health checks
+    - pick(): least-loaded healthy shard (waits while all are relaunching)
+    - shard_of(session_id) / attach / detach: session placement bookkeeping
+    """
+
+    def __init__(
+        self,
+        launcher: Callable[[], Awaitable[Browser]],
+        on_crash: Callable[[BrowserShard, List[str]], None],
+        size: int = BROWSER_SHARDS
+    ):
+        self._launcher = launcher
+        self._on_crash = on_crash
+        self.shards: List[BrowserShard] = [BrowserShard(i) for i in range(size)]
+        self._placement: Dict[str, BrowserShard] = {}
+        self._relaunching: Set[int] = set()
+        self._health_task: Optional[asyncio.Task] = None
+        self.crashes = 0
+
+    async def start(self):
+        results = await asyncio.gather(*(self._launch(shard) for shard in self.shards), return_exceptions=True)
+        failed = [shard.index for shard, r in zip(self.shards, results) if isinstance(r, Exception)]
+        if len(failed) == len(self.shards):
+            raise results[0]
+        for index in failed:
+            logger.error(f"❌ [SHARDS] Shard {index} failed to launch, retrying in background")
+            self._schedule_relaunch(self.shards[index])
+        self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+        logger.info(f"✅ [SHARDS] {len(self.shards) - len(failed)}/{len(self.shards)} browser shard(s) running")
+
+    def primary(self) -> Optional[BrowserShard]:
+        """First healthy shard (backs the legacy service.browser attribute)"""
+        for shard in self.shards:
+            if shard.healthy:
+                return shard
+        return None
+
+    async def pick(self) -> BrowserShard:
+        """Least-loaded healthy shard; waits for a relaunch if none is up"""
+        deadline = time.monotonic() + BROWSER_SHARD_WAIT_S
+        while True:
+            healthy = [s for s in self.shards if s.healthy and s.browser and s.browser.is_connected()]
+            if healthy:
+                return min(healthy, key=lambda s: (s.load(), s.index))
+            if time.monotonic() >= deadline:
+                raise RuntimeError("No healthy browser shard available")
+            await asyncio.sleep(0.2)
+
+    def attach(self, session_id: str, shard: BrowserShard, context: Optional[BrowserContext] = None):
+        shard.sessions.add(session_id)
+        self._placement[session_id] = shard
+        if context is not None:
+            shard.pool.attached(context)
+
+    def detach(self, session_id: str) -> Optional[BrowserShard]:
+        shard = self._placement.pop(session_id, None)
+        if shard:
+            shard.sessions.discard(session_id)
+            shard.pool.release()
+        return shard
+
+    def shard_of(self, session_id: str) -> Optional[BrowserShard]:
+        return self._placement.get(session_id)
+
+    async def close_all(self):
+        if self._health_task and not self._health_task.done():
+            self._health_task.cancel()
+        for shard in self.shards:
+            shard.healthy = False  # closing on purpose is not a crash
+            await shard.pool.close_all()
+            if shard.browser:
+                try:
+                    await shard.browser.close()
+                except Exception:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "shards": [shard.get_stats() for shard in self.shards],
+            "crashes": self.crashes,
+            "relaunching": sorted(self._relaunching)
+        }
+
+    # ----- internals -----
+
+    async def _launch(self, shard: BrowserShard):
+        browser = await self._launcher()
+        shard.browser = browser
+        shard.healthy = True
+        shard.ping_failures = 0
+        shard.launched_at = time.time()
+        browser.on("disconnected", lambda _b=None, s=shard, b=browser: self._handle_disconnect(s, b))
+        # Template survives relaunches; warm contexts of the dead process are discarded on take
+        shard.pool.release()
+
+    def _handle_disconnect(self, shard: BrowserShard, browser: Browser):
+        if shard.browser is not browser or not shard.healthy:
+            return  # stale handler or intentional shutdown
+        shard.healthy = False
+        self.crashes += 1
+        lost = list(shard.sessions)
+        shard.sessions.clear()
+        for session_id in lost:
+            self._placement.pop(session_id, None)
+        logger.error(f"💥 [SHARDS] Browser shard {shard.index} disconnected, failing {len(lost)} session(s)")
+        try:
+            self._on_crash(shard, lost)
+        except Exception as e:
+            logger.error(f"❌ [SHARDS] Crash handler failed: {e}")
+        self._schedule_relaunch(shard)
+
+    def _schedule_relaunch(self, shard: BrowserShard):
+        if shard.index in self._relaunching:
+            return
+        self._relaunching.add(shard.index)
+        asyncio.get_running_loop().create_task(self._relaunch(shard))
+
+    async def _relaunch(self, shard: BrowserShard):
+        delay = 1.0
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await self._launch(shard)
+                    shard.restarts += 1
+                    logger.info(f"✅ [SHARDS] Browser shard {shard.index} relaunched (restart #{shard.restarts})")
+                    return
+                except Exception as e:
+                    logger.error(f"❌ [SHARDS] Relaunch of shard {shard.index} failed: {e}")
+                    delay = min(RELAUNCH_BACKOFF_MAX_S, delay * 2)
+        finally:
+            self._relaunching.discard(shard.index)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(BROWSER_SHARD_HEALTH_S)
+            for shard in self.shards:
+                if shard.healthy:
+                    await self._ping(shard)
+
+    async def _ping(self, shard: BrowserShard):
+        """Round-trip to the browser process over CDP; a hung process gets killed and relaunched"""
+        browser = shard.browser
+        if not browser.is_connected():
+            self._handle_disconnect(shard, browser)
+            return
+        started = time.perf_counter()
+        try:
+            async def roundtrip():
+                cdp = await browser.new_browser_cdp_session()
+                try:
+                    await cdp.send("Browser.getVersion")
+                finally:
+                    await cdp.detach()
+            await asyncio.wait_for(roundtrip(), timeout=BROWSER_SHARD_PING_TIMEOUT_S)
+            shard.last_ping_ms = round((time.perf_counter() - started) * 1000, 1)
+            shard.ping_failures = 0
+        except Exception as e:
+            shard.ping_failures += 1
+            logger.warning(f"⚠️ [SHARDS] Health ping of shard {shard.index} failed ({shard.ping_failures}): {e}")
+            if shard.ping_failures >= 2:
+                # Closing fires "disconnected", which fails the sessions and relaunches
+                try:
+                    await asyncio.wait_for(browser.close(), timeout=BROWSER_SHARD_PING_TIMEOUT_S)
+                except Exception:
+                    pass
+                self._handle_disconnect(shard, browser)
@@ -0,0 +1,79 @@
+"""
+Byte-budget LRU - least-recently-used cache bounded by total payload size
+Used for screenshot blobs and other large binary payloads where an item
+count limit says nothing about memory.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class ByteBudgetLRU:
+    """
+    LRU mapping evicting oldest entries once the summed size exceeds max_bytes.
+    Size of a value is len(value) unless a custom sizeof is given.
+    A single value larger than the whole budget is not stored.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_bytes = max(0, int(max_bytes))
+        self._sizeof = sizeof or len
+        self._items: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._items:
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return self._items[key]
+
+    def put(self, key: Hashable, value: Any) -> bool:
+        """Store value; returns False if it does not fit the budget at all"""
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return False
+        if key in self._items:
+            self.bytes_used -= self._sizes[key]
+        self._items[key] = value
+        self._items.move_to_end(key)
+        self._sizes[key] = size
+        self.bytes_used += size
+        while self.bytes_used > self.max_bytes and self._items:
+            old_key, _ = self._items.popitem(last=False)
+            self.bytes_used -= self._sizes.pop(old_key)
+            self.evictions += 1
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._items:
+            return default
+        self.bytes_used -= self._sizes.pop(key)
+        return self._items.pop(key)
+
+    def clear(self):
+        self._items.clear()
+        self._sizes.clear()
+        self.bytes_used = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._items),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
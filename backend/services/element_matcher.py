@@ -0,0 +1,240 @@
+"""
+Element Matcher - indexed target lookup over one perception's elements
+TacticalBrain scores every candidate element against a step target by
+label match (40%), type match (30%), context fit (20%) and position (10%).
+Everything except the target text is fixed for a perception, so it is
+computed once per element set (an ElementSet, read column by column):
+- labels normalized and split into character trigrams (cached per label
+  across perceptions), with an inverted index trigram -> distinct labels
+- type buckets: elements grouped by (tag type, role), scored once per bucket
+- position features (y, has bbox, off-screen) as arrays
+A query only touches the postings of its own trigrams; label similarity is
+the mean of trigram Dice and target coverage, so "e-mail" finds "Email
+address" and a typo still scores. The per-factor breakdown is built for
+the top-k candidates only.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import numpy as np
+
+from services.element_set import ElementSet
+
+# Labels whose normalized form and trigrams are kept between perceptions (pages repeat labels)
+ELEMENT_MATCHER_LABEL_CACHE = int(os.environ.get('ELEMENT_MATCHER_LABEL_CACHE', '8192'))
+
+# Element types accepted for each target type
+TYPE_MAPPING = {
+    'textbox': ['textbox', 'input', 'textarea', 'text'],
+    'button': ['button', 'submit'],
+    'link': ['link', 'a'],
+    'checkbox': ['checkbox', 'check'],
+    'select': ['select', 'dropdown', 'combobox']
+}
+
+# Factor weights of the overall score
+LABEL_WEIGHT, TYPE_WEIGHT, CONTEXT_WEIGHT, POSITION_WEIGHT = 0.4, 0.3, 0.2, 0.1
+
+_NON_WORD = re.compile(r'[\W_]+')
+# trigram -> integer id, shared by all matchers
+_GRAM_IDS: Dict[str, int] = {}
+
+
+def normalize(text: Any) -> str:
+    return _NON_WORD.sub(' ', str(text or '').lower()).strip()
+
+
+def trigrams(norm: str) -> set:
+    """Character trigram ids of each token, padded so short words and word starts count"""
+    grams = set()
+    for token in norm.split():
+        padded = f"  {token} "
+        grams.update(_GRAM_IDS.setdefault(padded[i:i + 3], len(_GRAM_IDS)) for i in range(len(padded) - 2))
+    return grams
+
+
+@lru_cache(maxsize=ELEMENT_MATCHER_LABEL_CACHE)
+def label_features(label: str) -> Tuple[str, np.ndarray]:
+    """(normalized label, sorted trigram ids)"""
+    norm = normalize(label)
+    return norm, np.array(sorted(trigrams(norm)), dtype=np.int64)
+
+
+def type_score(tag_type: str, role: str, element_type: str) -> float:
+    expected = TYPE_MAPPING.get(element_type, [element_type])
+    if tag_type in expected or role in expected:
+        return 1.0
+    if tag_type in ['button', 'link'] and element_type in ['button', 'link']:
+        return 0.7  # Cross-compatible
+    if 'button' in role and element_type == 'button':
+        return 0.8  # Role-based match
+    return 0.0
+
+
+class ElementMatcher:
+    """Index over one element set (vision elements + off-screen entries)"""
+
+    def __init__(
+        self,
+        elements: Union[ElementSet, List[Dict[str, Any]]],
+        viewport_height: float = 800,
+        offscreen_factor: float = 1.0
+    ):
+        # Dict lists (OCR lines, callers without a set) are indexed through a set and handed back as given
+        if isinstance(elements, ElementSet):
+            self.set, self.elements = elements, None
+            roles = None
+        else:
+            self.set, self.elements = ElementSet.from_dicts(elements), elements
+            roles = [str(el.get('role') or '').lower() for el in elements]
+        self.viewport_height = viewport_height
+        es = self.set
+        n = len(es)
+
+        # Distinct labels: elements point at one entry each
+        label_ids: Dict[str, int] = {}
+        label_grams: List[np.ndarray] = []
+        label_of = np.zeros(n, dtype=np.int64)
+        buckets: Dict[tuple, List[int]] = {}
+        for i, (label, tag_type) in enumerate(zip(es.labels, es.types)):
+            norm, grams = label_features(label)
+            lid = label_ids.get(norm)
+            if lid is None:
+                lid = label_ids[norm] = len(label_grams)
+                label_grams.append(grams)
+            label_of[i] = lid
+            buckets.setdefault((tag_type.lower(), roles[i] if roles else ''), []).append(i)
+
+        self.labels = list(label_ids)
+        self._label_ids = label_ids
+        self._label_of = label_of
+        # Inverted index as sorted (trigram id, label id) pairs: one trigram's postings are a contiguous slice
+        counts = np.array([len(g) for g in label_grams], dtype=np.int64)
+        self._label_gram_counts = counts.astype(np.float64)
+        flat = np.concatenate(label_grams) if label_grams else np.zeros(0, dtype=np.int64)
+        order = np.argsort(flat, kind='stable')
+        self._gram_keys = flat[order]
+        self._gram_labels = np.repeat(np.arange(len(label_grams)), counts)[order]
+        self._buckets = {key: np.asarray(ids, dtype=np.int64) for key, ids in buckets.items()}
+        # Page offset of an off-screen entry says nothing about where it will sit once scrolled to
+        offscreen = ~es.in_view
+        self._y = np.where(offscreen, 0.0, es.boxes[:, 1].astype(np.float64))
+        self._has_bbox = es.boxes.any(axis=1) & ~offscreen
+        self._scale = np.where(offscreen, offscreen_factor, 1.0)
+        self._type_scores: Dict[str, np.ndarray] = {}
+        self._position_scores: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.set)
+
+    def element(self, i: int) -> Dict[str, Any]:
+        return self.elements[i] if self.elements is not None else self.set.element(i)
+
+    def _shared(self, grams: np.ndarray) -> np.ndarray:
+        """[distinct labels] number of the given trigrams each label contains"""
+        lo = np.searchsorted(self._gram_keys, grams, 'left')
+        hi = np.searchsorted(self._gram_keys, grams, 'right')
+        hits = [self._gram_labels[a:b] for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        if not hits:
+            return np.zeros(len(self.labels), dtype=np.float64)
+        return np.bincount(np.concatenate(hits), minlength=len(self.labels)).astype(np.float64)
+
+    def label_scores(self, target: Optional[str]) -> np.ndarray:
+        """[N] label similarity: 1.0 exact, else 0.9 x mean(trigram Dice, share of target trigrams in label)"""
+        norm, grams = label_features(str(target or ''))
+        if not len(grams):
+            return np.zeros(len(self), dtype=np.float64)
+        shared = self._shared(grams)
+        scores = 0.45 * (2 * shared / (len(grams) + self._label_gram_counts) + shared / len(grams))
+        exact = self._label_ids.get(norm)
+        if exact is not None:
+            scores[exact] = 1.0
+        return scores[self._label_of]
+
+    def field_scores(self, field: Optional[str]) -> np.ndarray:
+        """[N] form field name match: 0.8 x share of the field's trigrams in the label, 0.6 for any shared word"""
+        norm, grams = label_features(str(field or ''))
+        if not len(grams):
+            return np.zeros(len(self), dtype=np.float64)
+        scores = 0.8 * self._shared(grams) / len(grams)
+        for token in set(norm.split()):
+            # Labels holding all of the word's trigrams, then checked for the word itself
+            _, token_grams = label_features(token)
+            for lid in np.flatnonzero(self._shared(token_grams) == len(token_grams)).tolist():
+                if token in self.labels[lid].split():
+                    scores[lid] = max(scores[lid], 0.6)
+        return scores[self._label_of]
+
+    def type_scores(self, element_type: str) -> np.ndarray:
+        scores = self._type_scores.get(element_type)
+        if scores is None:
+            scores = np.zeros(len(self), dtype=np.float64)
+            for (tag_type, role), ids in self._buckets.items():
+                scores[ids] = type_score(tag_type, role, element_type)
+            self._type_scores[element_type] = scores
+        return scores
+
+    def position_scores(self, element_type: str) -> np.ndarray:
+        """[N] plausibility of the on-screen position (0.5 without a bbox)"""
+        scores = self._position_scores.get(element_type)
+        if scores is None:
+            y = self._y
+            if element_type == 'button':
+                # Primary action buttons typically in bottom half or center
+                scores = np.where(y > self.viewport_height * 0.5, 0.8, np.where((y > 200) & (y < 600), 0.7, 0.5))
+            elif element_type == 'textbox':
+                # Input fields typically in upper-middle area
+                scores = np.where((y > 100) & (y < 600), 0.8, 0.6)
+            else:
+                scores = np.full(len(self), 0.7)
+            scores = np.where(self._has_bbox, scores, 0.5)
+            self._position_scores[element_type] = scores
+        return scores
+
+    def top_k(
+        self,
+        target: Optional[str],
+        field: Optional[str],
+        element_type: str,
+        context_fit: float,
+        k: int = 5,
+        min_score: float = 0.2
+    ) -> List[Dict[str, Any]]:
+        """
+        Best k elements scoring above min_score, best first (ties keep input order).
+
+        Returns: [{"cell", "element", "label_match", "type_match", "context_fit",
+                   "position_score", "overall_score", "reasoning"}]
+        """
+        if not len(self):
+            return []
+        label = self.label_scores(target)
+        if field:
+            label = np.maximum(label, self.field_scores(field))
+        types = self.type_scores(element_type)
+        position = self.position_scores(element_type)
+        overall = (label * LABEL_WEIGHT + types * TYPE_WEIGHT + context_fit * CONTEXT_WEIGHT + position * POSITION_WEIGHT) * self._scale
+
+        idx = np.flatnonzero(overall > min_score)
+        idx = idx[np.argsort(-overall[idx], kind='stable')][:k]
+        results = []
+        for i in idx.tolist():
+            element = self.element(i)
+            results.append({
+                "cell": element.get("cell"),
+                "element": element,
+                "label_match": float(label[i]),
+                "type_match": float(types[i]),
+                "context_fit": context_fit,
+                "position_score": float(position[i]),
+                "overall_score": float(overall[i]),
+                "reasoning": (
+                    f"Label:{label[i]:.2f} "
+                    f"Type:{types[i]:.2f} "
+                    f"Context:{context_fit:.2f} "
+                    f"Pos:{position[i]:.2f}"
+                )
+            })
+        return results
@@ -0,0 +1,202 @@
+"""
+Element Set - compact column store of the elements of one frame
+Vision elements used to travel as one dict (plus a bbox dict) per element
+through DOM collection, detect(), the merge, the grid, the result cache,
+the scene builder and TacticalBrain, each stage copying and re-keying them.
+An ElementSet keeps them as columns instead:
+- boxes: [N, 4] float32 (x1, y1, x2, y2), the layout box_merge and GridIndex use
+- confidence: [N] float64, in_view: [N] bool
+- labels / types / sources: interned strings (a page repeats "button", "dom", ...)
+- eids / cells: plain lists (None where absent)
+Stages work on the columns; to_dicts() produces the vision[] JSON shape
+({cell, bbox {x, y, w, h}, label, type, confidence, source[, eid]}) only at
+the API edge. Sets are never modified after they are built, except that
+assign_cells() fills the cells column once, so cached sets can be shared.
+"""
+import sys
+from typing import Dict, Any, List, Optional, Sequence
+
+import numpy as np
+
+from services.box_merge import merge_boxes, xyxy
+from services.grid_service import GridConfig, GridIndex
+
+# Longest label kept per element
+MAX_LABEL_CHARS = 64
+
+_intern = sys.intern
+
+
+class ElementSet:
+    """Struct-of-arrays element list (see module docstring)"""
+
+    __slots__ = ('boxes', 'confidence', 'in_view', 'labels', 'types', 'sources', 'eids', 'cells')
+
+    def __init__(
+        self,
+        boxes: np.ndarray,
+        labels: List[str],
+        types: List[str],
+        sources: List[str],
+        confidence: np.ndarray,
+        eids: Optional[List[Optional[str]]] = None,
+        cells: Optional[List[Optional[str]]] = None,
+        in_view: Optional[np.ndarray] = None
+    ):
+        n = len(labels)
+        self.boxes = boxes
+        self.labels = labels
+        self.types = types
+        self.sources = sources
+        self.confidence = confidence
+        self.eids = eids if eids is not None else [None] * n
+        self.cells = cells if cells is not None else [None] * n
+        self.in_view = in_view if in_view is not None else np.ones(n, dtype=bool)
+
+    # ----- construction -----
+
+    @classmethod
+    def empty(cls) -> 'ElementSet':
+        return cls(np.zeros((0, 4), dtype=np.float32), [], [], [], np.zeros(0))
+
+    @classmethod
+    def from_dom(cls, clickables: Optional[List[Dict[str, Any]]], default_confidence: float = 0.90) -> 'ElementSet':
+        """
+        DOM clickables (page snapshot shape) in the viewport. Off-screen ones are left
+        out: they would clamp onto edge cells and stay reachable through perception's
+        document index.
+        """
+        visible = [el for el in clickables or [] if el.get('in_view') is not False]
+        if not visible:
+            return cls.empty()
+        return cls(
+            xyxy([el.get('bbox') or {} for el in visible]),
+            [_intern((el.get('label') or el.get('text') or el.get('name') or el.get('type', '').upper())[:MAX_LABEL_CHARS])
+             for el in visible],
+            [_intern(el.get('type') or 'button') for el in visible],
+            [_intern('dom')] * len(visible),
+            np.fromiter((float(el.get('confidence', default_confidence)) for el in visible), dtype=np.float64, count=len(visible)),
+            eids=[el.get('eid') for el in visible]
+        )
+
+    @classmethod
+    def from_dicts(cls, elements: Optional[List[Dict[str, Any]]], source: Optional[str] = None, bbox_key: str = 'bbox') -> 'ElementSet':
+        """
+        Vision-shaped dicts ({bbox, label, type, confidence, source, eid, cell}); bbox_key
+        holds {x, y, w, h} dicts or [x1, y1, x2, y2] lists (one format per list).
+        Elements with "offscreen" set become in_view = False.
+        """
+        elements = elements or []
+        if not elements:
+            return cls.empty()
+        return cls(
+            xyxy([el.get(bbox_key) or {} for el in elements]),
+            [_intern(str(el.get('label') or '')[:MAX_LABEL_CHARS]) for el in elements],
+            [_intern(str(el.get('type') or '')) for el in elements],
+            [_intern(source or str(el.get('source') or '')) for el in elements],
+            np.fromiter((float(el.get('confidence') or 0.0) for el in elements), dtype=np.float64, count=len(elements)),
+            eids=[el.get('eid') for el in elements],
+            cells=[el.get('cell') for el in elements],
+            in_view=np.fromiter((not el.get('offscreen') for el in elements), dtype=bool, count=len(elements))
+        )
+
+    @classmethod
+    def concat(cls, sets: Sequence['ElementSet']) -> 'ElementSet':
+        sets = [s for s in sets if len(s)]
+        if not sets:
+            return cls.empty()
+        if len(sets) == 1:
+            return sets[0]
+        return cls(
+            np.concatenate([s.boxes for s in sets]),
+            [v for s in sets for v in s.labels],
+            [v for s in sets for v in s.types],
+            [v for s in sets for v in s.sources],
+            np.concatenate([s.confidence for s in sets]),
+            eids=[v for s in sets for v in s.eids],
+            cells=[v for s in sets for v in s.cells],
+            in_view=np.concatenate([s.in_view for s in sets])
+        )
+
+    @classmethod
+    def merge(cls, tiers: Sequence['ElementSet']) -> 'ElementSet':
+        """
+        Tiers highest priority first (e.g. [dom, florence, ocr]): the first (DOM) is
+        kept whole, later elements duplicating a kept box (IoU / containment) or a
+        better-scored box of their own tier are dropped (box_merge.merge_boxes,
+        straight on the box columns). An empty DOM tier leaves the rest to NMS.
+        """
+        tiers = [t for t in tiers if t is not None]
+        if len(tiers) < 2 or not any(len(t) for t in tiers[1:]):
+            return tiers[0] if tiers else cls.empty()
+        merged = cls.concat(tiers)
+        sizes = [len(t) for t in tiers]
+        keep = merge_boxes(merged.boxes, np.repeat(np.arange(len(tiers)), sizes), merged.confidence)
+        if len(keep) == len(merged):
+            return merged
+        return merged.take(keep)
+
+    def take(self, indices: Any) -> 'ElementSet':
+        idx = np.asarray(indices, dtype=np.int64)
+        rows = idx.tolist()
+        return ElementSet(
+            self.boxes[idx],
+            [self.labels[i] for i in rows],
+            [self.types[i] for i in rows],
+            [self.sources[i] for i in rows],
+            self.confidence[idx],
+            eids=[self.eids[i] for i in rows],
+            cells=[self.cells[i] for i in rows],
+            in_view=self.in_view[idx]
+        )
+
+    # ----- stages -----
+
+    def assign_cells(self, grid: GridConfig, viewport_w: int, viewport_h: int) -> GridIndex:
+        """Adaptive grid cells for every element (sub-cells where crowded)"""
+        index = GridIndex(grid, viewport_w, viewport_h, self.boxes)
+        self.cells = index.cells
+        return index
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def nbytes(self) -> int:
+        """Approximate memory: arrays, list slots and each distinct string once"""
+        strings = {id(s): s for column in (self.labels, self.types, self.sources, self.eids, self.cells) for s in column if s is not None}
+        return (
+            self.boxes.nbytes + self.confidence.nbytes + self.in_view.nbytes
+            + 5 * (56 + 8 * len(self))
+            + sum(sys.getsizeof(s) for s in strings.values())
+        )
+
+    # ----- API edge -----
+
+    def bboxes(self) -> List[Dict[str, int]]:
+        """{x, y, w, h} dicts of all elements"""
+        b = np.rint(self.boxes).astype(np.int64)
+        b[:, 2:] -= b[:, :2]
+        return [{'x': x, 'y': y, 'w': w, 'h': h} for x, y, w, h in b.tolist()]
+
+    def element(self, i: int) -> Dict[str, Any]:
+        x1, y1, x2, y2 = np.rint(self.boxes[i]).astype(np.int64).tolist()
+        return self._dict(
+            {'x': x1, 'y': y1, 'w': x2 - x1, 'h': y2 - y1}, self.cells[i], self.labels[i], self.types[i],
+            float(self.confidence[i]), self.sources[i], self.eids[i], bool(self.in_view[i])
+        )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """vision[] JSON: [{cell, bbox {x, y, w, h}, label, type, confidence, source[, eid][, offscreen]}]"""
+        return list(map(
+            self._dict, self.bboxes(), self.cells, self.labels, self.types,
+            self.confidence.tolist(), self.sources, self.eids, self.in_view.tolist()
+        ))
+
+    @staticmethod
+    def _dict(bbox, cell, label, etype, confidence, source, eid, in_view) -> Dict[str, Any]:
+        out = {'cell': cell, 'bbox': bbox, 'label': label, 'type': etype, 'confidence': confidence, 'source': source}
+        if eid is not None:
+            out['eid'] = eid
+        if not in_view:
+            out['offscreen'] = True
+        return out
@@ -0,0 +1,405 @@
+"""
+Florence-2 ONNX Pipeline - vision encoder -> encoder -> decoder generation loop
+Runs the four graphs of an exported Florence-2 model (vision_encoder,
+embed_tokens, encoder_model, decoder_model_merged) with NumPy glue: image
+features are prepended to the embedded prompt and encoded once, then the merged
+decoder generates token by token reusing its KV cache (cross-attention keys and
+values come from the first step only, self-attention cache grows by one token).
+ONNX Runtime session options are tunable through ORT_* environment variables.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort  # type: ignore
+except Exception:
+    ort = None
+
+# Threads per ONNX run (0 = ONNX Runtime default: one per physical core)
+ORT_INTRA_OP_THREADS = int(os.environ.get('ORT_INTRA_OP_THREADS', '0'))
+# Threads across independent graph branches (only used in parallel execution mode)
+ORT_INTER_OP_THREADS = int(os.environ.get('ORT_INTER_OP_THREADS', '0'))
+# disable | basic | extended | all
+ORT_GRAPH_OPTIMIZATION = os.environ.get('ORT_GRAPH_OPTIMIZATION', 'all').lower()
+# sequential | parallel
+ORT_EXECUTION_MODE = os.environ.get('ORT_EXECUTION_MODE', 'sequential').lower()
+# Memory pattern planning pays off for fixed input shapes (vision encoder, encoder)
+ORT_ENABLE_MEM_PATTERN = os.environ.get('ORT_ENABLE_MEM_PATTERN', 'true').lower() == 'true'
+ORT_ENABLE_CPU_MEM_ARENA = os.environ.get('ORT_ENABLE_CPU_MEM_ARENA', 'true').lower() == 'true'
+
+# Upper bound on generated tokens (each <OD> box is a label plus 4 location tokens)
+FLORENCE_MAX_NEW_TOKENS = int(os.environ.get('FLORENCE_MAX_NEW_TOKENS', '256'))
+# From the model's generation config: no 3-gram may repeat (keeps greedy decoding from looping)
+FLORENCE_NO_REPEAT_NGRAM = int(os.environ.get('FLORENCE_NO_REPEAT_NGRAM', '3'))
+
+# Encoder micro-batching across concurrent detections (1 = off)
+FLORENCE_BATCH_MAX = int(os.environ.get('FLORENCE_BATCH_MAX', '4'))
+# How long the first image waits for companions before its batch runs, milliseconds
+FLORENCE_BATCH_WINDOW_MS = float(os.environ.get('FLORENCE_BATCH_WINDOW_MS', '8'))
+
+GRAPHS = ("vision_encoder", "embed_tokens", "encoder_model", "decoder_model_merged")
+
+ORT_DTYPES = {"tensor(float)": np.float32, "tensor(float16)": np.float16}
+
+
+def build_session_options(intra_op_threads: Optional[int] = None) -> "ort.SessionOptions":
+    """SessionOptions from the ORT_* environment variables (intra_op_threads overrides ORT_INTRA_OP_THREADS)"""
+    opts = ort.SessionOptions()
+    intra = ORT_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+    if intra > 0:
+        opts.intra_op_num_threads = intra
+    if ORT_INTER_OP_THREADS > 0:
+        opts.inter_op_num_threads = ORT_INTER_OP_THREADS
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    opts.graph_optimization_level = levels.get(ORT_GRAPH_OPTIMIZATION, ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+    opts.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if ORT_EXECUTION_MODE == 'parallel' else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    opts.enable_mem_pattern = ORT_ENABLE_MEM_PATTERN
+    opts.enable_cpu_mem_arena = ORT_ENABLE_CPU_MEM_ARENA
+    return opts
+
+
+def session_options_summary(intra_op_threads: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        "intra_op_threads": ORT_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads,
+        "inter_op_threads": ORT_INTER_OP_THREADS,
+        "graph_optimization": ORT_GRAPH_OPTIMIZATION,
+        "execution_mode": ORT_EXECUTION_MODE,
+        "mem_pattern": ORT_ENABLE_MEM_PATTERN,
+        "cpu_mem_arena": ORT_ENABLE_CPU_MEM_ARENA
+    }
+
+
+class Florence2OnnxPipeline:
+    """
+    Florence-2 generation on ONNX Runtime.
+    - load(): create the four sessions
+    - encode(pixel_values, input_ids) -> (encoder_hidden_states, attention_mask)
+    - decode(encoder_hidden_states, attention_mask) -> generated token ids
+    - generate(pixel_values, input_ids): encode + decode
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        variant: str = "q4",
+        providers: Optional[List[str]] = None,
+        decoder_start_token_id: int = 2,
+        bos_token_id: Optional[int] = 0,
+        eos_token_id: int = 2,
+        intra_op_threads: Optional[int] = None
+    ):
+        self.model_dir = model_dir
+        self.variant = variant
+        self.intra_op_threads = intra_op_threads
+        self.paths = {
+            name: os.path.join(model_dir, "onnx", f"{name}_{variant}.onnx" if variant else f"{name}.onnx")
+            for name in GRAPHS
+        }
+        self.providers = providers or ["CPUExecutionProvider"]
+        self.decoder_start_token_id = decoder_start_token_id
+        self.bos_token_id = bos_token_id
+        self.eos_token_id = eos_token_id
+        self.sessions: Dict[str, Any] = {}
+        self._decoder_inputs: set = set()
+        # (past input name, heads, head_dim, dtype) for every KV cache tensor
+        self._past_specs: List[Tuple[str, int, int, Any]] = []
+        self._logits_index = 0
+        self._present_names: List[Optional[str]] = []
+        self.stats = {"runs": 0, "tokens": 0, "last_ms": {}, "last_tokens": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return len(self.sessions) == len(GRAPHS)
+
+    def missing(self) -> List[str]:
+        return [path for path in self.paths.values() if not os.path.exists(path)]
+
+    def load(self):
+        if ort is None:
+            raise RuntimeError("onnxruntime not available")
+        missing = self.missing()
+        if missing:
+            raise FileNotFoundError(f"Florence-2 graphs missing: {missing}")
+        opts = build_session_options(self.intra_op_threads)
+        for name in GRAPHS:
+            started = time.perf_counter()
+            self.sessions[name] = ort.InferenceSession(self.paths[name], sess_options=opts, providers=self.providers)
+            logger.info(f"✅ [FLORENCE] {name} loaded in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        decoder = self.sessions["decoder_model_merged"]
+        self._decoder_inputs = {i.name for i in decoder.get_inputs()}
+        self._past_specs = []
+        for i in decoder.get_inputs():
+            if i.name.startswith("past_key_values."):
+                _, heads, _, head_dim = i.shape
+                if not isinstance(heads, int) or not isinstance(head_dim, int):
+                    raise ValueError(f"KV cache input {i.name} has symbolic heads/head_dim: {i.shape}")
+                self._past_specs.append((i.name, heads, head_dim, ORT_DTYPES.get(i.type, np.float32)))
+        outputs = [o.name for o in decoder.get_outputs()]
+        self._logits_index = outputs.index("logits")
+        self._present_names = [
+            name.replace("present.", "past_key_values.", 1) if name.startswith("present.") else None
+            for name in outputs
+        ]
+
+    def encode(self, pixel_values: np.ndarray, input_ids: np.ndarray, run_options: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Image features + embedded prompt through the encoder (batched over axis 0)"""
+        image_features = self.sessions["vision_encoder"].run(None, {"pixel_values": pixel_values}, run_options)[0]
+        prompt_embeds = self.sessions["embed_tokens"].run(None, {"input_ids": input_ids}, run_options)[0]
+        embeds = np.concatenate([image_features, prompt_embeds.astype(image_features.dtype)], axis=1)
+        attention_mask = np.ones(embeds.shape[:2], dtype=np.int64)
+        hidden = self.sessions["encoder_model"].run(
+            None, {"inputs_embeds": embeds, "attention_mask": attention_mask}, run_options
+        )[0]
+        return hidden, attention_mask
+
+    def decode(
+        self,
+        encoder_hidden_states: np.ndarray,
+        attention_mask: np.ndarray,
+        max_new_tokens: Optional[int] = None,
+        cancel: Any = None
+    ) -> List[int]:
+        """
+        Greedy generation for ONE encoded item with KV-cache reuse.
+        Returns the decoder token ids, starting with decoder_start_token_id.
+        """
+        max_new_tokens = max_new_tokens or FLORENCE_MAX_NEW_TOKENS
+        run_options = cancel.run_options if cancel else None
+        embed = self.sessions["embed_tokens"]
+        decoder = self.sessions["decoder_model_merged"]
+        past = {name: np.zeros((1, heads, 0, head_dim), dtype=dtype) for name, heads, head_dim, dtype in self._past_specs}
+        tokens = [self.decoder_start_token_id]
+
+        for step in range(max_new_tokens):
+            if cancel:
+                cancel.check()
+            step_embeds = embed.run(None, {"input_ids": np.array([[tokens[-1]]], dtype=np.int64)}, run_options)[0]
+            feed = {
+                "inputs_embeds": step_embeds,
+                "encoder_hidden_states": encoder_hidden_states,
+                "encoder_attention_mask": attention_mask,
+                **past
+            }
+            if "use_cache_branch" in self._decoder_inputs:
+                feed["use_cache_branch"] = np.array([step > 0])
+            outputs = decoder.run(None, feed, run_options)
+            for past_name, value in zip(self._present_names, outputs):
+                # Cross-attention cache is fixed after the first step
+                if past_name and (step == 0 or ".decoder." in past_name):
+                    past[past_name] = value
+            next_token = self._next_token(outputs[self._logits_index][0, -1], tokens, step, max_new_tokens)
+            tokens.append(next_token)
+            if next_token == self.eos_token_id:
+                break
+        return tokens
+
+    def generate(
+        self,
+        pixel_values: np.ndarray,
+        input_ids: np.ndarray,
+        max_new_tokens: Optional[int] = None,
+        cancel: Any = None,
+        batcher: Optional["EncoderBatcher"] = None
+    ) -> List[int]:
+        """Encoder + decoder for a single image (batch of 1); the encoder may run batched through batcher"""
+        started = time.perf_counter()
+        if batcher is not None:
+            hidden, attention_mask = batcher.encode(pixel_values, input_ids, cancel)
+        else:
+            hidden, attention_mask = self.encode(pixel_values, input_ids, cancel.run_options if cancel else None)
+        encoded = time.perf_counter()
+        tokens = self.decode(hidden, attention_mask, max_new_tokens, cancel)
+        self._record([tokens], started, encoded)
+        return tokens
+
+    def generate_batch(
+        self,
+        pixel_values: np.ndarray,
+        input_ids: np.ndarray,
+        max_new_tokens: Optional[int] = None,
+        cancel: Any = None
+    ) -> List[List[int]]:
+        """One batched encoder run for several images (crops of one frame), then greedy decoding per image"""
+        started = time.perf_counter()
+        hidden, attention_mask = self.encode(pixel_values, input_ids, cancel.run_options if cancel else None)
+        encoded = time.perf_counter()
+        results = [
+            self.decode(hidden[i:i + 1], attention_mask[i:i + 1], max_new_tokens, cancel)
+            for i in range(hidden.shape[0])
+        ]
+        self._record(results, started, encoded)
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "loaded": self.loaded,
+            "session_options": session_options_summary(self.intra_op_threads),
+            "kv_cache_tensors": len(self._past_specs)
+        }
+
+    def _record(self, results: List[List[int]], started: float, encoded: float):
+        generated = sum(len(tokens) - 1 for tokens in results)
+        self.stats["runs"] += len(results)
+        self.stats["tokens"] += generated
+        self.stats["last_tokens"] = generated
+        self.stats["last_ms"] = {
+            "encode": round((encoded - started) * 1000, 1),
+            "decode": round((time.perf_counter() - encoded) * 1000, 1)
+        }
+
+    def _next_token(self, logits: np.ndarray, tokens: List[int], step: int, max_new_tokens: int) -> int:
+        """Greedy pick with the model's forced BOS/EOS and no-repeat-ngram rules"""
+        if step == 0 and self.bos_token_id is not None:
+            return self.bos_token_id
+        if step == max_new_tokens - 1:
+            return self.eos_token_id
+        n = FLORENCE_NO_REPEAT_NGRAM
+        if n > 0 and len(tokens) >= n:
+            prefix = tokens[len(tokens) - n + 1:]
+            banned = {
+                tokens[i + n - 1] for i in range(len(tokens) - n + 1)
+                if tokens[i:i + n - 1] == prefix
+            }
+            if banned:
+                logits = logits.copy()
+                logits[list(banned)] = -np.inf
+        return int(np.argmax(logits))
+
+
+class _EncodeRequest:
+    __slots__ = ("pixel_values", "input_ids", "cancel", "group", "taken", "done", "result", "error")
+
+    def __init__(self, pixel_values: np.ndarray, input_ids: np.ndarray, cancel: Any):
+        self.pixel_values = pixel_values
+        self.input_ids = input_ids
+        self.cancel = cancel
+        # Only requests with equal image and prompt shapes can be stacked
+        self.group = (pixel_values.shape[1:], input_ids.shape[1])
+        self.taken = False
+        self.done = False
+        self.result: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.error: Optional[BaseException] = None
+
+
+class EncoderBatcher:
+    """
+    Micro-batcher for the encoder stage, shared by the vision worker threads.
+    The first waiting thread becomes the leader: it collects compatible images
+    for up to window_ms (or until max_batch), runs one batched encode() and
+    hands every caller its slice. Decoding stays per image.
+    """
+
+    def __init__(self, pipeline: Florence2OnnxPipeline, max_batch: int = FLORENCE_BATCH_MAX, window_ms: float = FLORENCE_BATCH_WINDOW_MS):
+        self.pipeline = pipeline
+        self.max_batch = max(1, max_batch)
+        self.window_s = max(0.0, window_ms) / 1000
+        self._cond = threading.Condition()
+        self._pending: List[_EncodeRequest] = []
+        self._collecting = False
+        self.stats = {"batches": 0, "images": 0, "sizes": {}}
+
+    def encode(self, pixel_values: np.ndarray, input_ids: np.ndarray, cancel: Any = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Blocking; returns this image's (encoder_hidden_states, attention_mask) with a batch axis of 1"""
+        if self.max_batch == 1:
+            self._record(1)
+            return self.pipeline.encode(pixel_values, input_ids, cancel.run_options if cancel else None)
+
+        request = _EncodeRequest(pixel_values, input_ids, cancel)
+        with self._cond:
+            self._pending.append(request)
+            self._cond.notify_all()
+            while not request.taken and self._collecting:
+                self._cond.wait()
+            batch = None if request.taken else self._collect(request)
+        if batch is not None:
+            self._run(batch)
+        else:
+            with self._cond:
+                while not request.done:
+                    self._cond.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        return {
+            "max_batch": self.max_batch,
+            "window_ms": round(self.window_s * 1000, 1),
+            "batches": batches,
+            "images": self.stats["images"],
+            "avg_batch": round(self.stats["images"] / batches, 2) if batches else 0.0,
+            "sizes": dict(sorted(self.stats["sizes"].items()))
+        }
+
+    # ----- internals -----
+
+    def _collect(self, leader: _EncodeRequest) -> List[_EncodeRequest]:
+        """Called with the lock held: gather companions of the leader's group, then take them out of the queue"""
+        self._collecting = True
+        deadline = time.monotonic() + self.window_s
+        while True:
+            companions = [r for r in self._pending if r is not leader and r.group == leader.group]
+            remaining = deadline - time.monotonic()
+            if len(companions) + 1 >= self.max_batch or remaining <= 0:
+                break
+            self._cond.wait(remaining)
+        batch = [leader] + companions[:self.max_batch - 1]
+        for r in batch:
+            self._pending.remove(r)
+            r.taken = True
+        # Whoever is still queued (other group, overflow) elects the next leader
+        self._collecting = False
+        self._cond.notify_all()
+        return batch
+
+    def _run(self, batch: List[_EncodeRequest]):
+        live = []
+        for r in batch:
+            try:
+                if r.cancel is not None:
+                    r.cancel.check()
+                live.append(r)
+            except Exception as e:
+                r.error = e
+        try:
+            if live:
+                # A shared run is not tied to one caller's RunOptions; a lone image keeps its own
+                run_options = live[0].cancel.run_options if len(live) == 1 and live[0].cancel else None
+                hidden, mask = self.pipeline.encode(
+                    np.concatenate([r.pixel_values for r in live], axis=0),
+                    np.concatenate([r.input_ids for r in live], axis=0),
+                    run_options
+                )
+                for i, r in enumerate(live):
+                    r.result = (hidden[i:i + 1], mask[i:i + 1])
+                self._record(len(live))
+        except Exception as e:
+            for r in live:
+                r.error = e
+        finally:
+            with self._cond:
+                for r in batch:
+                    r.done = True
+                self._cond.notify_all()
+
+    def _record(self, size: int):
+        self.stats["batches"] += 1
+        self.stats["images"] += size
+        self.stats["sizes"][size] = self.stats["sizes"].get(size, 0) + 1
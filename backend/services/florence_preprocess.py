@@ -0,0 +1,122 @@
+"""
+Florence-2 Preprocessing Fast Path - screenshot bytes to pixel_values without the HF processor
+The generic processor converts PIL -> NumPy -> PIL -> NumPy, rescales in
+float64 and tokenizes the task prompt on every call. Here the frame is resized
+once with PIL (same resample filter), then rescaled and normalized in a single
+fused pass into a preallocated float32 buffer (per worker thread). Prompt ids
+are tokenized once per task and reused.
+Output matches processor(text=task, images=image) within float32 rounding.
+"""
+import io
+import os
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+# Use the fast path when the processor's settings are supported (falls back to the processor otherwise)
+FLORENCE_FAST_PREPROCESS = os.environ.get('FLORENCE_FAST_PREPROCESS', 'true').lower() == 'true'
+
+# Prompts pre-tokenized at load time
+PRETOKENIZED_TASKS = ("<OD>", "<OCR>", "<OCR_WITH_REGION>")
+
+
+class FlorencePreprocessor:
+    """
+    Florence-2 image + prompt preprocessing.
+    - __call__(images, task) -> {"pixel_values": [N, 3, H, W] float32, "input_ids": [N, L] int64}
+    - prompt_ids(task): cached token ids of a task prompt
+    The pixel_values array is a view of a thread-local buffer: valid until the
+    same thread preprocesses again.
+    """
+
+    def __init__(
+        self,
+        size: Tuple[int, int],
+        image_mean: List[float],
+        image_std: List[float],
+        rescale_factor: float = 1 / 255,
+        resample: int = 3,
+        tokenize: Optional[Any] = None
+    ):
+        self.height, self.width = size
+        self.resample = int(resample)
+        mean = np.asarray(image_mean, dtype=np.float64)
+        std = np.asarray(image_std, dtype=np.float64)
+        # (x * rescale - mean) / std == x * scale + offset
+        self._scale = (rescale_factor / std).astype(np.float32)[:, None, None]
+        self._offset = (-mean / std).astype(np.float32)[:, None, None]
+        self._tokenize = tokenize
+        self._prompts: Dict[str, np.ndarray] = {}
+        self._local = threading.local()
+        self.stats = {"frames": 0, "prompt_cache_misses": 0}
+
+    @classmethod
+    def from_processor(cls, processor: Any) -> Optional["FlorencePreprocessor"]:
+        """Fast path for a Florence2Processor, or None if its image settings are not the plain resize/normalize ones"""
+        try:
+            ip = processor.image_processor
+            size = ip.size if isinstance(ip.size, dict) else {}
+            if "height" not in size or "width" not in size:
+                return None
+            if getattr(ip, "do_center_crop", False) or not (ip.do_resize and ip.do_rescale and ip.do_normalize):
+                return None
+
+            def tokenize(task: str) -> np.ndarray:
+                # Exact ids of the full processor (task -> prompt text -> tokenizer) on a 1x1 image
+                blank = Image.new("RGB", (1, 1))
+                return np.asarray(processor(text=task, images=blank, return_tensors="np")["input_ids"], dtype=np.int64)
+
+            pre = cls(
+                (int(size["height"]), int(size["width"])),
+                list(ip.image_mean), list(ip.image_std),
+                float(ip.rescale_factor), int(ip.resample), tokenize
+            )
+            for task in PRETOKENIZED_TASKS:
+                pre.prompt_ids(task)
+            return pre
+        except Exception as e:
+            logger.warning(f"⚠️ [VISION] Fast preprocessing unavailable, using the processor: {e}")
+            return None
+
+    def prompt_ids(self, task: str) -> np.ndarray:
+        ids = self._prompts.get(task)
+        if ids is None:
+            self.stats["prompt_cache_misses"] += 1
+            ids = self._prompts[task] = self._tokenize(task)
+        return ids
+
+    def __call__(self, images: List[Union["Image.Image", bytes]], task: str) -> Dict[str, np.ndarray]:
+        buffer = self._buffer(len(images))
+        for i, image in enumerate(images):
+            self._fill(buffer[i], image)
+        self.stats["frames"] += len(images)
+        ids = self.prompt_ids(task)
+        return {"pixel_values": buffer[:len(images)], "input_ids": np.repeat(ids, len(images), axis=0)}
+
+    def _fill(self, out: np.ndarray, image: Union["Image.Image", bytes]):
+        if isinstance(image, (bytes, bytearray)):
+            image = Image.open(io.BytesIO(image))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        if image.size != (self.width, self.height):
+            image = image.resize((self.width, self.height), resample=self.resample)
+        pixels = np.asarray(image)  # H, W, 3 uint8
+        # One pass per channel: uint8 -> float32 scaled and shifted, written straight into the buffer
+        np.multiply(pixels.transpose(2, 0, 1), self._scale, out=out, dtype=np.float32)
+        out += self._offset
+
+    def _buffer(self, n: int) -> np.ndarray:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < n:
+            buffer = np.empty((n, 3, self.height, self.width), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer
@@ -0,0 +1,76 @@
+"""
+Florence-2 Model Variants - which exported graphs to load
+An exported model directory can hold several quantizations of the same four
+graphs (onnx/<graph>_q4.onnx, _int8, _fp16, ...; no suffix = fp32). The
+variant benchmark (benchmarks/florence_variants.py) measures latency, peak
+memory and box recall of each variant / thread setting on golden screenshots;
+select_variant() picks the fastest one that meets the accuracy floor.
+"""
+import os
+import json
+import logging
+from typing import Dict, Any, List, Optional
+
+from services.florence_onnx import GRAPHS
+
+logger = logging.getLogger(__name__)
+
+
+def available_variants(model_dir: str) -> List[str]:
+    """Variants with all four graphs present ("" = unsuffixed fp32 export)"""
+    onnx_dir = os.path.join(model_dir, "onnx")
+    if not os.path.isdir(onnx_dir):
+        return []
+    prefix = GRAPHS[0]
+    variants = []
+    for name in sorted(os.listdir(onnx_dir)):
+        if not name.startswith(prefix) or not name.endswith(".onnx"):
+            continue
+        variant = name[len(prefix):-len(".onnx")].lstrip("_")
+        suffix = f"_{variant}" if variant else ""
+        if all(os.path.exists(os.path.join(onnx_dir, f"{graph}{suffix}.onnx")) for graph in GRAPHS):
+            variants.append(variant)
+    return variants
+
+
+def load_report(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"⚠️ [VISION] Unreadable variant benchmark report {path}: {e}")
+        return None
+
+
+def select_variant(
+    report: Dict[str, Any],
+    available: List[str],
+    min_recall: float = 0.0,
+    max_rss_mb: float = 0.0
+) -> Optional[Dict[str, Any]]:
+    """
+    Fastest (p95 latency) benchmarked setting that is installed, reaches
+    min_recall and stays under max_rss_mb (0 = no memory limit).
+
+    Returns:
+        {"variant", "intra_op_threads", "p95_ms", "recall", "peak_rss_mb"} or None
+    """
+    candidates = [
+        r for r in report.get("results", [])
+        if not r.get("error")
+        and r.get("variant") in available
+        and (r.get("recall") or 0.0) >= min_recall
+        and (not max_rss_mb or (r.get("peak_rss_mb") or 0.0) <= max_rss_mb)
+    ]
+    if not candidates:
+        return None
+    best = min(candidates, key=lambda r: (r["latency_ms"]["p95"], -(r.get("recall") or 0.0)))
+    return {
+        "variant": best["variant"],
+        "intra_op_threads": int(best.get("intra_op_threads") or 0),
+        "p95_ms": best["latency_ms"]["p95"],
+        "recall": best.get("recall"),
+        "peak_rss_mb": best.get("peak_rss_mb")
+    }
@@ -1,7 +1,22 @@
 from dataclasses import dataclass
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List, Any, Optional
+import os
 import re
 
+import numpy as np
+
+from services.box_merge import xyxy
+
+# Base lattice shared by DOM collection, vision, scene building and click_cell
+GRID_ROWS = int(os.environ.get('GRID_ROWS', '24'))
+GRID_COLS = int(os.environ.get('GRID_COLS', '16'))
+# Cells holding more element centers than this are split into quadrants (C7 -> C7.1 .. C7.4)
+GRID_MAX_PER_CELL = int(os.environ.get('GRID_MAX_PER_CELL', '1'))
+# Quadrant levels below a base cell (0 = fixed lattice)
+GRID_MAX_DEPTH = int(os.environ.get('GRID_MAX_DEPTH', '2'))
+# Never split below this sub-cell size, viewport pixels
+GRID_MIN_CELL_PX = float(os.environ.get('GRID_MIN_CELL_PX', '12'))
+
 LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
 
 def index_to_col_letters(index: int) -> str:
@@ -26,35 +41,45 @@ def col_letters_to_index(s: str) -> int:
         n = n * 26 + (ord(ch) - ord('A') + 1)
     return n - 1
 
-CELL_RE = re.compile(r"^[A-Z]{1,2}[0-9]{1,2}$")
+# Base cell ("C7", "AA12") optionally followed by quadrants ("C7.2", "C7.2.4")
+CELL_RE = re.compile(r"^[A-Z]{1,2}[0-9]{1,3}(\.[1-4])*$")
+
+def parse_cell(cell: str) -> Tuple[int, int, List[int]]:
+    """"C7.2" -> (col index, row index, [2]); quadrants 1..4 = top-left, top-right, bottom-left, bottom-right"""
+    base, *quadrants = cell.strip().upper().split(".")
+    # split letters and numbers
+    i = 0
+    while i < len(base) and base[i].isalpha():
+        i += 1
+    try:
+        row_num = int(base[i:])
+    except Exception:
+        row_num = 1
+    return col_letters_to_index(base[:i]), row_num - 1, [int(q) for q in quadrants if q in ("1", "2", "3", "4")]
 
 @dataclass
 class GridConfig:
-    rows: int = 12
-    cols: int = 8
+    rows: int = GRID_ROWS
+    cols: int = GRID_COLS
 
     def cell_size(self, viewport_w: int, viewport_h: int) -> Tuple[float, float]:
         return viewport_w / self.cols, viewport_h / self.rows
 
+    def cell_bbox(self, cell: str, viewport_w: int, viewport_h: int) -> Tuple[float, float, float, float]:
+        """(x, y, w, h) of a base cell or sub-cell; sub-cell geometry needs no element data"""
+        col_index, row_index, quadrants = parse_cell(cell)
+        w, h = self.cell_size(viewport_w, viewport_h)
+        x, y = col_index * w, row_index * h
+        for q in quadrants:
+            w, h = w / 2, h / 2
+            x += ((q - 1) & 1) * w
+            y += ((q - 1) >> 1) * h
+        return x, y, w, h
+
     def cell_to_xy(self, cell: str, viewport_w: int, viewport_h: int) -> Tuple[int, int]:
-        # Cell like "A1" or "AA12"
-        cell = cell.strip().upper()
-        # split letters and numbers
-        i = 0
-        while i < len(cell) and cell[i].isalpha():
-            i += 1
-        letters = cell[:i]
-        row_part = cell[i:]
-        try:
-            row_num = int(row_part)
-        except Exception:
-            row_num = 1
-        col_index = col_letters_to_index(letters)
-        row_index = row_num - 1
-        cw, ch = self.cell_size(viewport_w, viewport_h)
-        x = int((col_index + 0.5) * cw)
-        y = int((row_index + 0.5) * ch)
-        return x, y
+        # Cell like "A1", "AA12" or sub-cell "C7.2"
+        x, y, w, h = self.cell_bbox(cell, viewport_w, viewport_h)
+        return int(x + w / 2), int(y + h / 2)
 
     def xy_to_cell(self, x: int, y: int, viewport_w: int, viewport_h: int) -> str:
         cw, ch = self.cell_size(viewport_w, viewport_h)
@@ -67,3 +92,99 @@ class GridConfig:
         x = bbox.get('x', 0) + bbox.get('w', 0) / 2
         y = bbox.get('y', 0) + bbox.get('h', 0) / 2
         return self.xy_to_cell(x, y, viewport_w, viewport_h)
+
+    def bboxes_to_cells(self, bboxes: Any, viewport_w: int, viewport_h: int) -> List[str]:
+        """Base cells of many bboxes ({x, y, w, h} dicts, [x1, y1, x2, y2] lists or an [N, 4] array) at once"""
+        return GridIndex(self, viewport_w, viewport_h, bboxes, max_depth=0).cells
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rows": self.rows, "cols": self.cols, "max_depth": GRID_MAX_DEPTH, "max_per_cell": GRID_MAX_PER_CELL}
+
+
+class GridIndex:
+    """
+    Adaptive cells for one frame: the GridConfig lattice, with every cell holding
+    more than max_per_cell element centers split into quadrants (C7 -> C7.1 .. C7.4),
+    recursively up to max_depth. Sub-cell geometry depends only on the grid and
+    viewport, so GridConfig.cell_to_xy() resolves any address without the index.
+    - cells[i]: cell address of element i
+    - elements(cell): indices of the elements in a cell (dict lookup)
+    - cell_at(x, y): deepest cell of this index containing a point
+    """
+
+    def __init__(
+        self,
+        config: GridConfig,
+        viewport_w: int,
+        viewport_h: int,
+        bboxes: Any,
+        max_per_cell: int = GRID_MAX_PER_CELL,
+        max_depth: int = GRID_MAX_DEPTH,
+        min_cell_px: float = GRID_MIN_CELL_PX
+    ):
+        self.config = config
+        self.viewport = (viewport_w, viewport_h)
+        boxes = bboxes if isinstance(bboxes, np.ndarray) else xyxy(list(bboxes))
+        cw, ch = config.cell_size(viewport_w, viewport_h)
+        cx = np.clip((boxes[:, 0] + boxes[:, 2]) / 2, 0, None)
+        cy = np.clip((boxes[:, 1] + boxes[:, 3]) / 2, 0, None)
+        col = np.minimum((cx // cw).astype(np.int64), config.cols - 1)
+        row = np.minimum((cy // ch).astype(np.int64), config.rows - 1)
+
+        # One base-5 digit per level: 0 = not split, 1..4 = quadrant
+        key = row * config.cols + col
+        x0, y0 = col * cw, row * ch
+        levels = 0
+        for level in range(max_depth):
+            w, h = cw / 2 ** (level + 1), ch / 2 ** (level + 1)
+            if min(w, h) < min_cell_px or not len(key):
+                break
+            _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+            split = counts[inverse] > max_per_cell
+            if not split.any():
+                break
+            right = cx >= x0 + w
+            below = cy >= y0 + h
+            x0 = np.where(split & right, x0 + w, x0)
+            y0 = np.where(split & below, y0 + h, y0)
+            key = key * 5 + np.where(split, 1 + right + 2 * below, 0)
+            levels += 1
+
+        keys, inverse = np.unique(key, return_inverse=True)
+        labels = [self._address(int(k), levels) for k in keys.tolist()]
+        self.cells: List[str] = [labels[i] for i in inverse.tolist()]
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.cumsum(np.bincount(inverse, minlength=len(keys)))[:-1]
+        self._members: Dict[str, List[int]] = {
+            label: group.tolist() for label, group in zip(labels, np.split(order, bounds))
+        }
+        # Cells that were split, so cell_at() knows where to descend
+        self.split = {label.rsplit(".", depth)[0] for label in labels for depth in range(1, label.count(".") + 1)}
+
+    def elements(self, cell: str) -> List[int]:
+        return self._members.get(cell.strip().upper(), [])
+
+    def cell_map(self, ids: Optional[List[Any]] = None) -> Dict[str, List[Any]]:
+        """cell -> element indices (or the given ids of those elements)"""
+        if ids is None:
+            return {cell: list(members) for cell, members in self._members.items()}
+        return {cell: [ids[i] for i in members] for cell, members in self._members.items()}
+
+    def cell_at(self, x: float, y: float) -> str:
+        cell = self.config.xy_to_cell(x, y, *self.viewport)
+        while cell in self.split:
+            cx, cy, w, h = self.config.cell_bbox(cell, *self.viewport)
+            cell = f"{cell}.{1 + int(x >= cx + w / 2) + 2 * int(y >= cy + h / 2)}"
+        return cell
+
+    def _address(self, key: int, levels: int) -> str:
+        digits = []
+        for _ in range(levels):
+            key, digit = divmod(key, 5)
+            digits.append(digit)
+        row, col = divmod(key, self.config.cols)
+        return f"{index_to_col_letters(col)}{row + 1}" + "".join(f".{d}" for d in reversed(digits) if d)
+
+
+# Global instance: the grid definition every component addresses cells with
+grid_config = GridConfig()
@@ -0,0 +1,314 @@
+"""
+Grounding Cache Service - remembered answers of LLM element lookups and verdicts
+When the heuristics are unsure, TacticalBrain, the supervisor and Verification
+ask a remote model which element to use (or whether a step worked). The same
+site, step and element layout come back across jobs, so the answer is cached:
+
+    key = (URL pattern, step, element-set signature)
+
+- URL pattern: host + path with ids (numbers, hex, uuids) replaced by "*"
+- step: action / field / target (or goal and mode for the supervisor)
+- element-set signature: hash of the page's (type, label) multiset, so the
+  same layout matches even when boxes and cells moved
+
+Verdicts (verify_step, validator) also depend on what the page says, not only
+on its elements: their step part carries evidence_digest() of the page errors,
+success messages, page type and, for screenshot verdicts, the frame, so a new
+validation error next to the same buttons does not replay an old SUCCESS.
+
+An element answer is stored as the chosen element's signature (type, role,
+label, occurrence), not its cell, and resolved against the current elements
+on a hit. Entries live in memory and in Mongo (collection grounding_cache),
+expire after GROUNDING_CACHE_TTL_S and are dropped when they turn out wrong:
+an element answer whose step fails verification, a validator verdict whose
+follow-up fails, a step verdict the run's goal check contradicts.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+from services.element_matcher import normalize
+
+logger = logging.getLogger(__name__)
+
+# Master switch
+GROUNDING_CACHE_ENABLED = os.environ.get('GROUNDING_CACHE_ENABLED', 'true').lower() == 'true'
+# Entry lifetime, seconds (7 days)
+GROUNDING_CACHE_TTL_S = int(os.environ.get('GROUNDING_CACHE_TTL_S', '604800'))
+# Answers below this confidence are not remembered
+GROUNDING_CACHE_MIN_CONFIDENCE = float(os.environ.get('GROUNDING_CACHE_MIN_CONFIDENCE', '0.5'))
+# Entries kept in process (Mongo holds the rest)
+GROUNDING_CACHE_MEMORY_SIZE = int(os.environ.get('GROUNDING_CACHE_MEMORY_SIZE', '2048'))
+
+COLLECTION = "grounding_cache"
+
+# Path segments that are ids, not structure
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-f]{8,}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})$', re.I)
+
+
+def url_pattern(url: Optional[str]) -> str:
+    """host/path with id segments as "*"; query, fragment and scheme dropped"""
+    if not url:
+        return ""
+    parts = urlsplit(url if "//" in url else f"//{url}")
+    segments = ["*" if _ID_SEGMENT.match(s) else s.lower() for s in parts.path.split("/") if s]
+    return "/".join([(parts.hostname or "").lower()] + segments)
+
+
+def _element_key(el: Dict[str, Any]) -> str:
+    return f"{str(el.get('type') or '').lower()}|{str(el.get('role') or '').lower()}|{normalize(el.get('label'))}"
+
+
+def element_set_signature(elements: List[Dict[str, Any]]) -> str:
+    """Order- and position-independent hash of the page's elements"""
+    lines = sorted(_element_key(el) for el in elements or [])
+    return hashlib.blake2b("\n".join(lines).encode(), digest_size=12).hexdigest()
+
+
+def element_signature(element: Dict[str, Any], elements: List[Dict[str, Any]]) -> str:
+    """type|role|label|n - n counts earlier elements with the same type, role and label"""
+    key = _element_key(element)
+    n = 0
+    for el in elements:
+        if el is element:
+            break
+        if _element_key(el) == key:
+            n += 1
+    return f"{key}|{n}"
+
+
+def resolve_element(signature: str, elements: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """The element of elements with this signature, if the page still has it"""
+    key, _, n = signature.rpartition("|")
+    n = int(n or 0)
+    for el in elements:
+        if _element_key(el) == key:
+            if n == 0:
+                return el
+            n -= 1
+    return None
+
+
+def evidence_digest(page_analysis: Optional[Dict[str, Any]] = None, frame: Optional[str] = None) -> str:
+    """Hash of a verdict's evidence beyond the element layout (page errors, success messages, page type, frame digest)"""
+    analysis = page_analysis or {}
+    raw = json.dumps([
+        sorted(normalize(e) for e in analysis.get("errors") or []),
+        sorted(normalize(m) for m in analysis.get("success_messages") or []),
+        analysis.get("page_type"),
+        frame
+    ], default=str)
+    return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+
+def step_key(step: Dict[str, Any]) -> Dict[str, Any]:
+    """Parts of a plan step that decide which element / verdict it needs"""
+    return {
+        "action": str(step.get("action") or "").upper(),
+        "field": step.get("field"),
+        "target": step.get("target"),
+        "description": step.get("description"),
+        "expected_outcome": step.get("expected_outcome")
+    }
+
+
+class GroundingCacheService:
+    """
+    lookup() / store() by (kind, url, step, elements); kind separates the callers
+    ("element", "verify_step", "next_step"). A decision built from an entry
+    carries {"grounding": {"key", "cached"}}; report() it with the verification
+    outcome so failed groundings are forgotten.
+    """
+
+    def __init__(self):
+        self.enabled = GROUNDING_CACHE_ENABLED
+        self.db = None
+        self._db_failed = False
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,  # entry found, element no longer on the page
+            "stores": 0,
+            "invalidations": 0,
+            "llm_calls_saved": 0,
+            "latency_saved_ms": 0.0,
+            "by_kind": {}
+        }
+
+    async def initialize(self):
+        """Use the shared MongoDB connection; memory only when it is unavailable"""
+        if self.db is not None or self._db_failed:
+            return
+        try:
+            from server import db as shared_db
+            await shared_db[COLLECTION].create_index("expires_at", expireAfterSeconds=0)
+            self.db = shared_db
+            logger.info("✅ Grounding cache initialized (using shared MongoDB client)")
+        except Exception as e:
+            self._db_failed = True
+            logger.warning(f"⚠️ [GROUNDING] MongoDB unavailable, caching in memory only: {e}")
+
+    def make_key(self, kind: str, url: Optional[str], step: Dict[str, Any], elements: List[Dict[str, Any]]) -> str:
+        raw = json.dumps([kind, url_pattern(url), step, element_set_signature(elements)], sort_keys=True, default=str)
+        return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+    async def lookup(
+        self,
+        kind: str,
+        url: Optional[str],
+        step: Dict[str, Any],
+        elements: List[Dict[str, Any]]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cached entry ({key, result, confidence, llm_ms, ...}) or None. Element
+        answers come back resolved: entry["element"] is the matching element of
+        `elements`.
+        """
+        if not self.enabled:
+            return None
+        key = self.make_key(kind, url, step, elements)
+        self.stats["lookups"] += 1
+        entry = await self._get(key)
+        kind_stats = self.stats["by_kind"].setdefault(kind, {"hits": 0, "misses": 0})
+        if entry and entry.get("element_signature"):
+            element = resolve_element(entry["element_signature"], elements)
+            if element is None:
+                self.stats["stale"] += 1
+                entry = None
+            else:
+                entry = {**entry, "element": element}
+        if entry:
+            entry = {**entry, "key": key}
+        else:
+            self.stats["misses"] += 1
+            kind_stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.stats["llm_calls_saved"] += 1
+        self.stats["latency_saved_ms"] += entry.get("llm_ms", 0.0)
+        kind_stats["hits"] += 1
+        await self._touch(key)
+        logger.info(f"🎯 [GROUNDING] Cache hit ({kind}) on {entry.get('url_pattern')}, saved ~{entry.get('llm_ms', 0):.0f}ms")
+        return entry
+
+    async def store(
+        self,
+        kind: str,
+        url: Optional[str],
+        step: Dict[str, Any],
+        elements: List[Dict[str, Any]],
+        element: Optional[Dict[str, Any]] = None,
+        result: Optional[Dict[str, Any]] = None,
+        confidence: float = 1.0,
+        llm_ms: float = 0.0
+    ) -> Optional[str]:
+        """Remember an answer (the chosen element of `elements` and/or a result dict); returns its key"""
+        if not self.enabled or confidence < GROUNDING_CACHE_MIN_CONFIDENCE:
+            return None
+        key = self.make_key(kind, url, step, elements)
+        now = datetime.now(timezone.utc)
+        entry = {
+            "_id": key,
+            "kind": kind,
+            "url_pattern": url_pattern(url),
+            "step": step,
+            "element_signature": element_signature(element, elements) if element is not None else None,
+            "result": result,
+            "confidence": confidence,
+            "llm_ms": round(llm_ms, 1),
+            "hits": 0,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=GROUNDING_CACHE_TTL_S)
+        }
+        self._remember(key, entry)
+        self.stats["stores"] += 1
+        await self.initialize()
+        if self.db is not None:
+            try:
+                await self.db[COLLECTION].replace_one({"_id": key}, entry, upsert=True)
+            except Exception as e:
+                logger.warning(f"⚠️ [GROUNDING] Failed to persist entry: {e}")
+        return key
+
+    async def invalidate(self, key: str) -> bool:
+        existed = self._memory.pop(key, None) is not None
+        await self.initialize()
+        if self.db is not None:
+            try:
+                result = await self.db[COLLECTION].delete_one({"_id": key})
+                existed = existed or result.deleted_count > 0
+            except Exception as e:
+                logger.warning(f"⚠️ [GROUNDING] Failed to delete entry: {e}")
+        if existed:
+            self.stats["invalidations"] += 1
+            logger.info(f"🗑️ [GROUNDING] Invalidated {key}")
+        return existed
+
+    async def report(self, grounding: Optional[Dict[str, Any]], success: bool):
+        """Verification outcome of a step decided from a grounding: failures drop the entry"""
+        if grounding and grounding.get("key") and not success:
+            await self.invalidate(grounding["key"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "persistent": self.db is not None,
+            **self.stats,
+            "latency_saved_ms": round(self.stats["latency_saved_ms"], 1),
+            "hit_ratio": round(self.stats["hits"] / self.stats["lookups"], 3) if self.stats["lookups"] else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+    # ----- internals -----
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > GROUNDING_CACHE_MEMORY_SIZE:
+            self._memory.popitem(last=False)
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            await self.initialize()
+            if self.db is None:
+                return None
+            try:
+                entry = await self.db[COLLECTION].find_one({"_id": key})
+            except Exception as e:
+                logger.warning(f"⚠️ [GROUNDING] Lookup failed: {e}")
+                return None
+            if entry is None:
+                return None
+            self._remember(key, entry)
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at.tzinfo is None:
+            # Mongo returns naive UTC datetimes
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at is not None and expires_at < datetime.now(timezone.utc):
+            self._memory.pop(key, None)
+            return None
+        self._memory.move_to_end(key)
+        return entry
+
+    async def _touch(self, key: str):
+        entry = self._memory.get(key)
+        if entry is not None:
+            entry["hits"] = entry.get("hits", 0) + 1
+        if self.db is not None:
+            try:
+                await self.db[COLLECTION].update_one({"_id": key}, {"$inc": {"hits": 1}, "$set": {"last_hit": datetime.now(timezone.utc)}})
+            except Exception as e:
+                logger.warning(f"⚠️ [GROUNDING] Failed to record hit: {e}")
+
+
+# Global instance
+grounding_cache_service = GroundingCacheService()
@@ -0,0 +1,281 @@
+"""
+Local OCR Service - on-demand text reading with Florence-2, cached per region
+Reads text the DOM does not expose (canvas labels, text in images, rendered
+banners) from a screenshot region before anyone escalates to a remote VLM.
+Results are cached by a hash of the cropped pixels, so the same banner or
+label is read once even when it shows up in new frames or at other offsets.
+Decoding, cropping and hashing run in a worker thread, and a frame is decoded
+once however many of its regions are read.
+"""
+import io
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, Optional, Tuple, Union
+
+from services.byte_lru import ByteBudgetLRU
+from services.screenshot_store import screenshot_store, ScreenshotRef
+from services.vision_executor import vision_executor, VisionBusy, VisionCancelled
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+# Budget of cached OCR results (keyed by crop pixels)
+OCR_CACHE_MAX_MB = float(os.environ.get('OCR_CACHE_MAX_MB', '4'))
+# Time budget of one read (queue wait + run), seconds
+OCR_DEADLINE_S = float(os.environ.get('OCR_DEADLINE_S', '8'))
+# Crops smaller than this (either side, pixels) hold no readable text
+OCR_MIN_SIDE_PX = int(os.environ.get('OCR_MIN_SIDE_PX', '8'))
+
+# Regions read per perception state (largest first)
+OCR_MAX_REGIONS = int(os.environ.get('OCR_MAX_REGIONS', '4'))
+
+# (frame digest, region, mode) -> (crop hash, offset, scale) aliases; tiny entries
+ALIAS_ENTRY_BYTES = 96
+RESULT_OVERHEAD_BYTES = 256
+
+Region = Dict[str, int]
+
+
+def _result_size(result: Dict[str, Any]) -> int:
+    return RESULT_OVERHEAD_BYTES + len(result.get("text", "")) * 2 + 96 * len(result.get("lines", []))
+
+
+def _empty(reason: str, region: Optional[Region] = None) -> Dict[str, Any]:
+    return {"text": "", "lines": [], "available": False, "cached": False, "region": region, "reason": reason}
+
+
+class LocalOcrService:
+    """
+    Local OCR on screenshot regions.
+    - read_text(session_id, region): text in a viewport rect of the session's latest
+      (or the given) screenshot; {"available": False} means: fall back to a remote model
+    - with_regions=True also returns text lines with viewport bboxes
+    """
+
+    def __init__(self, max_bytes: int = int(OCR_CACHE_MAX_MB * 1024 * 1024)):
+        self._results = ByteBudgetLRU(max_bytes, sizeof=_result_size)
+        self._aliases = ByteBudgetLRU(max(ALIAS_ENTRY_BYTES, max_bytes // 8), sizeof=lambda _: ALIAS_ENTRY_BYTES)
+        self.stats = {"requests": 0, "ocr_runs": 0, "unavailable": 0, "failed": 0, "ocr_ms_total": 0.0}
+
+    async def read_text(
+        self,
+        session_id: Optional[str],
+        region: Optional[Region] = None,
+        screenshot: Union[ScreenshotRef, Dict[str, Any], bytes, None] = None,
+        viewport: Optional[Tuple[int, int]] = None,
+        with_regions: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Read text in a region of a frame.
+
+        Args:
+            session_id: session whose latest screenshot is used when screenshot is None
+            region: viewport rect {x, y, w, h}; None = whole frame
+            screenshot: ScreenshotRef / ref dict / raw bytes
+            viewport: (width, height) in CSS pixels when the screenshot is scaled
+            with_regions: also return lines [{text, bbox}] (bbox in viewport pixels)
+
+        Returns:
+            {text, lines, available, cached, region}
+        """
+        unavailable = self._unavailable(region)
+        if unavailable:
+            return unavailable
+        frame, digest = self._frame(session_id, screenshot)
+        if frame is None:
+            return _empty("no screenshot", region)
+        return await self._read(session_id, frame, digest, region, viewport, with_regions, {})
+
+    async def _read(
+        self,
+        session_id: Optional[str],
+        frame: bytes,
+        digest: Optional[str],
+        region: Optional[Region],
+        viewport: Optional[Tuple[int, int]],
+        with_regions: bool,
+        decoded: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """read_text() for one region; decoded memoizes the frame's decoded image across regions"""
+        from services.local_vision_service import local_vision_service
+
+        self.stats["requests"] += 1
+        mode = "lines" if with_regions else "text"
+        region_key = tuple((region or {}).get(k) for k in ("x", "y", "w", "h"))
+        alias = (digest, region_key, viewport, mode) if digest else None
+        # Same frame and region as before: skip decoding and hashing the crop
+        placed = self._aliases.get(alias) if alias else None
+        cached = self._results.get(placed[0]) if placed else None
+        hit = cached is not None
+
+        if cached is None:
+            try:
+                crop, offset, scale, crop_hash = await asyncio.to_thread(self._prepare, frame, decoded, region, viewport, mode)
+            except Exception as e:
+                logger.warning(f"⚠️ [OCR] Could not crop region {region}: {e}")
+                return _empty("bad region", region)
+            if crop is None:
+                return {"text": "", "lines": [], "available": True, "cached": False, "region": region}
+            placed = (crop_hash, offset, scale)
+            if alias:
+                self._aliases.put(alias, placed)
+            cached = self._results.get(crop_hash)
+            hit = cached is not None
+            if cached is None:
+                started = time.perf_counter()
+                try:
+                    cached = await vision_executor.run(
+                        lambda image, cancel: local_vision_service.ocr_image(image, with_regions, cancel),
+                        crop, session_id=session_id, deadline_s=OCR_DEADLINE_S
+                    )
+                except (VisionBusy, VisionCancelled) as e:
+                    self.stats["unavailable"] += 1
+                    return _empty(str(e), region)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    logger.error(f"❌ [OCR] Read failed: {e}")
+                    return _empty("ocr failed", region)
+                elapsed = (time.perf_counter() - started) * 1000
+                self.stats["ocr_runs"] += 1
+                self.stats["ocr_ms_total"] += elapsed
+                # Line boxes are cached relative to the crop, so a hit at another offset maps correctly
+                self._results.put(crop_hash, cached)
+                logger.info(f"🔤 [OCR] Read {len(cached['text'])} chars from {crop.size[0]}x{crop.size[1]} crop in {elapsed:.0f}ms")
+
+        _, (ox, oy), (sx, sy) = placed
+        lines = [
+            {
+                "text": line["text"],
+                "bbox": {
+                    "x": int((line["bbox"]["x"] + ox) * sx),
+                    "y": int((line["bbox"]["y"] + oy) * sy),
+                    "w": max(1, int(line["bbox"]["w"] * sx)),
+                    "h": max(1, int(line["bbox"]["h"] * sy))
+                }
+            }
+            for line in cached.get("lines", [])
+        ]
+        return {"text": cached["text"], "lines": lines, "available": True, "cached": hit, "region": region}
+
+    async def read_perception(
+        self,
+        perception: Dict[str, Any],
+        with_regions: bool = False,
+        include_changes: bool = False,
+        limit: int = OCR_MAX_REGIONS
+    ) -> Dict[str, Any]:
+        """
+        Text the DOM cannot provide for a perception state: OCR of its blind regions
+        (canvas, iframe, svg, image buttons) and, with include_changes, of the
+        regions that changed since the previous frame (banners, toasts).
+
+        Returns:
+            {text, lines, available, regions}; available False = no local answer
+        """
+        frame = perception.get("screenshot_ref")
+        viewport = tuple(perception.get("viewport") or ()) or None
+        regions = [
+            {k: int(r[k]) for k in ("x", "y", "w", "h")}
+            for r in (perception.get("dom_data") or {}).get("blind") or []
+        ]
+        change = perception.get("visual_change") or {}
+        if include_changes and change.get("regions") and frame and viewport:
+            # Visual diff regions are in image pixels
+            sx, sy = viewport[0] / max(1, frame.get("width") or viewport[0]), viewport[1] / max(1, frame.get("height") or viewport[1])
+            regions += [
+                {"x": int(r["x"] * sx), "y": int(r["y"] * sy), "w": int(r["w"] * sx), "h": int(r["h"] * sy)}
+                for r in change["regions"]
+            ]
+        if not frame or not regions or self._unavailable():
+            return {"text": "", "lines": [], "available": False, "regions": 0}
+        frame_bytes, digest = self._frame(None, frame)
+        if frame_bytes is None:
+            return {"text": "", "lines": [], "available": False, "regions": 0}
+        # Largest regions first; small ones rarely hold the text callers look for
+        regions = sorted(regions, key=lambda r: r["w"] * r["h"], reverse=True)[:limit]
+        texts, lines, available = [], [], False
+        decoded: Dict[str, Any] = {}
+        for region in regions:
+            result = await self._read(perception.get("session_id"), frame_bytes, digest, region, viewport, with_regions, decoded)
+            if not result["available"]:
+                continue
+            available = True
+            if result["text"]:
+                texts.append(result["text"])
+            lines += result["lines"]
+        return {"text": "\n".join(texts), "lines": lines, "available": available, "regions": len(regions)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        runs = self.stats["ocr_runs"]
+        return {
+            **{k: v for k, v in self.stats.items() if k != "ocr_ms_total"},
+            "avg_ocr_ms": round(self.stats["ocr_ms_total"] / runs, 1) if runs else None,
+            "cache": self._results.stats(),
+            "aliases": self._aliases.stats()
+        }
+
+    # ----- internals -----
+
+    def _unavailable(self, region: Optional[Region] = None) -> Optional[Dict[str, Any]]:
+        """Empty result when no local read is possible (PIL missing, model not loaded yet)"""
+        from services.local_vision_service import local_vision_service
+
+        if Image is None:
+            self.stats["unavailable"] += 1
+            return _empty("PIL not installed", region)
+        if not local_vision_service.ready:
+            # Never load the model on the caller's path; report and let it fall back
+            local_vision_service.start_preload()
+            self.stats["unavailable"] += 1
+            return _empty(f"vision model {local_vision_service.readiness['state']}", region)
+        return None
+
+    def _frame(self, session_id: Optional[str], screenshot: Any) -> Tuple[Optional[bytes], Optional[str]]:
+        """Raw image bytes and their digest (digest None for unstored bytes)"""
+        if isinstance(screenshot, (bytes, bytearray)):
+            return bytes(screenshot), hashlib.blake2b(screenshot, digest_size=16).hexdigest()
+        ref = screenshot
+        if ref is None and session_id:
+            ref = screenshot_store.latest(session_id)
+        if ref is None:
+            return None, None
+        digest = ref.digest if isinstance(ref, ScreenshotRef) else ref.get("digest")
+        return screenshot_store.get_bytes(ref), digest
+
+    def _prepare(self, frame: bytes, decoded: Dict[str, Any], region: Optional[Region],
+                 viewport: Optional[Tuple[int, int]], mode: str):
+        """
+        (crop, offset, scale, crop hash) for a region - CPU work, run in a worker thread.
+        The frame is decoded into decoded["image"] on first use; crop is None when too small to read.
+        """
+        image = decoded.get("image")
+        if image is None:
+            image = decoded["image"] = Image.open(io.BytesIO(frame)).convert("RGB")
+        crop, offset, scale = self._crop(image, region, viewport)
+        if crop.size[0] < OCR_MIN_SIDE_PX or crop.size[1] < OCR_MIN_SIDE_PX:
+            return None, offset, scale, None
+        crop_hash = f"{hashlib.blake2b(crop.tobytes(), digest_size=16).hexdigest()}:{crop.size[0]}x{crop.size[1]}:{mode}"
+        return crop, offset, scale, crop_hash
+
+    def _crop(self, image, region: Optional[Region], viewport: Optional[Tuple[int, int]]):
+        """(crop image, crop offset in image pixels, image->viewport scale) of a decoded frame"""
+        sx = viewport[0] / image.size[0] if viewport else 1.0
+        sy = viewport[1] / image.size[1] if viewport else 1.0
+        if not region:
+            return image, (0, 0), (sx, sy)
+        x0 = max(0, int(region["x"] / sx))
+        y0 = max(0, int(region["y"] / sy))
+        x1 = min(image.size[0], int((region["x"] + region["w"]) / sx))
+        y1 = min(image.size[1], int((region["y"] + region["h"]) / sy))
+        return image.crop((x0, y0, max(x0, x1), max(y0, y1))), (x0, y0), (sx, sy)
+
+
+# Global instance
+local_ocr_service = LocalOcrService()
@@ -2,7 +2,11 @@ import os
 import base64
 import logging
 import io
-from typing import List, Dict, Optional
+import math
+import time
+import asyncio
+import threading
+from typing import List, Dict, Optional, Tuple, Union
 import numpy as np
 
 logger = logging.getLogger(__name__)
@@ -18,16 +22,42 @@ except Exception as e:
     Image = None
     AutoProcessor = None
 
-from .grid_service import GridConfig
+from .grid_service import GridConfig, grid_config
+from .vision_executor import vision_executor, VisionBusy, VisionCancelled, CancelToken
+from .florence_onnx import Florence2OnnxPipeline, EncoderBatcher, FLORENCE_BATCH_MAX
+from .vision_roi import select_regions, sample_size
+from .florence_preprocess import FlorencePreprocessor, FLORENCE_FAST_PREPROCESS
+from .florence_variants import available_variants, load_report, select_variant
+from .element_set import ElementSet
+from .vision_result_cache import vision_result_cache, screenshot_digest as compute_digest
 
 # Florence-2 model path
-FLORENCE_MODEL_DIR = "/app/backend/onnx_models/florence-2-base"
-FLORENCE_VISION_ENCODER = os.path.join(FLORENCE_MODEL_DIR, "onnx/vision_encoder_q4.onnx")
-FLORENCE_ENCODER = os.path.join(FLORENCE_MODEL_DIR, "onnx/encoder_model_q4.onnx")
+FLORENCE_MODEL_DIR = os.environ.get('FLORENCE_MODEL_DIR', "/app/backend/onnx_models/florence-2-base")
+# Quantization suffix of the exported graphs (q4 -> onnx/<graph>_q4.onnx, empty -> onnx/<graph>.onnx);
+# "auto" picks the fastest variant of the benchmark report that meets FLORENCE_MIN_RECALL
+FLORENCE_VARIANT = os.environ.get('FLORENCE_VARIANT', 'q4')
+# Output of benchmarks/florence_variants.py (used by FLORENCE_VARIANT=auto)
+FLORENCE_VARIANT_REPORT = os.environ.get('FLORENCE_VARIANT_REPORT', os.path.join(FLORENCE_MODEL_DIR, "variant_benchmark.json"))
+FLORENCE_MIN_RECALL = float(os.environ.get('FLORENCE_MIN_RECALL', '0.8'))
+# Peak RSS limit for auto selection, MB (0 = no limit)
+FLORENCE_MAX_RSS_MB = float(os.environ.get('FLORENCE_MAX_RSS_MB', '0'))
+# Used by auto when there is no report or no benchmarked variant qualifies
+FLORENCE_DEFAULT_VARIANT = 'q4'
+# <OD> (objects with boxes) or <OCR_WITH_REGION> (text lines with boxes)
+FLORENCE_TASK = os.environ.get('FLORENCE_TASK', '<OD>')
 
-logger.info(f"🔧 [VISION] Florence-2 paths configured:")
-logger.info(f"  Vision Encoder: {FLORENCE_VISION_ENCODER}")
-logger.info(f"  Encoder: {FLORENCE_ENCODER}")
+logger.info(f"🔧 [VISION] Florence-2 configured: {FLORENCE_MODEL_DIR} (variant: {FLORENCE_VARIANT or 'fp32'})")
+
+# Florence-2 gives no per-box score; visual-only finds rank below DOM elements
+FLORENCE_CONFIDENCE = 0.6
+# Load and warm up Florence-2 in the background at startup (otherwise on first use)
+FLORENCE_PRELOAD = os.environ.get('FLORENCE_PRELOAD', 'true').lower() == 'true'
+# Tokens generated by the warm-up run (enough to touch every decoder kernel)
+FLORENCE_WARMUP_TOKENS = int(os.environ.get('FLORENCE_WARMUP_TOKENS', '8'))
+# A failed load is retried by the next observation after this many seconds
+FLORENCE_PRELOAD_RETRY_S = float(os.environ.get('FLORENCE_PRELOAD_RETRY_S', '300'))
+# Run Florence-2 only on regions DOM clickables do not cover (see vision_roi)
+VISION_ROI_ENABLED = os.environ.get('VISION_ROI_ENABLED', 'true').lower() == 'true'
 
 class LocalVisionService:
     """
@@ -37,15 +67,105 @@ class LocalVisionService:
     It maps detections to grid cells.
     """
     def __init__(self):
-        self.grid = GridConfig(rows=12, cols=8)
+        self.grid = grid_config
         self.vision_session = None
         self.encoder_session = None
         self.processor = None
+        # NumPy resize/normalize + pre-tokenized prompts (None = generic processor path)
+        self.preprocessor: Optional[FlorencePreprocessor] = None
+        self.pipeline: Optional[Florence2OnnxPipeline] = None
+        # Stacks encoder runs of concurrent detections (different sessions) into one batch
+        self.batcher: Optional[EncoderBatcher] = None
         self.model_loaded = False
+        # Graphs actually loaded: {"variant", "intra_op_threads", "source", ...}
+        self.variant_choice: Optional[Dict] = None
+        # detect() runs on vision executor threads; the model must be loaded once
+        self._load_lock = threading.Lock()
+        # idle -> loading -> warming -> ready | failed | unavailable
+        self.readiness = {"state": "idle", "started_at": None, "load_ms": None, "warmup_ms": None, "error": None}
+        self._preload_task: Optional[asyncio.Task] = None
+        self.roi_stats = {"frames": 0, "roi": 0, "full": 0, "none": 0, "regions": 0, "area_fraction_sum": 0.0}
         logger.info("🧠 [VISION] LocalVisionService initialized")
 
     def load_florence_model(self) -> bool:
         """Load Florence-2 ONNX models"""
+        if self.model_loaded:
+            return True
+        with self._load_lock:
+            return self._load_florence_model()
+
+    @property
+    def ready(self) -> bool:
+        """Model loaded and warmed up - observations use Florence-2 only from here on"""
+        return self.readiness["state"] == "ready"
+
+    def preload(self) -> bool:
+        """
+        Blocking: load the sessions and processor, then run one warm-up inference so
+        kernels, thread pools and memory arenas exist before the first real frame.
+        """
+        self.readiness.update(state="loading", started_at=time.time(), error=None)
+        started = time.perf_counter()
+        if not self.load_florence_model():
+            missing_deps = not ort or not Image or not AutoProcessor
+            self.readiness.update(
+                state="unavailable" if missing_deps else "failed",
+                error="onnxruntime/PIL/transformers not installed" if missing_deps else "model load failed (see logs)"
+            )
+            return False
+        loaded = time.perf_counter()
+        self.readiness.update(state="warming", load_ms=round((loaded - started) * 1000))
+        try:
+            blank = Image.new("RGB", (self.grid.cols * 64, self.grid.rows * 64), "white")
+            self._run_florence(blank, FLORENCE_TASK, None, max_new_tokens=FLORENCE_WARMUP_TOKENS)
+        except Exception as e:
+            # The model works without a warm-up; the first frame just pays for it
+            logger.warning(f"⚠️ [VISION] Florence-2 warm-up failed: {e}")
+        self.readiness.update(state="ready", warmup_ms=round((time.perf_counter() - loaded) * 1000))
+        logger.info(f"✅ [VISION] Florence-2 ready (load {self.readiness['load_ms']}ms, warm-up {self.readiness['warmup_ms']}ms)")
+        return True
+
+    def start_preload(self) -> bool:
+        """Schedule preload() on a background thread; False if nothing was started"""
+        state = self.readiness["state"]
+        if state in ("loading", "warming", "ready", "unavailable"):
+            return False
+        if state == "failed" and time.time() - (self.readiness["started_at"] or 0) < FLORENCE_PRELOAD_RETRY_S:
+            return False
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self.readiness["state"] = "loading"
+        self._preload_task = loop.create_task(asyncio.to_thread(self.preload))
+        return True
+
+    def get_readiness(self) -> Dict:
+        return {
+            **self.readiness,
+            "ready": self.ready,
+            "preload_on_startup": FLORENCE_PRELOAD,
+            "model_dir": FLORENCE_MODEL_DIR,
+            "variant": self.variant_choice or FLORENCE_VARIANT
+        }
+
+    def resolve_variant(self) -> Dict:
+        """Variant and thread count to load: FLORENCE_VARIANT, or the benchmark report's pick for "auto" """
+        if FLORENCE_VARIANT != "auto":
+            return {"variant": FLORENCE_VARIANT, "intra_op_threads": None, "source": "config"}
+        report = load_report(FLORENCE_VARIANT_REPORT)
+        if report is None:
+            logger.warning(f"⚠️ [VISION] No variant benchmark at {FLORENCE_VARIANT_REPORT}, using {FLORENCE_DEFAULT_VARIANT}")
+            return {"variant": FLORENCE_DEFAULT_VARIANT, "intra_op_threads": None, "source": "default"}
+        choice = select_variant(report, available_variants(FLORENCE_MODEL_DIR), FLORENCE_MIN_RECALL, FLORENCE_MAX_RSS_MB)
+        if choice is None:
+            logger.warning(f"⚠️ [VISION] No benchmarked variant reaches recall {FLORENCE_MIN_RECALL}, using {FLORENCE_DEFAULT_VARIANT}")
+            return {"variant": FLORENCE_DEFAULT_VARIANT, "intra_op_threads": None, "source": "default"}
+        logger.info(f"📊 [VISION] Variant from benchmark: {choice['variant'] or 'fp32'} x{choice['intra_op_threads'] or 'default'} threads "
+                    f"(p95 {choice['p95_ms']}ms, recall {choice['recall']})")
+        return {**choice, "source": "benchmark"}
+
+    def _load_florence_model(self) -> bool:
         if self.model_loaded:
             return True
             
@@ -57,25 +177,35 @@ class LocalVisionService:
             logger.info("📥 [VISION] Loading Florence-2 models...")
             
             # Check if files exist
-            if not os.path.exists(FLORENCE_VISION_ENCODER):
-                logger.error(f"❌ [VISION] Vision encoder not found: {FLORENCE_VISION_ENCODER}")
+            choice = self.resolve_variant()
+            pipeline = Florence2OnnxPipeline(
+                FLORENCE_MODEL_DIR, variant=choice["variant"], intra_op_threads=choice["intra_op_threads"]
+            )
+            missing = pipeline.missing()
+            if missing:
+                logger.error(f"❌ [VISION] Florence-2 graphs not found: {missing}")
                 return False
             
-            # Load vision encoder
-            logger.info(f"Loading vision encoder: {FLORENCE_VISION_ENCODER}")
-            self.vision_session = ort.InferenceSession(
-                FLORENCE_VISION_ENCODER,
-                providers=["CPUExecutionProvider"]
-            )
-            logger.info(f"✅ Vision encoder loaded: {len(self.vision_session.get_inputs())} inputs")
+            # Vision encoder, token embeddings, encoder and merged decoder
+            pipeline.load()
+            self.pipeline = pipeline
+            self.variant_choice = choice
+            self.batcher = EncoderBatcher(pipeline)
+            self.vision_session = pipeline.sessions["vision_encoder"]
+            self.encoder_session = pipeline.sessions["encoder_model"]
+            logger.info(f"✅ Florence-2 sessions loaded ({pipeline.get_stats()['session_options']})")
             
-            # Load processor for image preprocessing
+            # Load processor for image preprocessing, tokenization and post-processing
             logger.info(f"Loading processor from: {FLORENCE_MODEL_DIR}")
             self.processor = AutoProcessor.from_pretrained(
                 FLORENCE_MODEL_DIR,
                 trust_remote_code=True
             )
             logger.info("✅ Processor loaded")
+            if FLORENCE_FAST_PREPROCESS:
+                self.preprocessor = FlorencePreprocessor.from_processor(self.processor)
+                if self.preprocessor:
+                    logger.info(f"✅ Fast preprocessing enabled ({self.preprocessor.width}x{self.preprocessor.height})")
             
             self.model_loaded = True
             logger.info("✅ [VISION] Florence-2 models loaded successfully!")
@@ -92,82 +222,257 @@ class LocalVisionService:
         self.grid = GridConfig(rows=rows, cols=cols)
 
     def detect_with_florence(self, 
-                           screenshot_base64: str,
+                           screenshot_base64: Union[str, bytes],
                            viewport_w: int,
-                           viewport_h: int) -> List[Dict]:
+                           viewport_h: int,
+                           cancel: Optional[CancelToken] = None,
+                           grid: Optional[GridConfig] = None,
+                           task: Optional[str] = None,
+                           covered: Optional[List[Dict]] = None,
+                           blind: Optional[List[Dict]] = None,
+                           raise_errors: bool = False) -> List[Dict]:
         """
         Use Florence-2 to detect UI elements in screenshot.
-        Returns: List of detected elements with bboxes and labels.
+        Returns: List of {cell, bbox, label, type, confidence, source} in viewport
+        coordinates (the screenshot may be scaled relative to the viewport).
+        
+        covered (DOM clickable bboxes) enables ROI mode: only regions the DOM does
+        not explain (plus blind canvas/iframe/svg rects) are cropped and detected.
+        Visual finds supplement DOM elements; DOM stays the primary source.
         
-        IMPORTANT: This is EXPERIMENTAL and currently used as FALLBACK only.
-        Primary detection still relies on DOM for reliability.
+        A failure (model not loadable, ORT error) gives [] - or is raised with
+        raise_errors, so callers can tell it from "nothing found".
         """
         try:
             if not self.model_loaded:
                 logger.info("🔄 [VISION] Florence-2 not loaded, attempting to load...")
                 if not self.load_florence_model():
-                    logger.warning("⚠️ [VISION] Failed to load Florence-2")
-                    return []
-            
-            logger.info("🔍 [VISION] Starting Florence-2 visual detection...")
+                    raise RuntimeError("Failed to load Florence-2")
             
-            # Decode base64 image
-            image_data = base64.b64decode(screenshot_base64)
-            image = Image.open(io.BytesIO(image_data))
-            logger.info(f"📷 Image size: {image.size}")
+            task = task or FLORENCE_TASK
+            image = self._open_image(screenshot_base64)
+            sx = viewport_w / image.size[0]
+            sy = viewport_h / image.size[1]
             
-            # For UI detection, we use "<OD>" (Object Detection) prompt
-            # Florence-2 supports various tasks:
-            # - <OD>: General object detection
-            # - <DENSE_REGION_CAPTION>: Detailed descriptions
-            # - <CAPTION>: Image caption
-            # - <OCR>: Text extraction
-            prompt = "<OD>"
-            
-            # Preprocess image
-            logger.info("🔄 Preprocessing image...")
-            inputs = self.processor(
-                text=prompt,
-                images=image,
-                return_tensors="np"
-            )
-            
-            # Run vision encoder
-            logger.info("🚀 Running Florence-2 vision encoder...")
-            pixel_values = inputs["pixel_values"].astype(np.float32)
-            vision_outputs = self.vision_session.run(
-                None,
-                {"pixel_values": pixel_values}
-            )
-            logger.info(f"✅ Vision encoder completed: {len(vision_outputs)} output tensors")
+            # Crops in image pixels with their offsets (full frame unless ROI narrows it)
+            crops = [(image, 0, 0)]
+            if covered is not None and VISION_ROI_ENABLED:
+                roi = self._select_roi(image, viewport_w, viewport_h, covered, blind)
+                if roi["mode"] == "none":
+                    logger.info("⏭️ [VISION] DOM covers every non-blank region, Florence-2 skipped")
+                    return []
+                if roi["mode"] == "roi":
+                    crops = []
+                    for r in roi["regions"]:
+                        box = (int(r['x'] / sx), int(r['y'] / sy), int(math.ceil((r['x'] + r['w']) / sx)), int(math.ceil((r['y'] + r['h']) / sy)))
+                        crops.append((image.crop(box), box[0], box[1]))
+                logger.info(f"🔲 [VISION] ROI {roi['mode']}: {len(crops)} crop(s), {roi['area_fraction']:.0%} of viewport")
             
-            # TODO: Full Florence-2 pipeline requires:
-            # 1. Vision encoder (DONE)
-            # 2. Decoder for bbox extraction (NOT YET IMPLEMENTED)
-            # 3. Post-processing to convert to grid cells
+            logger.info(f"🔍 [VISION] Starting Florence-2 visual detection ({task})...")
+            parsed_list = self._run_florence_many([c[0] for c in crops], task, cancel)
             
-            # For now, return empty as we don't have full pipeline
-            # This will make system fall back to DOM elements (reliable)
+            grid = grid or self.grid
             detections = []
+            for parsed, (_, ox, oy) in zip(parsed_list, crops):
+                boxes, labels, etype = self._parse_boxes(parsed, task)
+                for (x1, y1, x2, y2), label in zip(boxes, labels):
+                    bbox = {
+                        'x': int((x1 + ox) * sx),
+                        'y': int((y1 + oy) * sy),
+                        'w': max(1, int((x2 - x1) * sx)),
+                        'h': max(1, int((y2 - y1) * sy))
+                    }
+                    detections.append({
+                        'cell': grid.bbox_to_cell(bbox, viewport_w, viewport_h),
+                        'bbox': bbox,
+                        'label': (label or '').replace('</s>', '').strip()[:64],
+                        'type': etype,
+                        'confidence': FLORENCE_CONFIDENCE,
+                        'source': 'florence2'
+                    })
             
-            logger.info(f"🎯 [VISION] Florence-2 detected {len(detections)} objects (full pipeline pending)")
+            stats = self.pipeline.stats
+            logger.info(f"🎯 [VISION] Florence-2 detected {len(detections)} objects "
+                        f"({stats['last_tokens']} tokens, encode {stats['last_ms'].get('encode')}ms, decode {stats['last_ms'].get('decode')}ms)")
             return detections
             
+        except VisionCancelled:
+            raise
         except Exception as e:
             logger.error(f"❌ [VISION] Florence-2 detection failed: {e}")
+            if raise_errors:
+                raise
             import traceback
             traceback.print_exc()
             return []
 
+    def read_text_with_florence(self, screenshot_base64: Union[str, bytes], cancel: Optional[CancelToken] = None) -> str:
+        """Plain <OCR> of a frame (no boxes); "" when Florence-2 is unavailable"""
+        try:
+            if not self.load_florence_model():
+                return ""
+            return self.ocr_image(self._open_image(screenshot_base64), cancel=cancel)["text"]
+        except VisionCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"❌ [VISION] Florence-2 OCR failed: {e}")
+            return ""
+
+    def ocr_image(self, image: "Image.Image", with_regions: bool = False, cancel: Optional[CancelToken] = None) -> Dict:
+        """
+        OCR of an already decoded image (a crop). Blocking; the model must be loaded.
+        Returns: {"text", "lines": [{"text", "bbox"}]} with bboxes in image pixels
+        (lines only with with_regions).
+        """
+        if not with_regions:
+            parsed = self._run_florence(image, "<OCR>", cancel)
+            return {"text": (parsed.get("<OCR>") or "").strip(), "lines": []}
+        parsed = self._run_florence(image, "<OCR_WITH_REGION>", cancel)
+        boxes, labels, _ = self._parse_boxes(parsed, "<OCR_WITH_REGION>")
+        lines = []
+        for (x1, y1, x2, y2), label in zip(boxes, labels):
+            text = (label or '').replace('</s>', '').strip()
+            if text:
+                lines.append({"text": text, "bbox": {"x": int(x1), "y": int(y1), "w": max(1, int(x2 - x1)), "h": max(1, int(y2 - y1))}})
+        return {"text": "\n".join(line["text"] for line in lines), "lines": lines}
+
+    def get_florence_stats(self) -> Dict:
+        if self.pipeline is None:
+            return {"loaded": False, "task": FLORENCE_TASK, "variant": FLORENCE_VARIANT}
+        return {
+            **self.pipeline.get_stats(),
+            "task": FLORENCE_TASK,
+            "variant": self.variant_choice,
+            "batching": self.batcher.get_stats() if self.batcher else None,
+            "preprocess": {"path": "fast", **self.preprocessor.stats} if self.preprocessor else {"path": "processor"},
+            "roi": self.get_roi_stats()
+        }
+
+    def get_roi_stats(self) -> Dict:
+        frames = self.roi_stats["frames"]
+        return {
+            "enabled": VISION_ROI_ENABLED,
+            **{k: v for k, v in self.roi_stats.items() if k != "area_fraction_sum"},
+            # Share of the viewport sent to the detector, averaged over frames (1.0 = always full frame)
+            "avg_area_fraction": round(self.roi_stats["area_fraction_sum"] / frames, 3) if frames else None
+        }
+
+    def _open_image(self, screenshot: Union[str, bytes]) -> "Image.Image":
+        # Raw image bytes (screenshot store) or base64 string (legacy callers)
+        if isinstance(screenshot, (bytes, bytearray)):
+            image_data = bytes(screenshot)
+        else:
+            image_data = base64.b64decode(screenshot)
+        return Image.open(io.BytesIO(image_data)).convert("RGB")
+
+    def _run_florence(self, image: "Image.Image", task: str, cancel: Optional[CancelToken], max_new_tokens: Optional[int] = None) -> Dict:
+        """Preprocess, generate and post-process one Florence-2 task (Florence2PostProcesser via the processor)"""
+        if cancel:
+            cancel.check()
+        inputs = self._preprocess([image], task)
+        token_ids = self.pipeline.generate(
+            inputs["pixel_values"].astype(np.float32),
+            inputs["input_ids"].astype(np.int64),
+            max_new_tokens=max_new_tokens,
+            cancel=cancel,
+            batcher=self.batcher
+        )
+        text = self.processor.batch_decode([token_ids], skip_special_tokens=False)[0]
+        return self.processor.post_process_generation(text, task=task, image_size=image.size)
+
+    def _run_florence_many(self, images: List["Image.Image"], task: str, cancel: Optional[CancelToken]) -> List[Dict]:
+        """Several crops of one frame: encoder batches of FLORENCE_BATCH_MAX, decoding per crop"""
+        if len(images) == 1:
+            return [self._run_florence(images[0], task, cancel)]
+        parsed = []
+        for start in range(0, len(images), FLORENCE_BATCH_MAX):
+            if cancel:
+                cancel.check()
+            chunk = images[start:start + FLORENCE_BATCH_MAX]
+            inputs = self._preprocess(chunk, task)
+            token_lists = self.pipeline.generate_batch(
+                inputs["pixel_values"].astype(np.float32),
+                inputs["input_ids"].astype(np.int64),
+                cancel=cancel
+            )
+            texts = self.processor.batch_decode(token_lists, skip_special_tokens=False)
+            parsed += [
+                self.processor.post_process_generation(text, task=task, image_size=img.size)
+                for text, img in zip(texts, chunk)
+            ]
+        return parsed
+
+    def _preprocess(self, images: List["Image.Image"], task: str) -> Dict:
+        """pixel_values / input_ids for a list of images (fast path when available)"""
+        if self.preprocessor is not None:
+            return self.preprocessor(images, task)
+        if len(images) == 1:
+            return self.processor(text=task, images=images[0], return_tensors="np")
+        return self.processor(text=[task] * len(images), images=images, return_tensors="np")
+
+    def _parse_boxes(self, parsed: Dict, task: str):
+        """(boxes [x1, y1, x2, y2] in image pixels, labels, element type) of a post-processed result"""
+        result = parsed.get(task) or {}
+        if task == "<OCR_WITH_REGION>":
+            # Quadrilaterals -> axis-aligned boxes
+            boxes = [
+                [min(q[0::2]), min(q[1::2]), max(q[0::2]), max(q[1::2])]
+                for q in result.get("quad_boxes", [])
+            ]
+            return boxes, result.get("labels", []), "text"
+        return result.get("bboxes", []), result.get("labels", []), "node"
+
+    def _select_roi(self, image: "Image.Image", viewport_w: int, viewport_h: int,
+                    covered: List[Dict], blind: Optional[List[Dict]]) -> Dict:
+        """ROI selection with a blank test on a small grayscale thumbnail"""
+        gray = np.asarray(image.convert("L").resize(sample_size(viewport_w, viewport_h), Image.BOX))
+        roi = select_regions(viewport_w, viewport_h, covered, blind, gray)
+        self.roi_stats["frames"] += 1
+        self.roi_stats[roi["mode"]] += 1
+        self.roi_stats["regions"] += len(roi["regions"]) if roi["mode"] == "roi" else 0
+        self.roi_stats["area_fraction_sum"] += roi["area_fraction"] if roi["mode"] != "full" else 1.0
+        return roi
+
     def detect(self,
-               screenshot_base64: str,
+               screenshot_base64: Union[str, bytes],
                viewport_w: int,
                viewport_h: int,
                dom_clickables: Optional[List[Dict]] = None,
                rows: Optional[int] = None,
-               cols: Optional[int] = None) -> List[Dict]:
+               cols: Optional[int] = None,
+               cancel: Optional[CancelToken] = None,
+               blind_regions: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        detect_set() as vision[] JSON: List of {cell, bbox, label, type, confidence, source[, eid]}
+        """
+        return self.detect_set(screenshot_base64, viewport_w, viewport_h, dom_clickables,
+                               rows, cols, cancel=cancel, blind_regions=blind_regions).to_dicts()
+
+    def detect_set(self,
+                   screenshot_base64: Union[str, bytes],
+                   viewport_w: int,
+                   viewport_h: int,
+                   dom_clickables: Optional[List[Dict]] = None,
+                   rows: Optional[int] = None,
+                   cols: Optional[int] = None,
+                   cancel: Optional[CancelToken] = None,
+                   blind_regions: Optional[List[Dict]] = None) -> ElementSet:
+        """detect_set_complete() without the completeness flag"""
+        return self.detect_set_complete(screenshot_base64, viewport_w, viewport_h, dom_clickables,
+                                        rows, cols, cancel=cancel, blind_regions=blind_regions)[0]
+
+    def detect_set_complete(self,
+                            screenshot_base64: Union[str, bytes],
+                            viewport_w: int,
+                            viewport_h: int,
+                            dom_clickables: Optional[List[Dict]] = None,
+                            rows: Optional[int] = None,
+                            cols: Optional[int] = None,
+                            cancel: Optional[CancelToken] = None,
+                            blind_regions: Optional[List[Dict]] = None) -> Tuple[ElementSet, bool]:
         """
         Main vision detection function for 3-TIER ARCHITECTURE.
+        Blocking (image decode + ONNX) - async callers use detect_set_async().
         
         ARCHITECTURE ROLE:
         - Called by: browser_automation_service._augment_with_vision()
@@ -179,44 +484,30 @@ class LocalVisionService:
         2. ENHANCEMENT: Florence-2 visual detection (experimental, when needed)
         3. MERGE: Combine results, prioritize DOM, add visual-only finds
         
-        Returns: List of {cell, bbox, label, type, confidence, source}
+        blind_regions: viewport rects of canvas/iframe/svg/image buttons (always
+        sent to Florence-2 even when DOM clickables overlap them).
+        
+        Returns: (ElementSet (columns of cell, box, label, type, confidence, source, eid),
+                  complete) - complete is False when Florence-2 did not run or failed
+                  (DOM-only result, not worth caching for the frame)
         """
         try:
             logger.info(f"🔍 [VISION] detect() called: viewport={viewport_w}x{viewport_h}, DOM={len(dom_clickables or [])}")
             
-            # Set grid configuration
-            if rows and cols:
-                self.set_grid(rows, cols)
-                logger.info(f"🔍 [VISION] Grid configured: {rows}x{cols}")
-
-            results: List[Dict] = []
+            # Local copy: concurrent calls on executor threads may use other grids
+            grid = GridConfig(rows=rows, cols=cols) if rows and cols else self.grid
 
             # ==============================================================
             # PHASE 1: DOM-BASED DETECTION (PRIMARY, ALWAYS ON)
             # ==============================================================
+            # Off-screen elements have no cell (they would clamp onto edge cells);
+            # they stay reachable through perception's document index
             if dom_clickables:
                 logger.info(f"🔍 [VISION] Processing {len(dom_clickables)} DOM clickables...")
-                for idx, el in enumerate(dom_clickables):
-                    try:
-                        bbox = el.get('bbox', {})
-                        label = el.get('label') or el.get('text') or el.get('name') or el.get('type', '').upper()
-                        etype = el.get('type') or 'button'
-                        cell = self.grid.bbox_to_cell(bbox, viewport_w, viewport_h)
-                        
-                        results.append({
-                            'cell': cell,
-                            'bbox': bbox,
-                            'label': label[:64],  # Cap label length
-                            'type': etype,
-                            'confidence': float(el.get('confidence', 0.90)),  # DOM is highly reliable
-                            'source': 'dom'  # Mark source for debugging
-                        })
-                    except Exception as e:
-                        logger.error(f"🔍 [VISION] Error processing DOM element {idx}: {e}")
-                        continue
-                
+                results = ElementSet.from_dom(dom_clickables)
                 logger.info(f"✅ [VISION] DOM detection: {len(results)} elements")
             else:
+                results = ElementSet.empty()
                 logger.warning("⚠️ [VISION] No DOM clickables provided - will rely on visual only")
             
             # ==============================================================
@@ -229,47 +520,123 @@ class LocalVisionService:
             
             USE_FLORENCE_ENHANCEMENT = True  # Feature flag (enabled for visual element detection)
             
+            complete = False
             if USE_FLORENCE_ENHANCEMENT and screenshot_base64:
                 logger.info("🔍 [VISION] Running Florence-2 visual enhancement...")
-                florence_results = self.detect_with_florence(
-                    screenshot_base64,
-                    viewport_w,
-                    viewport_h
-                )
+                try:
+                    florence_results = self.detect_with_florence(
+                        screenshot_base64,
+                        viewport_w,
+                        viewport_h,
+                        cancel=cancel,
+                        grid=grid,
+                        covered=results.bboxes(),
+                        blind=blind_regions,
+                        raise_errors=True
+                    )
+                    complete = True
+                except VisionCancelled:
+                    raise
+                except Exception:
+                    # Logged by detect_with_florence; DOM elements are still returned
+                    florence_results = []
                 
                 if florence_results:
                     logger.info(f"✅ [VISION] Florence-2 found {len(florence_results)} additional elements")
                     
-                    # Merge: Add Florence-2 detections that DON'T overlap with DOM
-                    existing_cells = {r['cell'] for r in results}
-                    for f_result in florence_results:
-                        if f_result['cell'] not in existing_cells:
-                            f_result['source'] = 'florence2'
-                            results.append(f_result)
-                            logger.info(f"  + Added visual element: {f_result['label']} at {f_result['cell']}")
+                    # Merge: DOM wins; visual finds duplicating a DOM box (IoU / containment) or each other are dropped
+                    dom_count = len(results)
+                    results = ElementSet.merge([results, ElementSet.from_dicts(florence_results, source='florence2')])
+                    logger.info(f"  + Added {len(results) - dom_count} visual elements "
+                                f"({len(florence_results) - (len(results) - dom_count)} duplicates dropped)")
             
             # ==============================================================
             # PHASE 3: QUALITY CHECK & RETURN
             # ==============================================================
-            # Remove duplicates by cell (keep highest confidence)
-            seen_cells = {}
-            unique_results = []
-            for r in results:
-                cell = r.get('cell')
-                if not cell:
-                    continue
-                if cell not in seen_cells or r.get('confidence', 0) > seen_cells[cell].get('confidence', 0):
-                    seen_cells[cell] = r
-            
-            unique_results = list(seen_cells.values())
+            # Duplicates were removed by box overlap above. Distinct elements sharing a cell
+            # get sub-cells (C7.1 .. C7.4) from the adaptive grid index
+            index = results.assign_cells(grid, viewport_w, viewport_h)
+            if index.split:
+                logger.info(f"🔲 [VISION] Split crowded cells: {sorted(c for c in index.split if '.' not in c)}")
             
-            logger.info(f"✅ [VISION] Final output: {len(unique_results)} unique elements")
-            return unique_results
+            logger.info(f"✅ [VISION] Final output: {len(results)} unique elements")
+            return results, complete
             
+        except VisionCancelled:
+            # Abandoned job: the caller falls back to DOM-only detection, nothing is cached
+            raise
         except Exception as e:
             logger.error(f"❌ [VISION] detect() FAILED: {e}")
             import traceback
             traceback.print_exc()
-            return []
+            return ElementSet.empty(), False
+
+    async def detect_async(self,
+                           screenshot_base64: Union[str, bytes, None],
+                           viewport_w: int,
+                           viewport_h: int,
+                           dom_clickables: Optional[List[Dict]] = None,
+                           rows: Optional[int] = None,
+                           cols: Optional[int] = None,
+                           session_id: Optional[str] = None,
+                           deadline_s: Optional[float] = None,
+                           screenshot_digest: Optional[str] = None,
+                           blind_regions: Optional[List[Dict]] = None) -> List[Dict]:
+        """detect_set_async() as vision[] JSON"""
+        results = await self.detect_set_async(
+            screenshot_base64, viewport_w, viewport_h, dom_clickables, rows, cols,
+            session_id=session_id, deadline_s=deadline_s,
+            screenshot_digest=screenshot_digest, blind_regions=blind_regions
+        )
+        return results.to_dicts()
+
+    async def detect_set_async(self,
+                               screenshot_base64: Union[str, bytes, None],
+                               viewport_w: int,
+                               viewport_h: int,
+                               dom_clickables: Optional[List[Dict]] = None,
+                               rows: Optional[int] = None,
+                               cols: Optional[int] = None,
+                               session_id: Optional[str] = None,
+                               deadline_s: Optional[float] = None,
+                               screenshot_digest: Optional[str] = None,
+                               blind_regions: Optional[List[Dict]] = None) -> ElementSet:
+        """
+        detect_set() on the vision executor, off the event loop.
+        Complete results are cached by (screenshot digest, DOM clickables, viewport, grid);
+        pass screenshot_digest when the frame's digest is already known (ScreenshotRef).
+        When the model is not ready yet (loading in the background), the queue is
+        full, the deadline passes or the session's jobs are cancelled, the DOM-only
+        result is returned instead (cheap, computed inline).
+        """
+        if not screenshot_base64:
+            return self.detect_set(None, viewport_w, viewport_h, dom_clickables, rows, cols)
+        if not self.ready:
+            # Never load on a step's critical path; the preloader brings the model up
+            if self.start_preload():
+                logger.info("📥 [VISION] Florence-2 preloading in background, DOM-only until ready")
+            return self.detect_set(None, viewport_w, viewport_h, dom_clickables, rows, cols)
+        key = vision_result_cache.key(
+            screenshot_digest or compute_digest(screenshot_base64), dom_clickables,
+            viewport_w, viewport_h, rows or self.grid.rows, cols or self.grid.cols,
+            blind_regions=blind_regions
+        )
+        cached = vision_result_cache.get(key, session_id)
+        if cached is not None:
+            logger.info(f"♻️ [VISION] Cache hit: {len(cached)} elements, skipping detection")
+            return cached
+        try:
+            results, complete = await vision_executor.run(
+                self.detect_set_complete, screenshot_base64, viewport_w, viewport_h, dom_clickables, rows, cols,
+                session_id=session_id, deadline_s=deadline_s, blind_regions=blind_regions
+            )
+            if complete:
+                vision_result_cache.put(key, results, session_id)
+            else:
+                logger.warning("⚠️ [VISION] Florence-2 did not run for this frame, result not cached")
+            return results
+        except (VisionBusy, VisionCancelled) as e:
+            logger.warning(f"⚠️ [VISION] {e} - using DOM-only detection")
+            return self.detect_set(None, viewport_w, viewport_h, dom_clickables, rows, cols)
 
 local_vision_service = LocalVisionService()
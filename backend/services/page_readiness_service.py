@@ -0,0 +1,265 @@
+"""
+Page Readiness Service - event-driven "page settled" detection
+Playwright request events track in-flight fetch/XHR, an in-page probe tracks DOM
+mutations and visible spinners; the wait resolves as soon as the page has been
+quiet for a settle window, instead of networkidle + fixed sleeps + per-element
+is_visible() polling.
+"""
+import os
+import json
+import asyncio
+import time
+import logging
+import weakref
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import Page
+
+from services.page_snapshot_service import LOADING_SELECTORS
+
+logger = logging.getLogger(__name__)
+
+# Quiet window (no mutations, no requests) after which the page counts as settled
+PAGE_SETTLE_MS = int(os.environ.get('PAGE_SETTLE_MS', '500'))
+# Hard deadline for one readiness wait
+PAGE_SETTLE_TIMEOUT_MS = int(os.environ.get('PAGE_SETTLE_TIMEOUT_MS', '10000'))
+# Requests pending longer than this are treated as long-poll/streaming and ignored
+PAGE_LONG_REQUEST_MS = int(os.environ.get('PAGE_LONG_REQUEST_MS', '5000'))
+# Per-host overrides, e.g. {"example.com": {"settle_ms": 1000, "timeout_ms": 15000}}
+try:
+    PAGE_SETTLE_OVERRIDES: Dict[str, Dict[str, int]] = json.loads(os.environ.get('PAGE_SETTLE_OVERRIDES', '{}') or '{}')
+except ValueError:
+    logger.warning("PAGE_SETTLE_OVERRIDES is not valid JSON, ignoring")
+    PAGE_SETTLE_OVERRIDES = {}
+
+# Installed as an init script so the observer sees mutations from the first page script.
+# Page APIs (fetch/XHR) are left untouched; network activity is tracked from Playwright events.
+READINESS_PROBE_JS = """
+(() => {
+  if (window.__chimeraReady) return;
+  const now = () => performance.now();
+  const st = { lastMutation: now() };
+
+  const isOurs = (n) => {
+    if (!n || n.nodeType !== 1) return false;
+    if (n.id && n.id.indexOf('chimera-') === 0) return true;
+    const cls = typeof n.className === 'string' ? n.className : '';
+    if (cls.indexOf('chimera-') === 0) return true;
+    return !!(n.closest && n.closest('[id^="chimera-"]'));
+  };
+  new MutationObserver((records) => {
+    for (const r of records) {
+      if (!isOurs(r.target)) { st.lastMutation = now(); return; }
+    }
+  }).observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+
+  const visibleSpinner = (selectors) => {
+    for (const sel of selectors || []) {
+      let els = [];
+      try { els = document.querySelectorAll(sel); } catch (e) { continue; }
+      for (const el of els) {
+        const r = el.getBoundingClientRect();
+        if (r.width <= 0 || r.height <= 0) continue;
+        const s = window.getComputedStyle(el);
+        if (s.visibility !== 'hidden' && s.display !== 'none') return sel;
+      }
+    }
+    return null;
+  };
+
+  window.__chimeraReady = {
+    state: (opts) => ({
+      ready_state: document.readyState,
+      quiet_ms: Math.round(now() - st.lastMutation),
+      spinner: visibleSpinner(opts.spinnerSelectors)
+    })
+  };
+})();
+"""
+
+
+class _NetworkTracker:
+    """fetch/XHR in flight for one page, fed by Playwright request events"""
+
+    TRACKED_TYPES = ('fetch', 'xhr')
+
+    def __init__(self):
+        self.pending: Dict[Any, float] = {}
+        self.last_network = time.monotonic()
+
+    def begin(self, request) -> None:
+        if request.resource_type in self.TRACKED_TYPES:
+            self.pending[request] = time.monotonic()
+            self.last_network = time.monotonic()
+
+    def end(self, request) -> None:
+        if self.pending.pop(request, None) is not None:
+            self.last_network = time.monotonic()
+
+    def state(self) -> Dict[str, int]:
+        now = time.monotonic()
+        long_s = PAGE_LONG_REQUEST_MS / 1000
+        return {
+            "inflight": sum(1 for started in self.pending.values() if now - started < long_s),
+            "network_quiet_ms": int((now - self.last_network) * 1000)
+        }
+
+
+class PageReadinessService:
+    """
+    Readiness probe.
+    Tracks fetch/XHR in flight (Playwright request events), a MutationObserver
+    quiet window and visible spinners (in the page); wait_until_settled()
+    resolves the moment all three are quiet or the deadline passes, and
+    reports why (quiet / network / spinner / timeout).
+    """
+
+    def __init__(self):
+        # Pages that already carry the probe init script, with their request tracker
+        self._trackers: "weakref.WeakKeyDictionary[Page, _NetworkTracker]" = weakref.WeakKeyDictionary()
+        # host -> {"quiet": n, "network": n, "spinner": n, "timeout": n, "error": n, "total_ms": n}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    async def ensure_probe(self, page: Page) -> None:
+        """Install the readiness probe and request tracking (once per page, survives navigation)"""
+        if page in self._trackers:
+            return
+        tracker = _NetworkTracker()
+        page.on("request", tracker.begin)
+        page.on("requestfinished", tracker.end)
+        page.on("requestfailed", tracker.end)
+        self._trackers[page] = tracker
+        try:
+            await page.add_init_script(READINESS_PROBE_JS)
+            # Current document predates the init script
+            await page.evaluate(READINESS_PROBE_JS)
+        except Exception as e:
+            logger.warning(f"⚠️ [READY] Probe install failed: {e}")
+
+    def settings_for(self, url: str) -> Dict[str, int]:
+        """Settle window / deadline for a URL, applying per-host overrides"""
+        settings = {"settle_ms": PAGE_SETTLE_MS, "timeout_ms": PAGE_SETTLE_TIMEOUT_MS}
+        host = urlparse(url or "").hostname or ""
+        for pattern, override in PAGE_SETTLE_OVERRIDES.items():
+            if host == pattern or host.endswith("." + pattern):
+                settings.update({k: int(v) for k, v in override.items() if k in settings})
+                break
+        return settings
+
+    async def wait_until_settled(
+        self,
+        page: Page,
+        settle_ms: Optional[int] = None,
+        timeout_ms: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Wait until the page is settled or the deadline passes.
+
+        Returns:
+            {settled, reason, elapsed_ms, inflight, quiet_ms, network_quiet_ms, spinner, ready_state}
+        """
+        settings = self.settings_for(page.url)
+        settle_ms = settle_ms if settle_ms is not None else settings["settle_ms"]
+        timeout_ms = timeout_ms if timeout_ms is not None else settings["timeout_ms"]
+        started = time.monotonic()
+        result: Dict[str, Any] = {"settled": False, "reason": "timeout"}
+
+        while True:
+            remaining = timeout_ms - int((time.monotonic() - started) * 1000)
+            try:
+                await self.ensure_probe(page)
+                state = await self._state(page)
+            except Exception as e:
+                # A navigation destroys the execution context; retry on the new document
+                if remaining > 0 and ("context was destroyed" in str(e) or "navigation" in str(e).lower()):
+                    try:
+                        await page.wait_for_load_state('domcontentloaded', timeout=max(1, remaining))
+                    except Exception:
+                        pass
+                    continue
+                logger.warning(f"⚠️ [READY] Readiness probe error: {e}")
+                result = {"settled": False, "reason": "error", "error": str(e)}
+                break
+
+            if state is not None:
+                result = state
+                quiet = (state["ready_state"] == 'complete' and state["inflight"] == 0 and not state["spinner"] and
+                         state["quiet_ms"] >= settle_ms and state["network_quiet_ms"] >= settle_ms)
+                if quiet:
+                    result.update({"settled": True, "reason": "quiet"})
+                    break
+                if remaining <= 0:
+                    reason = 'network' if state["inflight"] > 0 else ('spinner' if state["spinner"] else 'timeout')
+                    result.update({"settled": False, "reason": reason})
+                    break
+                # Sleep until the quiet window could be over, but re-check at least every 100ms
+                wait_ms = max(16, min(100, settle_ms - min(state["quiet_ms"], state["network_quiet_ms"])))
+            elif remaining <= 0:
+                break
+            else:
+                wait_ms = 16
+            await asyncio.sleep(min(wait_ms, remaining) / 1000)
+
+        result["elapsed_ms"] = int((time.monotonic() - started) * 1000)
+        self._record(page.url, result)
+        logger.debug(f"⏱️ [READY] {result.get('reason')} after {result['elapsed_ms']}ms ({page.url})")
+        return result
+
+    async def status(self, page: Page, settle_ms: int = 200) -> Dict[str, Any]:
+        """Instant readiness state (no waiting), in the is_page_loading() shape"""
+        await self.ensure_probe(page)
+        state = await self._state(page)
+        if not state:
+            ready_state = await page.evaluate("() => document.readyState")
+            state = {"ready_state": ready_state, "inflight": 0, "quiet_ms": settle_ms, "spinner": None}
+        ready_state = state.get("ready_state")
+
+        if ready_state != 'complete':
+            reason = f"document.readyState = {ready_state}"
+        elif state.get("spinner"):
+            reason = f"Visible loading indicator: {state['spinner']}"
+        elif state.get("inflight", 0) > 0:
+            reason = f"{state['inflight']} network request(s) in flight"
+        elif state.get("quiet_ms", 0) < settle_ms:
+            reason = f"DOM unstable: last mutation {state['quiet_ms']}ms ago"
+        else:
+            return {"is_loading": False, "reason": "Page fully loaded and stable", "ready_state": ready_state}
+        return {"is_loading": True, "reason": reason, "ready_state": ready_state}
+
+    async def _state(self, page: Page) -> Optional[Dict[str, Any]]:
+        """In-page DOM/spinner state merged with the page's request tracker"""
+        state = await page.evaluate(
+            "(opts) => window.__chimeraReady ? window.__chimeraReady.state(opts) : null",
+            {"spinnerSelectors": LOADING_SELECTORS}
+        )
+        if state is None:
+            # Document created before the probe was installed
+            await page.evaluate(READINESS_PROBE_JS)
+            return None
+        state.update(self._trackers[page].state())
+        return state
+
+    def _record(self, url: str, result: Dict[str, Any]):
+        host = urlparse(url or "").hostname or "unknown"
+        entry = self.stats.setdefault(host, {"quiet": 0, "network": 0, "spinner": 0, "timeout": 0, "error": 0, "total_ms": 0})
+        reason = result.get("reason", "timeout")
+        entry[reason] = entry.get(reason, 0) + 1
+        entry["total_ms"] += result.get("elapsed_ms", 0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Resolution reasons and average wait per host (for tuning overrides)"""
+        hosts = {}
+        for host, entry in self.stats.items():
+            waits = sum(v for k, v in entry.items() if k != "total_ms")
+            hosts[host] = {**entry, "avg_ms": int(entry["total_ms"] / waits) if waits else 0}
+        return {
+            "settle_ms": PAGE_SETTLE_MS,
+            "timeout_ms": PAGE_SETTLE_TIMEOUT_MS,
+            "overrides": PAGE_SETTLE_OVERRIDES,
+            "hosts": hosts
+        }
+
+
+# Global instance
+page_readiness_service = PageReadinessService()
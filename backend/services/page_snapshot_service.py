@@ -0,0 +1,559 @@
+"""
+Page Snapshot Service - one round-trip page observation
+Collects clickables, form analysis, page text, hints and load state in a single
+page.evaluate() instead of dozens of per-element Playwright calls.
+"""
+import logging
+import weakref
+from typing import Dict, Any, List, Optional
+
+from playwright.async_api import Page
+
+logger = logging.getLogger(__name__)
+
+# Parts that can be requested from the in-page collector. None = everything.
+SNAPSHOT_PARTS = ("clickables", "analysis", "text", "hints")
+
+ERROR_SELECTORS = [
+    "[class*='error']", "[class*='danger']", "[class*='invalid']",
+    ".alert-danger", ".error-message", ".field-error"
+]
+SUCCESS_SELECTORS = [
+    "[class*='success']", "[class*='confirm']", ".alert-success"
+]
+ANTIBOT_SELECTORS = [
+    'iframe[src*="recaptcha"]',
+    'iframe[src*="hcaptcha"]',
+    '.g-recaptcha',
+    '.h-captcha',
+    '[class*="cf-browser-verification"]',
+    '[class*="cloudflare"]'
+]
+LOADING_SELECTORS = [
+    '[class*="loading"]',
+    '[class*="spinner"]',
+    '[class*="loader"]',
+    '[aria-busy="true"]'
+]
+
+# In-page change counters. Installed as an init script so they survive navigations.
+# dom    - bumped by DOM mutations (except our own chimera-* overlay nodes) and by
+#          input/change/focus events (form values change without DOM mutations)
+# scroll - bumped by window or container scrolling
+# resize - bumped by viewport resizes
+PAGE_VERSION_JS = """
+(() => {
+  if (window.__chimeraVersion) return;
+  const v = { dom: 0, scroll: 0, resize: 0 };
+  window.__chimeraVersion = v;
+  const isOurs = (n) => {
+    if (!n || n.nodeType !== 1) return false;
+    if (n.id && n.id.indexOf('chimera-') === 0) return true;
+    const cls = typeof n.className === 'string' ? n.className : '';
+    if (cls.indexOf('chimera-') === 0) return true;
+    if (n.tagName === 'STYLE' && (n.textContent || '').indexOf('.chimera-grid') !== -1) return true;
+    return !!(n.closest && n.closest('[id^="chimera-"]'));
+  };
+  const allOurs = (list) => {
+    if (!list || !list.length) return true;
+    for (const n of list) { if (!isOurs(n)) return false; }
+    return true;
+  };
+  const observer = new MutationObserver((records) => {
+    for (const r of records) {
+      if (isOurs(r.target)) continue;
+      if (r.type === 'childList' && allOurs(r.addedNodes) && allOurs(r.removedNodes)) continue;
+      v.dom++;
+      return;
+    }
+  });
+  observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+  const bumpDom = () => { v.dom++; };
+  ['input', 'change', 'focusin', 'focusout'].forEach((t) => document.addEventListener(t, bumpDom, true));
+  document.addEventListener('scroll', () => { v.scroll++; }, { capture: true, passive: true });
+  window.addEventListener('resize', () => { v.resize++; }, { passive: true });
+})();
+"""
+
+# Cheap probe used before deciding whether a cached observation is still valid
+PAGE_VERSION_PROBE_JS = """
+() => {
+  const v = window.__chimeraVersion;
+  return {
+    url: location.href,
+    ready_state: document.readyState,
+    vw: window.innerWidth,
+    vh: window.innerHeight,
+    versions: v ? { dom: v.dom, scroll: v.scroll, resize: v.resize } : null
+  };
+}
+"""
+
+PAGE_SNAPSHOT_JS = """
+(opts) => {
+  opts = opts || {};
+  const parts = opts.parts || null;
+  const want = (p) => !parts || parts.indexOf(p) !== -1;
+  const textLimit = opts.textLimit || 8000;
+  const vw = window.innerWidth, vh = window.innerHeight;
+
+  const isVisible = (el) => {
+    const r = el.getBoundingClientRect();
+    if (!r || r.width <= 0 || r.height <= 0) return false;
+    const s = window.getComputedStyle(el);
+    return !!s && s.visibility !== 'hidden' && s.display !== 'none';
+  };
+  const visibleTexts = (selectors, limit) => {
+    const seen = new Set();
+    const texts = [];
+    for (const sel of selectors) {
+      let els = [];
+      try { els = document.querySelectorAll(sel); } catch (e) { continue; }
+      for (const el of els) {
+        if (seen.has(el)) continue;
+        seen.add(el);
+        if (!isVisible(el)) continue;
+        const t = (el.innerText || '').trim();
+        if (t) texts.push(t.slice(0, limit));
+      }
+    }
+    return texts;
+  };
+  const firstMatch = (selectors, visibleOnly) => {
+    for (const sel of selectors) {
+      let els = [];
+      try { els = document.querySelectorAll(sel); } catch (e) { continue; }
+      for (const el of els) {
+        if (!visibleOnly || isVisible(el)) return sel;
+      }
+    }
+    return null;
+  };
+
+  const out = {
+    url: location.href,
+    title: document.title || '',
+    ready_state: document.readyState,
+    vw: vw,
+    vh: vh,
+    scroll: { x: Math.round(window.scrollX), y: Math.round(window.scrollY) },
+    versions: window.__chimeraVersion ? {
+      dom: window.__chimeraVersion.dom,
+      scroll: window.__chimeraVersion.scroll,
+      resize: window.__chimeraVersion.resize
+    } : null
+  };
+
+  if (want('clickables')) {
+    // Stable element identities: a WeakMap survives re-renders of the same node and
+    // lets collections be sent as a delta against the previous one
+    const reg = window.__chimeraIds || (window.__chimeraIds = {
+      ids: new WeakMap(),
+      seq: 0,
+      tick: 0,
+      doc: Math.random().toString(36).slice(2, 10),
+      prev: null,
+      prevOrder: null,
+      prevToken: null
+    });
+    if (!reg.idOf) {
+      reg.idOf = (el) => {
+        let id = reg.ids.get(el);
+        if (!id) { id = 'd' + (++reg.seq); reg.ids.set(el, id); }
+        return id;
+      };
+    }
+    const clickables = [];
+    // eid -> element of the latest collection (lets callers scroll to an element by id)
+    reg.byId = new Map();
+    const sx = window.scrollX, sy = window.scrollY;
+    const selectors = 'a, button, input, select, textarea, [onclick], [role="button"], [role="link"]';
+    document.querySelectorAll(selectors).forEach((el) => {
+      const rect = el.getBoundingClientRect();
+      if (rect.width > 0 && rect.height > 0) {
+        const style = window.getComputedStyle(el);
+        if (style.display !== 'none' && style.visibility !== 'hidden') {
+          const eid = reg.idOf(el);
+          reg.byId.set(eid, el);
+          // Document coordinates: unchanged by window scrolling, so a scroll-only
+          // change produces an empty delta (viewport bbox is derived in Python)
+          clickables.push({
+            eid: eid,
+            doc: {
+              x: Math.round(rect.left + sx),
+              y: Math.round(rect.top + sy),
+              w: Math.round(rect.width),
+              h: Math.round(rect.height)
+            },
+            label: el.innerText?.trim() || el.value || el.placeholder || el.getAttribute('aria-label') || el.getAttribute('title') || el.tagName,
+            type: el.tagName.toLowerCase(),
+            name: el.name || el.id || eid,
+            confidence: 0.85
+          });
+        }
+      }
+    });
+
+    const token = reg.doc + ':' + (++reg.tick);
+    const order = clickables.map((c) => c.eid);
+    if (opts.since && reg.prev && opts.since === reg.prevToken) {
+      const delta = { since: opts.since, added: [], removed: [], moved: [], relabelled: [], updated: [] };
+      const seen = new Set();
+      for (const c of clickables) {
+        seen.add(c.eid);
+        const p = reg.prev.get(c.eid);
+        if (!p) { delta.added.push(c); continue; }
+        if (p.type !== c.type || p.name !== c.name || p.confidence !== c.confidence) { delta.updated.push(c); continue; }
+        const b = c.doc, pb = p.doc;
+        if (b.x !== pb.x || b.y !== pb.y || b.w !== pb.w || b.h !== pb.h) delta.moved.push({ eid: c.eid, doc: b });
+        if (p.label !== c.label) delta.relabelled.push({ eid: c.eid, label: c.label });
+      }
+      for (const id of reg.prevOrder) { if (!seen.has(id)) delta.removed.push(id); }
+      // Order only travels when it differs from "previous order minus removed, plus added at the end"
+      const expected = reg.prevOrder.filter((id) => seen.has(id) && reg.prev.has(id));
+      for (const c of delta.added) expected.push(c.eid);
+      let sameOrder = expected.length === order.length;
+      for (let i = 0; sameOrder && i < order.length; i++) { if (expected[i] !== order[i]) sameOrder = false; }
+      if (!sameOrder) delta.order = order;
+      out.clickables_delta = delta;
+    } else {
+      out.clickables = clickables;
+    }
+    // Regions the DOM cannot see into (vision looks there even when clickables overlap):
+    // canvas, iframes, embeds, standalone svg and image buttons outside clickable markup
+    const blind = [];
+    document.querySelectorAll('canvas, iframe, embed, object, svg, img').forEach((el) => {
+      if (blind.length >= 50) return;
+      const tag = el.tagName.toLowerCase();
+      if ((tag === 'svg' || tag === 'img') && el.closest(selectors)) return;
+      if (tag === 'svg' && el.parentElement && el.parentElement.closest('svg')) return;
+      const r = el.getBoundingClientRect();
+      const x = Math.max(0, r.left), y = Math.max(0, r.top);
+      const w = Math.min(vw, r.right) - x, h = Math.min(vh, r.bottom) - y;
+      if (w < 16 || h < 16) return;
+      const style = window.getComputedStyle(el);
+      if (style.display === 'none' || style.visibility === 'hidden') return;
+      if (tag === 'img' && style.cursor !== 'pointer') return;
+      blind.push({ x: Math.round(x), y: Math.round(y), w: Math.round(w), h: Math.round(h), type: tag });
+    });
+    out.blind = blind;
+
+    reg.prev = new Map(clickables.map((c) => [c.eid, c]));
+    reg.prevOrder = order;
+    reg.prevToken = token;
+    out.clickables_token = token;
+  }
+
+  if (want('analysis')) {
+    out.forms = Array.from(document.forms).map((form) => {
+      const inputs = Array.from(form.querySelectorAll('input, textarea, select'));
+      return {
+        action: typeof form.action === 'string' ? form.action : (form.getAttribute('action') || ''),
+        method: typeof form.method === 'string' ? form.method : (form.getAttribute('method') || 'GET'),
+        input_count: inputs.length,
+        input_types: inputs.map(i => i.type || i.tagName.toLowerCase())
+      };
+    });
+    out.buttons = [];
+    document.querySelectorAll("button, input[type='button'], input[type='submit']").forEach((b) => {
+      const t = (b.innerText || '').trim();
+      if (t) out.buttons.push(t.slice(0, 50));
+    });
+    out.inputs = Array.from(document.querySelectorAll('input, textarea, select')).map((i) => ({
+      type: i.type || i.tagName.toLowerCase(),
+      name: i.name || '',
+      placeholder: i.placeholder || '',
+      required: !!i.required
+    }));
+    out.link_count = document.querySelectorAll('a[href]').length;
+    out.errors = visibleTexts(opts.errorSelectors || [], 100);
+    out.success_messages = visibleTexts(opts.successSelectors || [], 100);
+  }
+
+  if (want('text')) {
+    out.page_text = (document.body ? (document.body.innerText || '') : '').slice(0, textLimit);
+  }
+
+  if (want('hints')) {
+    out.lang = (document.documentElement.lang || 'en').slice(0, 10);
+    let status = 200;
+    try {
+      const nav = performance.getEntriesByType('navigation')[0];
+      if (nav && nav.responseStatus) status = nav.responseStatus;
+    } catch (e) { /* older browsers */ }
+    out.http_status = status;
+    out.antibot_selector = firstMatch(opts.antibotSelectors || [], false);
+    out.captcha = !!document.querySelector('iframe[src*="captcha"], .g-recaptcha, .h-captcha');
+    out.captcha_marker = !!document.querySelector('iframe[src*="recaptcha"], iframe[src*="hcaptcha"], .g-recaptcha, .h-captcha, [class*="captcha"], #captcha');
+    let dialogs = 0;
+    document.querySelectorAll('[role="dialog"], .modal, .dialog').forEach((d) => { if (isVisible(d)) dialogs++; });
+    out.dialogs = dialogs;
+    out.loading_indicator = firstMatch(opts.loadingSelectors || [], true);
+  }
+
+  return out;
+}
+"""
+
+# Viewport rect of an element by stable id (from the latest clickables collection);
+# center=True scrolls it (and any scrollable ancestors) to the middle of the viewport
+ELEMENT_LOCATE_JS = """
+(args) => {
+  const reg = window.__chimeraIds;
+  const el = reg && reg.byId ? reg.byId.get(args.eid) : null;
+  const base = {
+    vw: window.innerWidth,
+    vh: window.innerHeight,
+    scroll: { x: Math.round(window.scrollX), y: Math.round(window.scrollY) }
+  };
+  if (!el || !el.isConnected) return Object.assign(base, { found: false });
+  if (args.center) {
+    el.scrollIntoView({ block: 'center', inline: 'nearest', behavior: 'instant' });
+    base.scroll = { x: Math.round(window.scrollX), y: Math.round(window.scrollY) };
+  }
+  const r = el.getBoundingClientRect();
+  return Object.assign(base, {
+    found: true,
+    bbox: { x: Math.round(r.left), y: Math.round(r.top), w: Math.round(r.width), h: Math.round(r.height) }
+  });
+}
+"""
+
+
+def in_viewport(bbox: Dict[str, Any], vw: int, vh: int) -> bool:
+    """True when the element's center lies inside the viewport (a click there lands on it)"""
+    cx = bbox.get("x", 0) + bbox.get("w", 0) / 2
+    cy = bbox.get("y", 0) + bbox.get("h", 0) / 2
+    return 0 <= cx < vw and 0 <= cy < vh
+
+
+class PageSnapshotService:
+    """
+    Single round-trip page observation.
+    Replaces the screenshot-independent part of an observation (DOM clickables,
+    forms/inputs/buttons, error/success texts, page text, title, readyState,
+    antibot markers and hints) with ONE in-page script call.
+    """
+
+    def __init__(self):
+        # Pages that already carry the version counter init script
+        self._tracked_pages: "weakref.WeakSet[Page]" = weakref.WeakSet()
+        # Per-page clickables keyed by stable element id, patched with in-page deltas
+        self._element_stores: "weakref.WeakKeyDictionary[Page, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self.delta_stats = {"full": 0, "delta": 0, "elements_sent": 0, "elements_total": 0}
+
+    async def ensure_version_tracking(self, page: Page) -> None:
+        """Install in-page dom/scroll/resize counters (once per page, survives navigation)"""
+        if page in self._tracked_pages:
+            return
+        try:
+            await page.add_init_script(PAGE_VERSION_JS)
+            self._tracked_pages.add(page)
+            await page.evaluate(PAGE_VERSION_JS)
+        except Exception as e:
+            logger.warning(f"⚠️ [SNAPSHOT] Version tracking install failed: {e}")
+
+    async def read_versions(self, page: Page) -> Optional[Dict[str, Any]]:
+        """
+        Read url/viewport/readyState and change counters in one cheap call.
+        Returns None if the page cannot be probed.
+        """
+        try:
+            return await page.evaluate(PAGE_VERSION_PROBE_JS)
+        except Exception as e:
+            logger.warning(f"⚠️ [SNAPSHOT] Version probe failed: {e}")
+            return None
+
+    async def capture(self, page: Page, parts: Optional[List[str]] = None, text_limit: int = 8000) -> Dict[str, Any]:
+        """
+        Collect a compact structured snapshot of the page.
+
+        Args:
+            page: Playwright page
+            parts: subset of SNAPSHOT_PARTS to collect (None = all)
+            text_limit: max characters of body innerText to return
+
+        Returns:
+            Snapshot dict (url/title/ready_state/vw/vh/scroll always present)
+        """
+        store = self._element_stores.get(page)
+        opts = {
+            "parts": list(parts) if parts else None,
+            "textLimit": text_limit,
+            "errorSelectors": ERROR_SELECTORS,
+            "successSelectors": SUCCESS_SELECTORS,
+            "antibotSelectors": ANTIBOT_SELECTORS,
+            "loadingSelectors": LOADING_SELECTORS,
+            "since": store["token"] if store else None,
+        }
+        try:
+            snapshot = await page.evaluate(PAGE_SNAPSHOT_JS, opts)
+            if not snapshot:
+                return self._fallback(page)
+            if "clickables_token" in snapshot:
+                self._apply_clickables(page, snapshot)
+            return snapshot
+        except Exception as e:
+            logger.error(f"❌ [SNAPSHOT] Page snapshot failed: {e}")
+            return self._fallback(page)
+
+    def _apply_clickables(self, page: Page, snapshot: Dict[str, Any]) -> None:
+        """
+        Keep the per-page element store in sync and expose a full clickables list.
+        snapshot["clickables_delta"] stays set when only changes travelled, so
+        consumers holding the previous token can patch instead of rebuilding.
+        """
+        delta = snapshot.get("clickables_delta")
+        store = self._element_stores.get(page)
+        if delta is None or store is None or store["token"] != delta.get("since"):
+            elements = {c["eid"]: c for c in snapshot.get("clickables") or []}
+            self._element_stores[page] = {"token": snapshot["clickables_token"], "elements": elements}
+            snapshot["clickables_delta"] = None
+            snapshot["clickables"] = self._viewport_view(elements, snapshot)
+            self.delta_stats["full"] += 1
+            self.delta_stats["elements_sent"] += len(elements)
+            self.delta_stats["elements_total"] += len(elements)
+            return
+
+        elements = store["elements"]
+        for eid in delta.get("removed", []):
+            elements.pop(eid, None)
+        for c in delta.get("updated", []):
+            elements[c["eid"]] = c
+        for m in delta.get("moved", []):
+            if m["eid"] in elements:
+                elements[m["eid"]] = {**elements[m["eid"]], "doc": m["doc"]}
+        for r in delta.get("relabelled", []):
+            if r["eid"] in elements:
+                elements[r["eid"]] = {**elements[r["eid"]], "label": r["label"]}
+        for c in delta.get("added", []):
+            elements[c["eid"]] = c
+        if delta.get("order"):
+            elements = {eid: elements[eid] for eid in delta["order"] if eid in elements}
+        store["elements"] = elements
+        store["token"] = snapshot["clickables_token"]
+
+        self.delta_stats["delta"] += 1
+        self.delta_stats["elements_sent"] += sum(len(delta.get(k, [])) for k in ("added", "moved", "relabelled", "updated"))
+        self.delta_stats["elements_total"] += len(elements)
+        snapshot["clickables"] = self._viewport_view(elements, snapshot)
+
+    def _viewport_view(self, elements: Dict[str, Dict[str, Any]], snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Copies of the stored elements with the viewport bbox and in_view flag for the
+        snapshot's scroll position (the store itself only keeps document coordinates,
+        and must stay pristine as consumers may annotate elements).
+        """
+        scroll = snapshot.get("scroll") or {}
+        sx, sy = scroll.get("x", 0), scroll.get("y", 0)
+        vw, vh = snapshot.get("vw", 1280), snapshot.get("vh", 800)
+        out = []
+        for c in elements.values():
+            doc = c["doc"]
+            bbox = {"x": doc["x"] - sx, "y": doc["y"] - sy, "w": doc["w"], "h": doc["h"]}
+            out.append({**c, "bbox": bbox, "in_view": in_viewport(bbox, vw, vh)})
+        return out
+
+    async def locate(self, page: Page, eid: str, center: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Current viewport bbox of an element by stable id.
+
+        Args:
+            eid: id from the latest clickables collection on this page
+            center: scroll the element to the middle of the viewport first
+        Returns:
+            {found, bbox, vw, vh, scroll} or None if the page cannot be probed
+        """
+        try:
+            return await page.evaluate(ELEMENT_LOCATE_JS, {"eid": eid, "center": center})
+        except Exception as e:
+            logger.warning(f"⚠️ [SNAPSHOT] Element locate failed for {eid}: {e}")
+            return None
+
+    def get_delta_stats(self) -> Dict[str, Any]:
+        total = self.delta_stats["elements_total"]
+        return {
+            **self.delta_stats,
+            "payload_ratio": round(self.delta_stats["elements_sent"] / total, 3) if total else 0.0
+        }
+
+    def dom_data(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """dom_data shape ({vw, vh, scroll, clickables, blind, delta, token}) used by vision and scene builder"""
+        return {
+            "vw": snapshot.get("vw", 1280),
+            "vh": snapshot.get("vh", 800),
+            "scroll": snapshot.get("scroll") or {"x": 0, "y": 0},
+            "clickables": snapshot.get("clickables") or [],
+            # Viewport rects of canvas/iframe/svg/image buttons (vision ROI)
+            "blind": snapshot.get("blind") or [],
+            # Delta vs the previous collection (None = full list) and the token it produced
+            "delta": snapshot.get("clickables_delta"),
+            "token": snapshot.get("clickables_token")
+        }
+
+    def element_index(self, snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Document-coordinate index of every interactive element, on screen or not.
+        Entries: {eid, label, type, name, doc, in_view}; doc is the page offset
+        (x/y from the top-left of the document) used to scroll straight to it.
+        """
+        return [
+            {
+                "eid": c.get("eid"),
+                "label": c.get("label", ""),
+                "type": c.get("type", ""),
+                "name": c.get("name", ""),
+                "doc": c.get("doc"),
+                "in_view": c.get("in_view", True)
+            }
+            for c in snapshot.get("clickables") or [] if c.get("doc")
+        ]
+
+    def loading_status(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Loading status in the same shape as BrowserAutomationService.is_page_loading()"""
+        ready_state = snapshot.get("ready_state", "unknown")
+        if ready_state != "complete":
+            return {
+                "is_loading": True,
+                "reason": f"document.readyState = {ready_state}",
+                "ready_state": ready_state
+            }
+        indicator = snapshot.get("loading_indicator")
+        if indicator:
+            return {
+                "is_loading": True,
+                "reason": f"Visible loading indicator: {indicator}",
+                "ready_state": ready_state
+            }
+        return {
+            "is_loading": False,
+            "reason": "Page fully loaded and stable",
+            "ready_state": ready_state
+        }
+
+    def _fallback(self, page: Page) -> Dict[str, Any]:
+        viewport = {}
+        try:
+            viewport = page.viewport_size or {}
+        except Exception:
+            pass
+        url = "about:blank"
+        try:
+            url = page.url
+        except Exception:
+            pass
+        return {
+            "url": url,
+            "title": "",
+            "ready_state": "unknown",
+            "vw": viewport.get("width", 1280),
+            "vh": viewport.get("height", 800),
+            "scroll": {"x": 0, "y": 0},
+            "versions": None,
+            "clickables": [],
+            "error": True
+        }
+
+
+# Global instance
+page_snapshot_service = PageSnapshotService()
@@ -17,10 +17,20 @@ class PageStateService:
             # Body text scan
             body_text = ''
             try:
-                body_text = (await page.inner_text('body'))[:8000].lower()
+                body_text = (await page.inner_text('body'))[:8000]
             except Exception:
                 body_text = ''
 
+            return self.classify(body_text, captcha)
+        except Exception as e:
+            logger.warning(f"detect page state error: {e}")
+            return {"state": "unknown"}
+
+    def classify(self, text: str, captcha: bool = False) -> Dict[str, Any]:
+        """Classify page state from already collected body text (e.g. a page snapshot)"""
+        try:
+            body_text = (text or '')[:8000].lower()
+
             def has_any(substrs):
                 return any(s in body_text for s in substrs)
 
@@ -35,7 +45,7 @@ class PageStateService:
                 return {"state": "success"}
             return {"state": "unknown"}
         except Exception as e:
-            logger.warning(f"detect page state error: {e}")
+            logger.warning(f"classify page state error: {e}")
             return {"state": "unknown"}
 
 page_state_service = PageStateService()
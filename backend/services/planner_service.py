@@ -6,6 +6,7 @@ import logging
 import json
 from typing import Dict, Any, List, Optional
 from services.openrouter_service import openrouter_service
+from services.scene_diff import summarize_diff
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,12 @@ class PlannerService:
         """
         Generate multi-path plan from goal + scene
         
+        Replanning: when context carries "previous_plan" and the scene carries a
+        diff starting at that plan's scene (diff["since"] == previous_plan["scene_id"],
+        see SceneBuilderService.diff_since), the prompt sends the previous plan and
+        the scene changes instead of the full element list. Plans carry the
+        scene_id they were built from.
+        
         Returns Plan JSON:
         {
           "goal": {"site": "...", "task": "register|login|..."},
@@ -70,6 +77,7 @@ class PlannerService:
             
             # Parse JSON
             plan = self._parse_plan_json(content)
+            plan["scene_id"] = scene.get("scene_id")
             
             logger.info(f"📋 Plan generated: {len(plan.get('candidates', []))} candidates, chosen={plan.get('chosen')}")
             
@@ -154,9 +162,20 @@ IMPORTANT: For "type" actions, you MUST specify:
     ) -> str:
         """Build planning prompt"""
         # Extract key info from scene
-        elements_summary = self._summarize_elements(scene.get('elements', []))
         antibot = scene.get('antibot', {})
         url = scene.get('url', '')
+        previous_plan = (context or {}).get('previous_plan')
+        diff = scene.get('diff')
+        # A diff against any other scene (e.g. the previous capture) does not describe what changed for the plan
+        if previous_plan and diff and previous_plan.get('scene_id') is not None and diff.get('since') == previous_plan['scene_id']:
+            elements_section = f"""PREVIOUS PLAN (chosen {previous_plan.get('chosen')}):
+{self._summarize_plan(previous_plan)}
+
+CHANGES SINCE THAT PLAN'S SCENE ({len(scene.get('elements', []))} elements now):
+{summarize_diff(scene['diff'])}"""
+        else:
+            elements_section = f"""AVAILABLE ELEMENTS ({len(scene.get('elements', []))}):
+{self._summarize_elements(scene.get('elements', []))}"""
         
         prompt = f"""Plan automation for this goal:
 
@@ -170,8 +189,7 @@ Viewport: {scene.get('viewport', [1280, 800])}
 Anti-bot: {antibot.get('present', False)} ({antibot.get('type', 'none')})
 HTTP: {scene.get('http', {}).get('status', 200)}
 
-AVAILABLE ELEMENTS ({len(scene.get('elements', []))}):
-{elements_summary}
+{elements_section}
 
 HINTS:
 Language: {scene.get('hints', {}).get('lang', 'en')}
@@ -207,6 +225,16 @@ Return ONLY JSON (no markdown):"""
         
         return '\n'.join(summary[:15])
     
+    def _summarize_plan(self, plan: Dict[str, Any]) -> str:
+        """Steps of the chosen candidate, one line each"""
+        chosen = next((c for c in plan.get('candidates', []) if c.get('id') == plan.get('chosen')), None)
+        if not chosen:
+            return "none"
+        return '\n'.join(
+            f"{i + 1}. {step.get('action')} {json.dumps(step.get('target'), separators=(',', ':'))} {step.get('explain', '')}".rstrip()
+            for i, step in enumerate(chosen.get('steps', []))
+        ) or "no steps"
+    
     def _parse_plan_json(self, content: str) -> Dict[str, Any]:
         """Parse JSON from LLM response"""
         # Remove markdown code blocks if present
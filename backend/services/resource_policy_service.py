@@ -0,0 +1,304 @@
+"""
+Resource Policy Service - request interception that skips resources perception never uses
+A policy blocks resource types (media, fonts, images) and/or known analytics
+hosts through Playwright routing. Sessions default to "no_analytics": blocking
+fonts or images changes what Florence-2 and the VLM see (icon-font buttons
+render blank), so "lean" / "strict" are opt-in per session (create_session's
+resource_policy) or per plan step. Steps that run vision on real imagery get
+a relaxed policy (images and fonts allowed). Blocked requests and estimated bytes saved
+are counted per navigation.
+
+Note: Playwright disables the HTTP cache of a context while routing is active,
+so sessions on "allow_all" are not routed at all.
+"""
+import os
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Route, Request
+
+logger = logging.getLogger(__name__)
+
+# allow_all | no_analytics | lean | strict (lean/strict block fonts, which vision relies on: opt in per session)
+RESOURCE_POLICY_DEFAULT = os.environ.get('RESOURCE_POLICY_DEFAULT', 'no_analytics').lower()
+# Extra hosts to block, comma-separated (suffix match)
+RESOURCE_BLOCK_HOSTS = [h.strip().lower() for h in os.environ.get('RESOURCE_BLOCK_HOSTS', '').split(',') if h.strip()]
+# Plan actions that look at real imagery (screenshots judged by a vision model)
+RESOURCE_POLICY_VISION_ACTIONS = {
+    a.strip().upper() for a in
+    os.environ.get('RESOURCE_POLICY_VISION_ACTIONS', 'VERIFY_RESULT,VERIFICATION_SUCCESS,VERIFICATION_FAILED').split(',')
+    if a.strip()
+}
+
+ANALYTICS_HOSTS = [
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'connect.facebook.net', 'hotjar.com', 'segment.io', 'segment.com', 'mixpanel.com',
+    'amplitude.com', 'clarity.ms', 'fullstory.com', 'nr-data.net', 'mc.yandex.ru',
+    'top-fwz1.mail.ru', 'tiktok.com/i18n/pixel', 'analytics.tiktok.com', 'bat.bing.com'
+]
+# Never blocked: CAPTCHA / anti-bot challenge providers need all their assets
+ALWAYS_ALLOW_HOSTS = ['recaptcha.net', 'google.com/recaptcha', 'gstatic.com/recaptcha', 'hcaptcha.com', 'challenges.cloudflare.com', 'arkoselabs.com', 'funcaptcha.com']
+
+POLICIES: Dict[str, Dict[str, Any]] = {
+    "allow_all": {"types": set(), "analytics": False},
+    "no_analytics": {"types": set(), "analytics": True},
+    "lean": {"types": {"media", "font"}, "analytics": True},
+    "strict": {"types": {"media", "font", "image"}, "analytics": True},
+}
+# Types that vision on real imagery needs back
+VISION_TYPES = {"image", "font"}
+
+# Max wait (ms) for resources requested again after a step relaxed the policy
+RESOURCE_REFETCH_TIMEOUT_MS = int(os.environ.get('RESOURCE_REFETCH_TIMEOUT_MS', '3000'))
+
+# Requests again what a stricter policy blocked on the loaded page: failed <img>s get
+# their src reset, stylesheets are re-inserted (their @font-face and background
+# loads are issued again) and the old copy removed once the new one has loaded.
+# Resolves with the number of elements retried, after they settled or the timeout.
+REFETCH_BLOCKED_JS = """
+async ({fonts, images, timeoutMs}) => {
+    const pending = [];
+    const settle = (el, events) => pending.push(new Promise(resolve => {
+        for (const ev of events) el.addEventListener(ev, resolve, {once: true});
+    }));
+    let retried = 0;
+    if (images) {
+        for (const img of Array.from(document.images)) {
+            if (!img.complete || img.naturalWidth > 0 || !img.currentSrc && !img.src) continue;
+            settle(img, ['load', 'error']);
+            const src = img.getAttribute('src'), srcset = img.getAttribute('srcset');
+            img.removeAttribute('src');
+            if (srcset !== null) { img.removeAttribute('srcset'); img.setAttribute('srcset', srcset); }
+            if (src !== null) img.setAttribute('src', src);
+            retried++;
+        }
+    }
+    if (fonts || images) {
+        for (const sheet of Array.from(document.querySelectorAll('link[rel~="stylesheet"], style'))) {
+            // <style> rules added through the CSSOM (CSS-in-JS) are not in its text: leave those alone
+            if (sheet.tagName === 'STYLE' && !sheet.textContent.includes('url(')) continue;
+            const copy = sheet.cloneNode(true);
+            if (sheet.tagName === 'LINK') {
+                settle(copy, ['load', 'error']);
+                copy.addEventListener('load', () => sheet.remove(), {once: true});
+                sheet.after(copy);
+            } else {
+                sheet.after(copy);
+                sheet.remove();
+            }
+            retried++;
+        }
+        if (fonts && document.fonts) pending.push(document.fonts.ready);
+    }
+    await Promise.race([Promise.all(pending), new Promise(r => setTimeout(r, timeoutMs))]);
+    return retried;
+}
+"""
+
+# Rough transfer sizes of blocked resources (bytes) - blocked requests are never fetched
+ESTIMATED_BYTES = {"image": 40_000, "font": 35_000, "media": 500_000, "script": 30_000, "xhr": 2_000, "fetch": 2_000}
+DEFAULT_ESTIMATED_BYTES = 5_000
+
+NAVIGATION_HISTORY = 20
+
+
+class ResourcePolicyService:
+    """
+    Per-session routing policy.
+    - attach(session_id, context, policy): install routing for a new session
+    - begin_step / end_step: per-step override and vision relaxation (resources the
+      loaded page was denied are requested again, so the step's frame has them)
+    - last_navigation(session_id): blocked requests / bytes saved for the latest page load
+    """
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self.totals = {"blocked_requests": 0, "allowed_requests": 0, "bytes_saved_est": 0}
+
+    async def attach(self, session_id: str, context: BrowserContext, policy: Optional[str] = None):
+        policy = self._normalize(policy or RESOURCE_POLICY_DEFAULT)
+        state = {
+            "context": context,
+            "policy": policy,
+            "step_policy": None,
+            "relaxed": False,
+            "routed": False,
+            "navigations": deque(maxlen=NAVIGATION_HISTORY),
+        }
+        self._sessions[session_id] = state
+        await self._sync_routing(session_id, state)
+        logger.info(f"🚦 [RESOURCES] Session {session_id} policy: {policy}")
+
+    def detach(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    async def set_policy(self, session_id: str, policy: str):
+        state = self._sessions.get(session_id)
+        if not state:
+            return
+        state["policy"] = self._normalize(policy)
+        await self._sync_routing(session_id, state)
+
+    async def begin_step(self, session_id: str, policy: Optional[str] = None, action: Optional[str] = None, needs_vision: bool = False):
+        """Apply a plan step's policy override; relax automatically for vision-on-imagery steps"""
+        state = self._sessions.get(session_id)
+        if not state:
+            return
+        blocked_before = self.effective(session_id)["types"]
+        state["step_policy"] = self._normalize(policy) if policy else None
+        state["relaxed"] = bool(needs_vision) or (action or "").upper() in RESOURCE_POLICY_VISION_ACTIONS
+        await self._sync_routing(session_id, state)
+        # Routing only affects later requests: the page this step judges was loaded without them
+        unblocked = blocked_before - self.effective(session_id)["types"]
+        nav = state["navigations"][-1] if state["navigations"] else None
+        if nav and any(nav["blocked_by_type"].get(t) for t in unblocked):
+            await self._refetch_blocked(session_id, state, unblocked)
+
+    async def end_step(self, session_id: str):
+        state = self._sessions.get(session_id)
+        if not state or (state["step_policy"] is None and not state["relaxed"]):
+            return
+        state["step_policy"] = None
+        state["relaxed"] = False
+        await self._sync_routing(session_id, state)
+
+    def effective(self, session_id: str) -> Dict[str, Any]:
+        """Effective rule set: {"name", "types", "analytics"}"""
+        state = self._sessions.get(session_id)
+        if not state:
+            return {"name": "allow_all", **POLICIES["allow_all"]}
+        name = state["step_policy"] or state["policy"]
+        rules = POLICIES[name]
+        types = set(rules["types"])
+        if state["relaxed"]:
+            types -= VISION_TYPES
+        return {"name": name + ("+vision" if state["relaxed"] and types != rules["types"] else ""), "types": types, "analytics": rules["analytics"]}
+
+    def last_navigation(self, session_id: str) -> Optional[Dict[str, Any]]:
+        state = self._sessions.get(session_id)
+        if not state or not state["navigations"]:
+            return None
+        return dict(state["navigations"][-1])
+
+    def get_stats(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        if session_id:
+            state = self._sessions.get(session_id)
+            if not state:
+                return {}
+            return {
+                "policy": self.effective(session_id)["name"],
+                "routed": state["routed"],
+                "navigations": [dict(n) for n in state["navigations"]]
+            }
+        return {
+            **self.totals,
+            "default_policy": RESOURCE_POLICY_DEFAULT,
+            "policies": sorted(POLICIES.keys()),
+            "sessions": {sid: self.effective(sid)["name"] for sid in self._sessions}
+        }
+
+    # ----- internals -----
+
+    def _normalize(self, policy: str) -> str:
+        policy = (policy or "").lower()
+        if policy not in POLICIES:
+            logger.warning(f"⚠️ [RESOURCES] Unknown policy '{policy}', using allow_all")
+            return "allow_all"
+        return policy
+
+    async def _sync_routing(self, session_id: str, state: Dict[str, Any]):
+        """Route only while something can be blocked (routing disables the HTTP cache)"""
+        rules = self.effective(session_id)
+        wanted = bool(rules["types"]) or rules["analytics"]
+        context = state["context"]
+        try:
+            if wanted and not state["routed"]:
+                await context.route("**/*", lambda route, request, sid=session_id: self._handle(sid, route, request))
+                state["routed"] = True
+            elif not wanted and state["routed"]:
+                await context.unroute("**/*")
+                state["routed"] = False
+        except Exception as e:
+            logger.warning(f"⚠️ [RESOURCES] Routing update failed for {session_id}: {e}")
+
+    async def _refetch_blocked(self, session_id: str, state: Dict[str, Any], types: set):
+        """Request the now-allowed resources again on the session's open pages"""
+        args = {"fonts": "font" in types, "images": "image" in types, "timeoutMs": RESOURCE_REFETCH_TIMEOUT_MS}
+        for page in list(state["context"].pages):
+            try:
+                retried = await page.evaluate(REFETCH_BLOCKED_JS, args)
+                logger.info(f"🔁 [RESOURCES] {session_id}: re-requested {sorted(types)} for {retried} elements after relaxing")
+            except Exception as e:
+                logger.warning(f"⚠️ [RESOURCES] Refetch after relaxing failed for {session_id}: {e}")
+
+    async def _handle(self, session_id: str, route: Route, request: Request):
+        state = self._sessions.get(session_id)
+        try:
+            if state is None:
+                await route.continue_()
+                return
+            if request.is_navigation_request() and self._is_main_frame(request):
+                state["navigations"].append({
+                    "url": request.url,
+                    "policy": self.effective(session_id)["name"],
+                    "started_at": time.time(),
+                    "blocked_requests": 0,
+                    "allowed_requests": 0,
+                    "bytes_saved_est": 0,
+                    "blocked_by_type": {}
+                })
+            reason = self._block_reason(session_id, request)
+            nav = state["navigations"][-1] if state["navigations"] else None
+            if reason:
+                size = ESTIMATED_BYTES.get(request.resource_type, DEFAULT_ESTIMATED_BYTES)
+                self.totals["blocked_requests"] += 1
+                self.totals["bytes_saved_est"] += size
+                if nav is not None:
+                    nav["blocked_requests"] += 1
+                    nav["bytes_saved_est"] += size
+                    nav["blocked_by_type"][reason] = nav["blocked_by_type"].get(reason, 0) + 1
+                await route.abort("blockedbyclient")
+            else:
+                self.totals["allowed_requests"] += 1
+                if nav is not None:
+                    nav["allowed_requests"] += 1
+                await route.continue_()
+        except Exception as e:
+            # Route already handled (page closed, navigation replaced) - nothing to do
+            logger.debug(f"[RESOURCES] Route handling skipped: {e}")
+
+    def _block_reason(self, session_id: str, request: Request) -> Optional[str]:
+        if request.is_navigation_request():
+            return None
+        parsed = urlparse(request.url.lower())
+        host, path = parsed.hostname or "", parsed.path
+        if any(self._host_matches(host, path, h) for h in ALWAYS_ALLOW_HOSTS):
+            return None
+        rules = self.effective(session_id)
+        if request.resource_type in rules["types"]:
+            return request.resource_type
+        if rules["analytics"] and any(self._host_matches(host, path, h) for h in ANALYTICS_HOSTS + RESOURCE_BLOCK_HOSTS):
+            return "analytics"
+        return None
+
+    @staticmethod
+    def _host_matches(host: str, path: str, pattern: str) -> bool:
+        """"example.com" matches example.com and *.example.com; "host/path" patterns also need the path prefix"""
+        p_host, _, p_path = pattern.partition("/")
+        if host != p_host and not host.endswith("." + p_host):
+            return False
+        return not p_path or path.startswith("/" + p_path)
+
+    @staticmethod
+    def _is_main_frame(request: Request) -> bool:
+        try:
+            return request.frame.parent_frame is None
+        except Exception:
+            return False
+
+
+# Global instance
+resource_policy_service = ResourcePolicyService()
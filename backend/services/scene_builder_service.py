@@ -2,29 +2,63 @@
 Scene Builder Service - Converts DOM/AX/Vision → Scene JSON
 Implements SB (Scene Builder) from Technical Assignment
 """
+import os
 import logging
 import time
-from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
 from playwright.async_api import Page
 
+from services.page_snapshot_service import page_snapshot_service
+from services.box_merge import merge_boxes, xyxy
+from services.element_set import ElementSet
+from services.grid_service import GridIndex, grid_config
+from services.scene_diff import PAGE_FIELDS, signatures, diff_scenes
+
 logger = logging.getLogger(__name__)
 
+# Scenes per session kept for diffs against them (the scenes plans were built from)
+SCENE_PIN_MAX = int(os.environ.get('SCENE_PIN_MAX', '4'))
+
 class SceneBuilderService:
     """
     Scene Builder: DOM/AX → elements + OCR + Vision → Scene JSON
     Priority: DOM/AX > OCR > Vision
     """
     
+    def __init__(self):
+        # session_id -> {token, elements: {eid: element}} - patched with DOM deltas
+        self._dom_elements: Dict[str, Dict[str, Any]] = {}
+        self.element_stats = {"rebuilt": 0, "patched": 0}
+        # session_id -> {"page": page-level fields + scene_id, "signatures": {id: (element, hash)}} of the last scene
+        self._scenes: Dict[str, Dict[str, Any]] = {}
+        self._scene_seq: Dict[str, int] = {}
+        # session_id -> {scene_id: {"page", "signatures"}} of pinned scenes (oldest first)
+        self._pinned: Dict[str, "OrderedDict[int, Dict[str, Any]]"] = {}
+        self.diff_stats = {"diffs": 0, "added": 0, "removed": 0, "changed": 0, "unchanged": 0}
+    
     async def build_scene(
         self, 
         page: Page, 
         dom_data: Dict[str, Any],
-        vision_elements: List[Dict[str, Any]],
-        session_id: str
+        vision_elements: Union[List[Dict[str, Any]], ElementSet],
+        session_id: str,
+        snapshot: Optional[Dict[str, Any]] = None,
+        diff: bool = False
     ) -> Dict[str, Any]:
         """
         Build Scene JSON from DOM + Vision data
         
+        Page facts (title, http status, antibot markers, hints) are read from a
+        page snapshot. Pass the snapshot already taken by the caller to avoid
+        another round-trip; otherwise one is captured here.
+        
+        Scenes are numbered per session (scene_id). With diff=True the scene also
+        carries "diff": changes against the session's previous scene (None for
+        the first one), see services/scene_diff.py.
+        
         Returns Scene JSON with:
         - viewport
         - url
@@ -33,29 +67,31 @@ class SceneBuilderService:
         - elements array (id/role/label/bbox/state)
         - hints
         - timestamp
+        - scene_id (+ diff)
         """
         try:
+            if snapshot is None or 'lang' not in snapshot:
+                snapshot = await page_snapshot_service.capture(page, parts=["text", "hints"])
+            
             # Get page info
-            url = page.url
-            title = await page.title()
-            viewport = page.viewport_size
+            url = snapshot.get('url') or page.url
+            title = snapshot.get('title', '')
+            viewport = page.viewport_size or {"width": snapshot.get('vw', 1280), "height": snapshot.get('vh', 800)}
             
-            # HTTP status (try to get from page)
-            http_status = 200  # Default
+            # HTTP status (from navigation timing entry)
             try:
-                response = await page.evaluate("() => window.performance?.getEntriesByType?.('navigation')?.[0]?.responseStatus || 200")
-                http_status = int(response) if response else 200
-            except:
-                pass
+                http_status = int(snapshot.get('http_status') or 200)
+            except (TypeError, ValueError):
+                http_status = 200
             
             # Antibot detection (basic, will enhance in BLOCK 5)
-            antibot = await self._detect_antibot_basic(page)
+            antibot = self._detect_antibot_basic(snapshot)
             
             # Build elements array from DOM + Vision
-            elements = await self._build_elements(dom_data, vision_elements)
+            elements = await self._build_elements(dom_data, vision_elements, session_id)
             
             # Hints
-            hints = await self._extract_hints(page)
+            hints = self._extract_hints(snapshot)
             
             scene = {
                 "viewport": [viewport['width'], viewport['height']],
@@ -67,10 +103,12 @@ class SceneBuilderService:
                 },
                 "antibot": antibot,
                 "elements": elements,
+                "grid": self._grid_cells(elements, viewport),
                 "hints": hints,
                 "ts": int(time.time() * 1000),
                 "session_id": session_id
             }
+            self._track(scene, diff)
             
             logger.info(f"📸 Scene built: {len(elements)} elements, antibot={antibot['present']}")
             return scene
@@ -79,35 +117,25 @@ class SceneBuilderService:
             logger.error(f"Scene build error: {e}")
             return self._get_fallback_scene(session_id)
     
-    async def _detect_antibot_basic(self, page: Page) -> Dict[str, Any]:
-        """Basic antibot detection (enhanced in BLOCK 5)"""
+    def _detect_antibot_basic(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Basic antibot detection from page snapshot (enhanced in BLOCK 5)"""
         try:
-            # Check for common antibot indicators
-            selectors = [
-                'iframe[src*="recaptcha"]',
-                'iframe[src*="hcaptcha"]',
-                '.g-recaptcha',
-                '.h-captcha',
-                '[class*="cf-browser-verification"]',
-                '[class*="cloudflare"]'
-            ]
-            
-            for selector in selectors:
-                el = await page.query_selector(selector)
-                if el:
-                    antibot_type = 'captcha' if 'captcha' in selector else 'cf_js_challenge'
-                    provider = 'recaptcha' if 'recaptcha' in selector else 'hcaptcha' if 'hcaptcha' in selector else 'cloudflare'
-                    
-                    return {
-                        "present": True,
-                        "type": antibot_type,
-                        "provider": provider,
-                        "severity": 0.7,
-                        "message": f"{provider} detected"
-                    }
+            # Check for common antibot indicators (first matching selector)
+            selector = snapshot.get('antibot_selector')
+            if selector:
+                antibot_type = 'captcha' if 'captcha' in selector else 'cf_js_challenge'
+                provider = 'recaptcha' if 'recaptcha' in selector else 'hcaptcha' if 'hcaptcha' in selector else 'cloudflare'
+                
+                return {
+                    "present": True,
+                    "type": antibot_type,
+                    "provider": provider,
+                    "severity": 0.7,
+                    "message": f"{provider} detected"
+                }
             
             # Check for rate limiting indicators
-            page_text = await page.evaluate("() => document.body?.innerText || ''")
+            page_text = snapshot.get('page_text') or ''
             if any(word in page_text.lower() for word in ['rate limit', 'too many requests', '429', 'slow down']):
                 return {
                     "present": True,
@@ -138,79 +166,174 @@ class SceneBuilderService:
     async def _build_elements(
         self, 
         dom_data: Dict[str, Any], 
-        vision_elements: List[Dict[str, Any]]
+        vision_elements: Union[List[Dict[str, Any]], ElementSet],
+        session_id: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Build elements array from DOM + Vision
         Priority: DOM > Vision
+        DOM elements carry their stable in-page id; vision-only ones get v<n>.
         """
-        elements = []
-        element_id = 1
+        elements = self._dom_scene_elements(dom_data, session_id)
+        dom_count = len(elements)
         
-        # Process DOM clickables (PRIMARY)
-        dom_clickables = dom_data.get('clickables', [])
-        for dom_el in dom_clickables:
-            bbox = dom_el.get('bbox', {})
-            element = {
-                "id": f"e{element_id}",
-                "role": self._normalize_role(dom_el.get('type', 'node')),
-                "label": dom_el.get('label', '')[:64],  # Limit label length
-                "bbox": [
-                    int(bbox.get('x', 0)),
-                    int(bbox.get('y', 0)),
-                    int(bbox.get('x', 0) + bbox.get('w', 0)),
-                    int(bbox.get('y', 0) + bbox.get('h', 0))
-                ],
-                "state": {
-                    "visible": True,
-                    "enabled": True
-                },
-                "value": "",
-                "confidence": dom_el.get('confidence', 0.85),
-                "source": "dom"
-            }
-            elements.append(element)
-            element_id += 1
-        
-        # Add vision-only elements (supplement)
-        for vis_el in vision_elements:
-            bbox = vis_el.get('bbox', {})
-            # Check if not already in DOM elements (avoid duplicates)
-            is_duplicate = False
-            vis_x = bbox.get('x', 0)
-            vis_y = bbox.get('y', 0)
-            
-            for existing in elements:
-                ex_bbox = existing['bbox']
-                if abs(ex_bbox[0] - vis_x) < 20 and abs(ex_bbox[1] - vis_y) < 20:
-                    is_duplicate = True
-                    break
-            
-            if not is_duplicate and vis_el.get('label'):
-                element = {
-                    "id": f"e{element_id}",
-                    "role": self._normalize_role(vis_el.get('type', 'node')),
-                    "label": vis_el.get('label', '')[:64],
-                    "bbox": [
-                        int(bbox.get('x', 0)),
-                        int(bbox.get('y', 0)),
-                        int(bbox.get('x', 0) + bbox.get('w', 0)),
-                        int(bbox.get('y', 0) + bbox.get('h', 0))
-                    ],
+        # Add vision-only elements (supplement): anything overlapping a DOM box is a duplicate
+        vision = vision_elements if isinstance(vision_elements, ElementSet) else ElementSet.from_dicts(vision_elements)
+        boxes = vision.boxes
+        labelled = np.flatnonzero(
+            np.fromiter(map(bool, vision.labels), dtype=bool, count=len(vision))
+            & (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        )
+        if len(labelled):
+            candidates = vision.take(labelled)
+            keep = merge_boxes(
+                np.concatenate([xyxy([el['bbox'] for el in elements]), candidates.boxes]),
+                np.repeat([0, 1], [dom_count, len(candidates)]),
+                np.concatenate([np.zeros(dom_count), candidates.confidence])
+            )
+            rows = (keep[keep >= dom_count] - dom_count).tolist()
+            bboxes = np.rint(candidates.boxes[rows]).astype(np.int64).tolist()
+            for element_id, (i, bbox) in enumerate(zip(rows, bboxes), 1):
+                elements.append({
+                    "id": f"v{element_id}",
+                    "role": self._normalize_role(candidates.types[i] or 'node'),
+                    "label": candidates.labels[i],
+                    "bbox": bbox,
                     "state": {
                         "visible": True,
                         "enabled": True
                     },
                     "value": "",
-                    "confidence": vis_el.get('confidence', 0.6),
+                    "confidence": float(candidates.confidence[i]),
                     "source": "vision"
-                }
-                elements.append(element)
-                element_id += 1
+                })
         
-        logger.info(f"Built {len(elements)} elements ({len(dom_clickables)} DOM, {len(elements) - len(dom_clickables)} vision)")
+        logger.info(f"Built {len(elements)} elements ({dom_count} DOM, {len(elements) - dom_count} vision)")
         return elements
     
+    def _dom_scene_elements(self, dom_data: Dict[str, Any], session_id: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Scene elements for DOM clickables.
+        When dom_data carries a delta against the token this session was last built
+        from (at the same scroll position), only added/changed elements are rebuilt
+        and removed ones dropped. Deltas are in document coordinates, so a scroll
+        moves every viewport bbox and forces a rebuild.
+        """
+        clickables = dom_data.get('clickables', [])
+        delta = dom_data.get('delta')
+        scroll = dom_data.get('scroll')
+        cached = self._dom_elements.get(session_id) if session_id else None
+        
+        if (delta is not None and cached is not None and cached['token'] == delta.get('since')
+                and cached.get('scroll') == scroll):
+            built = cached['elements']
+            for eid in delta.get('removed', []):
+                built.pop(eid, None)
+            touched = {c['eid'] for key in ('added', 'updated') for c in delta.get(key, [])}
+            touched.update(m['eid'] for key in ('moved', 'relabelled') for m in delta.get(key, []))
+            if touched:
+                for dom_el in clickables:
+                    eid = dom_el.get('eid')
+                    if eid in touched:
+                        built[eid] = self._dom_element(dom_el, eid)
+            if delta.get('order'):
+                built = {c.get('eid'): built[c.get('eid')] for c in clickables if c.get('eid') in built}
+            self.element_stats["patched"] += 1
+        else:
+            built = {}
+            for idx, dom_el in enumerate(clickables):
+                eid = dom_el.get('eid') or f"e{idx + 1}"
+                built[eid] = self._dom_element(dom_el, eid)
+            self.element_stats["rebuilt"] += 1
+        
+        if session_id and dom_data.get('token'):
+            self._dom_elements[session_id] = {'token': dom_data['token'], 'scroll': scroll, 'elements': built}
+        # Element dicts are replaced, never mutated, so scenes can share them
+        return list(built.values())
+    
+    def _dom_element(self, dom_el: Dict[str, Any], element_id: str) -> Dict[str, Any]:
+        bbox = dom_el.get('bbox', {})
+        return {
+            "id": element_id,
+            "role": self._normalize_role(dom_el.get('type', 'node')),
+            "label": dom_el.get('label', '')[:64],  # Limit label length
+            "bbox": [
+                int(bbox.get('x', 0)),
+                int(bbox.get('y', 0)),
+                int(bbox.get('x', 0) + bbox.get('w', 0)),
+                int(bbox.get('y', 0) + bbox.get('h', 0))
+            ],
+            "state": {
+                "visible": dom_el.get('in_view', True),
+                "enabled": True
+            },
+            "value": "",
+            "confidence": dom_el.get('confidence', 0.85),
+            "source": "dom"
+        }
+    
+    def _grid_cells(self, elements: List[Dict[str, Any]], viewport: Dict[str, int]) -> Dict[str, Any]:
+        """Shared grid definition plus cell -> element ids of the visible elements (crowded cells split: C7.1 .. C7.4)"""
+        visible = [el for el in elements if el['state'].get('visible', True)]
+        index = GridIndex(grid_config, viewport['width'], viewport['height'], [el['bbox'] for el in visible])
+        return {**grid_config.to_dict(), "cells": index.cell_map([el['id'] for el in visible])}
+    
+    def _track(self, scene: Dict[str, Any], diff: bool):
+        """Number the scene, remember its element signatures and attach the diff if asked"""
+        session_id = scene.get("session_id")
+        if not session_id:
+            return
+        scene["scene_id"] = self._scene_seq[session_id] = self._scene_seq.get(session_id, 0) + 1
+        previous = self._scenes.get(session_id)
+        # Element dicts kept from the previous build are not re-hashed
+        current = signatures(scene["elements"], previous["signatures"] if previous else None)
+        if diff:
+            scene["diff"] = diff_scenes(previous["page"], scene, previous["signatures"], current) if previous else None
+            if scene["diff"]:
+                self.diff_stats["diffs"] += 1
+                for key in ("added", "removed", "changed"):
+                    self.diff_stats[key] += len(scene["diff"][key])
+                self.diff_stats["unchanged"] += scene["diff"]["unchanged"]
+        self._scenes[session_id] = {
+            "page": {name: scene.get(name) for name in PAGE_FIELDS + ("scene_id",)},
+            "signatures": current
+        }
+    
+    def pin_scene(self, scene: Dict[str, Any]) -> Optional[int]:
+        """Keep a scene's signatures so later scenes can be diffed against it (diff_since)"""
+        session_id, scene_id = scene.get("session_id"), scene.get("scene_id")
+        if not session_id or scene_id is None:
+            return None
+        pinned = self._pinned.setdefault(session_id, OrderedDict())
+        pinned[scene_id] = {
+            "page": {name: scene.get(name) for name in PAGE_FIELDS + ("scene_id",)},
+            "signatures": self._signatures_of(scene)
+        }
+        pinned.move_to_end(scene_id)
+        while len(pinned) > SCENE_PIN_MAX:
+            pinned.popitem(last=False)
+        return scene_id
+    
+    def diff_since(self, scene: Dict[str, Any], since_scene_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Diff of scene against an earlier pinned scene of its session; None when that scene is not pinned"""
+        pinned = self._pinned.get(scene.get("session_id"), {}).get(since_scene_id)
+        if pinned is None:
+            return None
+        return diff_scenes(pinned["page"], scene, pinned["signatures"], self._signatures_of(scene, pinned["signatures"]))
+    
+    def _signatures_of(self, scene: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Element signatures of a scene (the tracked ones when it is the session's latest)"""
+        latest = self._scenes.get(scene.get("session_id"))
+        if latest and latest["page"].get("scene_id") == scene.get("scene_id"):
+            return latest["signatures"]
+        return signatures(scene.get("elements") or [], previous)
+    
+    def forget_session(self, session_id: str):
+        self._dom_elements.pop(session_id, None)
+        self._scenes.pop(session_id, None)
+        self._scene_seq.pop(session_id, None)
+        self._pinned.pop(session_id, None)
+    
     def _normalize_role(self, element_type: str) -> str:
         """Normalize element type to standard roles"""
         role_map = {
@@ -225,40 +348,16 @@ class SceneBuilderService:
         }
         return role_map.get(element_type.lower(), 'element')
     
-    async def _extract_hints(self, page: Page) -> Dict[str, Any]:
-        """Extract page hints (lang, dialogs, captcha, etc.)"""
+    def _extract_hints(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Extract page hints (lang, dialogs, captcha, etc.) from page snapshot"""
         try:
-            hints = {
-                "lang": "en",
-                "dialogs": 0,
-                "captcha": False,
-                "loading": False
+            return {
+                "lang": (snapshot.get('lang') or 'en')[:10],
+                "dialogs": int(snapshot.get('dialogs') or 0),
+                "captcha": bool(snapshot.get('captcha')),
+                "loading": bool(snapshot.get('loading_indicator'))
             }
             
-            # Detect language
-            lang = await page.evaluate("() => document.documentElement.lang || 'en'")
-            hints['lang'] = lang[:10]
-            
-            # Count visible dialogs
-            dialogs = await page.query_selector_all('[role="dialog"]:visible, .modal:visible, .dialog:visible')
-            hints['dialogs'] = len(dialogs) if dialogs else 0
-            
-            # Captcha presence
-            captcha_selectors = ['iframe[src*="captcha"]', '.g-recaptcha', '.h-captcha']
-            for sel in captcha_selectors:
-                if await page.query_selector(sel):
-                    hints['captcha'] = True
-                    break
-            
-            # Loading indicators
-            loading_selectors = ['[class*="loading"]:visible', '[class*="spinner"]:visible']
-            for sel in loading_selectors:
-                if await page.query_selector(sel):
-                    hints['loading'] = True
-                    break
-            
-            return hints
-            
         except Exception as e:
             logger.warning(f"Hints extraction error: {e}")
             return {"lang": "en", "dialogs": 0, "captcha": False, "loading": False}
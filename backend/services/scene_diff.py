@@ -0,0 +1,123 @@
+"""
+Scene Diff - what changed between two scenes of a session
+Every scene element gets a signature (hash of role, label, bbox, state,
+value, source). Consecutive scenes are compared by element id: ids only in
+the new scene are added, ids only in the old one removed, and ids whose
+signature differs are changed (with the fields that differ). Element dicts
+reused from the previous build (DOM delta patching) are recognised by identity
+and never re-hashed. Page-level facts (url, title, http, antibot, hints) are
+compared field by field.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+# Element fields that make up its signature (and can appear as changed)
+ELEMENT_FIELDS = ("role", "label", "bbox", "state", "value", "source")
+# Page-level scene fields compared between scenes
+PAGE_FIELDS = ("url", "title", "http", "antibot", "hints", "viewport")
+
+# id -> (element dict, signature)
+Signatures = Dict[str, Tuple[Dict[str, Any], int]]
+
+
+def element_signature(el: Dict[str, Any]) -> int:
+    state = el.get("state") or {}
+    return hash((
+        el.get("role"), el.get("label"), tuple(el.get("bbox") or ()),
+        state.get("visible"), state.get("enabled"), el.get("value"), el.get("source")
+    ))
+
+
+def signatures(elements: List[Dict[str, Any]], previous: Optional[Signatures] = None) -> Signatures:
+    """Signatures by element id; elements that are the very same dict as before keep their old signature"""
+    previous = previous or {}
+    out: Signatures = {}
+    for el in elements:
+        eid = el.get("id")
+        prev = previous.get(eid)
+        out[eid] = (el, prev[1]) if prev is not None and prev[0] is el else (el, element_signature(el))
+    return out
+
+
+def diff_scenes(
+    prev_scene: Dict[str, Any],
+    curr_scene: Dict[str, Any],
+    prev_signatures: Signatures,
+    curr_signatures: Signatures
+) -> Dict[str, Any]:
+    """
+    Structured diff of curr_scene against prev_scene.
+
+    Returns:
+        {since, scene_id, added: [element], removed: [{id, role, label, source}],
+         changed: [{id, role, label, source, fields: {name: new value}}],
+         page: {field: {"from", "to"}}, unchanged: int}
+    """
+    added, changed = [], []
+    unchanged = 0
+    for eid, (el, sig) in curr_signatures.items():
+        prev = prev_signatures.get(eid)
+        if prev is None:
+            added.append(el)
+        elif prev[1] == sig:
+            unchanged += 1
+        else:
+            fields = {name: el.get(name) for name in ELEMENT_FIELDS if el.get(name) != prev[0].get(name)}
+            changed.append({**_brief(el), "fields": fields})
+    removed = [_brief(el) for eid, (el, _) in prev_signatures.items() if eid not in curr_signatures]
+    page = {
+        name: {"from": prev_scene.get(name), "to": curr_scene.get(name)}
+        for name in PAGE_FIELDS if prev_scene.get(name) != curr_scene.get(name)
+    }
+    return {
+        "since": prev_scene.get("scene_id"),
+        "scene_id": curr_scene.get("scene_id"),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "page": page,
+        "unchanged": unchanged
+    }
+
+
+def is_empty(diff: Dict[str, Any]) -> bool:
+    return not (diff.get("added") or diff.get("removed") or diff.get("changed") or diff.get("page"))
+
+
+def summarize_diff(diff: Dict[str, Any], limit: int = 20) -> str:
+    """Compact text of a diff for LLM prompts (one line per change)"""
+    if is_empty(diff):
+        return "No changes since the previous scene"
+    lines = []
+    for name, change in diff.get("page", {}).items():
+        if name in ("url", "title"):
+            lines.append(f"{name}: {change['from']!r} -> {change['to']!r}")
+        elif name == "http":
+            lines.append(f"http: {(change['from'] or {}).get('status')} -> {(change['to'] or {}).get('status')}")
+        elif name == "antibot":
+            lines.append(f"antibot: {(change['to'] or {}).get('present', False)} ({(change['to'] or {}).get('type', 'none')})")
+        elif name == "hints":
+            before, after = change["from"] or {}, change["to"] or {}
+            lines.append("hints: " + ", ".join(f"{k}={after.get(k)}" for k in after if before.get(k) != after.get(k)))
+    entries = (
+        [f"+ {el.get('role')} '{el.get('label', '')[:40]}' [{el.get('id')}] at {el.get('bbox')}" for el in diff.get("added", [])]
+        + [f"- {el['role']} '{(el['label'] or '')[:40]}' [{el['id']}]" for el in diff.get("removed", [])]
+        + [f"~ {el['role']} '{(el['label'] or '')[:40]}' [{el['id']}]: {', '.join(_describe(k, v) for k, v in el['fields'].items())}"
+           for el in diff.get("changed", [])]
+    )
+    lines += entries[:limit]
+    if len(entries) > limit:
+        lines.append(f"... {len(entries) - limit} more element changes")
+    lines.append(f"{diff.get('unchanged', 0)} elements unchanged")
+    return "\n".join(lines)
+
+
+def _brief(el: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": el.get("id"), "role": el.get("role"), "label": el.get("label"), "source": el.get("source")}
+
+
+def _describe(name: str, value: Any) -> str:
+    if name == "label":
+        return f"label now {str(value)[:40]!r}"
+    if name == "state":
+        return "state " + ", ".join(f"{k}={v}" for k, v in (value or {}).items())
+    return f"{name} {value}"
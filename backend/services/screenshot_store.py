@@ -0,0 +1,215 @@
+"""
+Screenshot Store - content-addressed screenshot blobs
+Screenshots are captured as JPEG/WebP (configurable quality and scale), kept as raw
+bytes keyed by their content digest under a byte budget, and passed around
+internally as small ScreenshotRef objects. Base64 is produced only at the edge
+(HTTP responses, LLM payloads) and off the event loop.
+"""
+import os
+import io
+import base64
+import asyncio
+import hashlib
+import logging
+import struct
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, Tuple, Union
+
+from playwright.async_api import Page
+
+from services.byte_lru import ByteBudgetLRU
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image  # only needed for WebP transcoding
+except Exception:
+    Image = None
+
+# jpeg | webp | png
+SCREENSHOT_FORMAT = os.environ.get('SCREENSHOT_FORMAT', 'jpeg').lower()
+SCREENSHOT_QUALITY = int(os.environ.get('SCREENSHOT_QUALITY', '80'))
+# css = one image pixel per CSS pixel (smaller on HiDPI), device = native resolution
+SCREENSHOT_SCALE = os.environ.get('SCREENSHOT_SCALE', 'css').lower()
+SCREENSHOT_STORE_MAX_MB = float(os.environ.get('SCREENSHOT_STORE_MAX_MB', '64'))
+
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+@dataclass(frozen=True)
+class ScreenshotRef:
+    """Reference to a stored screenshot (what internal callers pass around)"""
+    digest: str
+    width: int
+    height: int
+    format: str
+    size: int
+
+    @property
+    def mime(self) -> str:
+        return MIME_TYPES.get(self.format, "image/png")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+ScreenshotLike = Union[ScreenshotRef, Dict[str, Any], str, None]
+
+
+def _image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """Width/height from PNG or JPEG headers without decoding the image"""
+    try:
+        if data[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', data[16:24])
+        if data[:2] == b'\xff\xd8':
+            i = 2
+            while i + 9 < len(data):
+                if data[i] != 0xFF:
+                    i += 1
+                    continue
+                marker = data[i + 1]
+                if marker in (0xC0, 0xC1, 0xC2):
+                    h, w = struct.unpack('>HH', data[i + 5:i + 9])
+                    return w, h
+                i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    except Exception:
+        pass
+    return None
+
+
+def _to_webp(png_bytes: bytes, quality: int) -> bytes:
+    with Image.open(io.BytesIO(png_bytes)) as img:
+        out = io.BytesIO()
+        img.save(out, format='WEBP', quality=quality)
+        return out.getvalue()
+
+
+class ScreenshotStore:
+    """
+    Content-addressed screenshot storage with byte-budget eviction.
+    - capture(page, session_id) -> ScreenshotRef
+    - get_bytes(ref) -> raw image bytes (None if evicted)
+    - to_base64(ref) / data_url(ref) -> edge encodings, computed in a worker thread
+    """
+
+    def __init__(self, max_bytes: int = int(SCREENSHOT_STORE_MAX_MB * 1024 * 1024)):
+        self._blobs = ByteBudgetLRU(max_bytes)
+        # Encoded strings are cached separately so repeated polling of the same frame is free
+        self._b64 = ByteBudgetLRU(max(1, max_bytes // 4))
+        self._refs: Dict[str, ScreenshotRef] = {}
+        self._latest: Dict[str, ScreenshotRef] = {}
+        self.captures = 0
+        self.duplicates = 0
+
+    async def capture(self, page: Page, session_id: Optional[str] = None) -> Optional[ScreenshotRef]:
+        """Capture the viewport in the configured format and store it"""
+        fmt = SCREENSHOT_FORMAT if SCREENSHOT_FORMAT in MIME_TYPES else 'jpeg'
+        if fmt == 'webp' and Image is None:
+            fmt = 'jpeg'
+        options: Dict[str, Any] = {"full_page": False, "scale": 'device' if SCREENSHOT_SCALE == 'device' else 'css'}
+        if fmt == 'jpeg':
+            options.update(type='jpeg', quality=SCREENSHOT_QUALITY)
+        else:
+            options.update(type='png')
+        try:
+            data = await page.screenshot(**options)
+            if fmt == 'webp':
+                data = await asyncio.to_thread(_to_webp, data, SCREENSHOT_QUALITY)
+        except Exception as e:
+            logger.error(f"Screenshot error: {str(e)}")
+            return None
+        size = _image_size(data)
+        if not size:
+            viewport = page.viewport_size or {}
+            size = (viewport.get('width', 1280), viewport.get('height', 800))
+        return self.put(data, fmt, size[0], size[1], session_id=session_id)
+
+    def put(self, data: bytes, fmt: str, width: int, height: int, session_id: Optional[str] = None) -> ScreenshotRef:
+        """Store raw bytes; identical frames share one blob"""
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self.captures += 1
+        ref = self._refs.get(digest)
+        if ref is not None and digest in self._blobs:
+            self.duplicates += 1
+            self._blobs.get(digest)  # refresh recency
+        else:
+            ref = ScreenshotRef(digest=digest, width=int(width), height=int(height), format=fmt, size=len(data))
+            self._blobs.put(digest, data)
+            self._refs[digest] = ref
+            self._prune_refs()
+        if session_id:
+            self._latest[session_id] = ref
+        return ref
+
+    def get_bytes(self, ref: ScreenshotLike) -> Optional[bytes]:
+        digest = self._digest(ref)
+        return self._blobs.get(digest) if digest else None
+
+    def get_ref(self, digest: str) -> Optional[ScreenshotRef]:
+        return self._refs.get(digest) if digest in self._blobs else None
+
+    def latest(self, session_id: str) -> Optional[ScreenshotRef]:
+        ref = self._latest.get(session_id)
+        return ref if ref and ref.digest in self._blobs else None
+
+    def forget_session(self, session_id: str):
+        self._latest.pop(session_id, None)
+
+    async def to_base64(self, ref: ScreenshotLike) -> str:
+        """Base64 (no data: prefix) for HTTP/LLM edges; "" if unknown or evicted"""
+        digest = self._digest(ref)
+        if not digest:
+            return ""
+        cached = self._b64.get(digest)
+        if cached is not None:
+            return cached
+        data = self._blobs.get(digest)
+        if data is None:
+            return ""
+        encoded = await asyncio.to_thread(lambda: base64.b64encode(data).decode('ascii'))
+        self._b64.put(digest, encoded)
+        return encoded
+
+    async def data_url(self, ref: ScreenshotLike) -> str:
+        digest = self._digest(ref)
+        stored = self._refs.get(digest) if digest else None
+        encoded = await self.to_base64(digest)
+        if not encoded:
+            return ""
+        return f"data:{stored.mime if stored else 'image/png'};base64,{encoded}"
+
+    async def with_base64(self, result: Dict[str, Any], key: str = "screenshot") -> Dict[str, Any]:
+        """Copy of an action result with result["screenshot_ref"] materialized as base64 under key"""
+        if not isinstance(result, dict) or not result.get("screenshot_ref"):
+            return result
+        out = dict(result)
+        out[key] = await self.to_base64(result["screenshot_ref"])
+        out.setdefault("screenshot_id", self._digest(result["screenshot_ref"]))
+        return out
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "format": SCREENSHOT_FORMAT,
+            "quality": SCREENSHOT_QUALITY,
+            "scale": SCREENSHOT_SCALE,
+            "captures": self.captures,
+            "duplicates": self.duplicates,
+            "blobs": self._blobs.stats(),
+            "base64_cache": self._b64.stats()
+        }
+
+    def _digest(self, ref: ScreenshotLike) -> Optional[str]:
+        if isinstance(ref, ScreenshotRef):
+            return ref.digest
+        if isinstance(ref, dict):
+            return ref.get("digest")
+        return ref or None
+
+    def _prune_refs(self):
+        # Drop metadata of evicted blobs so it cannot grow without bound
+        if len(self._refs) > 2 * len(self._blobs) + 64:
+            self._refs = {d: r for d, r in self._refs.items() if d in self._blobs}
+
+
+# Global instance
+screenshot_store = ScreenshotStore()
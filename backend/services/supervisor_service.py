@@ -4,6 +4,11 @@ from typing import Dict, Any, List, Optional
 import httpx
 import json
 import re
+import time
+import hashlib
+
+from services.visual_diff_service import visual_diff_service
+from services.grounding_cache_service import grounding_cache_service, evidence_digest
 
 # Supervisor (Step Brain) via OpenRouter (text-first, robust JSON)
 # Default model can be overridden by request payload or env
@@ -55,7 +60,7 @@ SAFE_MODELS = [
     lambda: 'qwen/qwen2.5',
 ]
 
-CELL_RE = re.compile(r"^[A-Z][0-9]{1,2}$")
+CELL_RE = re.compile(r"^[A-Z][0-9]{1,2}(\.[1-4])*$")
 
 class SupervisorService:
     def _extract_json(self, content: str) -> Dict[str, Any]:
@@ -131,6 +136,29 @@ class SupervisorService:
         out['amount'] = max(100, min(800, out['amount']))
         return out
 
+    async def _store_grounding(self, url: Optional[str], grounding_step: Dict[str, Any], vision: List[Dict[str, Any]],
+                               out: Dict[str, Any], mode: Optional[str], llm_ms: float) -> Dict[str, Any]:
+        """Remember clicks on a known element and validation verdicts (typed text is job data, never reused)"""
+        if out.get('needs_user_input'):
+            return out
+        element = None
+        if out.get('next_action') == 'CLICK_CELL':
+            element = next((el for el in vision if el.get('cell') == out.get('target_cell')), None)
+            if element is None:
+                return out
+        elif mode != 'validate':
+            return out
+        key = await grounding_cache_service.store(
+            "next_step", url, grounding_step, vision,
+            element=element,
+            result={k: v for k, v in out.items() if k != 'target_cell'},
+            confidence=out.get('confidence', 0.5),
+            llm_ms=llm_ms
+        )
+        if key:
+            out = {**out, "grounding": {"key": key, "cached": False}}
+        return out
+
     async def _call_openrouter(self, messages: List[Dict[str, str]], model: str) -> Dict[str, Any]:
         api_key = os.environ.get('OPENROUTER_API_KEY')
         if not api_key:
@@ -160,7 +188,36 @@ class SupervisorService:
 
     async def next_step(self, goal: str, history: List[Dict[str, Any]], screenshot_base64: str,
                         vision: List[Dict[str, Any]], available_data: Optional[Dict[str, Any]] = None, 
-                        model: str = DEFAULT_VLM) -> Dict[str, Any]:
+                        model: str = DEFAULT_VLM, mode: Optional[str] = None,
+                        change_score: Optional[float] = None, url: Optional[str] = None,
+                        frame_digest: Optional[str] = None) -> Dict[str, Any]:
+        # The client ran the previous answer and it did not work: a grounding behind it is forgotten
+        if history and history[-1].get('grounding') and history[-1].get('success') is False:
+            await grounding_cache_service.report(history[-1]['grounding'], False)
+
+        # Validation of an action that changed nothing on screen: told to the model, which decides
+        unchanged = mode == 'validate' and change_score is not None and change_score < visual_diff_service.threshold
+
+        # Same goal on the same site and element layout decided before -> reuse the answer
+        grounding_step = {
+            "goal": goal,
+            "mode": mode,
+            "last": (history[-1].get('next_action') or history[-1].get('action')) if history else None,
+            "data": sorted(k for k, v in (available_data or {}).items() if v),
+            "unchanged": unchanged
+        }
+        if mode == 'validate':
+            # A verdict is read off the screenshot: only the same frame may replay it
+            if not frame_digest and screenshot_base64:
+                frame_digest = hashlib.blake2b(screenshot_base64.encode(), digest_size=16).hexdigest()
+            grounding_step["evidence"] = evidence_digest(frame=frame_digest)
+        cached = await grounding_cache_service.lookup("next_step", url, grounding_step, vision or [])
+        if cached:
+            out = dict(cached["result"])
+            if cached.get("element") is not None:
+                out["target_cell"] = cached["element"].get("cell") or ''
+            return {**out, "grounding": {"key": cached["key"], "cached": True}}
+
         # Build the prompt (compact)
         has_screenshot = bool(screenshot_base64)
         
@@ -182,6 +239,10 @@ class SupervisorService:
             if data_lines:
                 user_parts.insert(1, f"AVAILABLE DATA (use for TYPE_AT_CELL):\n" + "\n".join(data_lines))
         
+        if unchanged:
+            user_parts.append(f"SCREEN CHANGE: none detected after the action (change score {change_score:.3f}). "
+                              "The effect may still be off-screen or not visual - judge from the elements.")
+
         # include a compact list of vision elements (cap at 40)
         lines = []
         for el in (vision or [])[:40]:
@@ -203,9 +264,12 @@ class SupervisorService:
                 m = None
             if not m:
                 continue
+            started = time.perf_counter()
             raw = await self._call_openrouter(messages, m)
             if not raw.get('error'):
-                return self._normalize(raw, vision)
+                out = self._normalize(raw, vision)
+                return await self._store_grounding(url, grounding_step, vision or [], out, mode,
+                                                   (time.perf_counter() - started) * 1000)
             tried_errors.append({"model": m, "error": raw.get('error'), "details": raw.get('details')})
         return {"error": "Brain request failed", "tried": tried_errors}
 
@@ -20,16 +20,25 @@ class VerifierService:
     
     async def verify(
         self,
-        prev_scene: Dict[str, Any],
+        prev_scene: Optional[Dict[str, Any]],
         curr_scene: Dict[str, Any],
         last_action: Dict[str, Any],
         goal: Dict[str, Any]
     ) -> Dict[str, Any]:
         """
         Verify if action had expected effect
+        prev_scene may be omitted when curr_scene carries a diff (build_scene(diff=True)).
         Returns: {success, reason, remediation}
         """
         try:
+            diff = self._scene_diff(prev_scene, curr_scene)
+            if prev_scene is None:
+                # Previous page facts are the "from" side of the diff (unchanged ones equal the current scene)
+                prev_scene = {
+                    **curr_scene,
+                    **{name: change['from'] for name, change in ((diff or {}).get('page') or {}).items()}
+                }
+            
             # Quick checks first
             prev_url = prev_scene.get('url', '')
             curr_url = curr_scene.get('url', '')
@@ -46,12 +55,8 @@ class VerifierService:
                         "remediation": "retry_target"
                     }
             
-            # Element state changes
-            prev_elements = {el['id']: el for el in prev_scene.get('elements', [])}
-            curr_elements = {el['id']: el for el in curr_scene.get('elements', [])}
-            
-            # Check for new elements (dialog, form, etc.)
-            new_elements = len(curr_elements) - len(prev_elements)
+            # Element state changes (DOM element ids are stable across scenes)
+            element_changes = self.diff_elements(prev_scene, curr_scene, diff)
             
             # Check for antibot changes
             prev_antibot = prev_scene.get('antibot', {}).get('present', False)
@@ -89,7 +94,8 @@ class VerifierService:
                 "success": True,
                 "expected": f"Action {action_type} completed",
                 "observed": "Scene changed appropriately",
-                "remediation": "none"
+                "remediation": "none",
+                "element_changes": {k: v for k, v in element_changes.items() if not k.endswith('_ids')}
             }
             
         except Exception as e:
@@ -102,6 +108,59 @@ class VerifierService:
             }
 
 
+    def _scene_diff(self, prev_scene: Optional[Dict[str, Any]], curr_scene: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The scene builder's diff of curr_scene, if it was taken against prev_scene"""
+        diff = curr_scene.get('diff')
+        if not diff:
+            return None
+        if prev_scene is not None and diff.get('since') != prev_scene.get('scene_id'):
+            return None
+        return diff
+
+    def diff_elements(
+        self,
+        prev_scene: Dict[str, Any],
+        curr_scene: Dict[str, Any],
+        diff: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Added / removed / moved / relabelled DOM elements between two scenes, by stable id"""
+        if diff is not None:
+            # Already computed by the scene builder from element signatures
+            added = [el['id'] for el in diff['added'] if el.get('source') == 'dom']
+            removed = [el['id'] for el in diff['removed'] if el.get('source') == 'dom']
+            changed = [el for el in diff['changed'] if el.get('source') == 'dom']
+            return {
+                "added": len(added),
+                "removed": len(removed),
+                "moved": sum(1 for el in changed if 'bbox' in el['fields']),
+                "relabelled": sum(1 for el in changed if 'label' in el['fields']),
+                "added_ids": added,
+                "removed_ids": removed
+            }
+        prev_elements = {el['id']: el for el in prev_scene.get('elements', []) if el.get('source') == 'dom'}
+        curr_elements = {el['id']: el for el in curr_scene.get('elements', []) if el.get('source') == 'dom'}
+        added = [eid for eid in curr_elements if eid not in prev_elements]
+        removed = [eid for eid in prev_elements if eid not in curr_elements]
+        moved = 0
+        relabelled = 0
+        for eid, el in curr_elements.items():
+            prev = prev_elements.get(eid)
+            if prev is None or prev is el:
+                continue
+            if prev['bbox'] != el['bbox']:
+                moved += 1
+            if prev['label'] != el['label']:
+                relabelled += 1
+        return {
+            "added": len(added),
+            "removed": len(removed),
+            "moved": moved,
+            "relabelled": relabelled,
+            "added_ids": added,
+            "removed_ids": removed
+        }
+
+
 class RecoveryService:
     """
     Recovery: Generate recovery steps from remediation hint
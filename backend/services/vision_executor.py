@@ -0,0 +1,201 @@
+"""
+Vision Executor - off-event-loop vision inference with backpressure
+Image decoding, Florence-2 preprocessing and ONNX runs happen on a dedicated
+thread pool instead of the FastAPI event loop. Jobs wait in a bounded queue and
+carry a deadline. A job whose caller gave up (step abandoned, session closed,
+deadline passed) is skipped if still queued, and an in-flight ONNX run is
+interrupted through RunOptions.terminate.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Set, Callable, Deque, List
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort  # type: ignore
+except Exception:
+    ort = None
+
+# Inference threads. ONNX Runtime spreads each run over its own intra-op threads,
+# so by default half the cores run jobs side by side
+VISION_WORKERS = int(os.environ.get('VISION_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+# Jobs allowed to wait for a worker; beyond that callers get an immediate VisionBusy
+VISION_QUEUE_MAX = int(os.environ.get('VISION_QUEUE_MAX', '16'))
+# Default time budget of one vision request (queue wait + run), seconds
+VISION_DEADLINE_S = float(os.environ.get('VISION_DEADLINE_S', '20'))
+
+
+class VisionBusy(Exception):
+    """Queue full, or the deadline passed before a result was ready"""
+
+
+class VisionCancelled(Exception):
+    """The job was cancelled before or while it ran"""
+
+
+class CancelToken:
+    """Cancellation handle of one job; jobs call check() between stages and pass run_options to ORT"""
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.cancelled = False
+        self.run_options = ort.RunOptions() if ort is not None else None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.run_options is not None:
+            self.run_options.terminate = True
+
+    @property
+    def expired(self) -> bool:
+        return self.cancelled or time.monotonic() >= self.deadline
+
+    def check(self):
+        if self.expired:
+            raise VisionCancelled("Vision job cancelled or past its deadline")
+
+
+class VisionExecutor:
+    """
+    Bounded thread pool for vision work.
+    - run(fn, *args, session_id, deadline_s): await fn(*args, cancel=token) on a worker
+    - cancel_session(session_id): abandon every job of a closed session
+    """
+
+    def __init__(self, workers: int = VISION_WORKERS, queue_max: int = VISION_QUEUE_MAX):
+        self.workers = max(1, workers)
+        self.queue_max = max(1, queue_max)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._tokens: Dict[str, Set[CancelToken]] = {}
+        self._wait_ms: Deque[float] = deque(maxlen=1024)
+        self._run_ms: Deque[float] = deque(maxlen=1024)
+        self.stats = {"submitted": 0, "completed": 0, "rejected": 0, "expired": 0, "cancelled": 0, "failed": 0}
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        session_id: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run fn(*args, cancel=token, **kwargs) on a vision worker.
+
+        Raises:
+            VisionBusy: queue full or deadline passed
+            VisionCancelled: the session's jobs were cancelled
+            asyncio.CancelledError: the awaiting step was cancelled (the job is cancelled too)
+        """
+        with self._lock:
+            if self._waiting >= self.queue_max:
+                self.stats["rejected"] += 1
+                raise VisionBusy(f"Vision queue full ({self._waiting} waiting)")
+            self._waiting += 1
+            self.stats["submitted"] += 1
+
+        budget = deadline_s or VISION_DEADLINE_S
+        token = CancelToken(time.monotonic() + budget)
+        if session_id:
+            self._tokens.setdefault(session_id, set()).add(token)
+        enqueued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self._waiting -= 1
+                self._running += 1
+            self._wait_ms.append((started - enqueued) * 1000)
+            try:
+                token.check()
+                return fn(*args, cancel=token, **kwargs)
+            finally:
+                self._run_ms.append((time.perf_counter() - started) * 1000)
+                with self._lock:
+                    self._running -= 1
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor(), job)
+        # Abandoned jobs still finish (usually with VisionCancelled); retrieve it quietly
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            # shield: an abandoned job must still reach job() so the queue accounting stays exact
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=budget)
+            # expired, not only cancelled: the worker's deadline check can fire before wait_for times out
+            if token.expired:
+                raise VisionCancelled("Vision job cancelled or past its deadline")
+            self.stats["completed"] += 1
+            return result
+        except asyncio.TimeoutError:
+            token.cancel()
+            self.stats["expired"] += 1
+            raise VisionBusy(f"Vision deadline of {budget:.1f}s exceeded")
+        except asyncio.CancelledError:
+            token.cancel()
+            self.stats["cancelled"] += 1
+            raise
+        except VisionCancelled:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            if session_id and session_id in self._tokens:
+                self._tokens[session_id].discard(token)
+                if not self._tokens[session_id]:
+                    del self._tokens[session_id]
+
+    def cancel_session(self, session_id: str):
+        """Cancel queued and running jobs of a session (closed or crashed)"""
+        for token in self._tokens.pop(session_id, ()):
+            token.cancel()
+
+    def shutdown(self):
+        for tokens in self._tokens.values():
+            for token in tokens:
+                token.cancel()
+        self._tokens.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "workers": self.workers,
+            "queue_max": self.queue_max,
+            "queued": self._waiting,
+            "running": self._running,
+            "wait_ms": self._summary(self._wait_ms),
+            "run_ms": self._summary(self._run_ms)
+        }
+
+    # ----- internals -----
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vision")
+        return self._pool
+
+    def _summary(self, values: Deque[float]) -> Dict[str, Any]:
+        samples: List[float] = sorted(values)
+        if not samples:
+            return {"p50": 0.0, "p99": 0.0, "samples": 0}
+        return {
+            "p50": round(samples[int(0.50 * (len(samples) - 1))], 1),
+            "p99": round(samples[int(0.99 * (len(samples) - 1))], 1),
+            "samples": len(samples)
+        }
+
+
+# Global instance
+vision_executor = VisionExecutor()
@@ -0,0 +1,136 @@
+"""
+Vision Result Cache - detect() results keyed by what they depend on
+Observations often repeat byte-identical frames with the same DOM clickables
+(perception before/after a no-op action, polling /screenshot, scroll at the
+page end). A result is keyed by (screenshot digest, DOM clickables digest,
+viewport, grid rows/cols) and reused instead of re-running Florence-2 and the
+DOM merge. Entries are ElementSets (never modified once cached, so they are
+shared instead of copied) and live under a byte budget, either one shared LRU
+or one LRU per session.
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from services.byte_lru import ByteBudgetLRU
+from services.element_set import ElementSet
+
+logger = logging.getLogger(__name__)
+
+# Budget of the shared cache (also used for calls without a session)
+VISION_CACHE_MAX_MB = float(os.environ.get('VISION_CACHE_MAX_MB', '16'))
+# When > 0, every session gets its own LRU of this size instead of sharing the global one
+VISION_CACHE_SESSION_MAX_MB = float(os.environ.get('VISION_CACHE_SESSION_MAX_MB', '0'))
+VISION_CACHE_ENABLED = os.environ.get('VISION_CACHE_ENABLED', 'true').lower() == 'true'
+
+# Fields of a DOM clickable that end up in (or decide) the detect() output
+DOM_KEY_FIELDS = ('eid', 'bbox', 'label', 'text', 'name', 'type', 'confidence', 'in_view')
+
+CacheKey = Tuple[str, str, int, int, int, int]
+
+
+def _result_size(results: ElementSet) -> int:
+    return 64 + results.nbytes()
+
+
+def screenshot_digest(screenshot: Union[str, bytes, None]) -> Optional[str]:
+    """Same digest as the screenshot store, so stored refs can pass theirs directly"""
+    if not screenshot:
+        return None
+    data = screenshot.encode('ascii') if isinstance(screenshot, str) else bytes(screenshot)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def dom_digest(clickables: Optional[List[Dict[str, Any]]], blind_regions: Optional[List[Dict[str, Any]]] = None) -> str:
+    projected = [{k: el.get(k) for k in DOM_KEY_FIELDS} for el in (clickables or [])]
+    if blind_regions:
+        projected.append({"blind": blind_regions})
+    payload = json.dumps(projected, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class VisionResultCache:
+    """
+    Byte-budget LRU of detect() results.
+    - key(screenshot_digest, dom_clickables, vw, vh, rows, cols) -> cache key
+    - get(key, session_id) / put(key, results, session_id)
+    - drop_session(session_id): free a closed session's entries
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = int(VISION_CACHE_MAX_MB * 1024 * 1024),
+        session_max_bytes: int = int(VISION_CACHE_SESSION_MAX_MB * 1024 * 1024),
+        enabled: bool = VISION_CACHE_ENABLED
+    ):
+        self.enabled = enabled
+        self.session_max_bytes = max(0, session_max_bytes)
+        self._global = ByteBudgetLRU(max_bytes, sizeof=_result_size)
+        self._sessions: Dict[str, ByteBudgetLRU] = {}
+        # Counters of dropped session caches, so hit ratios survive session turnover
+        self._closed = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def key(
+        self,
+        screenshot_digest: str,
+        dom_clickables: Optional[List[Dict[str, Any]]],
+        viewport_w: int,
+        viewport_h: int,
+        rows: int,
+        cols: int,
+        blind_regions: Optional[List[Dict[str, Any]]] = None
+    ) -> CacheKey:
+        return (screenshot_digest, dom_digest(dom_clickables, blind_regions), int(viewport_w), int(viewport_h), int(rows), int(cols))
+
+    def get(self, key: CacheKey, session_id: Optional[str] = None) -> Optional[ElementSet]:
+        if not self.enabled:
+            return None
+        return self._lru(session_id).get(key)
+
+    def put(self, key: CacheKey, results: ElementSet, session_id: Optional[str] = None):
+        if self.enabled:
+            self._lru(session_id).put(key, results)
+
+    def drop_session(self, session_id: str):
+        lru = self._sessions.pop(session_id, None)
+        if lru is not None:
+            for name in self._closed:
+                self._closed[name] += getattr(lru, name)
+
+    def clear(self):
+        self._global.clear()
+        self._sessions.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        caches = [self._global] + list(self._sessions.values())
+        hits = self._closed["hits"] + sum(c.hits for c in caches)
+        misses = self._closed["misses"] + sum(c.misses for c in caches)
+        return {
+            "enabled": self.enabled,
+            "scope": "session" if self.session_max_bytes else "global",
+            "items": sum(len(c) for c in caches),
+            "bytes_used": sum(c.bytes_used for c in caches),
+            "max_bytes": self._global.max_bytes,
+            "session_max_bytes": self.session_max_bytes,
+            "sessions": len(self._sessions),
+            "hits": hits,
+            "misses": misses,
+            "evictions": self._closed["evictions"] + sum(c.evictions for c in caches),
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0
+        }
+
+    # ----- internals -----
+
+    def _lru(self, session_id: Optional[str]) -> ByteBudgetLRU:
+        if not self.session_max_bytes or not session_id:
+            return self._global
+        lru = self._sessions.get(session_id)
+        if lru is None:
+            lru = self._sessions[session_id] = ByteBudgetLRU(self.session_max_bytes, sizeof=_result_size)
+        return lru
+
+
+# Global instance
+vision_result_cache = VisionResultCache()
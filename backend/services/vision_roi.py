@@ -0,0 +1,180 @@
+"""
+Vision ROI - screen regions the DOM does not explain
+The viewport is split into small cells. A cell needs vision when no DOM
+clickable covers it and it is not visually blank, or when it lies on a
+canvas / iframe / svg / image-button rect reported by the page. Needed cells
+are grouped into padded rectangles, and large ones are split into tiles, so
+the detector cost follows the uncovered area instead of the full frame.
+"""
+import os
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+# Occupancy cell size, viewport pixels
+VISION_ROI_CELL_PX = int(os.environ.get('VISION_ROI_CELL_PX', '32'))
+# Grayscale spread below which a cell counts as blank (background, whitespace)
+VISION_ROI_MIN_STD = float(os.environ.get('VISION_ROI_MIN_STD', '6'))
+# Above this share of the viewport one full-frame pass is cheaper than crops
+VISION_ROI_MAX_FRACTION = float(os.environ.get('VISION_ROI_MAX_FRACTION', '0.6'))
+# Crops larger than this (viewport pixels) are split into tiles
+VISION_ROI_TILE_PX = int(os.environ.get('VISION_ROI_TILE_PX', '640'))
+VISION_ROI_PAD_PX = int(os.environ.get('VISION_ROI_PAD_PX', '8'))
+# Isolated regions smaller than this many cells are ignored (stray text, borders)
+VISION_ROI_MIN_CELLS = int(os.environ.get('VISION_ROI_MIN_CELLS', '2'))
+
+# Sub-samples per cell side for the blank test
+_SAMPLES = 4
+
+Rect = Dict[str, int]
+
+
+def _cell_span(start: float, length: float, cell: int, limit: int, touch: bool) -> Tuple[int, int]:
+    """Cells overlapping [start, start + length) (touch) or whose centers fall inside it"""
+    if touch:
+        return max(0, math.floor(start / cell)), min(limit, math.ceil((start + length) / cell))
+    return max(0, math.ceil(start / cell - 0.5)), min(limit, math.ceil((start + length) / cell - 0.5))
+
+
+def _mark(mask: np.ndarray, rects: List[Rect], cell: int, touch: bool = False):
+    rows, cols = mask.shape
+    for r in rects:
+        try:
+            r0, r1 = _cell_span(r['y'], r['h'], cell, rows, touch)
+            c0, c1 = _cell_span(r['x'], r['w'], cell, cols, touch)
+        except (KeyError, TypeError):
+            continue
+        if r0 < r1 and c0 < c1:
+            mask[r0:r1, c0:c1] = True
+
+
+def blank_cells(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """
+    gray: grayscale frame resampled to (rows * 4, cols * 4) (box filter).
+    A cell is blank when its 4x4 sub-sample means barely differ.
+    """
+    blocks = gray.astype(np.float32).reshape(rows, _SAMPLES, cols, _SAMPLES)
+    return blocks.std(axis=(1, 3)) < VISION_ROI_MIN_STD
+
+
+def sample_size(viewport_w: int, viewport_h: int, cell: int = VISION_ROI_CELL_PX) -> Tuple[int, int]:
+    """(width, height) the grayscale frame must be resized to for blank_cells()"""
+    return math.ceil(viewport_w / cell) * _SAMPLES, math.ceil(viewport_h / cell) * _SAMPLES
+
+
+def _components(mask: np.ndarray, keep: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    """Bounding boxes (r0, c0, r1, c1) of 4-connected groups; small groups survive only if they touch keep"""
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    boxes = []
+    for r, c in zip(*np.nonzero(mask)):
+        if seen[r, c]:
+            continue
+        stack = [(r, c)]
+        seen[r, c] = True
+        r0, c0, r1, c1, size, kept = r, c, r, c, 0, False
+        while stack:
+            y, x = stack.pop()
+            size += 1
+            kept = kept or bool(keep[y, x])
+            r0, c0, r1, c1 = min(r0, y), min(c0, x), max(r1, y), max(c1, x)
+            for ny, nx in ((y - 1, x), (y + 1, x), (y, x - 1), (y, x + 1)):
+                if 0 <= ny < rows and 0 <= nx < cols and mask[ny, nx] and not seen[ny, nx]:
+                    seen[ny, nx] = True
+                    stack.append((ny, nx))
+        if size >= VISION_ROI_MIN_CELLS or kept:
+            boxes.append((int(r0), int(c0), int(r1) + 1, int(c1) + 1))
+    return boxes
+
+
+def _merge(rects: List[Rect]) -> List[Rect]:
+    """Union overlapping rectangles until none overlap"""
+    rects = [dict(r) for r in rects]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a['x'] < b['x'] + b['w'] and b['x'] < a['x'] + a['w'] and a['y'] < b['y'] + b['h'] and b['y'] < a['y'] + a['h']:
+                    x, y = min(a['x'], b['x']), min(a['y'], b['y'])
+                    rects[i] = {
+                        'x': x, 'y': y,
+                        'w': max(a['x'] + a['w'], b['x'] + b['w']) - x,
+                        'h': max(a['y'] + a['h'], b['y'] + b['h']) - y
+                    }
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+def _tiles(rect: Rect, tile: int) -> List[Rect]:
+    nx = max(1, math.ceil(rect['w'] / tile))
+    ny = max(1, math.ceil(rect['h'] / tile))
+    if nx == 1 and ny == 1:
+        return [rect]
+    tw, th = math.ceil(rect['w'] / nx), math.ceil(rect['h'] / ny)
+    return [
+        {
+            'x': rect['x'] + i * tw,
+            'y': rect['y'] + j * th,
+            'w': min(tw, rect['x'] + rect['w'] - (rect['x'] + i * tw)),
+            'h': min(th, rect['y'] + rect['h'] - (rect['y'] + j * th))
+        }
+        for j in range(ny) for i in range(nx)
+    ]
+
+
+def select_regions(
+    viewport_w: int,
+    viewport_h: int,
+    covered: List[Rect],
+    blind: Optional[List[Rect]] = None,
+    gray: Optional[np.ndarray] = None,
+    cell: int = VISION_ROI_CELL_PX
+) -> Dict[str, Any]:
+    """
+    Regions of the viewport that need the visual detector.
+
+    Args:
+        covered: viewport bboxes of DOM clickables
+        blind: viewport rects the DOM cannot see into (canvas, iframe, svg, image buttons)
+        gray: grayscale frame at sample_size() for the blank test (None = no blank test)
+
+    Returns:
+        {"mode": "roi" | "full" | "none", "regions": [viewport rects], "area_fraction": float}
+    """
+    rows, cols = math.ceil(viewport_h / cell), math.ceil(viewport_w / cell)
+    covered_mask = np.zeros((rows, cols), dtype=bool)
+    blind_mask = np.zeros((rows, cols), dtype=bool)
+    # A cell touching a clickable is explained by it (its edges would otherwise look like content)
+    _mark(covered_mask, covered, cell, touch=True)
+    _mark(blind_mask, blind or [], cell)
+
+    needed = ~covered_mask
+    if gray is not None and gray.shape == (rows * _SAMPLES, cols * _SAMPLES):
+        needed &= ~blank_cells(gray, rows, cols)
+    needed |= blind_mask
+
+    rects = []
+    for r0, c0, r1, c1 in _components(needed, blind_mask):
+        x, y = max(0, c0 * cell - VISION_ROI_PAD_PX), max(0, r0 * cell - VISION_ROI_PAD_PX)
+        rects.append({
+            'x': x,
+            'y': y,
+            'w': min(viewport_w, c1 * cell + VISION_ROI_PAD_PX) - x,
+            'h': min(viewport_h, r1 * cell + VISION_ROI_PAD_PX) - y
+        })
+    rects = _merge(rects)
+    area = sum(r['w'] * r['h'] for r in rects) / float(max(1, viewport_w * viewport_h))
+
+    if not rects:
+        return {"mode": "none", "regions": [], "area_fraction": 0.0}
+    if area > VISION_ROI_MAX_FRACTION:
+        return {"mode": "full", "regions": [{'x': 0, 'y': 0, 'w': viewport_w, 'h': viewport_h}], "area_fraction": round(area, 3)}
+    regions = [t for r in rects for t in _tiles(r, VISION_ROI_TILE_PX)]
+    return {"mode": "roi", "regions": regions, "area_fraction": round(area, 3)}
@@ -0,0 +1,230 @@
+"""
+Visual Diff Service - tile-based perceptual change detection between screenshots
+Each frame is reduced to a grid of tiles; every tile gets a difference hash
+(dHash) plus its mean brightness. Two frames are compared tile by tile, giving
+a changed-tile mask, changed regions and a change score (fraction of tiles
+changed). Callers use the score to skip vision and LLM work when nothing
+visible happened.
+"""
+import os
+import io
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Union
+
+import numpy as np
+
+from services.screenshot_store import screenshot_store, ScreenshotRef
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except Exception as e:
+    logger.warning(f"⚠️ PIL not available, visual diff disabled: {e}")
+    Image = None
+
+VISUAL_DIFF_TILES_X = int(os.environ.get('VISUAL_DIFF_TILES_X', '16'))
+VISUAL_DIFF_TILES_Y = int(os.environ.get('VISUAL_DIFF_TILES_Y', '12'))
+# Hamming distance (out of 64 bits) at which a tile counts as changed
+VISUAL_DIFF_TILE_BITS = int(os.environ.get('VISUAL_DIFF_TILE_BITS', '6'))
+# Mean brightness delta (0-255) at which a tile counts as changed (catches flat recolors)
+VISUAL_DIFF_TILE_MEAN = float(os.environ.get('VISUAL_DIFF_TILE_MEAN', '10'))
+# Frames whose change score is below this are treated as "nothing visible changed"
+# (default is below one tile of the 16x12 grid: any changed tile counts)
+VISUAL_CHANGE_THRESHOLD = float(os.environ.get('VISUAL_CHANGE_THRESHOLD', '0.005'))
+
+# Plan actions that are not expected to change the screen (an unchanged frame passes them unvalidated)
+NO_CHANGE_ACTIONS = ('WAIT',)
+
+HASH_SIZE = 8
+SIGNATURE_CACHE_SIZE = 256
+
+FrameLike = Union[ScreenshotRef, Dict[str, Any], str, bytes, None]
+
+
+class VisualDiffService:
+    """
+    Tile perceptual hash + diff over screenshots.
+    - compare(a, b): change between two frames
+    - is_unchanged(diff): below VISUAL_CHANGE_THRESHOLD
+    - skips_validation(action, ...): unchanged frame is enough to pass a plan step
+    """
+
+    def __init__(self):
+        self.tiles_x = VISUAL_DIFF_TILES_X
+        self.tiles_y = VISUAL_DIFF_TILES_Y
+        self.threshold = VISUAL_CHANGE_THRESHOLD
+        self._signatures: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"comparisons": 0, "unchanged": 0, "skipped": {}}
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def signature(self, frame: FrameLike) -> Optional[Dict[str, Any]]:
+        """Per-tile dHash (ty, tx, 8 bytes) and mean brightness (ty, tx) for a frame"""
+        if Image is None or frame is None:
+            return None
+        digest = None
+        if isinstance(frame, (bytes, bytearray)):
+            data = bytes(frame)
+        else:
+            digest = frame.digest if isinstance(frame, ScreenshotRef) else (frame.get("digest") if isinstance(frame, dict) else frame)
+            cached = self._signatures.get(digest)
+            if cached is not None:
+                self._signatures.move_to_end(digest)
+                return cached
+            data = screenshot_store.get_bytes(digest)
+            if data is None:
+                return None
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                width, height = img.size
+                # dHash needs HASH_SIZE+1 columns per tile
+                small = img.convert('L').resize(
+                    (self.tiles_x * (HASH_SIZE + 1), self.tiles_y * HASH_SIZE),
+                    Image.BILINEAR
+                )
+            pixels = np.asarray(small, dtype=np.int16)
+            tiles = pixels.reshape(self.tiles_y, HASH_SIZE, self.tiles_x, HASH_SIZE + 1).transpose(0, 2, 1, 3)
+            bits = tiles[..., 1:] > tiles[..., :-1]
+            hashes = np.packbits(bits.reshape(self.tiles_y, self.tiles_x, HASH_SIZE * HASH_SIZE), axis=-1)
+            means = tiles.mean(axis=(2, 3)).astype(np.float32)
+        except Exception as e:
+            logger.warning(f"⚠️ [DIFF] Signature failed: {e}")
+            return None
+        sig = {"hashes": hashes, "means": means, "width": width, "height": height, "digest": digest}
+        if digest:
+            self._signatures[digest] = sig
+            while len(self._signatures) > SIGNATURE_CACHE_SIZE:
+                self._signatures.popitem(last=False)
+        return sig
+
+    def compare(self, before: FrameLike, after: FrameLike) -> Dict[str, Any]:
+        """
+        Compare two frames.
+
+        Returns:
+            {change_score, changed_tiles, total_tiles, mask, regions, identical, available}
+            change_score is 1.0 when either frame is unknown (assume changed).
+        """
+        total = self.tiles_x * self.tiles_y
+        before_digest = self._digest(before)
+        after_digest = self._digest(after)
+        self.stats["comparisons"] += 1
+
+        if before_digest and before_digest == after_digest:
+            self.stats["unchanged"] += 1
+            return self._result(0.0, np.zeros((self.tiles_y, self.tiles_x), dtype=bool), None, identical=True)
+
+        sig_a = self.signature(before)
+        sig_b = self.signature(after)
+        if sig_a is None or sig_b is None:
+            return {
+                "change_score": 1.0, "changed_tiles": total, "total_tiles": total,
+                "mask": None, "regions": [], "identical": False, "available": False
+            }
+
+        distance = np.unpackbits(np.bitwise_xor(sig_a["hashes"], sig_b["hashes"]), axis=-1).sum(axis=-1)
+        mean_delta = np.abs(sig_a["means"] - sig_b["means"])
+        mask = (distance >= VISUAL_DIFF_TILE_BITS) | (mean_delta >= VISUAL_DIFF_TILE_MEAN)
+        if sig_a["width"] != sig_b["width"] or sig_a["height"] != sig_b["height"]:
+            mask[:] = True
+        score = float(mask.sum()) / total
+        if score < self.threshold:
+            self.stats["unchanged"] += 1
+        return self._result(score, mask, sig_b)
+
+    async def compare_async(self, before: FrameLike, after: FrameLike) -> Dict[str, Any]:
+        """compare() off the event loop (image decode is CPU work)"""
+        return await asyncio.to_thread(self.compare, before, after)
+
+    def is_unchanged(self, diff: Optional[Dict[str, Any]]) -> bool:
+        return bool(diff) and diff.get("change_score", 1.0) < self.threshold
+
+    def skips_validation(
+        self,
+        action: str,
+        change_score: Optional[float],
+        url_before: Optional[str] = None,
+        url_after: Optional[str] = None
+    ) -> bool:
+        """
+        Whether a plan step may pass without the validator because nothing changed.
+        Only steps that should not change the screen qualify: WAIT, and NAVIGATE to
+        the URL the page was already on. VERIFY_RESULT judges the screen as it is
+        (an error left by the previous step included), so it is always validated.
+        """
+        if change_score is None or change_score >= self.threshold:
+            return False
+        action = (action or '').upper()
+        if action == 'NAVIGATE':
+            return bool(url_before) and url_before == url_after
+        return action in NO_CHANGE_ACTIONS
+
+    def record_skip(self, kind: str):
+        """Count work skipped thanks to an unchanged frame (vision, verify_step, validator, ...)"""
+        self.stats["skipped"][kind] = self.stats["skipped"].get(kind, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "threshold": self.threshold,
+            "tiles": [self.tiles_x, self.tiles_y],
+            "available": self.available
+        }
+
+    def _result(self, score: float, mask: np.ndarray, sig: Optional[Dict[str, Any]], identical: bool = False) -> Dict[str, Any]:
+        regions = self._regions(mask, sig["width"], sig["height"]) if sig is not None and mask.any() else []
+        return {
+            "change_score": round(score, 4),
+            "changed_tiles": int(mask.sum()),
+            "total_tiles": int(mask.size),
+            "mask": mask.astype(np.uint8).tolist(),
+            "regions": regions,
+            "identical": identical,
+            "available": True
+        }
+
+    def _regions(self, mask: np.ndarray, width: int, height: int) -> List[Dict[str, int]]:
+        """Bounding boxes (image pixels) of 4-connected groups of changed tiles"""
+        tile_w = width / self.tiles_x
+        tile_h = height / self.tiles_y
+        seen = np.zeros_like(mask, dtype=bool)
+        regions = []
+        for ty, tx in zip(*np.nonzero(mask)):
+            if seen[ty, tx]:
+                continue
+            stack = [(ty, tx)]
+            seen[ty, tx] = True
+            y0 = y1 = ty
+            x0 = x1 = tx
+            while stack:
+                cy, cx = stack.pop()
+                y0, y1, x0, x1 = min(y0, cy), max(y1, cy), min(x0, cx), max(x1, cx)
+                for ny, nx in ((cy - 1, cx), (cy + 1, cx), (cy, cx - 1), (cy, cx + 1)):
+                    if 0 <= ny < mask.shape[0] and 0 <= nx < mask.shape[1] and mask[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        stack.append((ny, nx))
+            regions.append({
+                "x": int(x0 * tile_w),
+                "y": int(y0 * tile_h),
+                "w": int((x1 - x0 + 1) * tile_w),
+                "h": int((y1 - y0 + 1) * tile_h)
+            })
+        return regions
+
+    def _digest(self, frame: FrameLike) -> Optional[str]:
+        if isinstance(frame, ScreenshotRef):
+            return frame.digest
+        if isinstance(frame, dict):
+            return frame.get("digest")
+        if isinstance(frame, str):
+            return frame
+        return None
+
+
+# Global instance
+visual_diff_service = VisualDiffService()
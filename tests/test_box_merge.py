@@ -0,0 +1,51 @@
+"""
+Box merge tiers: only DOM (tier 0) skips NMS. Visual detections are deduped
+among themselves even when the page has no DOM elements at all.
+"""
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.box_merge import merge_boxes, merge_elements  # noqa: E402
+from services.element_set import ElementSet  # noqa: E402
+
+SAME = [10, 10, 110, 40]
+
+
+def test_vision_only_duplicates_are_suppressed():
+    boxes = np.array([SAME, SAME, SAME], dtype=np.float32)
+    keep = merge_boxes(boxes, np.array([1, 1, 1]), np.array([0.5, 0.9, 0.7]))
+    assert keep.tolist() == [1]
+
+
+def test_dedupe_does_not_depend_on_an_unrelated_dom_box():
+    boxes = np.array([[500, 500, 600, 530], SAME, SAME, SAME], dtype=np.float32)
+    keep = merge_boxes(boxes, np.array([0, 1, 1, 1]), np.array([0, 0.5, 0.9, 0.7]))
+    assert keep.tolist() == [0, 2]
+
+
+def test_dom_tier_is_kept_as_is():
+    boxes = np.array([SAME, SAME, [12, 12, 108, 38]], dtype=np.float32)
+    assert merge_boxes(boxes, np.array([0, 0, 0])).tolist() == [0, 1, 2]
+
+
+def test_merge_elements_without_dom():
+    florence = [{"bbox": SAME, "label": "icon", "confidence": c} for c in (0.4, 0.8)]
+    ocr = [{"bbox": [300, 300, 360, 320], "label": "Next", "confidence": 0.7}] * 2
+    merged = merge_elements([[], florence, ocr])
+    assert [(el["label"], el["confidence"]) for el in merged] == [("icon", 0.8), ("Next", 0.7)]
+
+
+def test_element_set_merge_without_dom():
+    florence = ElementSet.from_dicts(
+        [{"bbox": SAME, "label": "icon", "type": "icon", "confidence": c} for c in (0.4, 0.8, 0.6)],
+        source="florence2"
+    )
+    merged = ElementSet.merge([ElementSet.empty(), florence])
+    assert len(merged) == 1
+    assert merged.confidence.tolist() == [pytest.approx(0.8)]
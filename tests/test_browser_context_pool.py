@@ -0,0 +1,128 @@
+"""
+Browser context pool cap: with max_contexts sessions open and no warm context
+to evict, acquire waits for a session to close and then raises PoolExhausted
+instead of opening one context too many. Runs against a fake browser.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.browser_context_pool import BrowserContextPool, PoolExhausted  # noqa: E402
+
+KEY = "ctx:test"
+
+
+class FakePage:
+    def is_closed(self):
+        return False
+
+    def on(self, event, callback):
+        pass
+
+    async def add_init_script(self, script):
+        pass
+
+    async def evaluate(self, script, *args):
+        return None
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self._on_close = []
+
+    def once(self, event, callback):
+        if event == "close":
+            self._on_close.append(callback)
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        self.browser.open.discard(self)
+        for callback in self._on_close:
+            callback(self)
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.open = set()
+        self.peak = 0
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self, **options):
+        context = FakeContext(self)
+        self.open.add(context)
+        self.peak = max(self.peak, len(self.open))
+        return context
+
+
+@pytest.fixture
+def pool_env():
+    browser = FakeBrowser()
+    sessions = {}
+    pool = BrowserContextPool(lambda: browser, lambda: len(sessions), max_contexts=2, acquire_timeout_s=0.3)
+
+    async def open_session(name, attach=True):
+        context, _, _ = await pool.acquire(KEY, template={"locale": "en-US"})
+        if attach:
+            sessions[name] = context
+            pool.attached(context)
+        return context
+
+    async def close_session(name):
+        await sessions.pop(name).close()
+        pool.release()
+
+    return browser, pool, open_session, close_session
+
+
+def test_acquire_past_the_cap_raises(pool_env):
+    browser, pool, open_session, _ = pool_env
+
+    async def run():
+        await open_session("a")
+        await open_session("b")
+        with pytest.raises(PoolExhausted):
+            await open_session("c")
+
+    asyncio.run(run())
+    assert browser.peak == 2
+    assert pool.get_stats()["exhausted"] == 1
+
+
+def test_acquire_waits_for_a_session_to_close(pool_env):
+    browser, pool, open_session, close_session = pool_env
+
+    async def run():
+        await open_session("a")
+        await open_session("b")
+        waiting = asyncio.ensure_future(open_session("c"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        await close_session("a")
+        await asyncio.wait_for(waiting, 1.0)
+
+    asyncio.run(run())
+    assert browser.peak == 2
+    assert pool.get_stats()["waited"] == 1
+
+
+def test_contexts_not_yet_attached_count_towards_the_cap(pool_env):
+    browser, _, open_session, _ = pool_env
+
+    async def run():
+        await asyncio.gather(open_session("a", attach=False), open_session("b", attach=False))
+        with pytest.raises(PoolExhausted):
+            await open_session("c", attach=False)
+
+    asyncio.run(run())
+    assert browser.peak == 2
@@ -0,0 +1,63 @@
+"""
+TacticalBrain target ranking through ElementMatcher on a typical sign-up form:
+the intended field / button must come first for the usual targets, ahead of
+links, checkboxes and buttons that only share a word with the target.
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.element_matcher import ElementMatcher  # noqa: E402
+
+
+def element(cell, y, label, etype, **extra):
+    return {"cell": cell, "bbox": {"x": 400, "y": y, "w": 300, "h": 36}, "label": label, "type": etype, **extra}
+
+
+SIGNUP_PAGE = [
+    element("A1", 20, "Log in", "a"),
+    element("A9", 20, "Subscribe", "button"),
+    element("B3", 150, "First name", "input"),
+    element("C3", 210, "Email address", "input"),
+    element("D3", 270, "Password", "input"),
+    element("E3", 330, "Confirm password", "input"),
+    element("F3", 390, "Email me product news", "checkbox"),
+    element("G3", 450, "Forgot password?", "a"),
+    element("H3", 520, "Submit", "button", role="button"),
+    element("J3", 760, "Submit a support ticket", "a"),
+]
+
+
+def ranking(target, field, element_type, context_fit, elements=SIGNUP_PAGE):
+    results = ElementMatcher(elements).top_k(target, field, element_type, context_fit)
+    return [r["element"]["label"] for r in results]
+
+
+@pytest.mark.parametrize("target, field, element_type, context_fit, expected", [
+    ("Email", "email", "textbox", 1.0, ["Email address", "Email me product news"]),
+    ("e-mail", "email", "textbox", 1.0, ["Email address", "Email me product news"]),
+    ("Password", "password", "textbox", 1.0, ["Password", "Confirm password", "Forgot password?"]),
+    ("Submit", None, "button", 0.5, ["Submit"]),
+])
+def test_typical_targets_rank_first(target, field, element_type, context_fit, expected):
+    assert ranking(target, field, element_type, context_fit)[:len(expected)] == expected
+
+
+def test_position_breaks_ties_between_equal_labels():
+    # Primary action buttons sit low on the form: same label and type, the lower one wins
+    page = [element("A5", 40, "Continue", "button"), element("H5", 600, "Continue", "button")]
+    results = ElementMatcher(page).top_k("Continue", None, "button", 0.5, k=2)
+    assert [r["cell"] for r in results] == ["H5", "A5"]
+    assert results[0]["position_score"] > results[1]["position_score"]
+
+
+def test_offscreen_entry_ranks_below_visible_match():
+    page = SIGNUP_PAGE + [{**element(None, 1900, "Submit", "button"), "eid": "e42", "offscreen": True}]
+    results = ElementMatcher(page, offscreen_factor=0.85).top_k("Submit", None, "button", 0.5)
+    assert results[0]["cell"] == "H3"
+    assert results[1]["element"]["eid"] == "e42"
@@ -0,0 +1,74 @@
+"""
+Florence-2 ONNX decoding: KV-cache reuse must generate the same tokens as
+re-running the decoder over the whole sequence. Runs on the tiny synthetic
+model from backend/benchmarks/florence_tiny.py (CPU, a few KiB of weights).
+"""
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from benchmarks.florence_tiny import EOS, STOP_AT, build_tiny_florence, tiny_inputs  # noqa: E402
+from services.florence_onnx import Florence2OnnxPipeline  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def pipeline(tmp_path_factory):
+    out_dir = build_tiny_florence(str(tmp_path_factory.mktemp("florence_tiny")))
+    pipeline = Florence2OnnxPipeline(out_dir, variant="")
+    pipeline.load()
+    return pipeline
+
+
+def uncached_decode(pipeline, hidden, attention_mask, max_new_tokens=32):
+    """Greedy decoding without a cache: the full token sequence goes through the decoder every step"""
+    embed = pipeline.sessions["embed_tokens"]
+    decoder = pipeline.sessions["decoder_model_merged"]
+    empty = {name: np.zeros((1, heads, 0, head_dim), dtype=dtype) for name, heads, head_dim, dtype in pipeline._past_specs}
+    tokens = [pipeline.decoder_start_token_id]
+    for step in range(max_new_tokens):
+        embeds = embed.run(None, {"input_ids": np.array([tokens], dtype=np.int64)})[0]
+        outputs = decoder.run(None, {
+            "inputs_embeds": embeds,
+            "encoder_hidden_states": hidden,
+            "encoder_attention_mask": attention_mask,
+            "use_cache_branch": np.array([False]),
+            **empty
+        })
+        next_token = pipeline._next_token(outputs[pipeline._logits_index][0, -1], tokens, step, max_new_tokens)
+        tokens.append(next_token)
+        if next_token == pipeline.eos_token_id:
+            break
+    return tokens
+
+
+def test_cached_decode_matches_uncached(pipeline):
+    pixel_values, input_ids = tiny_inputs()
+    hidden, attention_mask = pipeline.encode(pixel_values, input_ids)
+
+    cached = pipeline.decode(hidden, attention_mask, max_new_tokens=32)
+    assert cached == uncached_decode(pipeline, hidden, attention_mask)
+    assert cached == [2, 0] + list(range(4, STOP_AT + 2)) + [EOS]
+
+
+def test_batched_encode_decodes_like_single_images(pipeline):
+    pixel_values, input_ids = tiny_inputs(batch=3, seed=1)
+
+    batched = pipeline.generate_batch(pixel_values, input_ids, max_new_tokens=32)
+    single = [pipeline.generate(pixel_values[i:i + 1], input_ids[i:i + 1], max_new_tokens=32) for i in range(3)]
+    assert batched == single
+
+
+def test_max_new_tokens_forces_eos(pipeline):
+    pixel_values, input_ids = tiny_inputs()
+    hidden, attention_mask = pipeline.encode(pixel_values, input_ids)
+
+    tokens = pipeline.decode(hidden, attention_mask, max_new_tokens=4)
+    assert tokens == uncached_decode(pipeline, hidden, attention_mask, max_new_tokens=4)
+    assert len(tokens) == 5 and tokens[-1] == EOS
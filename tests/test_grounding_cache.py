@@ -0,0 +1,63 @@
+"""
+Grounding cache verdict keys: a verdict is only replayed for the same evidence
+(page errors, success messages, page type, frame), not just the same elements.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.grounding_cache_service import GroundingCacheService, evidence_digest  # noqa: E402
+
+URL = "https://example.com/signup"
+ELEMENTS = [
+    {"cell": "C3", "label": "Email", "type": "input"},
+    {"cell": "H3", "label": "Create account", "type": "button"},
+]
+STEP = {"action": "CLICK", "target": "Create account"}
+
+
+@pytest.fixture
+def cache():
+    service = GroundingCacheService()
+    service._db_failed = True  # memory only
+    return service
+
+
+def verdict_step(page_analysis=None, frame=None):
+    return {**STEP, "evidence": evidence_digest(page_analysis, frame)}
+
+
+def test_new_page_error_misses_the_stored_success(cache):
+    clean = {"page_type": "registration", "errors": [], "success_messages": []}
+    failed = {**clean, "errors": ["Email is already taken"]}
+
+    async def run():
+        await cache.store("verify_step", URL, verdict_step(clean), ELEMENTS, result={"success": True})
+        return (await cache.lookup("verify_step", URL, verdict_step(clean), ELEMENTS),
+                await cache.lookup("verify_step", URL, verdict_step(failed), ELEMENTS))
+
+    hit, miss = asyncio.run(run())
+    assert hit["result"] == {"success": True}
+    assert miss is None
+
+
+def test_evidence_digest_ignores_message_order_and_case():
+    a = {"page_type": "login", "errors": ["Password required", "Email required"]}
+    b = {"page_type": "login", "errors": ["email required", "password required"]}
+    assert evidence_digest(a) == evidence_digest(b)
+    assert evidence_digest(a) != evidence_digest({**a, "page_type": "registration"})
+    assert evidence_digest(a) != evidence_digest(a, frame="f" * 32)
+
+
+def test_validator_verdict_is_tied_to_its_frame(cache):
+    async def run():
+        await cache.store("next_step", URL, verdict_step(frame="frame-a"), ELEMENTS, result={"next_action": "DONE"})
+        return await cache.lookup("next_step", URL, verdict_step(frame="frame-b"), ELEMENTS)
+
+    assert asyncio.run(run()) is None
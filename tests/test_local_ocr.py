@@ -0,0 +1,87 @@
+"""
+Local OCR over a perception's regions: the frame is decoded once for all of
+its regions, and decoding / cropping / hashing stay off the event loop thread.
+The Florence-2 OCR call itself is replaced by a recording fake.
+"""
+import asyncio
+import io
+import os
+import sys
+import threading
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+pytest.importorskip("numpy")
+pytest.importorskip("playwright.async_api")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import services.local_ocr_service as ocr_module  # noqa: E402
+from services.local_ocr_service import LocalOcrService  # noqa: E402
+from services.local_vision_service import LocalVisionService  # noqa: E402
+from services.screenshot_store import screenshot_store  # noqa: E402
+
+REGIONS = [{"x": 0, "y": 0, "w": 200, "h": 100}, {"x": 0, "y": 200, "w": 300, "h": 100}, {"x": 400, "y": 400, "w": 120, "h": 60}]
+
+
+@pytest.fixture
+def frame():
+    image = Image.new("RGB", (640, 480), "white")
+    for i, r in enumerate(REGIONS):
+        image.paste((40 * i, 0, 0), (r["x"], r["y"], r["x"] + r["w"], r["y"] + r["h"]))
+    data = io.BytesIO()
+    image.save(data, format="PNG")
+    return screenshot_store.put(data.getvalue(), "png", 640, 480, session_id="ocr-test")
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    reads = []
+    monkeypatch.setattr(LocalVisionService, "ready", property(lambda self: True))
+    monkeypatch.setattr(
+        LocalVisionService, "ocr_image",
+        lambda self, image, with_regions=False, cancel=None: reads.append(image.size) or {"text": f"text {image.size[0]}", "lines": []}
+    )
+    return reads
+
+
+def test_perception_regions_share_one_decode_off_the_loop(monkeypatch, frame, fake_model):
+    opened, threads = [], []
+    real_open = ocr_module.Image.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(1)
+        threads.append(threading.current_thread())
+        return real_open(*args, **kwargs)
+
+    monkeypatch.setattr(ocr_module.Image, "open", counting_open)
+    perception = {
+        "session_id": "ocr-test",
+        "screenshot_ref": frame.to_dict(),
+        "viewport": [640, 480],
+        "dom_data": {"blind": REGIONS}
+    }
+
+    async def run():
+        return threading.current_thread(), await LocalOcrService().read_perception(perception)
+
+    loop_thread, result = asyncio.run(run())
+    assert result["available"] and result["regions"] == 3
+    assert sorted(fake_model) == [(120, 60), (200, 100), (300, 100)]
+    assert len(opened) == 1
+    assert threads[0] is not loop_thread
+
+
+def test_repeated_region_hits_cache_without_decoding(frame, fake_model):
+    service = LocalOcrService()
+
+    async def run():
+        first = await service.read_text("ocr-test", REGIONS[0], frame)
+        second = await service.read_text("ocr-test", REGIONS[0], frame)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert not first["cached"] and second["cached"]
+    assert second["text"] == "text 200"
+    assert len(fake_model) == 1
@@ -0,0 +1,97 @@
+"""
+Page readiness: fetch/XHR in flight are tracked from Playwright request events
+on the Python side, so the page's own fetch/XMLHttpRequest stay native. Runs
+against a fake page that emits request events and serves the probe state.
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.page_readiness_service import READINESS_PROBE_JS, PageReadinessService  # noqa: E402
+
+
+class FakeRequest:
+    def __init__(self, resource_type):
+        self.resource_type = resource_type
+
+
+class FakePage:
+    url = "https://example.com/app"
+
+    def __init__(self):
+        self.listeners = {}
+        self.init_scripts = []
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def emit(self, event, request):
+        for callback in self.listeners.get(event, []):
+            callback(request)
+
+    async def add_init_script(self, script):
+        self.init_scripts.append(script)
+
+    async def evaluate(self, script, *args):
+        if "__chimeraReady.state" in script:
+            return {"ready_state": "complete", "quiet_ms": 10_000, "spinner": None}
+        return None
+
+
+def test_probe_leaves_page_network_apis_alone():
+    assert "fetch" not in READINESS_PROBE_JS
+    assert "XMLHttpRequest" not in READINESS_PROBE_JS
+
+
+def test_wait_holds_until_tracked_request_finishes():
+    page, service = FakePage(), PageReadinessService()
+
+    async def run():
+        await service.ensure_probe(page)
+        await service.ensure_probe(page)
+        api, image = FakeRequest("fetch"), FakeRequest("image")
+        page.emit("request", api)
+        page.emit("request", image)
+        waiting = asyncio.ensure_future(service.wait_until_settled(page, settle_ms=50, timeout_ms=2000))
+        await asyncio.sleep(0.2)
+        assert not waiting.done()
+        page.emit("requestfinished", api)
+        return await waiting
+
+    result = asyncio.run(run())
+    assert result["settled"] and result["reason"] == "quiet"
+    assert result["inflight"] == 0 and result["network_quiet_ms"] >= 50
+    assert 200 <= result["elapsed_ms"] < 2000
+    assert len(page.init_scripts) == 1 and len(page.listeners["request"]) == 1
+
+
+def test_pending_request_reports_network_at_deadline():
+    page, service = FakePage(), PageReadinessService()
+
+    async def run():
+        await service.ensure_probe(page)
+        page.emit("request", FakeRequest("xhr"))
+        return await service.wait_until_settled(page, settle_ms=50, timeout_ms=150)
+
+    result = asyncio.run(run())
+    assert not result["settled"] and result["reason"] == "network"
+    assert result["inflight"] == 1
+
+
+def test_failed_request_counts_as_done():
+    page, service = FakePage(), PageReadinessService()
+
+    async def run():
+        await service.ensure_probe(page)
+        request = FakeRequest("fetch")
+        page.emit("request", request)
+        page.emit("requestfailed", request)
+        return await service.status(page)
+
+    assert asyncio.run(run())["is_loading"] is False
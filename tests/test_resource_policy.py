@@ -0,0 +1,78 @@
+"""
+Resource policy relaxation: a vision step must see the imagery a stricter
+policy kept off the already loaded page, not only allow it for later requests.
+Runs headless Chromium against a local HTTP server.
+"""
+import asyncio
+import base64
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("playwright.async_api")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from playwright.async_api import async_playwright  # noqa: E402
+from services.resource_policy_service import ResourcePolicyService  # noqa: E402
+
+PIXEL_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+PAGE = b'<html><body><img id="logo" src="/pixel.png"><button>Sign up</button></body></html>'
+
+
+@pytest.fixture
+def server():
+    requested = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            body, kind = (PIXEL_PNG, "image/png") if self.path == "/pixel.png" else (PAGE, "text/html")
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}", requested
+    httpd.shutdown()
+
+
+def test_relaxed_step_fetches_previously_blocked_image(server):
+    base_url, requested = server
+    service = ResourcePolicyService()
+
+    async def run():
+        async with async_playwright() as pw:
+            try:
+                browser = await pw.chromium.launch()
+            except Exception as e:
+                pytest.skip(f"Chromium not available: {e}")
+            context = await browser.new_context()
+            await service.attach("s1", context, "strict")
+            page = await context.new_page()
+            await page.goto(base_url + "/")
+            blocked = await page.evaluate("document.getElementById('logo').naturalWidth")
+            fetched_before = "/pixel.png" in requested
+
+            await service.begin_step("s1", action="VERIFY_RESULT")
+            loaded = await page.evaluate("document.getElementById('logo').naturalWidth")
+            await service.end_step("s1")
+            await browser.close()
+            return blocked, fetched_before, loaded
+
+    blocked, fetched_before, loaded = asyncio.run(run())
+    assert blocked == 0 and not fetched_before
+    assert loaded == 1
+    assert "/pixel.png" in requested
+    assert service.last_navigation("s1")["blocked_by_type"] == {"image": 1}
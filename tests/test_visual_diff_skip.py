@@ -0,0 +1,45 @@
+"""
+Plan step validation skip: an unchanged frame only passes steps that are not
+expected to change the screen. VERIFY_RESULT has no action of its own, so its
+frames are nearly always identical, and it must still reach the validator.
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("playwright.async_api")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from services.visual_diff_service import VisualDiffService  # noqa: E402
+
+URL = "https://example.com/signup"
+
+
+@pytest.fixture
+def service():
+    return VisualDiffService()
+
+
+def test_verify_result_is_always_validated(service):
+    assert not service.skips_validation("VERIFY_RESULT", 0.0, URL, URL)
+    assert not service.skips_validation("verify_result", 0.0)
+
+
+def test_wait_skips_only_when_unchanged(service):
+    assert service.skips_validation("WAIT", 0.0)
+    assert not service.skips_validation("WAIT", 0.5)
+    assert not service.skips_validation("WAIT", None)
+
+
+def test_navigate_skips_only_to_the_same_url(service):
+    assert service.skips_validation("NAVIGATE", 0.0, URL, URL)
+    assert not service.skips_validation("NAVIGATE", 0.0, URL, "https://example.com/welcome")
+    assert not service.skips_validation("NAVIGATE", 0.0, None, URL)
+
+
+@pytest.mark.parametrize("action", ["CLICK", "TYPE", "WAIT_USER"])
+def test_acting_steps_are_always_validated(service, action):
+    assert not service.skips_validation(action, 0.0, URL, URL)